@@ -0,0 +1,61 @@
+"""
+Backfill user search fields
+為既有使用者寫入 email_normalized 與 name_grams (好友搜尋索引欄位)
+可重複執行：只處理尚未有搜尋欄位的使用者
+"""
+
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.config import settings
+from src.utils.user_search import search_fields
+
+BATCH_SIZE = 1000
+
+
+async def backfill_user_search():
+    print("=" * 60)
+    print("[BACKFILL] Writing user search fields")
+    print("=" * 60)
+
+    client = AsyncIOMotorClient(settings.MONGODB_URI)
+    db = client[settings.DB_NAME]
+
+    try:
+        updated = 0
+        while True:
+            users = await db.users.find(
+                {"name_grams": {"$exists": False}},
+                projection={"email": 1, "display_name": 1}
+            ).limit(BATCH_SIZE).to_list(length=BATCH_SIZE)
+            if not users:
+                break
+
+            await db.users.bulk_write([
+                UpdateOne(
+                    {"_id": user["_id"]},
+                    {"$set": search_fields(user.get("email", ""), user.get("display_name", ""))}
+                )
+                for user in users
+            ], ordered=False)
+            updated += len(users)
+            print(f"  [OK] {updated} users")
+
+        print("\n" + "=" * 60)
+        print(f"[OK] Backfilled {updated} users")
+        print("=" * 60)
+
+    except Exception as e:
+        print(f"\n[ERROR] {e}")
+        import traceback
+        traceback.print_exc()
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    asyncio.run(backfill_user_search())
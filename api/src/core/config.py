@@ -20,12 +20,35 @@ class Settings(BaseSettings):
     # The following are optional - they will be extracted from FIREBASE_PRIVATE_KEY if not provided
     FIREBASE_PROJECT_ID: Optional[str] = None
     FIREBASE_CLIENT_EMAIL: Optional[str] = None
+    # Push delivery backend: firebase | fake (local fake that records messages)
+    FCM_BACKEND: str = "firebase"
 
     # Cloudflare R2 Configuration
     R2_ACCOUNT_ID: str
     R2_ACCESS_KEY: str
     R2_SECRET_KEY: str
     R2_BUCKET_NAME: str = "motionstory-bucket"
+    # S3-compatible endpoint override (e.g. MinIO); defaults to the R2 account endpoint
+    R2_ENDPOINT_URL: Optional[str] = None
+
+    # Object Storage Configuration
+    STORAGE_BACKEND: str = "r2"  # r2 | local
+    LOCAL_STORAGE_DIR: str = "./storage"
+    LOCAL_STORAGE_PUBLIC_URL: str = "http://localhost:8000/static"
+    LOCAL_STORAGE_UPLOAD_URL: str = "http://localhost:8000/_local-storage"
+    # HMAC key for local presigned upload URLs (required when STORAGE_BACKEND=local; never the JWT key)
+    STORAGE_SIGNING_KEY: Optional[str] = None
+    STORAGE_MAX_CONNECTIONS: int = 32
+    STORAGE_MULTIPART_THRESHOLD: int = 8 * 1024 * 1024
+    STORAGE_MULTIPART_CHUNK_SIZE: int = 8 * 1024 * 1024
+    STORAGE_MULTIPART_CONCURRENCY: int = 4
+
+    # Realtime Push Configuration
+    REALTIME_BROKER: str = "local"  # local | redis (multiple workers share events through Redis pub/sub)
+    REDIS_URL: str = "redis://localhost:6379/0"
+
+    # Job Scheduler Configuration
+    SCHEDULER_ENABLED: bool = True  # every worker runs the scheduler; a Mongo lease picks one runner per job
 
     # JWT Configuration
     JWT_SECRET_KEY: str
@@ -3,8 +3,10 @@ MongoDB Database Connection
 使用 Motor (async MongoDB driver)
 """
 
+from datetime import datetime, timezone
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
-from typing import Optional
+from bson import ObjectId
+from typing import Dict, Optional, Union
 from .config import settings
 
 
@@ -57,6 +59,9 @@ class MongoDB:
         # T054: Users collection indexes
         await db.users.create_index("firebase_uid", unique=True, name="idx_firebase_uid")
         await db.users.create_index("email", unique=True, name="idx_email")
+        # 好友搜尋：正規化 Email 錨定前綴範圍與顯示名稱 n-gram (多鍵索引)
+        await db.users.create_index("email_normalized", name="idx_email_normalized")
+        await db.users.create_index("name_grams", name="idx_name_grams")
 
         # T055: Workouts collection indexes
         await db.workouts.create_index(
@@ -71,6 +76,11 @@ class MongoDB:
             [("user_id", 1), ("sync_status", 1)],
             name="idx_user_sync"
         )
+        await db.workouts.create_index(
+            [("delete_after", 1)],
+            name="idx_trash_delete_after",
+            partialFilterExpression={"is_deleted": True}
+        )
 
         # T056: Achievements collection indexes
         await db.achievements.create_index(
@@ -99,6 +109,15 @@ class MongoDB:
             [("user_id", 1), ("milestone_date", -1)],
             name="idx_user_milestone_date"
         )
+        # 時間軸游標分頁 (achieved_at, _id)，高亮篩選使用獨立索引
+        await db.milestones.create_index(
+            [("user_id", 1), ("achieved_at", -1), ("_id", -1)],
+            name="idx_user_achieved_at"
+        )
+        await db.milestones.create_index(
+            [("user_id", 1), ("highlighted", 1), ("achieved_at", -1), ("_id", -1)],
+            name="idx_user_highlighted_achieved_at"
+        )
 
         # T059: Annual reviews collection indexes
         await db.annual_reviews.create_index(
@@ -112,6 +131,34 @@ class MongoDB:
             [("user_id", 1), ("created_at", -1)],
             name="idx_user_created"
         )
+        await db.share_cards.create_index(
+            [("content_hash", 1)],
+            name="idx_content_hash",
+            sparse=True
+        )
+        await db.share_cards.create_index(
+            [("user_id", 1), ("achievement_id", 1), ("content_hash", 1)],
+            unique=True,
+            partialFilterExpression={"content_hash": {"$exists": True}},
+            name="idx_user_achievement_content"
+        )
+        # 背景繪製佇列領取工作
+        await db.share_cards.create_index(
+            [("status", 1), ("queued_at", 1)],
+            name="idx_status_queued_at"
+        )
+
+        # Upload sessions collection indexes
+        await db.upload_sessions.create_index(
+            [("user_id", 1), ("created_at", -1)],
+            name="idx_user_created"
+        )
+        # presigned URL 到期 7 天後清除工作階段記錄
+        await db.upload_sessions.create_index(
+            "expires_at",
+            expireAfterSeconds=7 * 24 * 3600,
+            name="idx_expires_at_ttl"
+        )
 
         # Phase 3: Social Features Indexes
 
@@ -183,6 +230,15 @@ class MongoDB:
             [("privacy", 1), ("status", 1)],
             name="idx_privacy_status"
         )
+        # 挑戰清單 keyset 分頁：等值條件 + (start_date, _id) 排序皆由索引提供
+        await db.challenges.create_index(
+            [("status", 1), ("start_date", -1), ("_id", -1)],
+            name="idx_status_start_id"
+        )
+        await db.challenges.create_index(
+            [("creator_id", 1), ("status", 1), ("start_date", -1), ("_id", -1)],
+            name="idx_creator_status_start_id"
+        )
 
         # T232: Participants collection indexes
         await db.participants.create_index(
@@ -208,12 +264,56 @@ class MongoDB:
             [("user_id", 1), ("is_read", 1)],
             name="idx_user_is_read"
         )
+        # 通知清單 keyset 分頁 (created_at, _id)
+        await db.notifications.create_index(
+            [("user_id", 1), ("created_at", -1), ("_id", -1)],
+            name="idx_user_created_id"
+        )
+        await db.notifications.create_index(
+            [("user_id", 1), ("is_read", 1), ("created_at", -1), ("_id", -1)],
+            name="idx_user_read_created_id"
+        )
+        # 按讚 / 留言通知合併：每位接收者、每則動態、每種互動、每個時段一筆
+        await db.notifications.create_index(
+            [("user_id", 1), ("reference_type", 1), ("reference_id", 1), ("window_start", 1)],
+            name="idx_user_reference_window_unique",
+            unique=True,
+            partialFilterExpression={"window_start": {"$exists": True}}
+        )
         await db.notifications.create_index(
             [("created_at", 1)],
             name="idx_created_at_ttl",
             expireAfterSeconds=2592000  # 30 days TTL
         )
 
+        # Push jobs collection indexes
+        # 推播佇列領取到期工作 (next_attempt_at) 與租約過期工作
+        await db.push_jobs.create_index(
+            [("status", 1), ("next_attempt_at", 1)],
+            name="idx_status_next_attempt"
+        )
+        await db.push_jobs.create_index(
+            [("status", 1), ("lease_expires_at", 1)],
+            name="idx_status_lease_expires"
+        )
+        # 完成 7 天後清除
+        await db.push_jobs.create_index(
+            "completed_at",
+            expireAfterSeconds=7 * 24 * 3600,
+            name="idx_completed_at_ttl"
+        )
+
+        # Scheduled pushes collection indexes (免打擾延後推播與摘要)
+        await db.scheduled_pushes.create_index(
+            [("user_id", 1), ("due_at", 1)],
+            unique=True,
+            name="idx_user_due_unique"
+        )
+        await db.scheduled_pushes.create_index(
+            [("due_at", 1)],
+            name="idx_due_at"
+        )
+
         # T234: Leaderboards collection indexes
         await db.leaderboards.create_index(
             [("period", 1), ("metric", 1), ("rank", 1)],
@@ -250,3 +350,19 @@ def get_db() -> AsyncIOMotorDatabase:
 
 # Alias for backward compatibility
 get_database = get_db
+
+
+def user_id_query(user_id: str) -> Union[Dict, str]:
+    """
+    Creates a query filter that matches user_id stored as either string or ObjectId.
+    This is needed because PyObjectId serializes to string when saving to MongoDB.
+    """
+    try:
+        return {"$in": [str(user_id), ObjectId(str(user_id))]}
+    except Exception:
+        return user_id
+
+
+def as_utc(value: datetime) -> datetime:
+    """MongoDB 回傳的 naive datetime 視為 UTC"""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
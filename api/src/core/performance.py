@@ -4,8 +4,10 @@ Includes caching, compression, and query profiling
 """
 from functools import wraps
 from typing import Optional, Callable, Any
+from collections import OrderedDict
 import time
 import hashlib
+import math
 import json
 from fastapi import Request, Response
 from fastapi.responses import JSONResponse
@@ -14,6 +16,9 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Throughput window for background worker metrics (seconds)
+METRICS_WINDOW_SECONDS = 60
+
 # Redis cache (optional - can be replaced with in-memory cache)
 try:
     import redis
@@ -145,6 +150,108 @@ def invalidate_cache(pattern: str):
     logger.info(f"Invalidated cache pattern: {pattern}")
 
 
+class LRUCache:
+    """
+    Bounded in-process LRU cache with optional TTL
+
+    For hot lookups that must not pay a network round trip (unlike CacheManager)
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Any, tuple]" = OrderedDict()
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        """Get cached value and mark it as recently used"""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Any, value: Any):
+        """Set cached value, evicting the least recently used entry when full"""
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: Any):
+        """Delete cached value"""
+        self._data.pop(key, None)
+
+    def clear(self):
+        """Clear all entries"""
+        self._data.clear()
+
+    def __contains__(self, key: Any) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and (entry[1] is None or entry[1] > time.monotonic())
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class BloomFilter:
+    """
+    Compact probabilistic set of strings (no false negatives, no deletes)
+
+    Sized for `capacity` items at the given false positive rate; membership
+    costs one hash and `hash_count` bit probes
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        # Double hashing (Kirsch-Mitzenmacher) from one 128-bit digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, item: str):
+        """Add item to the filter"""
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._bits)
+
+
+def summarize_samples(samples) -> dict:
+    """Average, p95 and max of duration samples (seconds)"""
+    if not samples:
+        return {"avg": 0.0, "p95": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+    return {
+        "avg": round(sum(ordered) / len(ordered), 3),
+        "p95": round(ordered[max(0, int(len(ordered) * 0.95) - 1)], 3),
+        "max": round(ordered[-1], 3),
+    }
+
+
 class QueryProfiler:
     """Profile database queries for optimization"""
 
@@ -0,0 +1,164 @@
+"""
+Event Broker
+即時推送的 pub/sub broker：Redis (多 worker 共用) 與 process 內的本機替代實作
+
+broker 只負責在 channel 間傳遞已序列化的訊息；每個 worker 只訂閱目前有連線的
+使用者 channel，收到的訊息交給 start() 時註冊的 handler 分派給連線
+"""
+
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Callable, List, Optional, Set, Tuple
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# handler(channel, message)：於 event loop 中同步呼叫，不可阻塞
+MessageHandler = Callable[[str, str], None]
+
+
+class EventBroker(ABC):
+    """pub/sub broker 基底類別"""
+
+    name = "broker"
+
+    def __init__(self):
+        self._handler: Optional[MessageHandler] = None
+
+    async def start(self, handler: MessageHandler):
+        """註冊訊息 handler 並連線"""
+        self._handler = handler
+
+    async def stop(self):
+        """中斷連線"""
+        self._handler = None
+
+    @abstractmethod
+    async def subscribe(self, channel: str):
+        """訂閱 channel"""
+
+    @abstractmethod
+    async def unsubscribe(self, channel: str):
+        """取消訂閱 channel"""
+
+    @abstractmethod
+    async def publish_many(self, messages: List[Tuple[str, str]]):
+        """
+        發布訊息
+
+        Args:
+            messages: [(channel, 已序列化的訊息)]
+        """
+
+
+class LocalBroker(EventBroker):
+    """
+    process 內的 broker (單一 worker、開發與測試用)
+
+    發布時直接分派給本 process 已訂閱的 channel；未訂閱的 channel 直接略過
+    """
+
+    name = "local"
+
+    def __init__(self):
+        super().__init__()
+        self._channels: Set[str] = set()
+
+    async def subscribe(self, channel: str):
+        self._channels.add(channel)
+
+    async def unsubscribe(self, channel: str):
+        self._channels.discard(channel)
+
+    async def publish_many(self, messages: List[Tuple[str, str]]):
+        if self._handler is None:
+            return
+        for channel, message in messages:
+            if channel in self._channels:
+                self._handler(channel, message)
+
+
+class RedisBroker(EventBroker):
+    """
+    Redis pub/sub broker (多 worker 部署)
+
+    每個 worker 以單一 pubsub 連線訂閱本機有連線的使用者 channel；
+    發布以 pipeline 一次送出 (需安裝 redis 套件)
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str, poll_timeout: float = 1.0):
+        """
+        Args:
+            url: Redis 連線 URL
+            poll_timeout: 讀取訊息的等待時間 (秒)
+        """
+        super().__init__()
+        self.url = url
+        self.poll_timeout = poll_timeout
+        self._client = None
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+
+    async def start(self, handler: MessageHandler):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("REALTIME_BROKER=redis requires the redis package") from e
+
+        await super().start(handler)
+        self._client = redis.from_url(self.url, decode_responses=True)
+        self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        self._reader = asyncio.create_task(self._read_loop(), name="realtime-redis-reader")
+
+    async def stop(self):
+        if self._reader:
+            self._reader.cancel()
+            await asyncio.gather(self._reader, return_exceptions=True)
+            self._reader = None
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+            self._pubsub = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        await super().stop()
+
+    async def _read_loop(self):
+        """讀取訂閱的訊息並交給 handler"""
+        while True:
+            try:
+                if not self._pubsub.subscribed:
+                    await asyncio.sleep(self.poll_timeout)
+                    continue
+                message = await self._pubsub.get_message(timeout=self.poll_timeout)
+                if message and message["type"] == "message":
+                    self._handler(message["channel"], message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # 連線中斷時 redis client 於下次讀取自動重連
+                logger.exception("Realtime broker read error")
+                await asyncio.sleep(self.poll_timeout)
+
+    async def subscribe(self, channel: str):
+        await self._pubsub.subscribe(channel)
+
+    async def unsubscribe(self, channel: str):
+        await self._pubsub.unsubscribe(channel)
+
+    async def publish_many(self, messages: List[Tuple[str, str]]):
+        async with self._client.pipeline(transaction=False) as pipe:
+            for channel, message in messages:
+                pipe.publish(channel, message)
+            await pipe.execute()
+
+
+def create_event_broker() -> EventBroker:
+    """依設定建立 broker (REALTIME_BROKER=local | redis)"""
+    if settings.REALTIME_BROKER == "redis":
+        return RedisBroker(settings.REDIS_URL)
+    return LocalBroker()
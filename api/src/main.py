@@ -12,7 +12,17 @@ from contextlib import asynccontextmanager
 from .core.database import MongoDB
 from .core.firebase_admin import initialize_firebase
 from .core.config import settings
+from .core.storage import LocalStorage, r2_storage
 from .core.middleware import ErrorHandlerMiddleware, RequestLoggingMiddleware
+from .utils.share_card_generator import share_card_generator
+from .utils.image_derivatives import image_derivative_generator
+from .services.share_card_queue import share_card_render_queue
+from .services.push_queue import push_delivery_queue
+from .services.push_scheduler import deferred_push_scheduler
+from .services.realtime_hub import realtime_hub
+from .services.job_scheduler import job_scheduler
+from .services.friend_graph import friend_graph
+from .services.block_cache import block_cache
 from .routers import (
     auth_router,
     workouts_router,
@@ -26,7 +36,10 @@ from .routers import (
     notifications_router,
     leaderboard_router,
     profiles_router,
+    uploads_router,
+    realtime_router,
 )
+from .routers.local_storage import create_local_storage_router
 
 
 @asynccontextmanager
@@ -36,9 +49,27 @@ async def lifespan(app: FastAPI):
     print("Starting MotionStory API...")
     await MongoDB.connect()
     initialize_firebase()
+    share_card_render_queue.start(MongoDB.get_database())
+    push_delivery_queue.start(MongoDB.get_database())
+    deferred_push_scheduler.start(MongoDB.get_database())
+    await realtime_hub.start()
+    await friend_graph.start()
+    await block_cache.start(MongoDB.get_database())
+    if settings.SCHEDULER_ENABLED:
+        job_scheduler.start(MongoDB.get_database())
     yield
     # Shutdown
     print("Shutting down MotionStory API...")
+    await job_scheduler.stop()
+    await block_cache.stop()
+    await friend_graph.stop()
+    await realtime_hub.stop()
+    await share_card_render_queue.stop()
+    await deferred_push_scheduler.stop()
+    await push_delivery_queue.stop()
+    share_card_generator.render_pool.shutdown()
+    image_derivative_generator.pool.shutdown()
+    r2_storage.close()
     await MongoDB.disconnect()
 
 
@@ -108,6 +139,12 @@ app.include_router(challenges_router, prefix="/api/v1")
 app.include_router(notifications_router, prefix="/api/v1")
 app.include_router(leaderboard_router, prefix="/api/v1")
 app.include_router(profiles_router, prefix="/api/v1")
+app.include_router(uploads_router, prefix="/api/v1")
+app.include_router(realtime_router, prefix="/api/v1")
+
+# 本機儲存的 presigned PUT 上傳端點 (STORAGE_BACKEND=local)
+if isinstance(r2_storage, LocalStorage):
+    app.include_router(create_local_storage_router(r2_storage))
 
 
 @app.get("/")
@@ -142,6 +179,22 @@ async def health_check():
     }
 
 
+@app.get("/metrics")
+async def metrics():
+    """背景工作指標"""
+    return {
+        "share_card_render_queue": share_card_render_queue.get_metrics(),
+        "push_delivery_queue": await push_delivery_queue.get_metrics(),
+        "deferred_push_scheduler": await deferred_push_scheduler.get_metrics(),
+        "realtime_hub": realtime_hub.get_metrics(),
+        "job_scheduler": job_scheduler.get_metrics(),
+        "friend_graph": friend_graph.get_metrics(),
+        "block_cache": block_cache.get_metrics(),
+        "share_card_render_times_ms": share_card_generator.render_pool.get_render_stats(),
+        "image_derivative_times_ms": image_derivative_generator.pool.get_run_stats(),
+    }
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
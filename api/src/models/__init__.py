@@ -51,6 +51,9 @@ from .milestone import (
     MilestoneBase,
     MilestoneInDB,
     MilestoneResponse,
+    MilestoneListResponse,
+    MilestoneMonthCount,
+    TimelineSummaryResponse,
 )
 
 from .annual_review import (
@@ -61,6 +64,9 @@ from .annual_review import (
     AnnualReviewBase,
     AnnualReviewInDB,
     AnnualReviewResponse,
+    YearSummary,
+    YearOverYearDelta,
+    MultiYearSummaryResponse,
     AnnualReviewExportRequest,
     AnnualReviewExportResponse,
 )
@@ -144,6 +150,12 @@ from .blocklist import (
     BlockListResponse,
 )
 
+from .upload import (
+    UploadSessionCreate,
+    UploadSessionInDB,
+    UploadSessionResponse,
+)
+
 __all__ = [
     # User models
     "PyObjectId",
@@ -185,6 +197,9 @@ __all__ = [
     "MilestoneBase",
     "MilestoneInDB",
     "MilestoneResponse",
+    "MilestoneListResponse",
+    "MilestoneMonthCount",
+    "TimelineSummaryResponse",
     # Annual Review models
     "MonthlyUsageStats",
     "WorkoutTypeSummary",
@@ -193,6 +208,9 @@ __all__ = [
     "AnnualReviewBase",
     "AnnualReviewInDB",
     "AnnualReviewResponse",
+    "YearSummary",
+    "YearOverYearDelta",
+    "MultiYearSummaryResponse",
     "AnnualReviewExportRequest",
     "AnnualReviewExportResponse",
     # Share Card models
@@ -253,4 +271,8 @@ __all__ = [
     "BlockListCreate",
     "BlockListInDB",
     "BlockListResponse",
+    # Upload Session models
+    "UploadSessionCreate",
+    "UploadSessionInDB",
+    "UploadSessionResponse",
 ]
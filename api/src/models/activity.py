@@ -4,7 +4,7 @@ Activity Model
 """
 
 from datetime import datetime
-from typing import Literal, Optional
+from typing import Dict, Literal, Optional
 from pydantic import BaseModel, Field
 from bson import ObjectId
 
@@ -55,6 +55,10 @@ class ActivityInDB(ActivityBase):
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
     content: dict = Field(default_factory=dict, description="動態內容快照（避免關聯查詢）")
     image_url: Optional[str] = Field(default=None, description="動態配圖 URL")
+    image_variants: Optional[Dict[str, Dict[str, str]]] = Field(
+        default=None,
+        description="配圖衍生版本 URL {thumb|feed|full: {webp|avif: url}}"
+    )
     caption: Optional[str] = Field(default=None, description="使用者短文/心得")
     likes_count: int = Field(default=0, description="按讚數量")
     comments_count: int = Field(default=0, description="留言數量")
@@ -77,6 +81,7 @@ class ActivityResponse(BaseModel):
     reference_id: str
     content: dict
     image_url: Optional[str] = None
+    image_variants: Optional[Dict[str, Dict[str, str]]] = None
     caption: Optional[str] = None
     likes_count: int
     comments_count: int
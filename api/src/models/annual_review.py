@@ -1,6 +1,6 @@
 """
 Annual Review Model
-年度回顧統計資料快取
+年度回顧統計資料 (隨運動記錄異動增量維護)
 """
 
 from datetime import datetime
@@ -95,9 +95,24 @@ class AnnualReviewInDB(AnnualReviewBase):
         description="個人紀錄 (longest_distance, fastest_pace, etc.)"
     )
 
-    # 快取資訊
-    generated_at: datetime = Field(default_factory=datetime.utcnow, description="生成時間")
-    cache_expires_at: datetime = Field(..., description="快取過期時間")
+    # 增量維護計數器 (由運動記錄異動以 $inc 更新，回應欄位由此推導)
+    monthly_counters: dict = Field(
+        default_factory=dict,
+        description="月度計數器 {month: {workout_count, total_duration_minutes, ...}}"
+    )
+    type_counters: dict = Field(
+        default_factory=dict,
+        description="運動類型計數器 {workout_type: {count, total_distance_km, ...}}"
+    )
+    pr_candidates: dict = Field(
+        default_factory=dict,
+        description="個人紀錄候選 {field: [{workout_id, value}, ...]}"
+    )
+
+    # 文件資訊
+    schema_version: int = Field(default=0, description="文件結構版本 (變更時完整重建)")
+    generated_at: datetime = Field(default_factory=datetime.utcnow, description="完整重建時間")
+    updated_at: datetime = Field(default_factory=datetime.utcnow, description="最後增量更新時間")
 
     # 圖片匯出
     export_image_url: Optional[str] = Field(default=None, description="匯出圖片 URL (R2)")
@@ -129,6 +144,49 @@ class AnnualReviewResponse(AnnualReviewBase):
         json_encoders = {ObjectId: str}
 
 
+class YearSummary(BaseModel):
+    """單一年度摘要 (多年度比較用)"""
+    year: int = Field(..., description="年份")
+    total_workouts: int = Field(default=0, description="總運動次數")
+    total_duration_minutes: int = Field(default=0, description="總運動時長")
+    total_distance_km: float = Field(default=0.0, description="總距離")
+    total_calories: int = Field(default=0, description="總消耗卡路里")
+    active_months: int = Field(default=0, description="有運動記錄的月份數")
+    workout_type_summary: List[WorkoutTypeSummary] = Field(
+        default_factory=list,
+        description="運動類型統計"
+    )
+    personal_records: dict = Field(default_factory=dict, description="年度個人紀錄")
+
+
+class YearOverYearDelta(BaseModel):
+    """相鄰年度差異 (year 相對於 previous_year)"""
+    year: int = Field(..., description="年份")
+    previous_year: int = Field(..., description="比較基準年份")
+    workouts_change: int = Field(..., description="運動次數差異")
+    duration_minutes_change: int = Field(..., description="運動時長差異")
+    distance_km_change: float = Field(..., description="距離差異")
+    calories_change: int = Field(..., description="卡路里差異")
+    workouts_change_percentage: Optional[float] = Field(
+        default=None, description="運動次數變化百分比 (基準為 0 時為 None)"
+    )
+    duration_change_percentage: Optional[float] = Field(
+        default=None, description="運動時長變化百分比 (基準為 0 時為 None)"
+    )
+    distance_change_percentage: Optional[float] = Field(
+        default=None, description="距離變化百分比 (基準為 0 時為 None)"
+    )
+
+
+class MultiYearSummaryResponse(BaseModel):
+    """多年度回顧比較回應"""
+    user_id: str = Field(..., description="使用者 ID")
+    start_year: int = Field(..., description="起始年份")
+    end_year: int = Field(..., description="結束年份")
+    years: List[YearSummary] = Field(default_factory=list, description="各年度摘要 (依年份排序)")
+    deltas: List[YearOverYearDelta] = Field(default_factory=list, description="相鄰年度差異")
+
+
 class AnnualReviewExportRequest(BaseModel):
     """年度回顧圖片匯出請求"""
     theme: str = Field(default="default", description="視覺主題")
@@ -4,7 +4,7 @@ Milestone Model
 """
 
 from datetime import datetime
-from typing import Any, Dict, Literal, Optional
+from typing import Any, Dict, List, Literal, Optional
 from pydantic import BaseModel, Field
 from bson import ObjectId
 from .user import PyObjectId
@@ -60,3 +60,24 @@ class MilestoneResponse(MilestoneBase):
     class Config:
         populate_by_name = True
         json_encoders = {ObjectId: str}
+
+
+class MilestoneListResponse(BaseModel):
+    """里程碑分頁回應 (cursor-based pagination)"""
+    milestones: List[MilestoneResponse] = Field(default_factory=list, description="里程碑列表")
+    next_cursor: Optional[str] = Field(None, description="下一頁游標")
+    has_more: bool = Field(default=False, description="是否有更多資料")
+
+
+class MilestoneMonthCount(BaseModel):
+    """單月里程碑數量 (時間軸捲動列用)"""
+    year: int = Field(..., description="年份")
+    month: int = Field(..., ge=1, le=12, description="月份")
+    count: int = Field(..., description="里程碑數量")
+    highlighted_count: int = Field(default=0, description="高亮里程碑數量")
+
+
+class TimelineSummaryResponse(BaseModel):
+    """時間軸摘要 (依月份統計)"""
+    months: List[MilestoneMonthCount] = Field(default_factory=list, description="各月份統計 (新到舊)")
+    total: int = Field(default=0, description="里程碑總數")
@@ -4,7 +4,7 @@ Notification Model
 """
 
 from datetime import datetime
-from typing import Literal, Optional
+from typing import List, Literal, Optional
 from pydantic import BaseModel, Field
 from bson import ObjectId
 
@@ -82,6 +82,8 @@ class NotificationResponse(BaseModel):
     reference_type: Optional[Literal["friendship", "activity", "like", "comment", "challenge"]] = None
     reference_id: Optional[str] = None
     sender: Optional[dict] = None  # Sender info
+    actor_count: int = Field(1, description="合併通知的互動人數")
+    recent_actors: List[dict] = Field(default_factory=list, description="最近的互動者 (由新到舊)")
     is_read: bool
     created_at: datetime
     read_at: Optional[datetime] = None
@@ -97,7 +99,7 @@ class NotificationPreferences(BaseModel):
     friend_activity_enabled: bool = True
     interaction_enabled: bool = True
     challenge_update_enabled: bool = True
-    notification_frequency: Literal["realtime", "daily_digest", "off"] = "realtime"
+    notification_frequency: Literal["realtime", "hourly_digest", "daily_digest", "off"] = "realtime"
     daily_digest_time: str = "08:00"
     do_not_disturb_enabled: bool = False
     do_not_disturb_start: Optional[str] = None
@@ -4,7 +4,7 @@ Participant Model
 """
 
 from datetime import datetime
-from typing import Literal, Optional
+from typing import Dict, Literal, Optional
 from pydantic import BaseModel, Field
 from bson import ObjectId
 
@@ -58,6 +58,14 @@ class ParticipantInDB(ParticipantBase):
         description="獲得的徽章（挑戰完成後）"
     )
     last_updated: datetime = Field(default_factory=datetime.utcnow, description="最後更新時間")
+    progress_synced_at: Optional[datetime] = Field(
+        None,
+        description="進度完整計算的時間 (之後由運動記錄異動差量更新)"
+    )
+    active_days: Dict[str, int] = Field(
+        default_factory=dict,
+        description="連續天數挑戰的運動日曆 (YYYY-MM-DD -> 運動次數)"
+    )
 
     class Config:
         populate_by_name = True
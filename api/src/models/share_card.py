@@ -4,7 +4,7 @@ Share Card Model
 """
 
 from datetime import datetime
-from typing import Literal, Optional
+from typing import Dict, Literal, Optional
 from pydantic import BaseModel, Field, HttpUrl
 from bson import ObjectId
 
@@ -26,9 +26,30 @@ class ShareCardInDB(ShareCardBase):
     """資料庫中的 Share Card 模型"""
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
 
-    # Cloudflare R2 儲存資訊
-    card_url: str = Field(..., description="卡片圖片 URL (R2)")
-    r2_key: str = Field(..., description="R2 物件 key")
+    # 背景繪製狀態 (pending -> rendering -> ready / failed)
+    status: Literal["pending", "rendering", "ready", "failed"] = Field(
+        default="pending",
+        description="繪製狀態"
+    )
+    queued_at: Optional[datetime] = Field(default=None, description="排入繪製佇列時間")
+    render_attempts: int = Field(default=0, description="繪製嘗試次數")
+    render_error: Optional[str] = Field(default=None, description="最後一次繪製錯誤")
+    render_job: Optional[dict] = Field(
+        default=None,
+        description="繪製參數 {template, data, user_name}"
+    )
+
+    # Cloudflare R2 儲存資訊 (繪製完成後寫入)
+    card_url: Optional[str] = Field(default=None, description="卡片圖片 URL (R2)")
+    r2_key: Optional[str] = Field(default=None, description="R2 物件 key")
+    image_variants: Optional[Dict[str, Dict[str, str]]] = Field(
+        default=None,
+        description="卡片衍生版本 URL {thumb|feed|full: {webp|avif: url}}"
+    )
+    content_hash: Optional[str] = Field(
+        default=None,
+        description="內容雜湊 (模板、卡片資料、使用者名稱、繪製版本)，相同雜湊共用圖片物件"
+    )
 
     # 卡片內容
     title: str = Field(..., max_length=100, description="卡片標題")
@@ -56,7 +77,9 @@ class ShareCardInDB(ShareCardBase):
 class ShareCardResponse(ShareCardBase):
     """API 回傳的 Share Card 模型"""
     id: str = Field(..., alias="_id")
-    card_url: str
+    status: Literal["pending", "rendering", "ready", "failed"] = "ready"
+    card_url: Optional[str] = None
+    image_variants: Optional[Dict[str, Dict[str, str]]] = None
     title: str
     description: str
     metadata: dict
@@ -0,0 +1,70 @@
+"""
+Upload Session Model
+直傳儲存的上傳工作階段 (presigned PUT)，完成後產生圖片衍生版本
+"""
+
+from datetime import datetime
+from typing import Dict, Literal, Optional
+from pydantic import BaseModel, Field, model_validator
+from bson import ObjectId
+
+from .user import PyObjectId
+
+UploadPurpose = Literal["activity_image", "avatar"]
+UploadContentType = Literal["image/jpeg", "image/png", "image/webp"]
+UploadStatus = Literal["pending", "processing", "ready", "failed"]
+
+
+class UploadSessionCreate(BaseModel):
+    """建立上傳工作階段請求"""
+    purpose: UploadPurpose = Field(..., description="用途：動態配圖、頭像")
+    content_type: UploadContentType = Field(..., description="圖片 MIME type")
+    content_length: int = Field(..., gt=0, description="圖片大小 (bytes)")
+    activity_id: Optional[str] = Field(default=None, description="動態 ID (purpose=activity_image 時必填)")
+
+    @model_validator(mode="after")
+    def require_activity_id(self):
+        if self.purpose == "activity_image" and not self.activity_id:
+            raise ValueError("activity_id is required for activity images")
+        return self
+
+
+class UploadSessionInDB(BaseModel):
+    """資料庫中的上傳工作階段"""
+    id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
+    user_id: PyObjectId = Field(..., description="使用者 ID")
+    purpose: UploadPurpose
+    activity_id: Optional[PyObjectId] = Field(default=None, description="動態 ID")
+    object_key: str = Field(..., description="原圖 object key")
+    content_type: str = Field(..., description="上傳時必須使用的 MIME type")
+    content_length: int = Field(..., description="上傳時必須使用的大小 (bytes)")
+    status: UploadStatus = Field(default="pending", description="pending -> processing -> ready / failed")
+    image_variants: Optional[Dict[str, Dict[str, str]]] = Field(
+        default=None,
+        description="衍生版本 URL {thumb|feed|full: {webp|avif: url}}"
+    )
+    error: Optional[str] = Field(default=None, description="驗證或處理失敗原因")
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    expires_at: datetime = Field(..., description="presigned URL 到期時間")
+    completed_at: Optional[datetime] = Field(default=None, description="完成時間")
+
+    class Config:
+        populate_by_name = True
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str}
+
+
+class UploadSessionResponse(BaseModel):
+    """API 回傳的上傳工作階段"""
+    session_id: str
+    purpose: UploadPurpose
+    status: UploadStatus
+    upload_url: Optional[str] = Field(default=None, description="presigned PUT URL (僅建立時回傳)")
+    upload_method: str = "PUT"
+    upload_headers: Dict[str, str] = Field(
+        default_factory=dict,
+        description="上傳時必須帶上的 header (Content-Type、Content-Length)"
+    )
+    expires_at: datetime
+    image_variants: Optional[Dict[str, Dict[str, str]]] = None
+    error: Optional[str] = None
@@ -16,6 +16,8 @@ from .challenges import router as challenges_router
 from .notifications import router as notifications_router
 from .leaderboard import router as leaderboard_router
 from .profiles import router as profiles_router
+from .uploads import router as uploads_router
+from .realtime import router as realtime_router
 
 __all__ = [
     # Phase 1-2 Routers
@@ -31,4 +33,6 @@ __all__ = [
     "notifications_router",
     "leaderboard_router",
     "profiles_router",
+    "uploads_router",
+    "realtime_router",
 ]
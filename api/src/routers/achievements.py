@@ -3,7 +3,7 @@ Achievements Router
 成就列表、檢查、分享卡片
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from typing import List, Dict
 from bson import ObjectId
@@ -16,7 +16,8 @@ from ..models import (
     ShareCardCreateRequest,
     ShareCardResponse,
 )
-from ..services import AchievementService
+from ..services import AchievementService, ShareCardService
+from ..services.share_card_queue import share_card_render_queue
 
 router = APIRouter(prefix="/achievements", tags=["Achievements"])
 
@@ -112,18 +113,20 @@ async def get_achievement_types(
     }
 
 
-@router.post("/{achievement_id}/share-card", response_model=ShareCardResponse, status_code=status.HTTP_201_CREATED)
+@router.post("/{achievement_id}/share-card", response_model=ShareCardResponse, status_code=status.HTTP_202_ACCEPTED)
 async def create_share_card(
     achievement_id: str,
     request: ShareCardCreateRequest,
+    response: Response,
     current_user_id: str = Depends(get_current_user_id),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """
     生成成就分享卡片
 
-    - 生成圖片並上傳至 Cloudflare R2
-    - 回傳分享卡片 URL
+    - 202: 已排入背景繪製佇列 (status=pending)，以 GET /achievements/share-cards/{card_id} 輪詢
+    - 201: 相同內容的圖片已存在，直接回傳 (status=ready)
+    - 圖片繪製後上傳至 Cloudflare R2，相同內容的卡片共用圖片
     """
     # 驗證成就存在且屬於當前使用者
     achievement = await db.achievements.find_one({
@@ -137,26 +140,48 @@ async def create_share_card(
             detail="Achievement not found"
         )
 
-    from ..models import ShareCardInDB
-    from datetime import datetime, timedelta, timezone
+    share_card_service = ShareCardService(db)
 
-    # 建立分享卡片記錄
-    share_card = ShareCardInDB(
-        achievement_id=ObjectId(achievement_id),
-        user_id=ObjectId(current_user_id),
-        achievement_type=achievement["achievement_type"],
+    share_card = await share_card_service.create_achievement_share_card(
+        user_id=current_user_id,
+        achievement=achievement,
         template=request.template,
-        title=achievement["metadata"].get("title", "成就達成"),
-        description=achievement["metadata"].get("description", ""),
-        metadata=achievement["metadata"],
-        card_url=f"https://r2.motionstory.app/share-cards/{achievement_id}.png",  # TODO: 實際生成圖片
-        r2_key=f"share-cards/{achievement_id}.png",
-        includes_location=False,  # 根據隱私設定
-        includes_detailed_stats=True,
-        expires_at=datetime.now(timezone.utc) + timedelta(days=30)
+        custom_message=request.custom_message
     )
 
-    result = await db.share_cards.insert_one(share_card.dict(by_alias=True))
-    share_card.id = result.inserted_id
+    if share_card.status == "ready":
+        response.status_code = status.HTTP_201_CREATED
+    else:
+        share_card_render_queue.notify()
 
-    return ShareCardResponse(**share_card.dict(by_alias=True))
+    return share_card
+
+
+@router.get("/share-cards/{card_id}", response_model=ShareCardResponse)
+async def get_share_card(
+    card_id: str,
+    current_user_id: str = Depends(get_current_user_id),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """
+    取得分享卡片 (輪詢繪製狀態)
+
+    - status: pending / rendering / ready / failed
+    - ready 時 card_url 為圖片 URL
+    """
+    if not ObjectId.is_valid(card_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Share card not found"
+        )
+
+    share_card_service = ShareCardService(db)
+    share_card = await share_card_service.get_share_card(card_id, current_user_id)
+
+    if not share_card:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Share card not found"
+        )
+
+    return share_card
@@ -30,6 +30,7 @@ from ..models import (
 )
 from pydantic import BaseModel, EmailStr
 from ..services import DashboardService
+from ..utils.user_search import search_fields
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
@@ -85,6 +86,7 @@ async def register(
 
         # 插入時排除 id 欄位，讓 MongoDB 自動生成
         user_dict = user.model_dump(by_alias=True, exclude={'id'})
+        user_dict.update(search_fields(user.email, user.display_name))
         result = await db.users.insert_one(user_dict)
         user_id = result.inserted_id
 
@@ -255,6 +257,7 @@ async def google_oauth(
             )
 
             user_dict = user.model_dump(by_alias=True, exclude={'id'})
+            user_dict.update(search_fields(user.email, user.display_name))
             result = await db.users.insert_one(user_dict)
             user_id = result.inserted_id
 
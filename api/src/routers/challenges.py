@@ -5,7 +5,7 @@ Challenges Router (T262-T268)
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from typing import Literal
+from typing import Literal, Optional
 
 from ..core.database import get_database
 from ..core.security import get_current_user_id
@@ -57,29 +57,36 @@ async def get_challenges(
     role: Literal["creator", "participant", "all"] = Query("all"),
     limit: int = Query(20, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="上一頁回傳的 next_cursor"),
     current_user_id: str = Depends(get_current_user_id),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """
     T263: 取得挑戰賽清單
 
-    取得使用者創建或參與的挑戰賽清單
+    取得使用者創建或參與的挑戰賽清單 (建議使用 cursor 分頁；total_count 只在第一頁回傳，
+    傳入 cursor 時為 null)
     """
     service = ChallengeService(db)
 
-    challenges, total_count = await service.get_challenges(
-        user_id=current_user_id,
-        status=status_filter,
-        role=role,
-        limit=limit,
-        offset=offset
-    )
+    try:
+        challenges, total_count, next_cursor = await service.get_challenges(
+            user_id=current_user_id,
+            status=status_filter,
+            role=role,
+            limit=limit,
+            offset=offset,
+            cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
     return {
         "challenges": challenges,
         "total_count": total_count,
         "limit": limit,
-        "offset": offset
+        "offset": offset,
+        "next_cursor": next_cursor
     }
 
 
@@ -25,7 +25,7 @@ router = APIRouter(prefix="/friends", tags=["Friends"])
 # T249: POST /friends/search
 @router.post("/search")
 async def search_friends(
-    query_type: Literal["user_id", "email", "qrcode"],
+    query_type: Literal["user_id", "email", "name", "qrcode"],
     query: str,
     current_user_id: str = Depends(get_current_user_id),
     db: AsyncIOMotorDatabase = Depends(get_database)
@@ -33,7 +33,7 @@ async def search_friends(
     """
     T249: 搜尋好友
 
-    透過使用者 ID、Email 或 QR Code 搜尋好友
+    透過使用者 ID、Email 前綴、顯示名稱或 QR Code 搜尋好友
     排除已封鎖使用者與已是好友的使用者
     """
     service = FriendService(db)
@@ -0,0 +1,40 @@
+"""
+Local Storage Router
+STORAGE_BACKEND=local 時的 S3-compatible 上傳端點 (離線開發與測試用)，
+接受 LocalStorage.presign_put 簽發的 presigned PUT URL
+"""
+
+from fastapi import APIRouter, HTTPException, Request, Response, status
+
+from ..core.storage import LocalStorage
+
+
+def create_local_storage_router(storage: LocalStorage) -> APIRouter:
+    """
+    建立本機儲存上傳端點
+
+    Args:
+        storage: 本機儲存
+
+    Returns:
+        APIRouter: PUT /_local-storage/{object_key}
+    """
+    router = APIRouter(prefix="/_local-storage", tags=["Local Storage"], include_in_schema=False)
+
+    @router.put("/{object_key:path}")
+    async def put_object(object_key: str, expires: int, signature: str, request: Request):
+        content_type = request.headers.get("content-type", "")
+        content_length = int(request.headers.get("content-length", "0"))
+
+        # 與 S3 相同：簽章涵蓋 Content-Type 與 Content-Length，不符即拒絕
+        if not storage.verify_presigned_put(object_key, content_type, content_length, expires, signature):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="SignatureDoesNotMatch")
+
+        body = await request.body()
+        if len(body) != content_length:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="IncompleteBody")
+
+        await storage._run(storage._put_object, object_key, body, content_type, None)
+        return Response(status_code=status.HTTP_200_OK)
+
+    return router
@@ -22,6 +22,7 @@ async def get_notifications(
     read_status: Literal["read", "unread", "all"] = Query("all"),
     limit: int = Query(20, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="上一頁回傳的 next_cursor"),
     current_user_id: str = Depends(get_current_user_id),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
@@ -29,18 +30,22 @@ async def get_notifications(
     T269: 取得通知清單
 
     取得使用者的通知記錄
-    - 支援類型篩選與分頁
+    - 支援類型篩選與分頁 (建議使用 cursor 分頁)
     - 顯示最近 30 天的通知
     """
     service = NotificationService(db)
 
-    result = await service.get_notifications(
-        user_id=current_user_id,
-        notification_type=notification_type,
-        read_status=read_status,
-        limit=limit,
-        offset=offset
-    )
+    try:
+        result = await service.get_notifications(
+            user_id=current_user_id,
+            notification_type=notification_type,
+            read_status=read_status,
+            limit=limit,
+            offset=offset,
+            cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
     return result
 
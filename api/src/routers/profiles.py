@@ -12,6 +12,9 @@ from datetime import datetime, timezone
 from ..core.database import get_database
 from ..core.security import get_current_user_id
 from ..models import UserResponse, UserUpdate
+from ..services.block_cache import block_cache
+from ..services.friend_graph import friend_graph
+from ..utils.user_search import name_grams
 
 router = APIRouter(prefix="/profiles", tags=["Profiles"])
 
@@ -45,28 +48,15 @@ async def get_user_profile(
             detail="User not found"
         )
 
-    # 檢查是否被封鎖
-    is_blocked = await db.blocklist.count_documents({
-        "$or": [
-            {"user_id": ObjectId(current_user_id), "blocked_user_id": ObjectId(user_id)},
-            {"user_id": ObjectId(user_id), "blocked_user_id": ObjectId(current_user_id)}
-        ]
-    }) > 0
-
-    if is_blocked:
+    # 檢查是否被封鎖 (封鎖名單快取)
+    if await block_cache.is_blocked(db, current_user_id, user_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
 
-    # 檢查是否為好友
-    is_friend = await db.friendships.count_documents({
-        "$or": [
-            {"user_id": ObjectId(current_user_id), "friend_id": ObjectId(user_id)},
-            {"user_id": ObjectId(user_id), "friend_id": ObjectId(current_user_id)}
-        ],
-        "status": "accepted"
-    }) > 0
+    # 檢查是否為好友 (好友關係快取)
+    is_friend = await friend_graph.are_friends(db, current_user_id, user_id)
 
     is_self = current_user_id == user_id
 
@@ -88,13 +78,7 @@ async def get_user_profile(
     })
 
     # 取得好友數量
-    friend_count = await db.friendships.count_documents({
-        "$or": [
-            {"user_id": ObjectId(user_id)},
-            {"friend_id": ObjectId(user_id)}
-        ],
-        "status": "accepted"
-    })
+    friend_count = await friend_graph.friend_count(db, user_id)
 
     # 基本資訊
     profile = {
@@ -151,6 +135,7 @@ async def update_my_profile(
 
     if request.display_name is not None:
         update_data["display_name"] = request.display_name
+        update_data["name_grams"] = name_grams(request.display_name)
 
     if request.avatar_url is not None:
         update_data["avatar_url"] = request.avatar_url
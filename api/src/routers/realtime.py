@@ -0,0 +1,93 @@
+"""
+Realtime Router
+即時推送 API：WebSocket 與 Server-Sent Events，每個客戶端一條連線接收
+新通知、好友新動態與排名變動事件
+"""
+
+import asyncio
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+
+from ..core.security import decode_access_token, get_current_user_id
+from ..services.realtime_hub import realtime_hub
+
+router = APIRouter(prefix="/realtime", tags=["Realtime"])
+
+HEARTBEAT_MESSAGE = json.dumps({"type": "heartbeat"})
+
+
+async def _send_events(websocket: WebSocket, connection):
+    """將事件寫入 WebSocket，閒置時送出 heartbeat"""
+    while True:
+        message = await connection.next_message(realtime_hub.heartbeat_seconds)
+        await websocket.send_text(message or HEARTBEAT_MESSAGE)
+
+
+async def _receive_until_closed(websocket: WebSocket):
+    """讀取客戶端訊息 (忽略內容) 直到連線關閉"""
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+
+
+@router.websocket("/ws")
+async def realtime_websocket(websocket: WebSocket, token: str = Query(...)):
+    """
+    WebSocket 即時推送
+
+    瀏覽器無法於 WebSocket 設定 Authorization header，JWT 以 token query 參數傳入；
+    驗證失敗時以 1008 關閉連線
+    """
+    try:
+        user_id = decode_access_token(token).get("user_id")
+    except HTTPException:
+        user_id = None
+    if not user_id:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    # 先訂閱再接受連線：客戶端收到 accept 後發布的事件不會遺失
+    connection = await realtime_hub.connect(user_id)
+    try:
+        await websocket.accept()
+        sender = asyncio.create_task(_send_events(websocket, connection))
+        receiver = asyncio.create_task(_receive_until_closed(websocket))
+        try:
+            await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            sender.cancel()
+            receiver.cancel()
+            await asyncio.gather(sender, receiver, return_exceptions=True)
+    finally:
+        await realtime_hub.disconnect(connection)
+
+
+@router.get("/events")
+async def realtime_events(
+    request: Request,
+    current_user_id: str = Depends(get_current_user_id)
+):
+    """
+    Server-Sent Events 即時推送 (不支援 WebSocket 的環境)
+
+    每個事件為一則 `data:` JSON 訊息，閒置時送出註解行 heartbeat
+    """
+    connection = await realtime_hub.connect(current_user_id)
+
+    async def event_stream():
+        try:
+            while not await request.is_disconnected():
+                message = await connection.next_message(realtime_hub.heartbeat_seconds)
+                yield f"data: {message}\n\n" if message else ": heartbeat\n\n"
+        finally:
+            await realtime_hub.disconnect(connection)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -7,14 +7,16 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.responses import StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from datetime import datetime
-from typing import List, Optional
+from typing import Optional
 import io
 
 from ..core.database import get_database
 from ..core.security import get_current_user_id
 from ..models import (
-    MilestoneResponse,
+    MilestoneListResponse,
+    TimelineSummaryResponse,
     AnnualReviewResponse,
+    MultiYearSummaryResponse,
     AnnualReviewExportRequest,
     AnnualReviewExportResponse,
 )
@@ -23,50 +25,82 @@ from ..services import TimelineService
 router = APIRouter(prefix="/timeline", tags=["Timeline"])
 
 
-@router.get("", response_model=List[MilestoneResponse])
+@router.get("", response_model=MilestoneListResponse)
 async def list_timeline(
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
     highlighted_only: bool = False,
+    cursor: Optional[str] = None,
+    limit: int = 20,
     current_user_id: str = Depends(get_current_user_id),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """
-    列出時間軸里程碑
+    列出時間軸里程碑 (cursor-based pagination)
 
     - start_date: 開始日期
     - end_date: 結束日期
     - highlighted_only: 只顯示高亮項目
+    - cursor: 分頁游標 (上一頁回傳的 next_cursor)
+    - limit: 每頁數量 (預設 20，最大 100)
     """
     timeline_service = TimelineService(db)
 
-    milestones = await timeline_service.list_milestones(
+    try:
+        return await timeline_service.list_milestones(
+            user_id=current_user_id,
+            start_date=start_date,
+            end_date=end_date,
+            highlighted_only=highlighted_only,
+            cursor=cursor,
+            limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.get("/summary", response_model=TimelineSummaryResponse)
+async def get_timeline_summary(
+    highlighted_only: bool = False,
+    current_user_id: str = Depends(get_current_user_id),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """
+    時間軸摘要 (各月份里程碑數量)
+
+    - 供時間軸捲動列使用，不載入里程碑內容
+    - highlighted_only: 只統計高亮項目
+    """
+    timeline_service = TimelineService(db)
+
+    return await timeline_service.get_timeline_summary(
         user_id=current_user_id,
-        start_date=start_date,
-        end_date=end_date,
         highlighted_only=highlighted_only
     )
 
-    return milestones
 
-
-@router.get("/milestones", response_model=List[MilestoneResponse])
+@router.get("/milestones", response_model=MilestoneListResponse)
 async def list_milestones(
     highlighted_only: bool = True,
+    cursor: Optional[str] = None,
+    limit: int = 20,
     current_user_id: str = Depends(get_current_user_id),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """
-    列出重要里程碑 (預設只顯示高亮項目)
+    列出重要里程碑 (預設只顯示高亮項目，cursor-based pagination)
     """
     timeline_service = TimelineService(db)
 
-    milestones = await timeline_service.list_milestones(
-        user_id=current_user_id,
-        highlighted_only=highlighted_only
-    )
-
-    return milestones
+    try:
+        return await timeline_service.list_milestones(
+            user_id=current_user_id,
+            highlighted_only=highlighted_only,
+            cursor=cursor,
+            limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
 @router.post("/annual-review", response_model=AnnualReviewResponse, status_code=status.HTTP_201_CREATED)
@@ -80,7 +114,7 @@ async def generate_annual_review(
 
     - year: 年份 (例: 2024)
     - 效能目標: < 3 秒完成 (FR-035)
-    - 快取 7 天
+    - 隨運動記錄異動增量維護，永遠為最新資料
     """
     if year < 2020 or year > 2100:
         raise HTTPException(
@@ -98,6 +132,43 @@ async def generate_annual_review(
     return annual_review
 
 
+@router.get("/annual-review/summary", response_model=MultiYearSummaryResponse)
+async def get_multi_year_summary(
+    start_year: Optional[int] = None,
+    end_year: Optional[int] = None,
+    current_user_id: str = Depends(get_current_user_id),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """
+    多年度回顧比較
+
+    - start_year / end_year: 年份範圍 (預設為今年往前 5 年，最多 10 年)
+    - 回傳各年度總計、類型統計、個人紀錄與相鄰年度差異
+    - 一次查詢讀取所有年度回顧文件
+    """
+    if end_year is None:
+        end_year = datetime.utcnow().year
+    if start_year is None:
+        start_year = max(2020, end_year - 4)
+
+    if start_year < 2020 or end_year > 2100:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid year"
+        )
+
+    timeline_service = TimelineService(db)
+
+    try:
+        return await timeline_service.get_multi_year_summary(
+            user_id=current_user_id,
+            start_year=start_year,
+            end_year=end_year
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
 @router.get("/annual-review/{year}", response_model=AnnualReviewResponse)
 async def get_annual_review(
     year: int,
@@ -105,9 +176,10 @@ async def get_annual_review(
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """
-    取得年度回顧 (從快取)
+    取得年度回顧
 
-    - 如果快取不存在，會自動生成
+    - 單次查詢讀取增量維護的年度回顧文件
+    - 文件不存在或結構版本變更時會自動重建
     """
     if year < 2020 or year > 2100:
         raise HTTPException(
@@ -0,0 +1,101 @@
+"""
+Uploads Router
+直傳儲存的上傳工作階段 API：簽發 presigned PUT URL、完成回呼與狀態查詢
+"""
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from bson import ObjectId
+
+from ..core.database import get_database
+from ..core.security import get_current_user_id
+from ..models import UploadSessionCreate, UploadSessionResponse
+from ..services import UploadService
+
+router = APIRouter(prefix="/uploads", tags=["Uploads"])
+
+
+def _validate_session_id(session_id: str):
+    if not ObjectId.is_valid(session_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload session not found")
+
+
+# POST /uploads - 建立上傳工作階段
+@router.post("", response_model=UploadSessionResponse, status_code=status.HTTP_201_CREATED)
+async def create_upload_session(
+    request: UploadSessionCreate,
+    current_user_id: str = Depends(get_current_user_id),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """
+    建立上傳工作階段
+
+    回傳 presigned PUT URL；客戶端以 upload_headers 直接上傳圖片至儲存，
+    完成後呼叫 POST /uploads/{session_id}/complete
+    """
+    service = UploadService(db)
+
+    try:
+        return await service.create_session(current_user_id, request)
+    except ValueError as e:
+        if "not found" in str(e).lower():
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+# POST /uploads/{session_id}/complete - 完成上傳
+@router.post(
+    "/{session_id}/complete",
+    response_model=UploadSessionResponse,
+    status_code=status.HTTP_202_ACCEPTED
+)
+async def complete_upload_session(
+    session_id: str,
+    background_tasks: BackgroundTasks,
+    current_user_id: str = Depends(get_current_user_id),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """
+    完成上傳
+
+    - 驗證物件大小與 MIME type 與簽發時一致
+    - 於背景產生 thumb / feed / full 衍生版本並套用至動態配圖或頭像
+    - 以 GET /uploads/{session_id} 輪詢處理狀態
+    """
+    _validate_session_id(session_id)
+    service = UploadService(db)
+
+    try:
+        session = await service.complete_session(session_id, current_user_id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    if not session:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload session not found")
+
+    if session.status == "processing":
+        background_tasks.add_task(service.process_session, session_id)
+
+    return session
+
+
+# GET /uploads/{session_id} - 查詢上傳工作階段
+@router.get("/{session_id}", response_model=UploadSessionResponse)
+async def get_upload_session(
+    session_id: str,
+    current_user_id: str = Depends(get_current_user_id),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """
+    查詢上傳工作階段
+
+    status 為 ready 時 image_variants 為衍生版本 URL
+    """
+    _validate_session_id(session_id)
+    service = UploadService(db)
+
+    session = await service.get_session(session_id, current_user_id)
+    if not session:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload session not found")
+
+    return session
@@ -7,6 +7,9 @@ from .achievement_service import AchievementService
 from .workout_service import WorkoutService
 from .dashboard_service import DashboardService
 from .timeline_service import TimelineService
+from .annual_review_service import AnnualReviewService
+from .share_card_service import ShareCardService
+from .upload_service import UploadService
 
 # Phase 3: Social Features Services
 from .friend_service import FriendService
@@ -21,6 +24,9 @@ __all__ = [
     "WorkoutService",
     "DashboardService",
     "TimelineService",
+    "AnnualReviewService",
+    "ShareCardService",
+    "UploadService",
     # Phase 3 Services
     "FriendService",
     "SocialService",
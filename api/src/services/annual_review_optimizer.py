@@ -2,11 +2,23 @@
 Annual Review Performance Optimizer
 Optimizes MongoDB aggregation and implements caching for yearly statistics
 """
-from typing import Dict, Any, List, Optional
-from datetime import datetime, timedelta
+from typing import Dict, Any, Deque, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from collections import defaultdict, deque
+from concurrent.futures import Executor
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from bson import ObjectId
 from ..core.performance import cache_response, invalidate_cache, query_profiler
+from .annual_review_service import (
+    REVIEW_SCHEMA_VERSION,
+    REVIEW_WORKOUT_PROJECTION,
+    compose_review_document,
+)
+import asyncio
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -437,11 +449,299 @@ async def create_annual_review_indexes(db: AsyncIOMotorDatabase):
     logger.info("Created annual review indexes")
 
 
+def _build_review_documents(
+    groups: List[Dict[str, Any]],
+    milestones_by_user: Dict[str, List[Dict[str, Any]]],
+    generated_at: datetime
+) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Compute annual review documents for a batch of users
+
+    Module-level so it can run inside a process pool
+
+    Args:
+        groups: Aggregated {"_id": user_id, "workouts": [...]} documents
+        milestones_by_user: Milestones of the year keyed by user_id
+        generated_at: Generation timestamp
+
+    Returns:
+        List of (user_id, review document fields)
+    """
+    return [
+        (
+            group["_id"],
+            compose_review_document(
+                group["workouts"],
+                milestones_by_user.get(group["_id"], []),
+                generated_at
+            )
+        )
+        for group in groups
+    ]
+
+
+class AnnualReviewBulkBuilder:
+    """
+    Rebuild annual reviews for every active user in one sorted pass
+
+    - Workouts of the year are grouped by user with a single aggregation
+    - Batches are computed inline or in an optional process pool
+    - Up to ``max_in_flight`` bulk_write batches run concurrently
+    - Progress is checkpointed after each contiguous batch so a crashed
+      run resumes from the last written user
+    - Only missing or outdated (schema_version) reviews are written; current
+      reviews are maintained incrementally by AnnualReviewService and are skipped
+    """
+
+    CHECKPOINT_PREFIX = "annual_review_pregeneration"
+
+    def __init__(
+        self,
+        db: AsyncIOMotorDatabase,
+        batch_size: int = 500,
+        max_in_flight: int = 4,
+        executor: Optional[Executor] = None
+    ):
+        """
+        Args:
+            db: Database instance
+            batch_size: Users per bulk_write batch
+            max_in_flight: Maximum concurrent batches
+            executor: Optional process pool for computing reviews
+        """
+        self.db = db
+        self.workouts = db.workouts
+        self.milestones = db.milestones
+        self.annual_reviews = db.annual_reviews
+        self.checkpoints = db.job_checkpoints
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.executor = executor
+
+    async def run(self, year: int, resume: bool = True) -> Dict[str, Any]:
+        """
+        Build annual reviews for all users with workouts in the year
+
+        Args:
+            year: Year to build
+            resume: Continue from an unfinished checkpoint (if any)
+
+        Returns:
+            Run statistics including users/sec throughput
+        """
+        job_id = f"{self.CHECKPOINT_PREFIX}:{year}"
+        checkpoint = await self.checkpoints.find_one({"_id": job_id}) if resume else None
+        if checkpoint and checkpoint.get("completed_at"):
+            checkpoint = None
+
+        resumed_from = checkpoint.get("last_user_id") if checkpoint else None
+        progress = {
+            "last_user_id": resumed_from,
+            "processed_users": checkpoint.get("processed_users", 0) if checkpoint else 0,
+        }
+
+        await self.checkpoints.update_one(
+            {"_id": job_id},
+            {
+                "$set": {
+                    "year": year,
+                    **progress,
+                    "started_at": datetime.now(timezone.utc),
+                    "completed_at": None
+                }
+            },
+            upsert=True
+        )
+
+        logger.info(
+            f"Starting annual review pre-generation for {year}"
+            + (f" (resuming after user {resumed_from})" if resumed_from else "")
+        )
+
+        started = time.perf_counter()
+        users_this_run = 0
+        written_users = 0
+        batches = 0
+        pending: Deque[Tuple[asyncio.Task, str, int]] = deque()
+
+        async def complete_oldest():
+            nonlocal written_users
+            task, last_user_id, count = pending.popleft()
+            written_users += await task
+            progress["last_user_id"] = last_user_id
+            progress["processed_users"] += count
+            await self.checkpoints.update_one(
+                {"_id": job_id},
+                {"$set": {**progress, "updated_at": datetime.now(timezone.utc)}}
+            )
+
+        try:
+            batch: List[Dict[str, Any]] = []
+            async for group in self._grouped_workouts(year, resumed_from):
+                batch.append(group)
+                if len(batch) < self.batch_size:
+                    continue
+
+                pending.append((
+                    asyncio.create_task(self._write_batch(year, batch)),
+                    batch[-1]["_id"],
+                    len(batch)
+                ))
+                users_this_run += len(batch)
+                batches += 1
+                batch = []
+
+                # Checkpoints only advance over contiguous completed batches
+                while len(pending) >= self.max_in_flight:
+                    await complete_oldest()
+
+            if batch:
+                pending.append((
+                    asyncio.create_task(self._write_batch(year, batch)),
+                    batch[-1]["_id"],
+                    len(batch)
+                ))
+                users_this_run += len(batch)
+                batches += 1
+
+            while pending:
+                await complete_oldest()
+
+        except Exception:
+            for task, _, _ in pending:
+                task.cancel()
+            logger.exception(
+                f"Annual review pre-generation for {year} failed; "
+                f"resume point is user {progress['last_user_id']}"
+            )
+            raise
+
+        elapsed = time.perf_counter() - started
+        users_per_second = users_this_run / elapsed if elapsed > 0 else 0.0
+
+        await self.checkpoints.update_one(
+            {"_id": job_id},
+            {
+                "$set": {
+                    **progress,
+                    "completed_at": datetime.now(timezone.utc),
+                    "users_per_second": users_per_second
+                }
+            }
+        )
+
+        logger.info(
+            f"Completed annual review pre-generation for {year}: "
+            f"{users_this_run} users in {elapsed:.1f}s ({users_per_second:.1f} users/sec)"
+        )
+
+        return {
+            "year": year,
+            "users": users_this_run,
+            "written_users": written_users,
+            "total_users": progress["processed_users"],
+            "batches": batches,
+            "elapsed_seconds": elapsed,
+            "users_per_second": users_per_second,
+            "resumed_from": resumed_from
+        }
+
+    def _grouped_workouts(self, year: int, after_user_id: Optional[str]):
+        """Stream the year's workouts grouped by user, sorted by user_id"""
+        pipeline = [
+            {
+                "$match": {
+                    "start_time": {
+                        "$gte": datetime(year, 1, 1, tzinfo=timezone.utc),
+                        "$lt": datetime(year + 1, 1, 1, tzinfo=timezone.utc)
+                    },
+                    "is_deleted": False
+                }
+            },
+            {"$project": REVIEW_WORKOUT_PROJECTION},
+            # user_id is stored as either string or ObjectId; group on its string form
+            {"$group": {"_id": {"$toString": "$user_id"}, "workouts": {"$push": "$$ROOT"}}},
+        ]
+        if after_user_id:
+            pipeline.append({"$match": {"_id": {"$gt": after_user_id}}})
+        pipeline.append({"$sort": {"_id": 1}})
+
+        return self.workouts.aggregate(pipeline, allowDiskUse=True, batchSize=self.batch_size)
+
+    async def _write_batch(self, year: int, groups: List[Dict[str, Any]]) -> int:
+        """
+        Compute and bulk-write the missing or outdated reviews of one batch
+
+        Returns:
+            Number of reviews written
+        """
+        groups = [g for g in groups if ObjectId.is_valid(g["_id"])]
+        current = await self.annual_reviews.find(
+            {
+                "user_id": {"$in": [ObjectId(g["_id"]) for g in groups]},
+                "year": year,
+                "schema_version": REVIEW_SCHEMA_VERSION
+            },
+            projection={"user_id": 1}
+        ).to_list(length=None)
+        current_ids = {str(review["user_id"]) for review in current}
+        groups = [g for g in groups if g["_id"] not in current_ids]
+        if not groups:
+            return 0
+
+        user_ids = [g["_id"] for g in groups]
+        milestones = await self.milestones.find({
+            "user_id": {"$in": user_ids + [ObjectId(u) for u in user_ids if ObjectId.is_valid(u)]},
+            "achieved_at": {
+                "$gte": datetime(year, 1, 1, tzinfo=timezone.utc),
+                "$lt": datetime(year + 1, 1, 1, tzinfo=timezone.utc)
+            }
+        }).to_list(length=None)
+
+        milestones_by_user = defaultdict(list)
+        for milestone in milestones:
+            milestones_by_user[str(milestone["user_id"])].append(milestone)
+
+        generated_at = datetime.now(timezone.utc)
+        if self.executor:
+            loop = asyncio.get_running_loop()
+            documents = await loop.run_in_executor(
+                self.executor,
+                _build_review_documents,
+                groups,
+                dict(milestones_by_user),
+                generated_at
+            )
+        else:
+            documents = _build_review_documents(groups, milestones_by_user, generated_at)
+
+        # The schema_version condition keeps a review that became current since the
+        # read above (and may already carry incremental deltas) from being overwritten;
+        # its upsert then fails with a duplicate key, which is expected
+        operations = [
+            UpdateOne(
+                {"user_id": ObjectId(user_id), "year": year, "schema_version": {"$ne": REVIEW_SCHEMA_VERSION}},
+                {"$set": document, "$unset": {"cache_expires_at": ""}},
+                upsert=True
+            )
+            for user_id, document in documents
+        ]
+        try:
+            await self.annual_reviews.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(error.get("code") != 11000 for error in errors) or e.details.get("writeConcernErrors"):
+                raise
+            return len(operations) - len(errors)
+        return len(operations)
+
+
 # Background job for pre-generation
 async def schedule_annual_review_pregeneration(
     db: AsyncIOMotorDatabase,
-    target_month: int = 12  # December
-):
+    target_month: int = 12,  # December
+    executor: Optional[Executor] = None
+) -> Optional[Dict[str, Any]]:
     """
     Schedule background job to pre-generate annual reviews
     Run in December for all active users
@@ -449,35 +749,16 @@ async def schedule_annual_review_pregeneration(
     Args:
         db: Database instance
         target_month: Month to start pre-generation (default: December)
+        executor: Optional process pool for computing reviews
+
+    Returns:
+        Run statistics, or None outside the target month
     """
     current_date = datetime.utcnow()
 
     # Only run in target month
     if current_date.month != target_month:
-        return
-
-    # Get all active users from current year
-    year = current_date.year
-    year_start = datetime(year, 1, 1)
-
-    active_users = await db.workouts.distinct(
-        "user_id",
-        {"date": {"$gte": year_start}}
-    )
-
-    logger.info(
-        f"Starting annual review pre-generation for {len(active_users)} users"
-    )
-
-    optimizer = AnnualReviewOptimizer(db)
-
-    for user_id in active_users:
-        try:
-            await optimizer.pregenerate_annual_review(user_id, year)
-        except Exception as e:
-            logger.error(
-                f"Failed to pre-generate annual review for user {user_id}: {e}"
-            )
-            continue
+        return None
 
-    logger.info("Completed annual review pre-generation")
+    builder = AnnualReviewBulkBuilder(db, executor=executor)
+    return await builder.run(current_date.year)
@@ -0,0 +1,754 @@
+"""
+Annual Review Service
+年度回顧文件的增量維護：運動記錄異動時直接套用差量，讀取只需一次 find_one
+"""
+
+from datetime import datetime, timezone
+from typing import List, Optional, Dict, Tuple
+from collections import defaultdict
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from bson import ObjectId
+
+from ..core.database import user_id_query
+from ..models import (
+    AnnualReviewResponse,
+    MonthlyUsageStats,
+    WorkoutTypeSummary,
+    TrendAnalysis,
+    MilestoneSummary,
+    YearSummary,
+    YearOverYearDelta,
+    MultiYearSummaryResponse,
+)
+
+# 文件結構版本：計數器欄位變更時調升，舊版文件會在下次讀取時完整重建
+REVIEW_SCHEMA_VERSION = 2
+
+# 每項個人紀錄保留的候選數量 (刪除紀錄保持者時仍可直接遞補)
+PR_CANDIDATE_LIMIT = 5
+
+# 個人紀錄欄位 -> (排序方向, personal_records key)；-1 取最大值、1 取最小值
+PR_FIELDS = {
+    "distance_km": (-1, "longest_distance_km"),
+    "duration_minutes": (-1, "longest_duration_minutes"),
+    "pace_min_per_km": (1, "fastest_pace_min_per_km"),
+}
+
+# 多年度比較的最大年份範圍
+MAX_SUMMARY_YEARS = 10
+
+# 計算年度回顧所需的運動記錄欄位
+REVIEW_WORKOUT_PROJECTION = {
+    "user_id": 1,
+    "start_time": 1,
+    "workout_type": 1,
+    "duration_minutes": 1,
+    "distance_km": 1,
+    "pace_min_per_km": 1,
+    "avg_heart_rate": 1,
+    "calories": 1,
+}
+
+
+def _review_key(workout: Optional[Dict]) -> Optional[Tuple[ObjectId, int, int]]:
+    """
+    取得運動記錄所屬的年度回顧 (user_id, year, month)
+
+    已刪除或缺少 start_time 的記錄不計入年度回顧
+    """
+    if not workout or workout.get("is_deleted", False):
+        return None
+
+    start_time = workout.get("start_time")
+    if not isinstance(start_time, datetime):
+        return None
+
+    if start_time.tzinfo is not None:
+        start_time = start_time.astimezone(timezone.utc)
+
+    return ObjectId(str(workout["user_id"])), start_time.year, start_time.month
+
+
+def _workout_increments(workout: Dict, month: int, sign: int) -> Dict[str, float]:
+    """單筆運動記錄對年度回顧計數器的貢獻 ($inc 路徑 -> 數值)"""
+    duration = workout.get("duration_minutes") or 0
+    distance = workout.get("distance_km") or 0.0
+    calories = workout.get("calories") or 0
+    workout_type = workout.get("workout_type") or "unknown"
+
+    monthly = f"monthly_counters.{month}"
+    by_type = f"type_counters.{workout_type}"
+
+    increments = {
+        "total_workouts": 1,
+        "total_duration_minutes": duration,
+        "total_distance_km": distance,
+        "total_calories": calories,
+        f"{monthly}.workout_count": 1,
+        f"{monthly}.total_duration_minutes": duration,
+        f"{monthly}.total_distance_km": distance,
+        f"{by_type}.count": 1,
+        f"{by_type}.total_duration_minutes": duration,
+        f"{by_type}.total_distance_km": distance,
+    }
+
+    if workout.get("avg_heart_rate"):
+        increments[f"{monthly}.heart_rate_sum"] = workout["avg_heart_rate"]
+        increments[f"{monthly}.heart_rate_count"] = 1
+
+    return {path: value * sign for path, value in increments.items()}
+
+
+def _pr_value(workout: Dict, field: str) -> Optional[float]:
+    """取得可列入個人紀錄的數值 (需大於 0)"""
+    value = workout.get(field)
+    if value is None or value <= 0:
+        return None
+    return value
+
+
+def _set_path(state: Dict, path: str, value: float):
+    """將 $inc 路徑累加至巢狀 dict (與 MongoDB 行為一致)"""
+    *parents, leaf = path.split(".")
+    node = state
+    for key in parents:
+        node = node.setdefault(key, {})
+    node[leaf] = node.get(leaf, 0) + value
+
+
+def build_review_state(workouts: List[Dict]) -> Dict:
+    """
+    由運動記錄完整計算年度回顧計數器 (完整重建與批次預生成共用)
+
+    Args:
+        workouts: 同一使用者、同一年度的運動記錄
+
+    Returns:
+        Dict: 計數器、使用月份與個人紀錄候選
+    """
+    state = {
+        "total_workouts": 0,
+        "total_duration_minutes": 0,
+        "total_distance_km": 0.0,
+        "total_calories": 0,
+        "monthly_counters": {},
+        "type_counters": {},
+    }
+    candidates = defaultdict(list)
+
+    for workout in workouts:
+        key = _review_key(workout)
+        if not key:
+            continue
+
+        for path, value in _workout_increments(workout, key[2], 1).items():
+            _set_path(state, path, value)
+
+        for field in PR_FIELDS:
+            value = _pr_value(workout, field)
+            if value is not None:
+                candidates[field].append({"workout_id": workout["_id"], "value": value})
+
+    state["pr_candidates"] = {
+        field: sorted(
+            candidates[field],
+            key=lambda c: c["value"],
+            reverse=direction == -1
+        )[:PR_CANDIDATE_LIMIT]
+        for field, (direction, _) in PR_FIELDS.items()
+    }
+    return state
+
+
+def compose_review_document(
+    workouts: List[Dict],
+    milestones: List[Dict],
+    generated_at: datetime
+) -> Dict:
+    """
+    組合完整的年度回顧文件內容 ($set 用，不含 user_id/year)
+
+    Args:
+        workouts: 同一使用者、同一年度的運動記錄
+        milestones: 同一使用者、同一年度的里程碑
+        generated_at: 生成時間
+
+    Returns:
+        Dict: 年度回顧文件欄位
+    """
+    document = build_review_state(workouts)
+    document.update({
+        "schema_version": REVIEW_SCHEMA_VERSION,
+        "milestones": [
+            MilestoneSummary(
+                milestone_id=str(m["_id"]),
+                milestone_type=m["milestone_type"],
+                title=m["title"],
+                achieved_at=m["achieved_at"]
+            ).dict()
+            for m in sorted(milestones, key=lambda m: m["achieved_at"])
+        ],
+        "generated_at": generated_at,
+        "updated_at": generated_at,
+    })
+    return document
+
+
+def analyze_trends(monthly_stats: List[MonthlyUsageStats]) -> List[TrendAnalysis]:
+    """分析趨勢 (前半年 vs 後半年平均距離)"""
+    if len(monthly_stats) < 2:
+        return []
+
+    trends = []
+
+    # 距離趨勢
+    distances = [s.total_distance_km for s in monthly_stats]
+    first_half_avg = sum(distances[:len(distances)//2]) / (len(distances)//2) if len(distances) > 1 else 0
+    second_half_avg = sum(distances[len(distances)//2:]) / (len(distances) - len(distances)//2)
+
+    if second_half_avg > first_half_avg * 1.1:
+        change_pct = ((second_half_avg - first_half_avg) / first_half_avg * 100) if first_half_avg > 0 else 0
+        trends.append(TrendAnalysis(
+            metric="distance",
+            trend="increasing",
+            change_percentage=change_pct,
+            insight=f"運動距離增加了 {change_pct:.1f}%"
+        ))
+    elif second_half_avg < first_half_avg * 0.9:
+        change_pct = ((first_half_avg - second_half_avg) / first_half_avg * 100) if first_half_avg > 0 else 0
+        trends.append(TrendAnalysis(
+            metric="distance",
+            trend="decreasing",
+            change_percentage=-change_pct,
+            insight=f"運動距離減少了 {change_pct:.1f}%"
+        ))
+    else:
+        trends.append(TrendAnalysis(
+            metric="distance",
+            trend="stable",
+            change_percentage=0.0,
+            insight="運動距離保持穩定"
+        ))
+
+    return trends
+
+
+def review_to_response(review: Dict) -> AnnualReviewResponse:
+    """
+    將年度回顧文件轉換為 API 回應
+
+    月度統計、類型統計、使用月份、趨勢與個人紀錄皆由計數器即時推導，
+    不需額外查詢
+    """
+    monthly_stats = []
+    monthly_counters = review.get("monthly_counters", {})
+    for month in sorted(monthly_counters, key=int):
+        counters = monthly_counters[month]
+        if counters.get("workout_count", 0) <= 0:
+            continue
+
+        heart_rate_count = counters.get("heart_rate_count", 0)
+        monthly_stats.append(MonthlyUsageStats(
+            month=int(month),
+            workout_count=counters["workout_count"],
+            total_duration_minutes=counters.get("total_duration_minutes", 0),
+            total_distance_km=round(counters.get("total_distance_km", 0.0), 3),
+            avg_heart_rate=(
+                counters.get("heart_rate_sum", 0) // heart_rate_count
+                if heart_rate_count > 0 else None
+            )
+        ))
+
+    return AnnualReviewResponse(
+        _id=str(review["_id"]),
+        user_id=review["user_id"],
+        year=review["year"],
+        usage_months=[s.month for s in monthly_stats],
+        total_workouts=review.get("total_workouts", 0),
+        total_duration_minutes=review.get("total_duration_minutes", 0),
+        total_distance_km=round(review.get("total_distance_km", 0.0), 3),
+        total_calories=review.get("total_calories", 0),
+        monthly_stats=monthly_stats,
+        workout_type_summary=_workout_type_summary(review.get("type_counters", {})),
+        trends=analyze_trends(monthly_stats),
+        milestones=[MilestoneSummary(**m) for m in review.get("milestones", [])],
+        personal_records=_personal_records(review.get("pr_candidates", {})),
+        generated_at=review.get("generated_at") or datetime.now(timezone.utc),
+        export_image_url=review.get("export_image_url")
+    )
+
+
+def _workout_type_summary(type_counters: Dict) -> List[WorkoutTypeSummary]:
+    """由運動類型計數器建立類型統計 (依次數排序)"""
+    return [
+        WorkoutTypeSummary(
+            workout_type=workout_type,
+            count=counters["count"],
+            total_distance_km=round(counters.get("total_distance_km", 0.0), 3),
+            total_duration_minutes=counters.get("total_duration_minutes", 0)
+        )
+        for workout_type, counters in sorted(
+            type_counters.items(),
+            key=lambda item: -item[1].get("count", 0)
+        )
+        if counters.get("count", 0) > 0
+    ]
+
+
+def _personal_records(pr_candidates: Dict) -> Dict[str, float]:
+    """由個人紀錄候選取得各項紀錄"""
+    personal_records = {}
+    for field, (_, record_key) in PR_FIELDS.items():
+        if pr_candidates.get(field):
+            personal_records[record_key] = pr_candidates[field][0]["value"]
+    return personal_records
+
+
+def review_to_year_summary(review: Dict) -> YearSummary:
+    """由年度回顧文件建立年度摘要"""
+    return YearSummary(
+        year=review["year"],
+        total_workouts=review.get("total_workouts", 0),
+        total_duration_minutes=review.get("total_duration_minutes", 0),
+        total_distance_km=round(review.get("total_distance_km", 0.0), 3),
+        total_calories=review.get("total_calories", 0),
+        active_months=sum(
+            1 for counters in review.get("monthly_counters", {}).values()
+            if counters.get("workout_count", 0) > 0
+        ),
+        workout_type_summary=_workout_type_summary(review.get("type_counters", {})),
+        personal_records=_personal_records(review.get("pr_candidates", {}))
+    )
+
+
+def grouped_rows_to_year_summaries(rows: List[Dict]) -> Dict[int, YearSummary]:
+    """
+    將 (年, 月, 運動類型) 分組聚合結果轉換為年度摘要
+
+    Args:
+        rows: _year_summary_pipeline 的聚合結果
+
+    Returns:
+        Dict[int, YearSummary]: 年份 -> 年度摘要
+    """
+    years: Dict[int, Dict] = {}
+    for row in rows:
+        year = row["_id"]["year"]
+        state = years.setdefault(year, {
+            "year": year,
+            "total_workouts": 0,
+            "total_duration_minutes": 0,
+            "total_distance_km": 0.0,
+            "total_calories": 0,
+            "months": set(),
+            "type_counters": {},
+            "pr_candidates": {},
+        })
+        state["total_workouts"] += row["count"]
+        state["total_duration_minutes"] += row.get("total_duration_minutes") or 0
+        state["total_distance_km"] += row.get("total_distance_km") or 0.0
+        state["total_calories"] += row.get("total_calories") or 0
+        state["months"].add(row["_id"]["month"])
+
+        counters = state["type_counters"].setdefault(row["_id"]["workout_type"], {
+            "count": 0, "total_duration_minutes": 0, "total_distance_km": 0.0
+        })
+        counters["count"] += row["count"]
+        counters["total_duration_minutes"] += row.get("total_duration_minutes") or 0
+        counters["total_distance_km"] += row.get("total_distance_km") or 0.0
+
+        for field, (direction, _) in PR_FIELDS.items():
+            value = row.get(field)
+            if value is None or value <= 0:
+                continue
+            current = state["pr_candidates"].get(field)
+            if current:
+                best = current[0]["value"]
+                if (value <= best) if direction == -1 else (value >= best):
+                    continue
+            state["pr_candidates"][field] = [{"value": value}]
+
+    summaries = {}
+    for year, state in years.items():
+        state["monthly_counters"] = {
+            str(month): {"workout_count": 1} for month in state.pop("months")
+        }
+        summaries[year] = review_to_year_summary(state)
+    return summaries
+
+
+def _change_percentage(current: float, previous: float) -> Optional[float]:
+    """計算變化百分比 (基準為 0 時無法計算)"""
+    if not previous:
+        return None
+    return round((current - previous) / previous * 100, 1)
+
+
+def compute_year_deltas(summaries: List[YearSummary]) -> List[YearOverYearDelta]:
+    """
+    計算相鄰年度差異
+
+    Args:
+        summaries: 依年份排序的年度摘要
+
+    Returns:
+        List[YearOverYearDelta]: 每一年相對於前一年的差異
+    """
+    return [
+        YearOverYearDelta(
+            year=current.year,
+            previous_year=previous.year,
+            workouts_change=current.total_workouts - previous.total_workouts,
+            duration_minutes_change=current.total_duration_minutes - previous.total_duration_minutes,
+            distance_km_change=round(current.total_distance_km - previous.total_distance_km, 3),
+            calories_change=current.total_calories - previous.total_calories,
+            workouts_change_percentage=_change_percentage(
+                current.total_workouts, previous.total_workouts
+            ),
+            duration_change_percentage=_change_percentage(
+                current.total_duration_minutes, previous.total_duration_minutes
+            ),
+            distance_change_percentage=_change_percentage(
+                current.total_distance_km, previous.total_distance_km
+            )
+        )
+        for previous, current in zip(summaries, summaries[1:])
+    ]
+
+
+class AnnualReviewService:
+    """年度回顧服務"""
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.db = db
+        self.annual_reviews = db.annual_reviews
+        self.workouts = db.workouts
+        self.milestones = db.milestones
+
+    async def get_review(self, user_id: str, year: int) -> AnnualReviewResponse:
+        """
+        取得年度回顧
+
+        文件由運動記錄異動增量維護，一般情況只需一次 find_one；
+        文件不存在或結構版本過舊時才完整重建
+
+        Args:
+            user_id: 使用者 ID
+            year: 年份
+
+        Returns:
+            AnnualReviewResponse: 年度回顧
+        """
+        review = await self.annual_reviews.find_one({
+            "user_id": ObjectId(user_id),
+            "year": year
+        })
+
+        if not review or review.get("schema_version") != REVIEW_SCHEMA_VERSION:
+            review = await self.rebuild_review(user_id, year)
+
+        return review_to_response(review)
+
+    async def get_multi_year_summary(
+        self,
+        user_id: str,
+        start_year: int,
+        end_year: int
+    ) -> MultiYearSummaryResponse:
+        """
+        取得多年度回顧比較
+
+        一次 find 讀取範圍內所有增量維護的年度回顧文件；
+        文件不存在或結構版本過舊的年份，以一次分組聚合補齊 (不寫回文件)
+
+        Args:
+            user_id: 使用者 ID
+            start_year: 起始年份
+            end_year: 結束年份 (含)
+
+        Returns:
+            MultiYearSummaryResponse: 各年度摘要與相鄰年度差異
+
+        Raises:
+            ValueError: 年份範圍無效
+        """
+        if start_year > end_year:
+            raise ValueError("start_year must not be after end_year")
+        if end_year - start_year + 1 > MAX_SUMMARY_YEARS:
+            raise ValueError(f"Year range cannot exceed {MAX_SUMMARY_YEARS} years")
+
+        reviews = await self.annual_reviews.find(
+            {
+                "user_id": ObjectId(user_id),
+                "year": {"$gte": start_year, "$lte": end_year},
+                "schema_version": REVIEW_SCHEMA_VERSION
+            },
+            projection={"milestones": 0}
+        ).to_list(length=MAX_SUMMARY_YEARS)
+
+        summaries = {review["year"]: review_to_year_summary(review) for review in reviews}
+
+        missing_years = [
+            year for year in range(start_year, end_year + 1) if year not in summaries
+        ]
+        if missing_years:
+            rows = await self.workouts.aggregate(
+                self._year_summary_pipeline(user_id, missing_years)
+            ).to_list(length=None)
+            summaries.update(grouped_rows_to_year_summaries(rows))
+
+        years = [
+            summaries.get(year) or YearSummary(year=year)
+            for year in range(start_year, end_year + 1)
+        ]
+
+        return MultiYearSummaryResponse(
+            user_id=user_id,
+            start_year=start_year,
+            end_year=end_year,
+            years=years,
+            deltas=compute_year_deltas(years)
+        )
+
+    def _year_summary_pipeline(self, user_id: str, years: List[int]) -> List[Dict]:
+        """依 (年, 月, 運動類型) 分組計算總計與個人紀錄的聚合管線"""
+        return [
+            {
+                "$match": {
+                    "user_id": user_id_query(user_id),
+                    "start_time": {
+                        "$gte": datetime(min(years), 1, 1, tzinfo=timezone.utc),
+                        "$lt": datetime(max(years) + 1, 1, 1, tzinfo=timezone.utc)
+                    },
+                    "is_deleted": False
+                }
+            },
+            {"$match": {"$expr": {"$in": [{"$year": "$start_time"}, years]}}},
+            {
+                "$group": {
+                    "_id": {
+                        "year": {"$year": "$start_time"},
+                        "month": {"$month": "$start_time"},
+                        "workout_type": {"$ifNull": ["$workout_type", "unknown"]}
+                    },
+                    "count": {"$sum": 1},
+                    "total_duration_minutes": {"$sum": "$duration_minutes"},
+                    "total_distance_km": {"$sum": "$distance_km"},
+                    "total_calories": {"$sum": "$calories"},
+                    "distance_km": {"$max": "$distance_km"},
+                    "duration_minutes": {"$max": "$duration_minutes"},
+                    "pace_min_per_km": {
+                        "$min": {
+                            "$cond": [
+                                {"$gt": ["$pace_min_per_km", 0]},
+                                "$pace_min_per_km",
+                                None
+                            ]
+                        }
+                    }
+                }
+            }
+        ]
+
+    async def rebuild_review(self, user_id: str, year: int) -> Dict:
+        """
+        完整重建年度回顧 (僅在文件不存在或結構版本變更時使用)
+
+        Args:
+            user_id: 使用者 ID
+            year: 年份
+
+        Returns:
+            Dict: 重建後的年度回顧文件
+        """
+        start_date = datetime(year, 1, 1, tzinfo=timezone.utc)
+        end_date = datetime(year + 1, 1, 1, tzinfo=timezone.utc)
+
+        workouts = await self.workouts.find(
+            {
+                "user_id": user_id_query(user_id),
+                "start_time": {"$gte": start_date, "$lt": end_date},
+                "is_deleted": False
+            },
+            projection=REVIEW_WORKOUT_PROJECTION
+        ).to_list(length=None)
+
+        milestones = await self.milestones.find({
+            "user_id": user_id_query(user_id),
+            "achieved_at": {"$gte": start_date, "$lt": end_date}
+        }).to_list(length=None)
+
+        document = compose_review_document(workouts, milestones, datetime.now(timezone.utc))
+
+        # 以 upsert 取代 delete_many + insert_one，保留 _id 與匯出圖片資訊
+        return await self.annual_reviews.find_one_and_update(
+            {"user_id": ObjectId(user_id), "year": year},
+            {"$set": document, "$unset": {"cache_expires_at": ""}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def apply_workout_change(
+        self,
+        before: Optional[Dict],
+        after: Optional[Dict]
+    ):
+        """
+        將單筆運動記錄異動套用至年度回顧
+
+        - 建立: before=None
+        - 刪除: after=None (或 after.is_deleted=True)
+        - 更新/復原: 兩者皆有，跨年度更新會同時調整兩份回顧
+
+        尚未建立 (或結構版本過舊) 的回顧不處理，下次讀取時會完整重建
+
+        Args:
+            before: 異動前的運動記錄文件
+            after: 異動後的運動記錄文件
+        """
+        groups = defaultdict(list)
+        for sign, workout in ((-1, before), (1, after)):
+            key = _review_key(workout)
+            if key:
+                groups[(key[0], key[1])].append((sign, workout, key[2]))
+
+        for (user_oid, year), entries in groups.items():
+            await self._apply_entries(user_oid, year, entries)
+
+    async def _apply_entries(
+        self,
+        user_oid: ObjectId,
+        year: int,
+        entries: List[Tuple[int, Dict, int]]
+    ):
+        """將同一份年度回顧的差量以最少次數的更新寫入"""
+        increments = defaultdict(int)
+        for sign, workout, month in entries:
+            for path, value in _workout_increments(workout, month, sign).items():
+                increments[path] += value
+        increments = {path: value for path, value in increments.items() if value != 0}
+
+        pulls: Dict[str, List] = {}
+        pushes: Dict[str, List[Dict]] = {}
+        for field in PR_FIELDS:
+            removed = {
+                workout["_id"]: _pr_value(workout, field)
+                for sign, workout, _ in entries
+                if sign < 0 and _pr_value(workout, field) is not None
+            }
+            for sign, workout, _ in entries:
+                if sign < 0:
+                    continue
+                value = _pr_value(workout, field)
+                if workout["_id"] in removed and removed[workout["_id"]] == value:
+                    # 數值未變，候選清單不需調整
+                    removed.pop(workout["_id"])
+                elif value is not None:
+                    pushes.setdefault(field, []).append(
+                        {"workout_id": workout["_id"], "value": value}
+                    )
+            if removed:
+                pulls[field] = list(removed)
+
+        if not increments and not pulls and not pushes:
+            return
+
+        review_filter = {
+            "user_id": user_oid,
+            "year": year,
+            "schema_version": REVIEW_SCHEMA_VERSION
+        }
+        update = {"$set": {"updated_at": datetime.now(timezone.utc)}}
+        if increments:
+            update["$inc"] = increments
+
+        if not pulls:
+            if pushes:
+                update["$push"] = self._candidate_pushes(pushes)
+            await self.annual_reviews.update_one(review_filter, update)
+            return
+
+        # 同一欄位無法在單次更新中同時 $pull 與 $push，先移除再補上
+        update["$pull"] = {
+            f"pr_candidates.{field}": {"workout_id": {"$in": workout_ids}}
+            for field, workout_ids in pulls.items()
+        }
+        previous = await self.annual_reviews.find_one_and_update(
+            review_filter,
+            update,
+            projection={"pr_candidates": 1},
+            return_document=ReturnDocument.BEFORE
+        )
+        if not previous:
+            return
+
+        # 被移除的是候選紀錄時，候選清單可能不再完整，直接由資料庫遞補
+        refill_fields = []
+        for field, workout_ids in pulls.items():
+            candidate_ids = {
+                c["workout_id"] for c in previous.get("pr_candidates", {}).get(field, [])
+            }
+            if candidate_ids.intersection(workout_ids):
+                refill_fields.append(field)
+
+        refills = {}
+        for field in refill_fields:
+            refills[f"pr_candidates.{field}"] = await self._load_candidates(user_oid, year, field)
+            pushes.pop(field, None)
+
+        follow_up = {}
+        if refills:
+            follow_up["$set"] = refills
+        if pushes:
+            follow_up["$push"] = self._candidate_pushes(pushes)
+        if follow_up:
+            await self.annual_reviews.update_one(review_filter, follow_up)
+
+    def _candidate_pushes(self, pushes: Dict[str, List[Dict]]) -> Dict:
+        """建立維持候選清單排序與長度的 $push 操作"""
+        return {
+            f"pr_candidates.{field}": {
+                "$each": candidates,
+                "$sort": {"value": PR_FIELDS[field][0]},
+                "$slice": PR_CANDIDATE_LIMIT
+            }
+            for field, candidates in pushes.items()
+        }
+
+    async def _load_candidates(self, user_oid: ObjectId, year: int, field: str) -> List[Dict]:
+        """從運動記錄重新載入單一欄位的個人紀錄候選"""
+        workouts = await self.workouts.find(
+            {
+                "user_id": user_id_query(str(user_oid)),
+                "start_time": {
+                    "$gte": datetime(year, 1, 1, tzinfo=timezone.utc),
+                    "$lt": datetime(year + 1, 1, 1, tzinfo=timezone.utc)
+                },
+                "is_deleted": False,
+                field: {"$gt": 0}
+            },
+            projection={field: 1}
+        ).sort(field, PR_FIELDS[field][0]).limit(PR_CANDIDATE_LIMIT).to_list(
+            length=PR_CANDIDATE_LIMIT
+        )
+
+        return [{"workout_id": w["_id"], "value": w[field]} for w in workouts]
+
+    async def add_milestone(self, user_id: str, milestone: MilestoneSummary):
+        """將新達成的里程碑加入對應年度的回顧"""
+        achieved_at = milestone.achieved_at
+        if achieved_at.tzinfo is not None:
+            achieved_at = achieved_at.astimezone(timezone.utc)
+
+        await self.annual_reviews.update_one(
+            {
+                "user_id": ObjectId(user_id),
+                "year": achieved_at.year,
+                "schema_version": REVIEW_SCHEMA_VERSION
+            },
+            {
+                "$push": {"milestones": milestone.dict()},
+                "$set": {"updated_at": datetime.now(timezone.utc)}
+            }
+        )
@@ -10,6 +10,7 @@ from bson import ObjectId
 from ..core.firebase_admin import verify_firebase_token, create_firebase_user
 from ..core.security import create_access_token, hash_password, verify_password
 from ..models import UserCreate, UserInDB, UserResponse
+from ..utils.user_search import search_fields
 
 
 class AuthService:
@@ -72,7 +73,9 @@ class AuthService:
             updated_at=datetime.now(timezone.utc)
         )
 
-        result = await self.users_collection.insert_one(user.dict(by_alias=True))
+        result = await self.users_collection.insert_one(
+            {**user.dict(by_alias=True), **search_fields(user.email, user.display_name)}
+        )
         user.id = result.inserted_id
 
         # 生成 JWT token
@@ -149,7 +152,9 @@ class AuthService:
                 updated_at=datetime.now(timezone.utc)
             )
 
-            result = await self.users_collection.insert_one(user.dict(by_alias=True))
+            result = await self.users_collection.insert_one(
+                {**user.dict(by_alias=True), **search_fields(user.email, user.display_name)}
+            )
             user.id = result.inserted_id
         else:
             user = UserInDB(**user_doc)
@@ -0,0 +1,237 @@
+"""
+Block Cache
+封鎖名單快取：每位使用者的封鎖集合 (雙向：我封鎖的 + 封鎖我的) 存於有上限的 LRU，
+搜尋、個人檔案與動態牆在記憶體中排除封鎖的使用者
+
+搜尋與動態牆 (blocked_ids) 前置 Bloom filter：記錄所有曾出現在封鎖記錄中的使用者，
+大多數使用者從未封鎖或被封鎖，不在 filter 中時直接回傳空集合，不佔用 LRU 也不查詢資料庫。
+filter 為每個 worker 各自的狀態，啟動時與每 BLOCK_FILTER_REFRESH_SECONDS 由 blocklist 重建
+(不使用 job_scheduler：租約只讓單一 worker 執行)
+
+個人檔案與好友邀請 (is_blocked) 不經 filter，直接走 LRU/資料庫
+
+封鎖時將雙方加入 filter 並清除雙方的快取，經由 broker 通知其他 worker 同步
+(REALTIME_BROKER=redis 時跨 worker 生效)；漏接通知時 LRU 以 TTL、filter 以重建間隔為過期上限
+"""
+
+import asyncio
+import logging
+from typing import Dict, FrozenSet, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from bson import ObjectId
+
+from ..core.performance import BloomFilter, LRUCache
+from ..core.pubsub import EventBroker, create_event_broker
+
+logger = logging.getLogger(__name__)
+
+BLOCK_CACHE_SIZE = 50000
+BLOCK_CACHE_TTL_SECONDS = 600
+
+# Bloom filter 容量 (使用者數) 與誤判率：100 萬使用者約 1.2 MB
+BLOCK_FILTER_CAPACITY = 1_000_000
+BLOCK_FILTER_ERROR_RATE = 0.01
+BLOCK_FILTER_REFRESH_SECONDS = 600
+
+INVALIDATION_CHANNEL = "motionstory:blocklist:invalidate"
+
+_EMPTY: FrozenSet[str] = frozenset()
+
+
+class BlockCache:
+    """封鎖名單快取 (每個 worker 一個)"""
+
+    def __init__(
+        self,
+        maxsize: int = BLOCK_CACHE_SIZE,
+        ttl: float = BLOCK_CACHE_TTL_SECONDS,
+        filter_capacity: int = BLOCK_FILTER_CAPACITY,
+        refresh_seconds: float = BLOCK_FILTER_REFRESH_SECONDS,
+        broker: Optional[EventBroker] = None
+    ):
+        """
+        Args:
+            maxsize: 快取的使用者數量上限
+            ttl: 快取有效時間 (秒)
+            filter_capacity: Bloom filter 容量 (使用者數)
+            refresh_seconds: Bloom filter 重建間隔 (秒)
+            broker: 跨 worker 同步的 pub/sub broker (預設依 REALTIME_BROKER 設定建立)
+        """
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.filter_capacity = filter_capacity
+        self.refresh_seconds = refresh_seconds
+        self._filter = BloomFilter(filter_capacity, BLOCK_FILTER_ERROR_RATE)
+        self._pending_filter: Optional[BloomFilter] = None
+        self._filter_ready = False
+        self.broker = broker
+        self._started = False
+        self._refresher: Optional[asyncio.Task] = None
+        self._loads = 0
+        self._filtered = 0
+        self._invalidations = 0
+        self._filter_builds = 0
+
+    async def start(self, db: AsyncIOMotorDatabase):
+        """
+        訂閱同步通知、建立 Bloom filter 並啟動定期重建 (應用程式啟動時呼叫)
+
+        filter 建立完成前所有查詢改走 LRU/資料庫，建立失敗時維持此模式直到下一次重建
+        """
+        if self._started:
+            return
+        self.broker = self.broker or create_event_broker()
+        await self.broker.start(self._on_invalidation)
+        await self.broker.subscribe(INVALIDATION_CHANNEL)
+        self._started = True
+        await self._try_load_filter(db)
+        self._refresher = asyncio.create_task(self._refresh_loop(db), name="block-filter-refresh")
+
+    async def stop(self):
+        if not self._started:
+            return
+        self._started = False
+        if self._refresher:
+            self._refresher.cancel()
+            await asyncio.gather(self._refresher, return_exceptions=True)
+            self._refresher = None
+        await self.broker.stop()
+
+    async def _refresh_loop(self, db: AsyncIOMotorDatabase):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            await self._try_load_filter(db)
+
+    async def _try_load_filter(self, db: AsyncIOMotorDatabase):
+        try:
+            await self.load_filter(db)
+        except Exception:
+            logger.exception("Failed to build blocklist Bloom filter")
+
+    async def load_filter(self, db: AsyncIOMotorDatabase):
+        """
+        以 blocklist 全部記錄重建 Bloom filter，完成後替換目前的 filter
+
+        重建期間的封鎖同時寫入新舊 filter，不會遺漏；已刪除的封鎖記錄於重建後移出
+        """
+        pending = BloomFilter(self.filter_capacity, BLOCK_FILTER_ERROR_RATE)
+        self._pending_filter = pending
+        try:
+            blocks = db.blocklist.find({}, projection={"_id": 0, "user_id": 1, "blocked_user_id": 1})
+            async for block in blocks:
+                pending.add(str(block["user_id"]))
+                pending.add(str(block["blocked_user_id"]))
+        finally:
+            if self._pending_filter is pending:
+                self._pending_filter = None
+        self._filter = pending
+        self._filter_ready = True
+        self._filter_builds += 1
+
+    async def blocked_ids(self, db: AsyncIOMotorDatabase, user_id: str) -> FrozenSet[str]:
+        """
+        取得與使用者互有封鎖關係的使用者 ID 集合 (雙向)
+
+        Args:
+            db: 資料庫連線
+            user_id: 使用者 ID
+
+        Returns:
+            FrozenSet[str]: 使用者封鎖的與封鎖使用者的 ID (字串)
+        """
+        user_id = str(user_id)
+        if self._filter_ready and user_id not in self._filter:
+            self._filtered += 1
+            return _EMPTY
+        return await self._blocked_set(db, user_id)
+
+    async def is_blocked(self, db: AsyncIOMotorDatabase, user_id: str, other_user_id: str) -> bool:
+        """
+        X 與 Y 之間是否有封鎖關係 (任一方向)
+
+        用於個人檔案與好友邀請：不經 Bloom filter，漏接通知時過期上限為 LRU TTL
+        """
+        return str(other_user_id) in await self._blocked_set(db, str(user_id))
+
+    async def _blocked_set(self, db: AsyncIOMotorDatabase, user_id: str) -> FrozenSet[str]:
+        blocked_ids = self._cache.get(user_id)
+        if blocked_ids is not None:
+            return blocked_ids
+
+        # 載入期間發生清除時不寫入快取 (避免寫回已過期的集合)
+        generation = self._invalidations
+        blocked_ids = await self._load(db, user_id)
+        if generation == self._invalidations:
+            self._cache.set(user_id, blocked_ids)
+        return blocked_ids
+
+    async def _load(self, db: AsyncIOMotorDatabase, user_id: str) -> FrozenSet[str]:
+        """以單一查詢載入雙向封鎖記錄 (idx_user_blocked_unique 與 idx_blocked_user_id)"""
+        self._loads += 1
+        user_oid = ObjectId(user_id)
+        blocks = await db.blocklist.find(
+            {"$or": [{"user_id": user_oid}, {"blocked_user_id": user_oid}]},
+            projection={"_id": 0, "user_id": 1, "blocked_user_id": 1}
+        ).to_list(length=None)
+
+        blocked_ids = set()
+        for block in blocks:
+            if str(block["user_id"]) == user_id:
+                blocked_ids.add(str(block["blocked_user_id"]))
+            else:
+                blocked_ids.add(str(block["user_id"]))
+        return frozenset(blocked_ids)
+
+    async def record_block(self, user_id: str, blocked_user_id: str):
+        """
+        封鎖後呼叫：雙方加入 Bloom filter 並清除雙方的快取
+
+        同步通知發布失敗只記錄錯誤，其他 worker 的快取於 TTL 後過期
+        """
+        user_ids = [str(user_id), str(blocked_user_id)]
+        self._apply(user_ids)
+        if not self._started:
+            return
+        try:
+            await self.broker.publish_many([(INVALIDATION_CHANNEL, ",".join(user_ids))])
+        except Exception:
+            logger.exception("Block cache invalidation publish failed")
+
+    def _apply(self, user_ids):
+        self._invalidations += 1
+        for user_id in user_ids:
+            self._filter.add(user_id)
+            if self._pending_filter is not None:
+                self._pending_filter.add(user_id)
+            self._cache.delete(user_id)
+
+    def _on_invalidation(self, channel: str, message: str):
+        self._apply(message.split(","))
+
+    def clear(self):
+        self._invalidations += 1
+        self._cache.clear()
+
+    def get_metrics(self) -> Dict:
+        """
+        快取指標
+
+        Returns:
+            Dict: 快取使用者數、命中/未命中次數、Bloom filter 略過次數、大小與重建次數、資料庫載入次數
+        """
+        return {
+            "cached_users": len(self._cache),
+            "hits": self._cache.hits,
+            "misses": self._cache.misses,
+            "filter_ready": self._filter_ready,
+            "filtered": self._filtered,
+            "filter_entries": self._filter.count,
+            "filter_bytes": self._filter.nbytes,
+            "filter_builds": self._filter_builds,
+            "loads": self._loads,
+            "invalidations": self._invalidations,
+        }
+
+
+# 單例實例
+block_cache = BlockCache()
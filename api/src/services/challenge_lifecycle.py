@@ -0,0 +1,98 @@
+"""
+Challenge Lifecycle
+挑戰狀態轉換：upcoming → active → completed
+
+到期的挑戰以 idx_status_start_date 索引分批查詢 (每批 LIFECYCLE_BATCH_SIZE 個)；
+結束的挑戰先計算最終排名與徽章，再標記為 completed
+"""
+
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from bson import ObjectId
+
+from .challenge_ranking import ChallengeRankingJob
+
+LIFECYCLE_BATCH_SIZE = 500
+
+
+class ChallengeLifecycle:
+    """挑戰狀態轉換"""
+
+    def __init__(self, db: AsyncIOMotorDatabase, batch_size: int = LIFECYCLE_BATCH_SIZE, ranking=None):
+        """
+        Args:
+            db: 資料庫連線
+            batch_size: 每批處理的挑戰數量
+            ranking: 排名計算 (預設為 ChallengeRankingJob)
+        """
+        self.db = db
+        self.challenges = db.challenges
+        self.batch_size = batch_size
+        self.ranking = ranking or ChallengeRankingJob(db)
+
+    async def advance(self, now: Optional[datetime] = None) -> Dict:
+        """
+        轉換所有到期挑戰的狀態
+
+        Args:
+            now: 目前時間 (預設為現在)
+
+        Returns:
+            Dict: {activated, completed}
+        """
+        now = now or datetime.now(timezone.utc)
+        return {
+            "activated": await self.activate_started(now),
+            "completed": await self.complete_ended(now),
+        }
+
+    async def activate_started(self, now: datetime) -> int:
+        """已開始的 upcoming 挑戰轉為 active"""
+        activated = 0
+        while True:
+            batch = await self._due_batch({"status": "upcoming", "start_date": {"$lte": now}})
+            if not batch:
+                break
+            result = await self.challenges.update_many(
+                {"_id": {"$in": [challenge["_id"] for challenge in batch]}, "status": "upcoming"},
+                {"$set": {"status": "active"}}
+            )
+            activated += result.modified_count
+            if len(batch) < self.batch_size:
+                break
+        return activated
+
+    async def complete_ended(self, now: datetime) -> int:
+        """已結束的 active 挑戰計算最終排名與徽章後轉為 completed"""
+        completed = 0
+        while True:
+            # start_date 條件讓查詢使用 idx_status_start_date 的範圍掃描 (開始時間必早於結束時間)
+            batch = await self._due_batch({
+                "status": "active",
+                "start_date": {"$lte": now},
+                "end_date": {"$lte": now},
+            })
+            if not batch:
+                break
+
+            ids_by_type: Dict[str, List[ObjectId]] = {}
+            for challenge in batch:
+                ids_by_type.setdefault(challenge["challenge_type"], []).append(challenge["_id"])
+            for challenge_type, challenge_ids in ids_by_type.items():
+                await self.ranking.rank_batch(challenge_type, challenge_ids)
+
+            result = await self.challenges.update_many(
+                {"_id": {"$in": [challenge["_id"] for challenge in batch]}, "status": "active"},
+                {"$set": {"status": "completed", "completed_at": now}}
+            )
+            completed += result.modified_count
+            if len(batch) < self.batch_size:
+                break
+        return completed
+
+    async def _due_batch(self, query: Dict) -> List[Dict]:
+        return await self.challenges.find(
+            query,
+            projection={"challenge_type": 1}
+        ).sort("start_date", 1).limit(self.batch_size).to_list(self.batch_size)
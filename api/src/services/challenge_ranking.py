@@ -0,0 +1,282 @@
+"""
+Challenge Ranking Job
+挑戰排名批次計算：進行中挑戰的所有參與者
+
+同一種挑戰類型的挑戰以單一 aggregation 計算 (每批最多 RANKING_BATCH_SIZE 個挑戰)：
+參與者 $lookup 期間內的運動記錄計算進度，$setWindowFields 依挑戰分區排名，
+排名、徽章與校正後的進度以每個挑戰一次 bulk_write 寫回，排名變動即時推送給參與者
+
+參與記錄的 challenge_id 以字串儲存 (PyObjectId 序列化)，比對與 $lookup 時兩種型別皆接受。
+校正後的進度只寫回計算後未再被 apply_workout_change 更新的參與記錄 (last_updated 條件)，
+避免覆蓋 aggregation 與寫入之間發生的差量更新
+"""
+
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from bson import ObjectId
+
+from ..core.database import as_utc
+from .challenge_service import PROGRESS_PARTICIPANT_STATUSES, _completion_percentage
+from .realtime_hub import EVENT_RANK_CHANGE, realtime_hub
+
+# 每次 aggregation 處理的挑戰數量上限 (每個挑戰最多 20 位參與者)
+RANKING_BATCH_SIZE = 500
+
+# 累加型挑戰的進度來源 (運動次數以 1 累加)
+PROGRESS_SOURCES = {
+    "total_distance": "$distance_km",
+    "total_duration": "$duration_minutes",
+    "specific_workout_type": 1,
+}
+
+RANK_BADGES = ("gold", "silver", "bronze")
+
+_DAY_MILLISECONDS = 24 * 3600 * 1000
+
+
+def _workout_lookup(challenge_type: str) -> Dict:
+    """參與者在挑戰期間內的運動記錄 (累加型加總；連續天數依日期分組)"""
+    conditions = [
+        {"$eq": ["$user_id", "$$user_id"]},
+        {"$gte": ["$start_time", "$$start_date"]},
+        {"$lte": ["$start_time", "$$end_date"]},
+    ]
+    if challenge_type == "specific_workout_type":
+        conditions.append({"$or": [
+            {"$eq": ["$$workout_type", None]},
+            {"$eq": ["$workout_type", "$$workout_type"]},
+        ]})
+
+    if challenge_type == "consecutive_days":
+        group = [
+            {"$group": {
+                "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$start_time"}},
+                "count": {"$sum": 1},
+            }},
+            {"$sort": {"_id": 1}},
+        ]
+    else:
+        group = [{"$group": {"_id": None, "total": {"$sum": PROGRESS_SOURCES[challenge_type]}}}]
+
+    return {"$lookup": {
+        "from": "workouts",
+        "let": {
+            "user_id": "$user_id",
+            "start_date": "$challenge.start_date",
+            "end_date": "$challenge.end_date",
+            "workout_type": {"$ifNull": ["$challenge.workout_type", None]},
+        },
+        "pipeline": [
+            {"$match": {"is_deleted": False, "$expr": {"$and": conditions}}},
+            *group,
+        ],
+        "as": "workout_days" if challenge_type == "consecutive_days" else "workout_totals",
+    }}
+
+
+def _longest_streak_expression() -> Dict:
+    """由依日期排序的運動日 (workout_days) 計算最長連續天數"""
+    return {"$let": {
+        "vars": {"streak": {"$reduce": {
+            "input": "$workout_days",
+            "initialValue": {"previous": None, "current": 0, "longest": 0},
+            "in": {"$let": {
+                "vars": {"day": {"$dateFromString": {"dateString": "$$this._id"}}},
+                "in": {"$let": {
+                    "vars": {"current": {"$cond": [
+                        {"$eq": [{"$subtract": ["$$day", "$$value.previous"]}, _DAY_MILLISECONDS]},
+                        {"$add": ["$$value.current", 1]},
+                        1,
+                    ]}},
+                    "in": {
+                        "previous": "$$day",
+                        "current": "$$current",
+                        "longest": {"$max": ["$$value.longest", "$$current"]},
+                    },
+                }},
+            }},
+        }}},
+        "in": "$$streak.longest",
+    }}
+
+
+def ranking_pipeline(challenge_type: str, challenge_ids: List[ObjectId]) -> List[Dict]:
+    """
+    計算一批同類型挑戰所有參與者進度與排名的 aggregation
+
+    Args:
+        challenge_type: 挑戰類型
+        challenge_ids: 挑戰 ID
+
+    Returns:
+        List[Dict]: aggregation pipeline
+    """
+    if challenge_type == "consecutive_days":
+        progress = {
+            "current_progress": _longest_streak_expression(),
+            "active_days": {"$arrayToObject": {"$map": {
+                "input": "$workout_days",
+                "in": {"k": "$$this._id", "v": "$$this.count"},
+            }}},
+        }
+    else:
+        progress = {"current_progress": {"$ifNull": [{"$arrayElemAt": ["$workout_totals.total", 0]}, 0]}}
+
+    projection = {
+        "challenge_id": "$challenge._id",
+        "user_id": 1,
+        "current_progress": 1,
+        "previous_rank": 1,
+        "rank": 1,
+        "target_value": "$challenge.target_value",
+        "end_date": "$challenge.end_date",
+    }
+    if challenge_type == "consecutive_days":
+        projection["active_days"] = 1
+
+    return [
+        {"$match": {
+            "challenge_id": {"$in": challenge_ids + [str(challenge_id) for challenge_id in challenge_ids]},
+            "status": {"$in": PROGRESS_PARTICIPANT_STATUSES},
+        }},
+        {"$lookup": {
+            "from": "challenges",
+            "let": {"cid": {"$toObjectId": "$challenge_id"}},
+            "pipeline": [{"$match": {"$expr": {"$eq": ["$_id", "$$cid"]}}}],
+            "as": "challenge",
+        }},
+        {"$unwind": "$challenge"},
+        _workout_lookup(challenge_type),
+        {"$set": {**progress, "previous_rank": "$rank"}},
+        {"$setWindowFields": {
+            "partitionBy": "$challenge._id",
+            "sortBy": {"current_progress": -1},
+            "output": {"rank": {"$rank": {}}},
+        }},
+        {"$project": projection},
+    ]
+
+
+def challenge_badge(rank: int, progress: float, target_value: float, final: bool) -> Optional[str]:
+    """
+    挑戰結束後的徽章：前 3 名 gold/silver/bronze，達成目標 challenger，超過 150% super_challenger
+
+    Args:
+        rank: 排名
+        progress: 進度數值
+        target_value: 目標數值
+        final: 挑戰是否已結束 (進行中的挑戰不頒發徽章)
+    """
+    if not final or progress <= 0:
+        return None
+    if rank <= len(RANK_BADGES):
+        return RANK_BADGES[rank - 1]
+    if progress >= target_value * 1.5:
+        return "super_challenger"
+    if progress >= target_value:
+        return "challenger"
+    return None
+
+
+class ChallengeRankingJob:
+    """挑戰排名批次計算"""
+
+    def __init__(self, db: AsyncIOMotorDatabase, batch_size: int = RANKING_BATCH_SIZE, realtime=None):
+        """
+        Args:
+            db: 資料庫連線
+            batch_size: 每次 aggregation 處理的挑戰數量上限
+            realtime: 即時推送中心 (預設為 realtime_hub)
+        """
+        self.db = db
+        self.challenges = db.challenges
+        self.participants = db.participants
+        self.batch_size = batch_size
+        self.realtime = realtime or realtime_hub
+
+    async def run(self) -> Dict:
+        """
+        計算所有進行中挑戰的排名
+
+        Returns:
+            Dict: {challenges, participants, rank_changes}
+        """
+        ids_by_type: Dict[str, List[ObjectId]] = {}
+        async for challenge in self.challenges.find({"status": "active"}, projection={"challenge_type": 1}):
+            ids_by_type.setdefault(challenge["challenge_type"], []).append(challenge["_id"])
+
+        totals = {"challenges": 0, "participants": 0, "rank_changes": 0}
+        for challenge_type, challenge_ids in ids_by_type.items():
+            for start in range(0, len(challenge_ids), self.batch_size):
+                result = await self.rank_batch(challenge_type, challenge_ids[start:start + self.batch_size])
+                for key, value in result.items():
+                    totals[key] += value
+        return totals
+
+    async def rank_batch(self, challenge_type: str, challenge_ids: List[ObjectId]) -> Dict:
+        """
+        以單一 aggregation 計算一批同類型挑戰的排名，每個挑戰一次 bulk_write
+
+        Args:
+            challenge_type: 挑戰類型
+            challenge_ids: 挑戰 ID
+
+        Returns:
+            Dict: {challenges, participants, rank_changes}
+        """
+        if challenge_type != "consecutive_days" and challenge_type not in PROGRESS_SOURCES:
+            return {"challenges": 0, "participants": 0, "rank_changes": 0}
+
+        # 計算時間：之後才被差量更新的參與記錄不以此次計算結果覆蓋進度
+        read_at = datetime.now(timezone.utc)
+        by_challenge: Dict[ObjectId, List[Dict]] = {}
+        async for participant in self.participants.aggregate(ranking_pipeline(challenge_type, challenge_ids)):
+            by_challenge.setdefault(participant["challenge_id"], []).append(participant)
+
+        now = datetime.now(timezone.utc)
+        participant_count = rank_changes = 0
+        for challenge_id, participants in by_challenge.items():
+            operations = []
+            changed = {}
+            for participant in participants:
+                progress = participant["current_progress"]
+                rank = participant["rank"]
+                operations.append(UpdateOne({"_id": participant["_id"]}, {"$set": {
+                    "rank": rank,
+                    "badge": challenge_badge(
+                        rank, progress, participant["target_value"], as_utc(participant["end_date"]) <= now
+                    ),
+                }}))
+
+                progress_update = {
+                    "current_progress": progress,
+                    "completion_percentage": _completion_percentage(progress, participant["target_value"]),
+                    "progress_synced_at": now,
+                    "last_updated": now,
+                }
+                if "active_days" in participant:
+                    progress_update["active_days"] = participant["active_days"]
+                operations.append(UpdateOne(
+                    {"_id": participant["_id"], "$or": [
+                        {"last_updated": {"$lte": read_at}},
+                        {"last_updated": None},
+                    ]},
+                    {"$set": progress_update}
+                ))
+
+                if participant.get("previous_rank") != rank:
+                    changed[str(participant["user_id"])] = {
+                        "challenge_id": str(challenge_id),
+                        "rank": rank,
+                        "previous_rank": participant.get("previous_rank"),
+                        "current_progress": progress,
+                    }
+
+            await self.participants.bulk_write(operations, ordered=False)
+            await self.realtime.publish_each(EVENT_RANK_CHANGE, changed)
+            participant_count += len(participants)
+            rank_changes += len(changed)
+
+        return {"challenges": len(by_challenge), "participants": participant_count, "rank_changes": rank_changes}
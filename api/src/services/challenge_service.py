@@ -2,11 +2,14 @@
 Challenge Service (T242-T244)
 挑戰賽服務：創建管理、參與者管理、排名計算
 """
-from datetime import datetime, timezone
-from typing import List, Optional, Dict
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Dict, Tuple
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument, UpdateOne
 from bson import ObjectId
 
+from ..core.database import as_utc, user_id_query
 from ..models import (
     ChallengeCreate,
     ChallengeInDB,
@@ -16,8 +19,107 @@ from ..models import (
     ParticipantCreate,
     ParticipantInDB,
     ParticipantResponse,
-    LeaderboardEntry,
+    ChallengeLeaderboardEntry,
 )
+from .friend_graph import friend_graph
+
+# 仍會隨運動記錄更新進度的參與狀態
+PROGRESS_PARTICIPANT_STATUSES = ["active", "completed"]
+
+# 詳情與排行榜列出的參與者上限
+MAX_LISTED_PARTICIPANTS = 100
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def encode_challenge_cursor(challenge: Dict) -> str:
+    """分頁游標：最後一筆挑戰的開始時間 (毫秒) 與 ID"""
+    millis = (as_utc(challenge["start_date"]) - _EPOCH) // timedelta(milliseconds=1)
+    return f"{millis}:{challenge['_id']}"
+
+
+def decode_challenge_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """
+    解析分頁游標
+
+    Returns:
+        Tuple[datetime, ObjectId]: (開始時間, 挑戰 ID)
+
+    Raises:
+        ValueError: 無效的分頁游標
+    """
+    try:
+        millis, challenge_id = cursor.split(":")
+        return _EPOCH + timedelta(milliseconds=int(millis)), ObjectId(challenge_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def _user_card_lookup() -> List[Dict]:
+    """參與者的使用者卡片 (顯示名稱、頭像)；找不到使用者的參與者略過"""
+    return [
+        {"$lookup": {
+            "from": "users",
+            "localField": "user_id",
+            "foreignField": "_id",
+            "pipeline": [{"$project": {"display_name": 1, "avatar_url": 1}}],
+            "as": "user",
+        }},
+        {"$unwind": "$user"},
+    ]
+
+
+def _counts_toward(workout: Optional[Dict], challenge: Dict) -> bool:
+    """運動記錄是否計入挑戰進度 (未刪除、在挑戰期間內、符合指定運動類型)"""
+    if not workout or workout.get("is_deleted", False):
+        return False
+
+    start_time = workout.get("start_time")
+    if not isinstance(start_time, datetime):
+        return False
+    if not as_utc(challenge["start_date"]) <= as_utc(start_time) <= as_utc(challenge["end_date"]):
+        return False
+
+    workout_type = challenge.get("workout_type")
+    if challenge["challenge_type"] == "specific_workout_type" and workout_type:
+        return workout.get("workout_type") == workout_type
+    return True
+
+
+def _workout_contribution(workout: Optional[Dict], challenge: Dict) -> float:
+    """單筆運動記錄對累加型挑戰進度的貢獻 (不計入時為 0)"""
+    if not _counts_toward(workout, challenge):
+        return 0
+
+    challenge_type = challenge["challenge_type"]
+    if challenge_type == "total_distance":
+        return workout.get("distance_km") or 0
+    if challenge_type == "total_duration":
+        return workout.get("duration_minutes") or 0
+    if challenge_type == "specific_workout_type":
+        return 1
+    return 0
+
+
+def _day_key(start_time: datetime) -> str:
+    """運動日 (UTC) 的日曆鍵"""
+    return as_utc(start_time).astimezone(timezone.utc).date().isoformat()
+
+
+def _longest_streak(days: Iterable[str]) -> int:
+    """日曆中最長的連續運動天數"""
+    sorted_days = sorted(date.fromisoformat(day) for day in days)
+    longest = current = 0
+    previous = None
+    for day in sorted_days:
+        current = current + 1 if previous and day - previous == timedelta(days=1) else 1
+        longest = max(longest, current)
+        previous = day
+    return longest
+
+
+def _completion_percentage(progress: float, target_value: float) -> float:
+    return min((progress / target_value) * 100, 100)
 
 
 class ChallengeService:
@@ -87,8 +189,10 @@ class ChallengeService:
         result = await self.challenges.insert_one(challenge.dict(by_alias=True, exclude={"id"}))
         challenge_id = str(result.inserted_id)
 
-        # 創建者自動成為參與者
+        # 創建者自動成為參與者 (已開始的挑戰計入期間內既有的運動記錄)
         await self._add_participant(challenge_id, user_id)
+        if status != "upcoming":
+            await self.update_participant_progress(challenge_id, user_id)
 
         # 如果有邀請使用者，發送邀請 (這裡簡化處理，實際應該透過通知系統)
         # for invited_user_id in challenge_data.invited_users:
@@ -114,58 +218,110 @@ class ChallengeService:
         status: str = "active",
         role: str = "all",
         limit: int = 20,
-        offset: int = 0
-    ) -> tuple[List[ChallengeListItem], int]:
+        offset: int = 0,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[ChallengeListItem], Optional[int], Optional[str]]:
         """
         取得挑戰賽清單
 
+        頁面以 (start_date, _id) keyset 條件、排序與 limit 直接查詢 (走 idx_status_start_id /
+        idx_creator_status_start_id)，頁面中的挑戰以 $lookup 帶出使用者自己的參與資料；
+        總數另以一次計數查詢取得，且只在第一頁 (未傳入 cursor) 計算
+
         Args:
             user_id: 使用者 ID
             status: 挑戰狀態篩選 (active, completed, upcoming)
             role: 角色篩選 (creator, participant, all)
             limit: 每頁數量
-            offset: 偏移量
+            offset: 偏移量 (未使用 cursor 時的相容分頁)
+            cursor: 分頁游標
 
         Returns:
-            tuple: (挑戰列表, 總數)
+            tuple: (挑戰列表, 總數 (傳入 cursor 時為 None), 下一頁游標)
+
+        Raises:
+            ValueError: 無效的分頁游標
         """
-        # 構建查詢條件
-        query = {"status": status}
+        user_oid = ObjectId(user_id)
+
+        # keyset 條件：上一頁最後一筆之後
+        keyset = None
+        if cursor:
+            start_date, last_id = decode_challenge_cursor(cursor)
+            keyset = {"$or": [
+                {"start_date": {"$lt": start_date}},
+                {"start_date": start_date, "_id": {"$lt": last_id}},
+            ]}
+
+        # 排序與 limit (多取一筆判斷是否有下一頁)
+        page = [{"$sort": {"start_date": -1, "_id": -1}}]
+        if offset and not cursor:
+            page.append({"$skip": offset})
+        page.append({"$limit": limit + 1})
+
+        if role == "participant":
+            # 由使用者的參與記錄出發 (idx_user_status_participant)，挑戰以 _id $lookup，
+            # 狀態與 keyset 條件在 $lookup 內比對；排序範圍只有使用者自己的參與記錄
+            challenge_match = {"status": status}
+            if keyset:
+                challenge_match.update(keyset)
+            collection = self.participants
+            head = [
+                {"$match": {"user_id": user_oid}},
+                {"$lookup": {
+                    "from": "challenges",
+                    "localField": "challenge_id",
+                    "foreignField": "_id",
+                    "pipeline": [{"$match": challenge_match}],
+                    "as": "challenge",
+                }},
+                {"$unwind": "$challenge"},
+            ]
+            pipeline = head + [
+                {"$replaceWith": {"$mergeObjects": ["$challenge", {"my_participation": {
+                    "completion_percentage": "$completion_percentage",
+                    "rank": "$rank",
+                }}]}},
+            ] + page
+            count_pipeline = head + [{"$count": "count"}]
+        else:
+            query = {"status": status}
+            if role == "creator":
+                query["creator_id"] = user_oid
+            collection = self.challenges
+            pipeline = [{"$match": {**query, **keyset} if keyset else query}] + page + [
+                {"$lookup": {
+                    "from": "participants",
+                    "localField": "_id",
+                    "foreignField": "challenge_id",
+                    "pipeline": [
+                        {"$match": {"user_id": user_oid}},
+                        {"$project": {"completion_percentage": 1, "rank": 1}},
+                    ],
+                    "as": "my_participation",
+                }},
+                {"$set": {"my_participation": {"$arrayElemAt": ["$my_participation", 0]}}},
+            ]
 
-        if role == "creator":
-            query["creator_id"] = ObjectId(user_id)
-        elif role == "participant":
-            # 查詢參與的挑戰
-            participant_challenges = await self.participants.find({
-                "user_id": ObjectId(user_id)
-            }).to_list(length=1000)
+        challenges = await collection.aggregate(pipeline).to_list(length=limit + 1)
 
-            challenge_ids = [p["challenge_id"] for p in participant_challenges]
-            query["_id"] = {"$in": challenge_ids}
+        # 總數：只在第一頁計算，後續頁面沿用第一頁的總數
+        total_count = None
+        if not cursor and role == "participant":
+            result = await self.participants.aggregate(count_pipeline).to_list(length=1)
+            total_count = result[0]["count"] if result else 0
+        elif not cursor:
+            total_count = await self.challenges.count_documents(query)
 
-        # 計算總數
-        total_count = await self.challenges.count_documents(query)
-
-        # 查詢挑戰
-        challenges_cursor = self.challenges.find(query).sort("start_date", -1).skip(offset).limit(limit)
-        challenges = await challenges_cursor.to_list(length=limit)
+        next_cursor = None
+        if len(challenges) > limit:
+            challenges = challenges[:limit]
+            next_cursor = encode_challenge_cursor(challenges[-1])
 
         # 組裝回應
         challenge_items = []
         for challenge in challenges:
-            # 查詢使用者的參與資料
-            participant = await self.participants.find_one({
-                "challenge_id": challenge["_id"],
-                "user_id": ObjectId(user_id)
-            })
-
-            my_progress = 0
-            my_rank = None
-
-            if participant:
-                my_progress = participant.get("completion_percentage", 0)
-                my_rank = participant.get("rank")
-
+            participation = challenge.get("my_participation") or {}
             challenge_items.append(ChallengeListItem(
                 challenge_id=str(challenge["_id"]),
                 challenge_type=challenge["challenge_type"],
@@ -174,11 +330,11 @@ class ChallengeService:
                 end_date=challenge["end_date"],
                 status=challenge["status"],
                 participant_count=challenge["participant_count"],
-                my_progress=my_progress,
-                my_rank=my_rank
+                my_progress=participation.get("completion_percentage") or 0,
+                my_rank=participation.get("rank")
             ))
 
-        return challenge_items, total_count
+        return challenge_items, total_count, next_cursor
 
     async def get_challenge_detail(
         self,
@@ -195,32 +351,42 @@ class ChallengeService:
         Returns:
             ChallengeDetail: 挑戰詳情
         """
-        # 查詢挑戰
-        challenge = await self.challenges.find_one({"_id": ObjectId(challenge_id)})
-        if not challenge:
+        # 挑戰、創建者與參與者 (含使用者卡片) 以單一 aggregation 取得
+        result = await self.challenges.aggregate([
+            {"$match": {"_id": ObjectId(challenge_id)}},
+            {"$lookup": {
+                "from": "users",
+                "localField": "creator_id",
+                "foreignField": "_id",
+                "pipeline": [{"$project": {"display_name": 1, "avatar_url": 1}}],
+                "as": "creator",
+            }},
+            {"$lookup": {
+                "from": "participants",
+                "localField": "_id",
+                "foreignField": "challenge_id",
+                "pipeline": [{"$limit": MAX_LISTED_PARTICIPANTS}, *_user_card_lookup()],
+                "as": "participants",
+            }},
+        ]).to_list(length=1)
+        if not result:
             raise ValueError("Challenge not found")
+        challenge = result[0]
+        creator = challenge["creator"][0] if challenge["creator"] else None
 
-        # 查詢創建者資料
-        creator = await self.users.find_one({"_id": challenge["creator_id"]})
-
-        # 查詢參與者資料
-        participants_cursor = self.participants.find({"challenge_id": ObjectId(challenge_id)})
-        participants = await participants_cursor.to_list(length=100)
-
-        participant_list = []
-        for p in participants:
-            user = await self.users.find_one({"_id": p["user_id"]})
-            if user:
-                participant_list.append({
-                    "user_id": str(p["user_id"]),
-                    "display_name": user.get("display_name", ""),
-                    "avatar_url": user.get("avatar_url"),
-                    "joined_at": p["joined_at"],
-                    "current_progress": p["current_progress"],
-                    "completion_percentage": p["completion_percentage"],
-                    "rank": p.get("rank"),
-                    "status": p["status"]
-                })
+        participant_list = [
+            {
+                "user_id": str(p["user_id"]),
+                "display_name": p["user"].get("display_name", ""),
+                "avatar_url": p["user"].get("avatar_url"),
+                "joined_at": p["joined_at"],
+                "current_progress": p["current_progress"],
+                "completion_percentage": p["completion_percentage"],
+                "rank": p.get("rank"),
+                "status": p["status"]
+            }
+            for p in challenge["participants"]
+        ]
 
         return ChallengeDetail(
             challenge_id=str(challenge["_id"]),
@@ -386,8 +552,8 @@ class ChallengeService:
         T244: 排名計算邏輯
 
         取得挑戰賽即時排名
-        - 每日批次更新（凌晨 2:00）
-        - 依挑戰目標排序參與者
+        - 參與者進度於運動記錄異動時即時更新，排名由排名批次計算 (ChallengeRankingJob) 更新
+        - 挑戰與參與者 (含使用者卡片) 以單一 aggregation 取得
 
         Args:
             challenge_id: 挑戰 ID
@@ -395,33 +561,40 @@ class ChallengeService:
         Returns:
             Dict: 排行榜資料
         """
-        # 查詢挑戰
-        challenge = await self.challenges.find_one({"_id": ObjectId(challenge_id)})
-        if not challenge:
+        # 挑戰與依排名排序的參與者 (含使用者卡片) 以單一 aggregation 取得
+        result = await self.challenges.aggregate([
+            {"$match": {"_id": ObjectId(challenge_id)}},
+            {"$project": {"challenge_type": 1, "target_value": 1}},
+            {"$lookup": {
+                "from": "participants",
+                "localField": "_id",
+                "foreignField": "challenge_id",
+                "pipeline": [
+                    {"$match": {"status": {"$in": PROGRESS_PARTICIPANT_STATUSES}}},
+                    {"$sort": {"rank": 1}},
+                    {"$limit": MAX_LISTED_PARTICIPANTS},
+                    *_user_card_lookup(),
+                ],
+                "as": "participants",
+            }},
+        ]).to_list(length=1)
+        if not result:
             raise ValueError("Challenge not found")
-
-        # 查詢參與者（依排名排序）
-        participants_cursor = self.participants.find({
-            "challenge_id": ObjectId(challenge_id),
-            "status": {"$in": ["active", "completed"]}
-        }).sort("rank", 1)
-
-        participants = await participants_cursor.to_list(length=100)
+        challenge = result[0]
 
         # 組裝排行榜
-        leaderboard_entries = []
-        for p in participants:
-            user = await self.users.find_one({"_id": p["user_id"]})
-            if user:
-                leaderboard_entries.append(LeaderboardEntry(
-                    rank=p.get("rank", 0),
-                    user_id=str(p["user_id"]),
-                    display_name=user.get("display_name", ""),
-                    avatar_url=user.get("avatar_url"),
-                    current_progress=p["current_progress"],
-                    completion_percentage=p["completion_percentage"],
-                    badge=p.get("badge")
-                ))
+        leaderboard_entries = [
+            ChallengeLeaderboardEntry(
+                rank=p.get("rank") or 0,
+                user_id=str(p["user_id"]),
+                display_name=p["user"].get("display_name", ""),
+                avatar_url=p["user"].get("avatar_url"),
+                current_progress=p["current_progress"],
+                completion_percentage=p["completion_percentage"],
+                badge=p.get("badge")
+            )
+            for p in challenge["participants"]
+        ]
 
         return {
             "challenge_id": challenge_id,
@@ -434,72 +607,193 @@ class ChallengeService:
     async def update_participant_progress(
         self,
         challenge_id: str,
-        user_id: str
+        user_id: str,
+        challenge: Optional[Dict] = None
     ):
         """
         T244: 排名計算邏輯
 
-        更新參與者進度（通常由定時任務觸發）
+        完整重新計算參與者進度 (尚未同步的參與者首次計算或校正用)，
+        之後的運動記錄異動由 apply_workout_change 以差量更新
 
         Args:
             challenge_id: 挑戰 ID
             user_id: 使用者 ID
+            challenge: 已查詢的挑戰文件 (未提供時查詢)
         """
         # 查詢挑戰
-        challenge = await self.challenges.find_one({"_id": ObjectId(challenge_id)})
+        if challenge is None:
+            challenge = await self.challenges.find_one({"_id": ObjectId(challenge_id)})
         if not challenge:
             return
 
-        # 計算進度
-        progress = await self._calculate_progress(
-            user_id,
-            challenge["challenge_type"],
-            challenge["start_date"],
-            challenge["end_date"],
-            challenge.get("workout_type")
-        )
+        update = {}
+        if challenge["challenge_type"] == "consecutive_days":
+            calendar = await self._workout_calendar(user_id, challenge["start_date"], challenge["end_date"])
+            progress = _longest_streak(calendar)
+            update["active_days"] = calendar
+        else:
+            progress = await self._calculate_progress(
+                user_id,
+                challenge["challenge_type"],
+                challenge["start_date"],
+                challenge["end_date"],
+                challenge.get("workout_type")
+            )
 
-        # 計算完成百分比
-        completion_percentage = min((progress / challenge["target_value"]) * 100, 100)
+        now = datetime.now(timezone.utc)
+        update.update({
+            "current_progress": progress,
+            "completion_percentage": _completion_percentage(progress, challenge["target_value"]),
+            "progress_synced_at": now,
+            "last_updated": now
+        })
 
         # 更新參與者資料
         await self.participants.update_one(
             {
-                "challenge_id": ObjectId(challenge_id),
-                "user_id": ObjectId(user_id)
+                "challenge_id": {"$in": [str(challenge_id), ObjectId(str(challenge_id))]},
+                "user_id": user_id_query(user_id)
             },
+            {"$set": update}
+        )
+
+    async def apply_workout_change(self, before: Optional[Dict], after: Optional[Dict]) -> int:
+        """
+        將單筆運動記錄異動套用至使用者參與中的挑戰進度
+
+        以 (user_id, status) 索引查詢使用者的參與記錄，只處理期間涵蓋該運動記錄的挑戰：
+        累加型挑戰以差量更新 current_progress / completion_percentage (同一次 bulk_write)，
+        連續天數挑戰更新參與者的運動日曆後重新計算最長連續天數
+
+        - 建立: before=None
+        - 刪除: after=None (或 after.is_deleted=True)
+        - 更新/復原: 兩者皆有
+
+        Args:
+            before: 異動前的運動記錄文件
+            after: 異動後的運動記錄文件
+
+        Returns:
+            int: 更新的參與記錄數量
+        """
+        times = [
+            as_utc(workout["start_time"])
+            for workout in (before, after)
+            if workout and not workout.get("is_deleted", False)
+            and isinstance(workout.get("start_time"), datetime)
+        ]
+        if not times:
+            return 0
+
+        user_id = str((after or before)["user_id"])
+        # 參與記錄的 user_id / challenge_id 以字串儲存 (PyObjectId 序列化)
+        participations = await self.participants.find(
+            {"user_id": user_id_query(user_id), "status": {"$in": PROGRESS_PARTICIPANT_STATUSES}},
+            projection={"challenge_id": 1, "progress_synced_at": 1}
+        ).to_list(length=None)
+        if not participations:
+            return 0
+
+        participation_by_challenge = {str(p["challenge_id"]): p for p in participations}
+        challenges = await self.challenges.find({
+            "_id": {"$in": [ObjectId(challenge_id) for challenge_id in participation_by_challenge]},
+            "status": {"$ne": "completed"},
+            "start_date": {"$lte": max(times)},
+            "end_date": {"$gte": min(times)}
+        }).to_list(length=None)
+
+        now = datetime.now(timezone.utc)
+        updated = 0
+        operations = []
+        for challenge in challenges:
+            participation = participation_by_challenge[str(challenge["_id"])]
+            if participation.get("progress_synced_at") is None:
+                # 尚未同步 (此功能上線前加入的參與者)：完整計算一次
+                await self.update_participant_progress(str(challenge["_id"]), user_id, challenge=challenge)
+                updated += 1
+            elif challenge["challenge_type"] == "consecutive_days":
+                if await self._apply_calendar_change(participation["_id"], challenge, before, after, now):
+                    updated += 1
+            else:
+                delta = _workout_contribution(after, challenge) - _workout_contribution(before, challenge)
+                if delta:
+                    operations.append(UpdateOne(
+                        {"_id": participation["_id"]},
+                        [
+                            {"$set": {
+                                "current_progress": {"$max": [0, {"$add": ["$current_progress", delta]}]},
+                                "last_updated": now
+                            }},
+                            {"$set": {"completion_percentage": {"$min": [
+                                100,
+                                {"$multiply": [{"$divide": ["$current_progress", challenge["target_value"]]}, 100]}
+                            ]}}}
+                        ]
+                    ))
+
+        if operations:
+            await self.participants.bulk_write(operations, ordered=False)
+        return updated + len(operations)
+
+    async def _apply_calendar_change(
+        self,
+        participant_id: ObjectId,
+        challenge: Dict,
+        before: Optional[Dict],
+        after: Optional[Dict],
+        now: datetime
+    ) -> bool:
+        """更新連續天數挑戰的運動日曆 (每日運動次數) 並重新計算最長連續天數"""
+        increments = defaultdict(int)
+        for sign, workout in ((-1, before), (1, after)):
+            if _counts_toward(workout, challenge):
+                increments[_day_key(workout["start_time"])] += sign
+        increments = {day: count for day, count in increments.items() if count}
+        if not increments:
+            return False
+
+        participant = await self.participants.find_one_and_update(
+            {"_id": participant_id},
             {
-                "$set": {
-                    "current_progress": progress,
-                    "completion_percentage": completion_percentage,
-                    "last_updated": datetime.now(timezone.utc)
-                }
-            }
+                "$inc": {f"active_days.{day}": count for day, count in increments.items()},
+                "$set": {"last_updated": now}
+            },
+            projection={"active_days": 1},
+            return_document=ReturnDocument.AFTER
         )
+        if not participant:
+            return False
+
+        streak = _longest_streak(day for day, count in participant.get("active_days", {}).items() if count > 0)
+        await self.participants.update_one(
+            {"_id": participant_id},
+            {"$set": {
+                "current_progress": streak,
+                "completion_percentage": _completion_percentage(streak, challenge["target_value"]),
+                "last_updated": now
+            }}
+        )
+        return True
 
     # Helper methods
 
     async def _add_participant(self, challenge_id: str, user_id: str):
         """新增參與者"""
+        now = datetime.now(timezone.utc)
         participant = ParticipantInDB(
             challenge_id=ObjectId(challenge_id),
             user_id=ObjectId(user_id),
-            joined_at=datetime.now(timezone.utc),
-            status="active"
+            joined_at=now,
+            status="active",
+            progress_synced_at=now
         )
 
         await self.participants.insert_one(participant.dict(by_alias=True, exclude={"id"}))
 
     async def _is_friend(self, user_id1: str, user_id2: str) -> bool:
-        """檢查是否為好友"""
-        count = await self.friendships.count_documents({
-            "$or": [
-                {"user_id": ObjectId(user_id1), "friend_id": ObjectId(user_id2)},
-                {"user_id": ObjectId(user_id2), "friend_id": ObjectId(user_id1)}
-            ],
-            "status": "accepted"
-        })
-        return count > 0
+        """檢查是否為好友 (好友關係快取)"""
+        return await friend_graph.are_friends(self.db, user_id1, user_id2)
 
     async def _calculate_progress(
         self,
@@ -524,7 +818,7 @@ class ChallengeService:
         """
         # 構建查詢條件
         query = {
-            "user_id": ObjectId(user_id),
+            "user_id": user_id_query(user_id),
             "start_time": {
                 "$gte": start_date,
                 "$lte": end_date
@@ -555,29 +849,28 @@ class ChallengeService:
             return result[0]["total"] if result else 0
 
         elif challenge_type == "consecutive_days":
-            # 連續天數 (需要特殊計算)
-            workouts = await self.workouts.find(query).sort("start_time", 1).to_list(length=1000)
+            # 連續天數 (最長連續運動天數)
+            calendar = await self._workout_calendar(user_id, start_date, end_date)
+            return _longest_streak(calendar)
 
-            if not workouts:
-                return 0
-
-            # 計算最長連續天數
-            dates = set()
-            for workout in workouts:
-                dates.add(workout["start_time"].date())
-
-            sorted_dates = sorted(dates)
-            max_streak = 1
-            current_streak = 1
-
-            for i in range(1, len(sorted_dates)):
-                diff = (sorted_dates[i] - sorted_dates[i-1]).days
-                if diff == 1:
-                    current_streak += 1
-                    max_streak = max(max_streak, current_streak)
-                else:
-                    current_streak = 1
-
-            return max_streak
+        elif challenge_type == "specific_workout_type":
+            # 特定運動類型 (運動次數)
+            return await self.workouts.count_documents(query)
 
         return 0
+
+    async def _workout_calendar(self, user_id: str, start_date: datetime, end_date: datetime) -> Dict[str, int]:
+        """挑戰期間內每個運動日 (UTC) 的運動次數"""
+        pipeline = [
+            {"$match": {
+                "user_id": user_id_query(user_id),
+                "start_time": {"$gte": start_date, "$lte": end_date},
+                "is_deleted": False
+            }},
+            {"$group": {
+                "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$start_time"}},
+                "count": {"$sum": 1}
+            }}
+        ]
+        days = await self.workouts.aggregate(pipeline).to_list(length=None)
+        return {day["_id"]: day["count"] for day in days}
@@ -0,0 +1,156 @@
+"""
+Friend Graph
+好友關係快取：每位使用者的好友 ID 集合 (鄰接集合) 存於有上限的 LRU，
+「X 的好友」「X 與 Y 是否為好友」「好友數量」在快取命中時不需查詢資料庫
+
+好友關係異動 (接受邀請、移除好友、封鎖) 時清除雙方的快取，並經由 broker
+通知其他 worker 清除 (REALTIME_BROKER=redis 時跨 worker 生效)；TTL 為漏接通知時
+的過期上限
+"""
+
+import logging
+from typing import Dict, FrozenSet, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from bson import ObjectId
+
+from ..core.performance import LRUCache
+from ..core.pubsub import EventBroker, create_event_broker
+
+logger = logging.getLogger(__name__)
+
+FRIEND_GRAPH_CACHE_SIZE = 50000
+FRIEND_GRAPH_TTL_SECONDS = 600
+
+INVALIDATION_CHANNEL = "motionstory:friend-graph:invalidate"
+
+
+class FriendGraph:
+    """好友關係快取 (每個 worker 一個)"""
+
+    def __init__(
+        self,
+        maxsize: int = FRIEND_GRAPH_CACHE_SIZE,
+        ttl: float = FRIEND_GRAPH_TTL_SECONDS,
+        broker: Optional[EventBroker] = None
+    ):
+        """
+        Args:
+            maxsize: 快取的使用者數量上限
+            ttl: 快取有效時間 (秒)
+            broker: 跨 worker 清除通知的 pub/sub broker (預設依 REALTIME_BROKER 設定建立)
+        """
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.broker = broker
+        self._started = False
+        self._loads = 0
+        self._invalidations = 0
+
+    async def start(self):
+        """訂閱清除通知 (應用程式啟動時呼叫)"""
+        if self._started:
+            return
+        self.broker = self.broker or create_event_broker()
+        await self.broker.start(self._on_invalidation)
+        await self.broker.subscribe(INVALIDATION_CHANNEL)
+        self._started = True
+
+    async def stop(self):
+        if not self._started:
+            return
+        self._started = False
+        await self.broker.stop()
+
+    async def friend_ids(self, db: AsyncIOMotorDatabase, user_id: str) -> FrozenSet[str]:
+        """
+        取得好友 ID 集合
+
+        Args:
+            db: 資料庫連線
+            user_id: 使用者 ID
+
+        Returns:
+            FrozenSet[str]: 好友 ID (字串)
+        """
+        user_id = str(user_id)
+        friend_ids = self._cache.get(user_id)
+        if friend_ids is not None:
+            return friend_ids
+
+        # 載入期間發生清除時不寫入快取 (避免寫回已過期的集合)
+        generation = self._invalidations
+        friend_ids = await self._load(db, user_id)
+        if generation == self._invalidations:
+            self._cache.set(user_id, friend_ids)
+        return friend_ids
+
+    async def are_friends(self, db: AsyncIOMotorDatabase, user_id: str, other_user_id: str) -> bool:
+        """X 與 Y 是否為好友"""
+        return str(other_user_id) in await self.friend_ids(db, user_id)
+
+    async def friend_count(self, db: AsyncIOMotorDatabase, user_id: str) -> int:
+        """好友數量"""
+        return len(await self.friend_ids(db, user_id))
+
+    async def _load(self, db: AsyncIOMotorDatabase, user_id: str) -> FrozenSet[str]:
+        """以單一查詢載入使用者的好友 ID"""
+        self._loads += 1
+        user_oid = ObjectId(user_id)
+        friendships = await db.friendships.find(
+            {"$or": [{"user_id": user_oid}, {"friend_id": user_oid}], "status": "accepted"},
+            projection={"user_id": 1, "friend_id": 1}
+        ).to_list(length=None)
+
+        friend_ids = set()
+        for friendship in friendships:
+            if str(friendship["user_id"]) == user_id:
+                friend_ids.add(str(friendship["friend_id"]))
+            else:
+                friend_ids.add(str(friendship["user_id"]))
+        return frozenset(friend_ids)
+
+    async def invalidate(self, *user_ids: str):
+        """
+        清除使用者的快取 (好友關係異動時呼叫，傳入雙方 ID)
+
+        清除通知發布失敗只記錄錯誤，其他 worker 的快取於 TTL 後過期
+        """
+        user_ids = [str(user_id) for user_id in user_ids]
+        self._evict(user_ids)
+        if not self._started:
+            return
+        try:
+            await self.broker.publish_many([(INVALIDATION_CHANNEL, ",".join(user_ids))])
+        except Exception:
+            logger.exception("Friend graph invalidation publish failed")
+
+    def _evict(self, user_ids):
+        self._invalidations += 1
+        for user_id in user_ids:
+            self._cache.delete(user_id)
+
+    def _on_invalidation(self, channel: str, message: str):
+        self._evict(message.split(","))
+
+    def clear(self):
+        self._invalidations += 1
+        self._cache.clear()
+
+    def get_metrics(self) -> Dict:
+        """
+        快取指標
+
+        Returns:
+            Dict: 快取使用者數、命中/未命中次數、資料庫載入次數與清除次數
+        """
+        return {
+            "cached_users": len(self._cache),
+            "hits": self._cache.hits,
+            "misses": self._cache.misses,
+            "loads": self._loads,
+            "invalidations": self._invalidations,
+        }
+
+
+# 單例實例
+friend_graph = FriendGraph()
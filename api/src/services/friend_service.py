@@ -3,7 +3,7 @@ Friend Service (T236-T238)
 好友系統服務：搜尋、邀請、管理與封鎖
 """
 from datetime import datetime, timedelta, timezone
-from typing import List, Optional, Dict
+from typing import FrozenSet, List, Optional, Dict
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
 
@@ -17,17 +17,31 @@ from ..models import (
     BlockListCreate,
     BlockListInDB,
 )
+from ..utils.user_search import email_prefix_filter, name_filter
+from .block_cache import block_cache
+from .friend_graph import friend_graph
+
+# 好友搜尋回傳筆數上限
+SEARCH_LIMIT = 20
 
 
 class FriendService:
     """好友服務"""
 
-    def __init__(self, db: AsyncIOMotorDatabase):
+    def __init__(self, db: AsyncIOMotorDatabase, graph=None, blocks=None):
+        """
+        Args:
+            db: 資料庫連線
+            graph: 好友關係快取 (預設為 friend_graph)
+            blocks: 封鎖名單快取 (預設為 block_cache)
+        """
         self.db = db
         self.friendships = db.friendships
         self.users = db.users
         self.blocklist = db.blocklist
         self.workouts = db.workouts
+        self.graph = graph or friend_graph
+        self.blocks = blocks or block_cache
 
     async def search_friends(
         self,
@@ -38,12 +52,14 @@ class FriendService:
         """
         T236: 好友搜尋邏輯
 
-        透過使用者 ID、Email 或 QR Code 搜尋好友
-        排除已封鎖使用者與已是好友的使用者
+        透過使用者 ID、Email 前綴、顯示名稱或 QR Code 搜尋好友
+        排除與自己有封鎖關係 (任一方向) 的使用者
+        Email 與顯示名稱只使用索引範圍查詢 (idx_email_normalized、idx_name_grams)，
+        最多回傳 SEARCH_LIMIT 筆
 
         Args:
             user_id: 當前使用者 ID
-            query_type: 搜尋類型 (user_id, email, qrcode)
+            query_type: 搜尋類型 (user_id, email, name, qrcode)
             query: 搜尋關鍵字
 
         Returns:
@@ -52,7 +68,13 @@ class FriendService:
         # 構建查詢條件
         search_filter = {}
         if query_type == "email":
-            search_filter = {"email": {"$regex": query, "$options": "i"}}
+            search_filter = email_prefix_filter(query)
+            if search_filter is None:
+                return []
+        elif query_type == "name":
+            search_filter = name_filter(query)
+            if search_filter is None:
+                return []
         elif query_type == "user_id":
             if ObjectId.is_valid(query):
                 search_filter = {"_id": ObjectId(query)}
@@ -73,15 +95,17 @@ class FriendService:
         search_filter["_id"] = {"$ne": ObjectId(user_id)}
 
         # 查詢使用者
-        users_cursor = self.users.find(search_filter).limit(20)
-        users = await users_cursor.to_list(length=20)
+        users_cursor = self.users.find(
+            search_filter,
+            projection={"display_name": 1, "avatar_url": 1}
+        ).limit(SEARCH_LIMIT)
+        users = await users_cursor.to_list(length=SEARCH_LIMIT)
 
         if not users:
             return []
 
-        # 取得封鎖名單
-        blocked_users = await self.get_blocked_users(user_id)
-        blocked_ids = {str(bu) for bu in blocked_users}
+        # 取得封鎖名單 (雙向，封鎖名單快取)
+        blocked_ids = await self.blocks.blocked_ids(self.db, user_id)
 
         # 取得已有好友關係的使用者
         friend_ids = await self.get_friend_ids(user_id)
@@ -142,10 +166,7 @@ class FriendService:
             raise ValueError("Cannot send friend request to blocked user")
 
         # 檢查好友數量上限 (200)
-        friend_count = await self.friendships.count_documents({
-            "user_id": ObjectId(user_id),
-            "status": "accepted"
-        })
+        friend_count = await self.graph.friend_count(self.db, user_id)
         if friend_count >= 200:
             raise ValueError("Friend limit reached (200 friends maximum)")
 
@@ -246,6 +267,7 @@ class FriendService:
                 }
             }
         )
+        await self.graph.invalidate(friendship["user_id"], friendship["friend_id"])
 
         return FriendshipResponse(
             friendship_id=friendship_id,
@@ -316,6 +338,7 @@ class FriendService:
 
         # 刪除好友關係
         await self.friendships.delete_one({"_id": ObjectId(friendship_id)})
+        await self.graph.invalidate(friendship["user_id"], friendship["friend_id"])
 
     async def block_user(
         self,
@@ -360,6 +383,8 @@ class FriendService:
                 {"user_id": ObjectId(blocked_user_id), "friend_id": ObjectId(user_id)}
             ]
         })
+        await self.graph.invalidate(user_id, blocked_user_id)
+        await self.blocks.record_block(user_id, blocked_user_id)
 
     async def get_friends(
         self,
@@ -482,33 +507,10 @@ class FriendService:
         return [block["blocked_user_id"] for block in blocks]
 
     async def is_blocked(self, user_id: str, target_user_id: str) -> bool:
-        """檢查是否已封鎖"""
-        count = await self.blocklist.count_documents({
-            "$or": [
-                {"user_id": ObjectId(user_id), "blocked_user_id": ObjectId(target_user_id)},
-                {"user_id": ObjectId(target_user_id), "blocked_user_id": ObjectId(user_id)}
-            ]
-        })
-        return count > 0
-
-    async def get_friend_ids(self, user_id: str) -> set:
-        """取得好友 ID 列表"""
-        friendships_cursor = self.friendships.find({
-            "$or": [
-                {"user_id": ObjectId(user_id)},
-                {"friend_id": ObjectId(user_id)}
-            ],
-            "status": "accepted"
-        })
-
-        friendships = await friendships_cursor.to_list(length=1000)
-        friend_ids = set()
-
-        for friendship in friendships:
-            if str(friendship["user_id"]) == user_id:
-                friend_ids.add(str(friendship["friend_id"]))
-            else:
-                friend_ids.add(str(friendship["user_id"]))
+        """檢查是否有封鎖關係 (任一方向，封鎖名單快取)"""
+        return await self.blocks.is_blocked(self.db, user_id, target_user_id)
 
-        return friend_ids
+    async def get_friend_ids(self, user_id: str) -> FrozenSet[str]:
+        """取得好友 ID 集合 (好友關係快取)"""
+        return await self.graph.friend_ids(self.db, user_id)
 # Reload trigger Wed, Dec 10, 2025  2:45:54 PM
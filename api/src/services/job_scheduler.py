@@ -0,0 +1,284 @@
+"""
+Job Scheduler
+排程工作：以 cron 表示式觸發的背景工作 (挑戰狀態轉換、挑戰排名、排行榜快照、
+垃圾桶清除、年度回顧預生成)
+
+每個 worker 都執行排程器；每次觸發以 job_leases 集合的租約 (每個工作一筆) 選出
+單一執行者：同一觸發時間只有一個 worker 能取得租約，執行期間定期延長租約，
+執行者中斷時租約到期，由下一次觸發重新選出
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+from apscheduler.triggers.cron import CronTrigger
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import DuplicateKeyError
+from bson import ObjectId
+
+from .annual_review_optimizer import schedule_annual_review_pregeneration
+from .challenge_lifecycle import ChallengeLifecycle
+from .challenge_ranking import ChallengeRankingJob
+from .leaderboard_service import LeaderboardService
+from .workout_service import WorkoutService
+
+logger = logging.getLogger(__name__)
+
+# 工作函式：job(db) -> 執行結果 (記錄於租約文件)
+JobFunction = Callable[[AsyncIOMotorDatabase], Awaitable[Any]]
+
+# 定期更新的排行榜快取 (週期, 指標)
+LEADERBOARD_SNAPSHOTS = [("weekly", "distance"), ("monthly", "distance")]
+
+
+class ScheduledJob:
+    """已註冊的排程工作與執行統計"""
+
+    def __init__(self, name: str, cron: str, func: JobFunction, lease_seconds: int):
+        self.name = name
+        self.cron = cron
+        self.trigger = CronTrigger.from_crontab(cron, timezone=timezone.utc)
+        self.func = func
+        self.lease_seconds = lease_seconds
+        self.next_run_at: Optional[datetime] = None
+        self.running = False
+
+        self.runs = 0
+        self.skipped = 0
+        self.failures = 0
+        self.last_status: Optional[str] = None
+        self.last_duration: Optional[float] = None
+
+    def schedule_next(self, after: datetime):
+        """下一次觸發時間 (晚於 after；錯過的多次觸發合併為一次)"""
+        self.next_run_at = self.trigger.get_next_fire_time(None, after + timedelta(microseconds=1))
+
+
+class JobScheduler:
+    """排程器 (每個 worker 一個，經由租約確保每次觸發只執行一次)"""
+
+    def __init__(self, lease_seconds: int = 120, max_sleep: float = 60.0, owner_id: Optional[str] = None):
+        """
+        Args:
+            lease_seconds: 預設租約時間 (秒)，執行期間每 1/3 租約時間延長一次
+            max_sleep: 最長睡眠時間 (秒)
+            owner_id: 租約持有者 ID (預設為 主機名稱:pid:隨機 ID)
+        """
+        self.lease_seconds = lease_seconds
+        self.max_sleep = max_sleep
+        self.owner_id = owner_id or f"{socket.gethostname()}:{os.getpid()}:{ObjectId()}"
+        self.jobs: Dict[str, ScheduledJob] = {}
+
+        self.db: Optional[AsyncIOMotorDatabase] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+
+    def add_job(self, name: str, cron: str, func: JobFunction, lease_seconds: Optional[int] = None):
+        """
+        註冊排程工作
+
+        Args:
+            name: 工作名稱 (租約文件 ID)
+            cron: cron 表示式 (UTC，分 時 日 月 星期)
+            func: 工作函式
+            lease_seconds: 租約時間 (預設為排程器設定)
+
+        Raises:
+            ValueError: 名稱重複或無效的 cron 表示式
+        """
+        if name in self.jobs:
+            raise ValueError(f"Job already registered: {name}")
+        self.jobs[name] = ScheduledJob(name, cron, func, lease_seconds or self.lease_seconds)
+
+    def start(self, db: AsyncIOMotorDatabase):
+        """啟動 worker (應用程式啟動時呼叫)"""
+        if self._worker:
+            return
+        self.db = db
+        now = datetime.now(timezone.utc)
+        for job in self.jobs.values():
+            job.schedule_next(now)
+        self._worker = asyncio.create_task(self._worker_loop(), name="job-scheduler")
+
+    async def stop(self):
+        """停止 worker 並取消執行中的工作 (租約到期後由其他 worker 接手下一次觸發)"""
+        tasks = [task for task in (self._worker, *self._running) if task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._worker = None
+        self._running.clear()
+
+    async def _worker_loop(self):
+        """睡到最近的觸發時間，觸發所有到期的工作"""
+        while True:
+            now = datetime.now(timezone.utc)
+            for job in self.jobs.values():
+                if job.next_run_at is None or job.next_run_at > now:
+                    continue
+                scheduled_at = job.next_run_at
+                job.schedule_next(now)
+                if job.running:
+                    # 上一次執行尚未結束
+                    job.skipped += 1
+                    continue
+                task = asyncio.create_task(self.run_job(job.name, scheduled_at), name=f"job-{job.name}")
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+            upcoming = [job.next_run_at for job in self.jobs.values() if job.next_run_at]
+            sleep = min([(due - now).total_seconds() for due in upcoming] + [self.max_sleep])
+            await asyncio.sleep(max(sleep, 0))
+
+    async def run_job(self, name: str, scheduled_at: Optional[datetime] = None) -> Any:
+        """
+        取得租約後執行工作
+
+        Args:
+            name: 工作名稱
+            scheduled_at: 觸發時間 (預設為現在，手動執行)
+
+        Returns:
+            Any: 工作結果；未取得租約或執行失敗時為 None
+        """
+        job = self.jobs[name]
+        scheduled_at = scheduled_at or datetime.now(timezone.utc)
+        if not await self._acquire(job, scheduled_at):
+            job.skipped += 1
+            return None
+
+        job.running = True
+        started = time.perf_counter()
+        status, result, error = "succeeded", None, None
+        try:
+            result = await self._run_holding_lease(job, scheduled_at)
+        except asyncio.CancelledError:
+            status, error = "cancelled", "cancelled"
+            raise
+        except Exception as e:
+            status, error = "failed", str(e)
+            job.failures += 1
+            logger.exception(f"Scheduled job {name} failed")
+        finally:
+            job.running = False
+            job.runs += 1
+            job.last_status = status
+            job.last_duration = time.perf_counter() - started
+            await self._release(job, scheduled_at, status, result, error)
+        return result
+
+    async def _run_holding_lease(self, job: ScheduledJob, scheduled_at: datetime) -> Any:
+        """執行工作並每 1/3 租約時間延長租約；租約被取走時取消工作"""
+        task = asyncio.create_task(job.func(self.db))
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=job.lease_seconds / 3)
+                if done:
+                    return task.result()
+                if not await self._renew(job, scheduled_at):
+                    raise RuntimeError(f"Lease lost for job {job.name}")
+        finally:
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+
+    async def _acquire(self, job: ScheduledJob, scheduled_at: datetime) -> bool:
+        """
+        取得租約：租約已到期且尚未有 worker 執行此觸發時間
+
+        文件不存在時以 upsert 建立；條件不符時 upsert 因 _id 重複失敗，表示其他 worker 持有
+        """
+        now = datetime.now(timezone.utc)
+        try:
+            await self.db.job_leases.update_one(
+                {"_id": job.name, "expires_at": {"$lte": now}, "scheduled_at": {"$lt": scheduled_at}},
+                {"$set": {
+                    "owner": self.owner_id,
+                    "scheduled_at": scheduled_at,
+                    "started_at": now,
+                    "expires_at": now + timedelta(seconds=job.lease_seconds),
+                }},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def _renew(self, job: ScheduledJob, scheduled_at: datetime) -> bool:
+        result = await self.db.job_leases.update_one(
+            {"_id": job.name, "owner": self.owner_id, "scheduled_at": scheduled_at},
+            {"$set": {"expires_at": datetime.now(timezone.utc) + timedelta(seconds=job.lease_seconds)}}
+        )
+        return result.matched_count == 1
+
+    async def _release(self, job: ScheduledJob, scheduled_at: datetime, status: str, result: Any, error: Optional[str]):
+        """釋放租約並記錄執行結果 (失敗不影響排程)"""
+        now = datetime.now(timezone.utc)
+        try:
+            await self.db.job_leases.update_one(
+                {"_id": job.name, "owner": self.owner_id, "scheduled_at": scheduled_at},
+                {"$set": {
+                    "expires_at": now,
+                    "finished_at": now,
+                    "last_status": status,
+                    "last_result": result if isinstance(result, dict) else None,
+                    "last_error": error,
+                    "last_duration_seconds": job.last_duration,
+                }}
+            )
+        except Exception:
+            logger.exception(f"Failed to release lease for job {job.name}")
+
+    def get_metrics(self) -> Dict:
+        """
+        排程指標
+
+        Returns:
+            Dict: 租約持有者 ID 與各工作的下一次觸發時間、執行/略過/失敗次數
+        """
+        return {
+            "owner": self.owner_id,
+            "jobs": {
+                job.name: {
+                    "cron": job.cron,
+                    "next_run_at": job.next_run_at.isoformat() if job.next_run_at else None,
+                    "running": job.running,
+                    "runs": job.runs,
+                    "skipped": job.skipped,
+                    "failures": job.failures,
+                    "last_status": job.last_status,
+                    "last_duration_seconds": job.last_duration,
+                }
+                for job in self.jobs.values()
+            },
+        }
+
+
+async def _snapshot_leaderboards(db: AsyncIOMotorDatabase) -> Dict:
+    service = LeaderboardService(db)
+    for period, metric in LEADERBOARD_SNAPSHOTS:
+        await service.update_leaderboard_cache(period=period, metric=metric)
+    return {"snapshots": len(LEADERBOARD_SNAPSHOTS)}
+
+
+async def _purge_trash(db: AsyncIOMotorDatabase) -> Dict:
+    return {"purged": await WorkoutService(db).purge_expired_trash()}
+
+
+def register_default_jobs(scheduler: JobScheduler):
+    """註冊應用程式的排程工作 (UTC)"""
+    scheduler.add_job("challenge_lifecycle", "* * * * *", lambda db: ChallengeLifecycle(db).advance())
+    scheduler.add_job("challenge_ranking", "*/5 * * * *", lambda db: ChallengeRankingJob(db).run())
+    scheduler.add_job("leaderboard_snapshots", "0 * * * *", _snapshot_leaderboards)
+    scheduler.add_job("trash_purge", "30 3 * * *", _purge_trash)
+    scheduler.add_job("annual_review_pregeneration", "0 4 * 12 *", schedule_annual_review_pregeneration)
+
+
+# 單例實例
+job_scheduler = JobScheduler()
+register_default_jobs(job_scheduler)
@@ -11,17 +11,25 @@ from ..models import (
     LeaderboardResponse,
     LeaderboardEntry,
 )
+from .friend_graph import friend_graph
+from .realtime_hub import EVENT_RANK_CHANGE, realtime_hub
 
 
 class LeaderboardService:
     """排行榜服務"""
 
-    def __init__(self, db: AsyncIOMotorDatabase):
+    def __init__(self, db: AsyncIOMotorDatabase, realtime=None):
+        """
+        Args:
+            db: 資料庫連線
+            realtime: 即時推送中心 (預設為 realtime_hub)
+        """
         self.db = db
         self.leaderboards = db.leaderboards
         self.users = db.users
         self.workouts = db.workouts
         self.friendships = db.friendships
+        self.realtime = realtime or realtime_hub
 
     async def get_friend_leaderboard(
         self,
@@ -120,7 +128,13 @@ class LeaderboardService:
         # 計算週期範圍
         period_start, period_end = self._get_period_range(period)
 
-        # 刪除舊的快取資料
+        # 記錄舊排名 (推送排名變動)，再刪除舊的快取資料
+        previous_entries = await self.leaderboards.find(
+            {"period": period, "metric": metric, "period_start": period_start},
+            projection={"user_id": 1, "rank": 1}
+        ).to_list(length=None)
+        previous_ranks = {str(entry["user_id"]): entry["rank"] for entry in previous_entries}
+
         await self.leaderboards.delete_many({
             "period": period,
             "metric": metric,
@@ -174,28 +188,23 @@ class LeaderboardService:
         if docs:
             await self.leaderboards.insert_many(docs)
 
-    # Helper methods
-
-    async def _get_friend_ids(self, user_id: str) -> List[ObjectId]:
-        """取得好友 ID 列表"""
-        friendships_cursor = self.friendships.find({
-            "$or": [
-                {"user_id": ObjectId(user_id)},
-                {"friend_id": ObjectId(user_id)}
-            ],
-            "status": "accepted"
+        # 即時推送排名變動 (客戶端不需輪詢排行榜)
+        await self.realtime.publish_each(EVENT_RANK_CHANGE, {
+            str(doc["user_id"]): {
+                "period": period,
+                "metric": metric,
+                "rank": doc["rank"],
+                "previous_rank": previous_ranks.get(str(doc["user_id"])),
+            }
+            for doc in docs
+            if previous_ranks.get(str(doc["user_id"])) != doc["rank"]
         })
 
-        friendships = await friendships_cursor.to_list(length=1000)
-        friend_ids = []
-
-        for friendship in friendships:
-            if str(friendship["user_id"]) == user_id:
-                friend_ids.append(friendship["friend_id"])
-            else:
-                friend_ids.append(friendship["user_id"])
+    # Helper methods
 
-        return friend_ids
+    async def _get_friend_ids(self, user_id: str) -> List[ObjectId]:
+        """取得好友 ID 列表 (好友關係快取)"""
+        return [ObjectId(friend_id) for friend_id in await friend_graph.friend_ids(self.db, user_id)]
 
     async def _calculate_metric(
         self,
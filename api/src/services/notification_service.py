@@ -2,11 +2,20 @@
 Notification Service (T245-T246)
 通知服務：通知觸發邏輯、Firebase Cloud Messaging 整合
 """
-from datetime import datetime, timezone
+import re
+from datetime import datetime, timedelta, timezone
 from typing import List, Optional, Dict
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
 
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from ..core.database import as_utc
+from ..core.performance import LRUCache
+from .push_queue import push_delivery_queue
+from .push_scheduler import deferred_push_scheduler, in_quiet_hours, push_due_at
+from .realtime_hub import EVENT_NOTIFICATION, realtime_hub
 from ..models import (
     NotificationCreate,
     NotificationInDB,
@@ -14,15 +23,119 @@ from ..models import (
     NotificationPreferences,
 )
 
+# user_id -> 通知偏好設定，update_notification_preferences 時失效
+# (多 process 部署下其他 process 最多延遲 TTL 秒生效)
+PREFERENCE_CACHE_TTL_SECONDS = 60
+_preference_cache = LRUCache(maxsize=10000, ttl=PREFERENCE_CACHE_TTL_SECONDS)
+
+# 通知頻率：即時、每小時摘要、每日摘要、關閉推播 (通知仍會寫入)
+NOTIFICATION_FREQUENCIES = ("realtime", "hourly_digest", "daily_digest", "off")
+
+_TIME_OF_DAY = re.compile(r"^([01]\d|2[0-3]):[0-5]\d$")
+
+# 未讀計數每日以通知記錄重新校正 (修正 TTL 過期刪除造成的誤差)
+COUNTER_RECOUNT_SECONDS = 24 * 3600
+
+# 通知類型 (未讀計數分類)
+NOTIFICATION_TYPES = ("friend_request", "friend_activity", "interaction", "challenge_update")
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+# 按讚 / 留言通知合併：同一則動態的同一種互動在每個時段內合併為一筆通知，
+# 記錄互動人數與最近的互動者；同一筆通知兩次推播至少間隔 INTERACTION_PUSH_INTERVAL_SECONDS
+INTERACTION_WINDOW_SECONDS = 3600
+INTERACTION_RECENT_ACTORS = 3
+INTERACTION_PUSH_INTERVAL_SECONDS = 15 * 60
+
+# 好友動態通知的動態類型描述
+FRIEND_ACTIVITY_LABELS = {
+    "workout": "運動記錄",
+    "achievement": "成就",
+    "challenge": "挑戰成果",
+}
+
+
+def preferences_from_document(user_id: str, prefs: Optional[Dict]) -> Dict:
+    """
+    由偏好設定文件建立偏好設定 (缺少的欄位與不存在的文件使用預設值)
+
+    Args:
+        user_id: 使用者 ID
+        prefs: notification_preferences 文件
+
+    Returns:
+        Dict: 通知偏好設定
+    """
+    prefs = prefs or {}
+    return {
+        "user_id": user_id,
+        "friend_request_enabled": prefs.get("friend_request_enabled", True),
+        "friend_activity_enabled": prefs.get("friend_activity_enabled", True),
+        "interaction_enabled": prefs.get("interaction_enabled", True),
+        "challenge_update_enabled": prefs.get("challenge_update_enabled", True),
+        "notification_frequency": prefs.get("notification_frequency", "realtime"),
+        "daily_digest_time": prefs.get("daily_digest_time", "08:00"),
+        "do_not_disturb_enabled": prefs.get("do_not_disturb_enabled", False),
+        "do_not_disturb_start": prefs.get("do_not_disturb_start"),
+        "do_not_disturb_end": prefs.get("do_not_disturb_end"),
+        "updated_at": prefs.get("updated_at")
+    }
+
+
+def encode_notification_cursor(notification: Dict) -> str:
+    """分頁游標：最後一筆通知的建立時間 (毫秒) 與 ID"""
+    millis = (as_utc(notification["created_at"]) - _EPOCH) // timedelta(milliseconds=1)
+    return f"{millis}:{notification['_id']}"
+
+
+def decode_notification_cursor(cursor: str):
+    """
+    解析分頁游標
+
+    Returns:
+        Tuple[datetime, ObjectId]: (建立時間, 通知 ID)
+
+    Raises:
+        ValueError: 無效的分頁游標
+    """
+    try:
+        millis, notification_id = cursor.split(":")
+        return _EPOCH + timedelta(milliseconds=int(millis)), ObjectId(notification_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def _filtered_total(counters: Dict, notification_type: str, read_status: str) -> int:
+    """依篩選條件由計數取得通知總數"""
+    types = NOTIFICATION_TYPES if notification_type == "all" else (notification_type,)
+    unread = sum(counters["count_by_type"].get(t, 0) for t in types)
+    total = sum(counters["total_by_type"].get(t, 0) for t in types)
+    if read_status == "unread":
+        return unread
+    if read_status == "read":
+        return max(0, total - unread)
+    return total
+
 
 class NotificationService:
     """通知服務"""
 
-    def __init__(self, db: AsyncIOMotorDatabase):
+    def __init__(self, db: AsyncIOMotorDatabase, push_queue=None, push_scheduler=None, realtime=None):
+        """
+        Args:
+            db: 資料庫連線
+            push_queue: 推播發送佇列 (預設為 push_delivery_queue)
+            push_scheduler: 延後推播排程器 (預設為 deferred_push_scheduler)
+            realtime: 即時推送中心 (預設為 realtime_hub)
+        """
         self.db = db
         self.notifications = db.notifications
         self.notification_preferences = db.notification_preferences
+        self.notification_counters = db.notification_counters
         self.users = db.users
+        self.push_queue = push_queue or push_delivery_queue
+        self.push_scheduler = push_scheduler or deferred_push_scheduler
+        self.realtime = realtime or realtime_hub
 
     async def create_notification(
         self,
@@ -32,7 +145,8 @@ class NotificationService:
         message: str,
         reference_type: Optional[str] = None,
         reference_id: Optional[str] = None,
-        sender_id: Optional[str] = None
+        sender_id: Optional[str] = None,
+        preferences: Optional[Dict] = None
     ) -> NotificationResponse:
         """
         T245: 通知觸發邏輯
@@ -47,27 +161,19 @@ class NotificationService:
             reference_type: 關聯物件類型
             reference_id: 關聯物件 ID
             sender_id: 發送者 ID
+            preferences: 已批次載入的接收者偏好設定 (未提供時查詢)
 
         Returns:
             NotificationResponse: 通知回應
         """
         # 檢查使用者通知偏好
-        preferences = await self.get_notification_preferences(user_id)
+        if preferences is None:
+            preferences = await self.get_notification_preferences(user_id)
 
-        # 根據偏好設定決定是否發送
-        should_send = self._should_send_notification(notification_type, preferences)
-
-        if not should_send:
+        # 根據偏好設定決定是否發送 (免打擾時段只延後推播，通知照常寫入)
+        if not self._should_send_notification(notification_type, preferences):
             return None
 
-        # 檢查免打擾時段
-        if preferences.get("do_not_disturb_enabled", False):
-            if self._is_do_not_disturb_time(
-                preferences.get("do_not_disturb_start"),
-                preferences.get("do_not_disturb_end")
-            ):
-                return None
-
         # 建立通知
         notification = NotificationInDB(
             user_id=ObjectId(user_id),
@@ -84,10 +190,20 @@ class NotificationService:
         result = await self.notifications.insert_one(
             notification.dict(by_alias=True, exclude={"id"})
         )
+        await self._increment_counters({user_id: 1}, notification_type)
+        await self.realtime.publish([user_id], EVENT_NOTIFICATION, {
+            "notification_id": str(result.inserted_id),
+            "notification_type": notification_type,
+            "title": title,
+            "message": message,
+            "reference_type": reference_type,
+            "reference_id": reference_id,
+        })
 
-        # 發送推播通知 (Firebase Cloud Messaging)
-        if preferences.get("notification_frequency") == "realtime":
-            await self._send_push_notification(user_id, title, message)
+        # 發送推播通知 (Firebase Cloud Messaging，經由背景佇列或延後排程)
+        await self._dispatch_push(
+            {user_id: preferences}, notification_type, title, message, reference_type, reference_id
+        )
 
         # 查詢發送者資料
         sender = None
@@ -114,26 +230,105 @@ class NotificationService:
             read_at=None
         )
 
+    async def create_notifications_bulk(
+        self,
+        user_ids: List[str],
+        notification_type: str,
+        title: str,
+        message: str,
+        reference_type: Optional[str] = None,
+        reference_id: Optional[str] = None,
+        sender_id: Optional[str] = None
+    ) -> Dict:
+        """
+        批次建立並發送相同內容的通知 (好友動態、挑戰更新等 fan-out)
+
+        偏好設定於記憶體中篩選，通知以單一 insert_many 寫入；推播排入背景佇列
+        (由佇列批次查詢 token 並以 multicast 發送)，免打擾與摘要模式的接收者延後推播
+
+        Args:
+            user_ids: 接收者 ID 列表
+            notification_type: 通知類型
+            title: 通知標題
+            message: 通知內容
+            reference_type: 關聯物件類型
+            reference_id: 關聯物件 ID
+            sender_id: 發送者 ID
+
+        Returns:
+            Dict: {notification_count, push_recipient_count, deferred_push_count}
+        """
+        preferences = await self.get_notification_preferences_batch(user_ids)
+        recipients = [
+            user_id
+            for user_id, user_preferences in preferences.items()
+            if self._should_send_notification(notification_type, user_preferences)
+        ]
+
+        result = {"notification_count": 0, "push_recipient_count": 0, "deferred_push_count": 0}
+        if not recipients:
+            return result
+
+        created_at = datetime.now(timezone.utc)
+        documents = [
+            NotificationInDB(
+                user_id=ObjectId(user_id),
+                notification_type=notification_type,
+                title=title,
+                message=message,
+                reference_type=reference_type,
+                reference_id=ObjectId(reference_id) if reference_id else None,
+                sender_id=ObjectId(sender_id) if sender_id else None,
+                is_read=False,
+                created_at=created_at
+            ).dict(by_alias=True, exclude={"id"})
+            for user_id in recipients
+        ]
+        await self.notifications.insert_many(documents, ordered=False)
+        await self._increment_counters({user_id: 1 for user_id in recipients}, notification_type)
+        await self.realtime.publish(recipients, EVENT_NOTIFICATION, {
+            "notification_type": notification_type,
+            "title": title,
+            "message": message,
+            "reference_type": reference_type,
+            "reference_id": reference_id,
+        })
+        result["notification_count"] = len(documents)
+
+        result.update(await self._dispatch_push(
+            {user_id: preferences[user_id] for user_id in recipients},
+            notification_type, title, message, reference_type, reference_id
+        ))
+        return result
+
     async def get_notifications(
         self,
         user_id: str,
         notification_type: str = "all",
         read_status: str = "all",
         limit: int = 20,
-        offset: int = 0
+        offset: int = 0,
+        cursor: Optional[str] = None
     ) -> Dict:
         """
         取得通知清單
 
+        以 (user_id, created_at, _id) 索引的 keyset 查詢分頁 (傳入上一頁的 next_cursor)，
+        發送者資料以單一查詢批次取得，數量統計來自未讀計數文件
+
         Args:
             user_id: 使用者 ID
             notification_type: 通知類型篩選
             read_status: 已讀狀態篩選
             limit: 每頁數量
-            offset: 偏移量
+            offset: 偏移量 (未使用 cursor 時的相容分頁)
+            cursor: 分頁游標
 
         Returns:
-            Dict: 通知清單與統計資料
+            Dict: 通知清單、統計資料與下一頁游標
+
+        Raises:
+            ValueError: 無效的分頁游標
         """
         # 構建查詢條件
         query = {"user_id": ObjectId(user_id)}
@@ -146,36 +341,42 @@ class NotificationService:
         elif read_status == "unread":
             query["is_read"] = False
 
-        # 計算總數與未讀數
-        total_count = await self.notifications.count_documents(query)
-        unread_count = await self.notifications.count_documents({
-            "user_id": ObjectId(user_id),
-            "is_read": False
-        })
+        if cursor:
+            created_at, last_id = decode_notification_cursor(cursor)
+            query["$or"] = [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "_id": {"$lt": last_id}},
+            ]
 
-        # 查詢通知
+        # 多取一筆判斷是否有下一頁
         notifications_cursor = self.notifications.find(query)\
-            .sort("created_at", -1)\
-            .skip(offset)\
-            .limit(limit)
-
-        notifications = await notifications_cursor.to_list(length=limit)
+            .sort([("created_at", -1), ("_id", -1)])
+        if offset and not cursor:
+            notifications_cursor = notifications_cursor.skip(offset)
+        notifications = await notifications_cursor.limit(limit + 1).to_list(length=limit + 1)
+
+        next_cursor = None
+        if len(notifications) > limit:
+            notifications = notifications[:limit]
+            next_cursor = encode_notification_cursor(notifications[-1])
+
+        # 批次查詢發送者資料
+        sender_ids = list({notif["sender_id"] for notif in notifications if notif.get("sender_id")})
+        senders = {}
+        if sender_ids:
+            async for sender_doc in self.users.find(
+                {"_id": {"$in": sender_ids}},
+                projection={"display_name": 1, "avatar_url": 1}
+            ):
+                senders[sender_doc["_id"]] = {
+                    "user_id": str(sender_doc["_id"]),
+                    "display_name": sender_doc.get("display_name", ""),
+                    "avatar_url": sender_doc.get("avatar_url")
+                }
 
         # 組裝回應
-        response_notifications = []
-        for notif in notifications:
-            # 查詢發送者資料
-            sender = None
-            if notif.get("sender_id"):
-                sender_doc = await self.users.find_one({"_id": notif["sender_id"]})
-                if sender_doc:
-                    sender = {
-                        "user_id": str(sender_doc["_id"]),
-                        "display_name": sender_doc.get("display_name", ""),
-                        "avatar_url": sender_doc.get("avatar_url")
-                    }
-
-            response_notifications.append(NotificationResponse(
+        response_notifications = [
+            NotificationResponse(
                 notification_id=str(notif["_id"]),
                 user_id=str(notif["user_id"]),
                 notification_type=notif["notification_type"],
@@ -183,128 +384,260 @@ class NotificationService:
                 message=notif["message"],
                 reference_type=notif.get("reference_type"),
                 reference_id=str(notif["reference_id"]) if notif.get("reference_id") else None,
-                sender=sender,
+                sender=senders.get(notif.get("sender_id")),
+                actor_count=notif.get("actor_count", 1),
+                recent_actors=[
+                    {"user_id": str(actor["user_id"]), "display_name": actor.get("display_name", "")}
+                    for actor in reversed(notif.get("recent_actors", []))
+                ],
                 is_read=notif["is_read"],
                 created_at=notif["created_at"],
                 read_at=notif.get("read_at")
-            ))
+            )
+            for notif in notifications
+        ]
 
+        counters = await self._get_counters(user_id)
         return {
             "notifications": response_notifications,
-            "unread_count": unread_count,
-            "total_count": total_count,
+            "unread_count": counters["unread_count"],
+            "total_count": _filtered_total(counters, notification_type, read_status),
             "limit": limit,
-            "offset": offset
+            "offset": offset,
+            "next_cursor": next_cursor
         }
 
     async def mark_as_read(self, user_id: str, notification_id: str):
-        """標記通知為已讀"""
-        await self.notifications.update_one(
+        """標記通知為已讀 (僅未讀 -> 已讀時扣減未讀計數)"""
+        notification = await self.notifications.find_one_and_update(
             {
                 "_id": ObjectId(notification_id),
-                "user_id": ObjectId(user_id)
+                "user_id": ObjectId(user_id),
+                "is_read": False
             },
             {
                 "$set": {
                     "is_read": True,
                     "read_at": datetime.now(timezone.utc)
                 }
-            }
+            },
+            projection={"notification_type": 1}
         )
+        if notification:
+            await self._adjust_counters(user_id, unread={notification["notification_type"]: -1})
 
     async def mark_all_as_read(self, user_id: str) -> int:
-        """標記所有通知為已讀"""
-        result = await self.notifications.update_many(
-            {
-                "user_id": ObjectId(user_id),
-                "is_read": False
-            },
-            {
-                "$set": {
-                    "is_read": True,
-                    "read_at": datetime.now(timezone.utc)
+        """
+        標記所有通知為已讀
+
+        依類型分別更新，以各類型實際更新的數量扣減未讀計數
+        (與同時進行的單則已讀、新通知互不重複計算)
+        """
+        read_at = datetime.now(timezone.utc)
+
+        marked = {}
+        for notification_type in NOTIFICATION_TYPES:
+            result = await self.notifications.update_many(
+                {
+                    "user_id": ObjectId(user_id),
+                    "notification_type": notification_type,
+                    "is_read": False
+                },
+                {
+                    "$set": {
+                        "is_read": True,
+                        "read_at": read_at
+                    }
                 }
-            }
-        )
-        return result.modified_count
+            )
+            if result.modified_count:
+                marked[notification_type] = -result.modified_count
+
+        if marked:
+            await self._adjust_counters(user_id, unread=marked)
+        return -sum(marked.values())
 
     async def delete_notification(self, user_id: str, notification_id: str):
         """刪除通知"""
-        await self.notifications.delete_one({
-            "_id": ObjectId(notification_id),
-            "user_id": ObjectId(user_id)
-        })
+        notification = await self.notifications.find_one_and_delete(
+            {
+                "_id": ObjectId(notification_id),
+                "user_id": ObjectId(user_id)
+            },
+            projection={"notification_type": 1, "is_read": 1}
+        )
+        if notification:
+            notification_type = notification["notification_type"]
+            await self._adjust_counters(
+                user_id,
+                unread=None if notification.get("is_read") else {notification_type: -1},
+                total={notification_type: -1}
+            )
 
     async def get_unread_count(self, user_id: str) -> Dict:
-        """取得未讀通知數量"""
-        total_unread = await self.notifications.count_documents({
-            "user_id": ObjectId(user_id),
-            "is_read": False
-        })
+        """取得未讀通知數量 (單一主鍵查詢)"""
+        counters = await self._get_counters(user_id)
+        return {
+            "unread_count": counters["unread_count"],
+            "count_by_type": counters["count_by_type"]
+        }
 
-        # 分類統計
-        pipeline = [
-            {"$match": {"user_id": ObjectId(user_id), "is_read": False}},
-            {"$group": {"_id": "$notification_type", "count": {"$sum": 1}}}
+    # 未讀計數：notification_counters 以使用者 ID 為主鍵，
+    # unread.<type> 為未讀數量、total.<type> 為通知總數
+
+    async def _increment_counters(self, increments: Dict[str, int], notification_type: str):
+        """新通知：未讀與總數加一 (多位接收者以單一 bulk_write 更新)"""
+        operations = [
+            UpdateOne(
+                {"_id": ObjectId(user_id)},
+                {"$inc": {
+                    f"unread.{notification_type}": count,
+                    f"total.{notification_type}": count,
+                }},
+                upsert=True
+            )
+            for user_id, count in increments.items()
         ]
-        results = await self.notifications.aggregate(pipeline).to_list(100)
+        await self.notification_counters.bulk_write(operations, ordered=False)
+
+    async def _adjust_counters(
+        self,
+        user_id: str,
+        unread: Optional[Dict[str, int]] = None,
+        total: Optional[Dict[str, int]] = None
+    ):
+        """
+        調整未讀與總數
+
+        Args:
+            user_id: 使用者 ID
+            unread: {通知類型: 未讀數變化量}
+            total: {通知類型: 總數變化量}
+        """
+        increments = {f"unread.{key}": delta for key, delta in (unread or {}).items()}
+        increments.update({f"total.{key}": delta for key, delta in (total or {}).items()})
+        await self.notification_counters.update_one(
+            {"_id": ObjectId(user_id)},
+            {"$inc": increments}
+        )
 
+    async def _get_counters(self, user_id: str) -> Dict:
+        """
+        讀取計數 (單一主鍵查詢)；尚無計數或超過 COUNTER_RECOUNT_SECONDS 未校正時重新計算
+
+        Returns:
+            Dict: {unread_count, count_by_type, total_by_type}
+        """
+        counters = await self.notification_counters.find_one({"_id": ObjectId(user_id)})
+
+        recounted_at = counters.get("recounted_at") if counters else None
+        if recounted_at is None or \
+                (datetime.now(timezone.utc) - as_utc(recounted_at)).total_seconds() > COUNTER_RECOUNT_SECONDS:
+            counters = await self._recount(user_id)
+
+        unread = counters.get("unread") or {}
+        total = counters.get("total") or {}
         count_by_type = {
-            "friend_request": 0,
-            "friend_activity": 0,
-            "interaction": 0,
-            "challenge_update": 0
+            notification_type: max(0, unread.get(notification_type, 0))
+            for notification_type in NOTIFICATION_TYPES
+        }
+        return {
+            "unread_count": sum(count_by_type.values()),
+            "count_by_type": count_by_type,
+            "total_by_type": {
+                notification_type: max(0, total.get(notification_type, 0))
+                for notification_type in NOTIFICATION_TYPES
+            },
         }
 
-        for result in results:
-            if result["_id"] in count_by_type:
-                count_by_type[result["_id"]] = result["count"]
+    async def _recount(self, user_id: str) -> Dict:
+        """由通知記錄重新計算計數並寫回 (舊資料遷移與 TTL 過期校正)"""
+        pipeline = [
+            {"$match": {"user_id": ObjectId(user_id)}},
+            {"$group": {
+                "_id": "$notification_type",
+                "total": {"$sum": 1},
+                "unread": {"$sum": {"$cond": [{"$eq": ["$is_read", False]}, 1, 0]}},
+            }}
+        ]
+        results = await self.notifications.aggregate(pipeline).to_list(100)
 
-        return {
-            "unread_count": total_unread,
-            "count_by_type": count_by_type
+        counters = {
+            "unread": {result["_id"]: result["unread"] for result in results},
+            "total": {result["_id"]: result["total"] for result in results},
+            "recounted_at": datetime.now(timezone.utc),
         }
+        return await self.notification_counters.find_one_and_update(
+            {"_id": ObjectId(user_id)},
+            {"$set": counters},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
 
     async def get_notification_preferences(self, user_id: str) -> Dict:
-        """取得通知偏好設定"""
+        """取得通知偏好設定 (優先使用本機快取)"""
+        cached = _preference_cache.get(user_id)
+        if cached is not None:
+            return dict(cached)
+
         prefs = await self.notification_preferences.find_one({"user_id": ObjectId(user_id)})
+        preferences = preferences_from_document(user_id, prefs)
+        _preference_cache.set(user_id, preferences)
+        return dict(preferences)
 
-        if prefs:
-            return {
-                "user_id": user_id,
-                "friend_request_enabled": prefs.get("friend_request_enabled", True),
-                "friend_activity_enabled": prefs.get("friend_activity_enabled", True),
-                "interaction_enabled": prefs.get("interaction_enabled", True),
-                "challenge_update_enabled": prefs.get("challenge_update_enabled", True),
-                "notification_frequency": prefs.get("notification_frequency", "realtime"),
-                "daily_digest_time": prefs.get("daily_digest_time", "08:00"),
-                "do_not_disturb_enabled": prefs.get("do_not_disturb_enabled", False),
-                "do_not_disturb_start": prefs.get("do_not_disturb_start"),
-                "do_not_disturb_end": prefs.get("do_not_disturb_end"),
-                "updated_at": prefs.get("updated_at")
-            }
-
-        # 返回預設值
-        return {
-            "user_id": user_id,
-            "friend_request_enabled": True,
-            "friend_activity_enabled": True,
-            "interaction_enabled": True,
-            "challenge_update_enabled": True,
-            "notification_frequency": "realtime",
-            "daily_digest_time": "08:00",
-            "do_not_disturb_enabled": False,
-            "do_not_disturb_start": None,
-            "do_not_disturb_end": None,
-            "updated_at": None
-        }
+    async def get_notification_preferences_batch(self, user_ids: List[str]) -> Dict[str, Dict]:
+        """
+        批次取得通知偏好設定：快取未命中的使用者以單一 $in 查詢載入
+
+        Args:
+            user_ids: 使用者 ID 列表
+
+        Returns:
+            Dict[str, Dict]: user_id -> 通知偏好設定
+        """
+        result = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            cached = _preference_cache.get(user_id)
+            if cached is not None:
+                result[user_id] = dict(cached)
+            else:
+                missing.append(user_id)
+
+        if missing:
+            documents = {}
+            cursor = self.notification_preferences.find(
+                {"user_id": {"$in": [ObjectId(user_id) for user_id in missing]}}
+            )
+            async for prefs in cursor:
+                documents[str(prefs["user_id"])] = prefs
+
+            for user_id in missing:
+                preferences = preferences_from_document(user_id, documents.get(user_id))
+                _preference_cache.set(user_id, preferences)
+                result[user_id] = dict(preferences)
+
+        return result
 
     async def update_notification_preferences(
         self,
         user_id: str,
         preferences: Dict
     ) -> Dict:
-        """更新通知偏好設定"""
+        """
+        更新通知偏好設定
+
+        Raises:
+            ValueError: 通知頻率或時間格式 (HH:MM) 不正確
+        """
+        frequency = preferences.get("notification_frequency")
+        if frequency is not None and frequency not in NOTIFICATION_FREQUENCIES:
+            raise ValueError(f"Invalid notification_frequency: {frequency}")
+        for field in ("daily_digest_time", "do_not_disturb_start", "do_not_disturb_end"):
+            value = preferences.get(field)
+            if value is not None and not _TIME_OF_DAY.match(value):
+                raise ValueError(f"Invalid {field}: expected HH:MM")
+
         preferences["user_id"] = ObjectId(user_id)
         preferences["updated_at"] = datetime.now(timezone.utc)
 
@@ -314,54 +647,68 @@ class NotificationService:
             upsert=True
         )
 
+        _preference_cache.delete(user_id)
         return await self.get_notification_preferences(user_id)
 
     # T246: Firebase Cloud Messaging 整合
 
-    async def _send_push_notification(
+    async def _dispatch_push(
         self,
-        user_id: str,
+        preferences: Dict[str, Dict],
+        notification_type: str,
         title: str,
-        message: str
-    ):
+        message: str,
+        reference_type: Optional[str] = None,
+        reference_id: Optional[str] = None
+    ) -> Dict:
         """
         T246: Firebase Cloud Messaging 整合
 
-        發送推播通知
+        依偏好設定發送推播：即時模式排入推播佇列 (不等待 FCM)，
+        免打擾時段與摘要模式交由延後推播排程器，關閉推播者略過
 
         Args:
-            user_id: 使用者 ID
+            preferences: 接收者 ID -> 通知偏好設定
+            notification_type: 通知類型
             title: 通知標題
             message: 通知內容
+            reference_type: 關聯物件類型
+            reference_id: 關聯物件 ID
+
+        Returns:
+            Dict: {push_recipient_count, deferred_push_count}
         """
+        now = datetime.now(timezone.utc)
+        immediate, deferred = [], []
+        for user_id, user_preferences in preferences.items():
+            if user_preferences.get("notification_frequency") == "off":
+                continue
+            due_at = push_due_at(user_preferences, now)
+            if due_at is None:
+                immediate.append(user_id)
+            else:
+                deferred.append((user_id, due_at))
+
+        data = {"notification_type": notification_type}
+        if reference_type:
+            data["reference_type"] = reference_type
+        if reference_id:
+            data["reference_id"] = reference_id
+
+        result = {"push_recipient_count": 0, "deferred_push_count": 0}
         try:
-            # 查詢使用者的 FCM token
-            user = await self.users.find_one({"_id": ObjectId(user_id)})
-            if not user or not user.get("fcm_token"):
-                return
-
-            fcm_token = user["fcm_token"]
-
-            # 使用 Firebase Admin SDK 發送通知
-            # 這裡需要整合 firebase-admin 套件
-            # 由於環境限制,這裡只是佔位邏輯
-
-            # from firebase_admin import messaging
-            # message = messaging.Message(
-            #     notification=messaging.Notification(
-            #         title=title,
-            #         body=message,
-            #     ),
-            #     token=fcm_token,
-            # )
-            # response = messaging.send(message)
-            # print(f"Successfully sent message: {response}")
-
-            pass  # 實際 FCM 發送邏輯待整合 firebase-admin
-
+            if immediate:
+                await self.push_queue.enqueue(self.db, immediate, title, message, data)
+                result["push_recipient_count"] = len(immediate)
+            if deferred:
+                result["deferred_push_count"] = await self.push_scheduler.schedule(
+                    self.db, deferred, notification_type, title, message, data
+                )
         except Exception as e:
-            # 記錄錯誤但不中斷主流程
-            print(f"Failed to send push notification: {e}")
+            # 記錄錯誤但不中斷主流程 (通知已寫入)
+            print(f"Failed to enqueue push notification: {e}")
+
+        return result
 
     # Notification trigger helpers
 
@@ -392,32 +739,58 @@ class NotificationService:
         activity_id: str,
         activity_type: str
     ):
-        """發送好友動態通知 (給所有好友)"""
-        # 這裡簡化處理，實際應該批次發送
-        pass
+        """發送好友動態通知 (給所有好友，批次寫入與推播)"""
+        from .friend_service import FriendService
+
+        owner = await self.users.find_one(
+            {"_id": ObjectId(activity_owner_id)},
+            projection={"display_name": 1}
+        )
+        if not owner:
+            return
+
+        friend_ids = list(await FriendService(self.db).get_friend_ids(activity_owner_id))
+        if not friend_ids:
+            return
+
+        activity_label = FRIEND_ACTIVITY_LABELS.get(activity_type, "新動態")
+        await self.create_notifications_bulk(
+            user_ids=friend_ids,
+            notification_type="friend_activity",
+            title="好友動態",
+            message=f"{owner.get('display_name', '某人')} 分享了{activity_label}",
+            reference_type="activity",
+            reference_id=activity_id,
+            sender_id=activity_owner_id
+        )
 
     async def notify_like(
         self,
         from_user_id: str,
         to_user_id: str,
         activity_id: str
-    ):
-        """發送按讚通知"""
+    ) -> Optional[Dict]:
+        """發送按讚通知 (時段內的按讚合併為一筆通知)"""
         if from_user_id == to_user_id:
-            return  # 不通知自己
+            return None  # 不通知自己
 
-        from_user = await self.users.find_one({"_id": ObjectId(from_user_id)})
+        from_user = await self.users.find_one(
+            {"_id": ObjectId(from_user_id)},
+            projection={"display_name": 1}
+        )
         if not from_user:
-            return
+            return None
 
-        await self.create_notification(
+        name = from_user.get("display_name", "某人")
+        return await self.create_interaction_notification(
             user_id=to_user_id,
-            notification_type="interaction",
-            title="有人按讚了你的動態",
-            message=f"{from_user.get('display_name', '某人')} 對你的動態按讚",
             reference_type="like",
-            reference_id=activity_id,
-            sender_id=from_user_id
+            activity_id=activity_id,
+            actor_id=from_user_id,
+            actor_name=name,
+            title="有人按讚了你的動態",
+            message=f"{name} 對你的動態按讚",
+            coalesced_suffix=" 人對你的動態按讚"
         )
 
     async def notify_comment(
@@ -426,28 +799,168 @@ class NotificationService:
         to_user_id: str,
         activity_id: str,
         comment_preview: str
-    ):
-        """發送留言通知"""
+    ) -> Optional[Dict]:
+        """發送留言通知 (時段內的留言合併為一筆通知)"""
         if from_user_id == to_user_id:
-            return  # 不通知自己
+            return None  # 不通知自己
 
-        from_user = await self.users.find_one({"_id": ObjectId(from_user_id)})
+        from_user = await self.users.find_one(
+            {"_id": ObjectId(from_user_id)},
+            projection={"display_name": 1}
+        )
         if not from_user:
-            return
+            return None
 
         # 截斷留言預覽
         preview = comment_preview[:50] + "..." if len(comment_preview) > 50 else comment_preview
 
-        await self.create_notification(
+        name = from_user.get("display_name", "某人")
+        return await self.create_interaction_notification(
             user_id=to_user_id,
-            notification_type="interaction",
-            title="有人留言了",
-            message=f"{from_user.get('display_name', '某人')}: {preview}",
             reference_type="comment",
-            reference_id=activity_id,
-            sender_id=from_user_id
+            activity_id=activity_id,
+            actor_id=from_user_id,
+            actor_name=name,
+            title="有人留言了",
+            message=f"{name}: {preview}",
+            coalesced_suffix=" 人留言了你的動態"
         )
 
+    async def create_interaction_notification(
+        self,
+        user_id: str,
+        reference_type: str,
+        activity_id: str,
+        actor_id: str,
+        actor_name: str,
+        title: str,
+        message: str,
+        coalesced_suffix: str
+    ) -> Optional[Dict]:
+        """
+        建立或合併互動通知 (按讚、留言)
+
+        以 (接收者, 動態, 互動類型, 時段) 為鍵的單一 upsert：互動人數以互動者集合計算
+        (同一人重複互動不重複計算)，通知內容改為「A 和其他 N 人...」並移到清單最前面；
+        推播在時段內第一次互動時發送，之後至少間隔 INTERACTION_PUSH_INTERVAL_SECONDS
+
+        Args:
+            user_id: 接收者 ID
+            reference_type: 互動類型 (like, comment)
+            activity_id: 動態 ID
+            actor_id: 互動者 ID
+            actor_name: 互動者顯示名稱
+            title: 通知標題
+            message: 只有一位互動者時的通知內容
+            coalesced_suffix: 多位互動者時接在「A 和其他 N」之後的內容
+
+        Returns:
+            Optional[Dict]: {notification_id, actor_count, pushed}，偏好設定關閉時為 None
+        """
+        preferences = await self.get_notification_preferences(user_id)
+        if not self._should_send_notification("interaction", preferences):
+            return None
+
+        # MongoDB 日期精度為毫秒，截斷後才能與寫入的值比對
+        now = datetime.now(timezone.utc)
+        now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+        window_seconds = int(now.timestamp()) // INTERACTION_WINDOW_SECONDS * INTERACTION_WINDOW_SECONDS
+        window_start = datetime.fromtimestamp(window_seconds, tz=timezone.utc)
+        actor = {"user_id": ObjectId(actor_id), "display_name": actor_name}
+        actor_count = {"$size": "$actor_ids"}
+
+        # 使用者輸入一律以 $literal 包裝，避免以 $ 開頭的字串被當成欄位路徑
+        pipeline = [
+            {"$set": {
+                "notification_type": "interaction",
+                "title": {"$literal": title},
+                "sender_id": actor["user_id"],
+                "actor_ids": {"$setUnion": [{"$ifNull": ["$actor_ids", []]}, [actor["user_id"]]]},
+                "recent_actors": {"$slice": [
+                    {"$concatArrays": [
+                        {"$filter": {
+                            "input": {"$ifNull": ["$recent_actors", []]},
+                            "cond": {"$ne": ["$$this.user_id", actor["user_id"]]},
+                        }},
+                        [{"$literal": actor}],
+                    ]},
+                    -INTERACTION_RECENT_ACTORS,
+                ]},
+                "first_event_at": {"$ifNull": ["$first_event_at", now]},
+                # 由已讀 (或新建) 變為未讀的時間，用於判斷是否增加未讀計數
+                "unread_since": {"$cond": [{"$eq": ["$is_read", False]}, "$unread_since", now]},
+                "last_push_at": {"$cond": [
+                    {"$lte": [
+                        {"$ifNull": ["$last_push_at", _EPOCH]},
+                        now - timedelta(seconds=INTERACTION_PUSH_INTERVAL_SECONDS)
+                    ]},
+                    now,
+                    "$last_push_at"
+                ]},
+                "is_read": {"$literal": False},
+                "read_at": {"$literal": None},
+                "created_at": now,
+            }},
+            {"$set": {
+                "actor_count": actor_count,
+                "message": {"$cond": [
+                    {"$gt": [actor_count, 1]},
+                    {"$concat": [
+                        {"$literal": actor_name},
+                        " 和其他 ",
+                        {"$toString": {"$subtract": [actor_count, 1]}},
+                        {"$literal": coalesced_suffix},
+                    ]},
+                    {"$literal": message},
+                ]},
+            }},
+        ]
+        key = {
+            "user_id": ObjectId(user_id),
+            "reference_type": reference_type,
+            "reference_id": ObjectId(activity_id),
+            "window_start": window_start,
+        }
+        projection = {
+            "actor_count": 1, "message": 1, "first_event_at": 1, "unread_since": 1, "last_push_at": 1,
+        }
+        try:
+            notification = await self.notifications.find_one_and_update(
+                key, pipeline, projection=projection, upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # 同時建立同一筆通知：另一個請求已插入，改為更新
+            notification = await self.notifications.find_one_and_update(
+                key, pipeline, projection=projection, upsert=True, return_document=ReturnDocument.AFTER
+            )
+
+        if as_utc(notification["first_event_at"]) == now:
+            await self._increment_counters({user_id: 1}, "interaction")
+        elif as_utc(notification["unread_since"]) == now:
+            await self._adjust_counters(user_id, unread={"interaction": 1})
+
+        await self.realtime.publish([user_id], EVENT_NOTIFICATION, {
+            "notification_id": str(notification["_id"]),
+            "notification_type": "interaction",
+            "title": title,
+            "message": notification["message"],
+            "reference_type": reference_type,
+            "reference_id": activity_id,
+            "actor_count": notification["actor_count"],
+        })
+
+        pushed = as_utc(notification["last_push_at"]) == now
+        if pushed:
+            await self._dispatch_push(
+                {user_id: preferences}, "interaction", title, notification["message"], reference_type, activity_id
+            )
+
+        return {
+            "notification_id": str(notification["_id"]),
+            "actor_count": notification["actor_count"],
+            "pushed": pushed,
+        }
+
     async def notify_challenge_update(
         self,
         user_id: str,
@@ -465,6 +978,23 @@ class NotificationService:
             reference_id=challenge_id
         )
 
+    async def notify_challenge_participants(
+        self,
+        participant_ids: List[str],
+        challenge_id: str,
+        update_type: str,
+        message: str
+    ):
+        """發送挑戰更新通知給所有參與者 (批次寫入與推播)"""
+        await self.create_notifications_bulk(
+            user_ids=participant_ids,
+            notification_type="challenge_update",
+            title="挑戰更新",
+            message=message,
+            reference_type="challenge",
+            reference_id=challenge_id
+        )
+
     # Helper methods
 
     def _should_send_notification(
@@ -492,14 +1022,4 @@ class NotificationService:
         end_time: Optional[str]
     ) -> bool:
         """檢查是否在免打擾時段"""
-        if not start_time or not end_time:
-            return False
-
-        now = datetime.now(timezone.utc)
-        current_time = now.strftime("%H:%M")
-
-        # 處理跨日的情況 (例如 22:00 - 07:00)
-        if start_time > end_time:
-            return current_time >= start_time or current_time <= end_time
-        else:
-            return start_time <= current_time <= end_time
+        return in_quiet_hours(start_time, end_time, datetime.now(timezone.utc))
@@ -0,0 +1,401 @@
+"""
+Push Delivery Queue
+推播發送佇列：通知寫入後只排入 push_jobs，由背景 workers 批次領取並以
+FCM multicast 發送，請求路徑不等待 FCM
+
+- 暫時性失敗以指數退避重試，只重送失敗的接收者
+- 已失效 (unregistered) 的 token 立即自使用者文件移除；
+  重試耗盡仍失敗的 token 累計失敗次數，達上限後移除
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from bson import ObjectId
+
+from ..core.database import as_utc
+from ..core.performance import METRICS_WINDOW_SECONDS, summarize_samples
+from ..utils.fcm_helper import FCM_MULTICAST_MAX_TOKENS, fcm_helper
+
+logger = logging.getLogger(__name__)
+
+# 推播工作狀態
+PUSH_PENDING = "pending"
+PUSH_SENDING = "sending"
+PUSH_SENT = "sent"
+PUSH_FAILED = "failed"
+
+# 單一推播工作的接收者上限 (與 multicast 上限一致)
+PUSH_JOB_MAX_RECIPIENTS = FCM_MULTICAST_MAX_TOKENS
+
+# 重試耗盡的連續失敗次數達上限即移除 token (送達成功時歸零)
+MAX_TOKEN_FAILURES = 3
+
+
+class PushDeliveryQueue:
+    """推播發送佇列"""
+
+    def __init__(
+        self,
+        concurrency: int = 2,
+        batch_size: int = 20,
+        poll_interval: float = 1.0,
+        lease_seconds: int = 60,
+        max_attempts: int = 5,
+        backoff_base_seconds: float = 2.0,
+        backoff_max_seconds: float = 300.0,
+        fcm=None
+    ):
+        """
+        Args:
+            concurrency: worker 數量
+            batch_size: 每次領取的工作數量上限
+            poll_interval: 無工作時的輪詢間隔 (秒)，同一 process 的新工作會立即喚醒 worker
+            lease_seconds: 領取後的租約時間，逾時未完成 (worker 中斷) 的工作會被重新領取
+            max_attempts: 最多嘗試次數，超過後標記為 failed
+            backoff_base_seconds: 第一次重試的等待時間，之後每次加倍
+            backoff_max_seconds: 重試等待時間上限
+            fcm: 推播發送 (預設為 fcm_helper)
+        """
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.fcm = fcm or fcm_helper
+
+        self.db: Optional[AsyncIOMotorDatabase] = None
+        self._workers: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._next_lease_sweep_at: Optional[datetime] = None
+
+        self._sent = 0
+        self._failed = 0
+        self._retried = 0
+        self._delivered_tokens = 0
+        self._pruned_tokens = 0
+        self._completion_times = deque()
+        self._delivery_latencies = deque(maxlen=1000)
+
+    def start(self, db: AsyncIOMotorDatabase):
+        """啟動 workers (應用程式啟動時呼叫)"""
+        if self._workers:
+            return
+        self.db = db
+        self._wakeup = asyncio.Event()
+        self._workers = [
+            asyncio.create_task(self._worker_loop(), name=f"push-delivery-{i}")
+            for i in range(self.concurrency)
+        ]
+
+    async def stop(self):
+        """停止 workers，進行中的工作租約到期後由其他 process 接手"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def notify(self):
+        """通知 workers 有新工作"""
+        self._wakeup.set()
+
+    async def enqueue(
+        self,
+        db: AsyncIOMotorDatabase,
+        user_ids: List[str],
+        title: str,
+        body: str,
+        data: Optional[Dict[str, str]] = None
+    ) -> int:
+        """
+        排入推播工作 (每 PUSH_JOB_MAX_RECIPIENTS 位接收者一筆)
+
+        Args:
+            db: 資料庫連線
+            user_ids: 接收者 ID 列表
+            title: 通知標題
+            body: 通知內容
+            data: 額外資料 (FCM data payload，值須為字串)
+
+        Returns:
+            int: 排入的工作數量
+        """
+        if not user_ids:
+            return 0
+
+        now = datetime.now(timezone.utc)
+        jobs = [
+            {
+                "user_ids": [ObjectId(user_id) for user_id in user_ids[start:start + PUSH_JOB_MAX_RECIPIENTS]],
+                "title": title,
+                "body": body,
+                "data": data or {},
+                "status": PUSH_PENDING,
+                "attempts": 0,
+                "queued_at": now,
+                "next_attempt_at": now,
+            }
+            for start in range(0, len(user_ids), PUSH_JOB_MAX_RECIPIENTS)
+        ]
+        await db.push_jobs.insert_many(jobs, ordered=False)
+        self.notify()
+        return len(jobs)
+
+    async def _worker_loop(self):
+        """持續領取並處理工作"""
+        while True:
+            # 先清除再領取，領取期間的 notify 不會遺失
+            self._wakeup.clear()
+            try:
+                jobs = await self.claim_jobs()
+                if jobs:
+                    await self.process_jobs(jobs)
+                    continue
+            except Exception:
+                # 記錄錯誤但不中斷 worker；未完成的工作於租約到期後重新領取
+                logger.exception("Push delivery worker error")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _claimable(self, now: datetime) -> Dict:
+        """可領取的工作：已到重試時間的待發送工作，或租約已過期且尚有嘗試次數的工作"""
+        return {
+            "$or": [
+                {"status": PUSH_PENDING, "next_attempt_at": {"$lte": now}},
+                {
+                    "status": PUSH_SENDING,
+                    "lease_expires_at": {"$lt": now},
+                    "attempts": {"$lt": self.max_attempts},
+                },
+            ]
+        }
+
+    async def claim_jobs(self) -> List[Dict]:
+        """
+        批次領取到期的工作 (最多 batch_size 筆)
+
+        以 claim_id 標記本次領取，並發領取時每筆工作只會被一個 worker 取得
+
+        Returns:
+            List[Dict]: 推播工作文件
+        """
+        now = datetime.now(timezone.utc)
+        if self._next_lease_sweep_at is None or now >= self._next_lease_sweep_at:
+            self._next_lease_sweep_at = now + timedelta(seconds=self.lease_seconds)
+            await self.fail_exhausted_leases(now)
+
+        candidates = await self.db.push_jobs.find(
+            self._claimable(now),
+            projection={"_id": 1}
+        ).sort("next_attempt_at", 1).limit(self.batch_size).to_list(self.batch_size)
+        if not candidates:
+            return []
+
+        ids = [job["_id"] for job in candidates]
+        claim_id = ObjectId()
+        await self.db.push_jobs.update_many(
+            {"_id": {"$in": ids}, **self._claimable(now)},
+            {
+                "$set": {
+                    "status": PUSH_SENDING,
+                    "claim_id": claim_id,
+                    "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                },
+                "$inc": {"attempts": 1},
+            }
+        )
+        return await self.db.push_jobs.find(
+            {"_id": {"$in": ids}, "claim_id": claim_id}
+        ).to_list(len(ids))
+
+    async def fail_exhausted_leases(self, now: datetime) -> int:
+        """
+        租約逾時且已達嘗試上限的工作標記為 failed (發送中使 worker 中斷的工作不再重試)
+
+        由 claim_jobs 每個租約時間最多執行一次
+
+        Returns:
+            int: 標記為 failed 的工作數量
+        """
+        result = await self.db.push_jobs.update_many(
+            {
+                "status": PUSH_SENDING,
+                "lease_expires_at": {"$lt": now},
+                "attempts": {"$gte": self.max_attempts},
+            },
+            {
+                "$set": {"status": PUSH_FAILED, "completed_at": now, "error": "Delivery lease expired"},
+                "$unset": {"claim_id": "", "lease_expires_at": ""},
+            }
+        )
+        self._failed += result.modified_count
+        return result.modified_count
+
+    async def process_jobs(self, jobs: List[Dict]):
+        """
+        發送一批推播工作：所有接收者的 FCM token 以單一 projection 查詢取得
+
+        Args:
+            jobs: claim_jobs 領取的推播工作
+        """
+        user_ids = list({user_id for job in jobs for user_id in job["user_ids"]})
+        cursor = self.db.users.find(
+            {"_id": {"$in": user_ids}, "fcm_token": {"$nin": [None, ""]}},
+            projection={"fcm_token": 1}
+        )
+        tokens_by_user = {user["_id"]: user["fcm_token"] async for user in cursor}
+
+        for job in jobs:
+            await self._deliver(job, tokens_by_user)
+
+    async def _deliver(self, job: Dict, tokens_by_user: Dict[ObjectId, str]):
+        """以 multicast 發送單一工作，處理失效 token 與重試"""
+        users_by_token = {
+            tokens_by_user[user_id]: user_id
+            for user_id in job["user_ids"]
+            if user_id in tokens_by_user
+        }
+        tokens = list(users_by_token)
+
+        delivered, unregistered, retry = [], [], []
+        for start in range(0, len(tokens), FCM_MULTICAST_MAX_TOKENS):
+            chunk = tokens[start:start + FCM_MULTICAST_MAX_TOKENS]
+            try:
+                response = await self.fcm.send_multicast(chunk, job["title"], job["body"], job.get("data"))
+            except Exception as e:
+                logger.warning("Push multicast failed: %s", e)
+                retry.extend(chunk)
+                continue
+            self._delivered_tokens += response["success_count"]
+            failed = set(response["failed_tokens"])
+            delivered.extend(token for token in chunk if token not in failed)
+            unregistered.extend(response.get("unregistered_tokens", []))
+            retry.extend(
+                token for token in response["failed_tokens"]
+                if token not in response.get("unregistered_tokens", [])
+            )
+
+        if delivered:
+            await self._reset_token_failures({users_by_token[token]: token for token in delivered})
+        if unregistered:
+            await self._prune_tokens({users_by_token[token]: token for token in unregistered})
+
+        now = datetime.now(timezone.utc)
+        if retry and job["attempts"] < self.max_attempts:
+            await self.db.push_jobs.update_one(
+                {"_id": job["_id"], "claim_id": job["claim_id"]},
+                {
+                    "$set": {
+                        "status": PUSH_PENDING,
+                        "user_ids": [users_by_token[token] for token in retry],
+                        "next_attempt_at": now + timedelta(seconds=self._backoff(job["attempts"])),
+                    },
+                    "$unset": {"claim_id": "", "lease_expires_at": ""},
+                }
+            )
+            self._retried += 1
+            return
+
+        if retry:
+            await self._record_token_failures({users_by_token[token]: token for token in retry})
+
+        status = PUSH_FAILED if retry else PUSH_SENT
+        await self.db.push_jobs.update_one(
+            {"_id": job["_id"], "claim_id": job["claim_id"]},
+            {
+                "$set": {"status": status, "completed_at": now, "failed_token_count": len(retry)},
+                "$unset": {"claim_id": "", "lease_expires_at": ""},
+            }
+        )
+
+        if retry:
+            self._failed += 1
+        else:
+            self._sent += 1
+        self._completion_times.append(time.monotonic())
+        self._delivery_latencies.append((now - as_utc(job["queued_at"])).total_seconds())
+
+    def _backoff(self, attempts: int) -> float:
+        """第 attempts 次失敗後的重試等待時間 (指數退避，加上隨機抖動避免同時重試)"""
+        delay = min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _prune_tokens(self, tokens_by_user: Dict[ObjectId, str]):
+        """移除已失效的 token (僅在使用者尚未更新 token 時移除)"""
+        result = await self.db.users.update_many(
+            {
+                "_id": {"$in": list(tokens_by_user)},
+                "fcm_token": {"$in": list(tokens_by_user.values())},
+            },
+            {"$unset": {"fcm_token": "", "fcm_token_failures": ""}}
+        )
+        self._pruned_tokens += result.modified_count
+
+    async def _reset_token_failures(self, tokens_by_user: Dict[ObjectId, str]):
+        """送達成功後清除失敗計數 (只計算連續失敗；只寫入有失敗記錄的使用者)"""
+        await self.db.users.update_many(
+            {
+                "_id": {"$in": list(tokens_by_user)},
+                "fcm_token": {"$in": list(tokens_by_user.values())},
+                "fcm_token_failures": {"$exists": True},
+            },
+            {"$unset": {"fcm_token_failures": ""}}
+        )
+
+    async def _record_token_failures(self, tokens_by_user: Dict[ObjectId, str]):
+        """累計重試耗盡的連續失敗次數，達 MAX_TOKEN_FAILURES 後移除 token"""
+        query = {
+            "_id": {"$in": list(tokens_by_user)},
+            "fcm_token": {"$in": list(tokens_by_user.values())},
+        }
+        await self.db.users.update_many(query, {"$inc": {"fcm_token_failures": 1}})
+        result = await self.db.users.update_many(
+            {**query, "fcm_token_failures": {"$gte": MAX_TOKEN_FAILURES}},
+            {"$unset": {"fcm_token": "", "fcm_token_failures": ""}}
+        )
+        self._pruned_tokens += result.modified_count
+
+    async def get_queue_depth(self) -> int:
+        """待發送與發送中的工作數量"""
+        if self.db is None:
+            return 0
+        return await self.db.push_jobs.count_documents(
+            {"status": {"$in": [PUSH_PENDING, PUSH_SENDING]}}
+        )
+
+    async def get_metrics(self) -> Dict:
+        """
+        佇列指標
+
+        Returns:
+            Dict: 佇列深度、完成/失敗/重試數、已移除 token 數、近一分鐘吞吐量與送達延遲
+        """
+        cutoff = time.monotonic() - METRICS_WINDOW_SECONDS
+        while self._completion_times and self._completion_times[0] < cutoff:
+            self._completion_times.popleft()
+
+        return {
+            "workers": len(self._workers),
+            "queue_depth": await self.get_queue_depth(),
+            "sent": self._sent,
+            "failed": self._failed,
+            "retried": self._retried,
+            "delivered_tokens": self._delivered_tokens,
+            "pruned_tokens": self._pruned_tokens,
+            "jobs_per_minute": len(self._completion_times),
+            "delivery_latency_seconds": summarize_samples(self._delivery_latencies),
+        }
+
+
+# 單例實例
+push_delivery_queue = PushDeliveryQueue()
@@ -0,0 +1,342 @@
+"""
+Deferred Push Scheduler
+延後推播排程：免打擾時段內的推播延到時段結束，摘要模式 (每小時 / 每日) 的推播
+合併為每位使用者一則摘要
+
+排程存於 scheduled_pushes (每位使用者每個到期時間一筆，新事件以 upsert 合併)，
+依 due_at 索引領取到期項目，重啟不會遺失；process 內以 min-heap 記錄最近的到期時間，
+worker 睡到下一個到期時間 (或輪詢間隔) 才醒來，每次喚醒只讀取到期的項目
+"""
+
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from bson import ObjectId
+
+from ..core.database import as_utc
+from .push_queue import push_delivery_queue
+
+logger = logging.getLogger(__name__)
+
+# 排程狀態
+SCHEDULED = "scheduled"
+FIRING = "firing"
+
+# 摘要推播的通知類型描述
+NOTIFICATION_TYPE_LABELS = {
+    "friend_request": "好友邀請",
+    "friend_activity": "好友動態",
+    "interaction": "互動",
+    "challenge_update": "挑戰更新",
+}
+
+
+def _parse_time_of_day(value: str) -> Tuple[int, int]:
+    hour, minute = value.split(":")
+    return int(hour), int(minute)
+
+
+def _next_time_of_day(value: str, after: datetime) -> datetime:
+    """after 之後 (不含) 最近一次的 HH:MM (UTC)"""
+    hour, minute = _parse_time_of_day(value)
+    candidate = after.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if candidate <= after:
+        candidate += timedelta(days=1)
+    return candidate
+
+
+def in_quiet_hours(start: Optional[str], end: Optional[str], at: datetime) -> bool:
+    """
+    是否在免打擾時段 [start, end) 內 (HH:MM，UTC，支援跨日，例如 22:00 - 07:00)
+
+    Args:
+        start: 開始時間
+        end: 結束時間
+        at: 檢查的時間點
+    """
+    if not start or not end:
+        return False
+
+    current = at.strftime("%H:%M")
+    if start > end:
+        return current >= start or current < end
+    return start <= current < end
+
+
+def push_due_at(preferences: Dict, now: datetime) -> Optional[datetime]:
+    """
+    依偏好設定計算推播時間
+
+    Args:
+        preferences: 通知偏好設定 (notification_frequency 不為 off)
+        now: 目前時間
+
+    Returns:
+        Optional[datetime]: 延後推播的時間，立即推播時為 None
+    """
+    frequency = preferences.get("notification_frequency", "realtime")
+    if frequency == "daily_digest":
+        due = _next_time_of_day(preferences.get("daily_digest_time") or "08:00", now)
+    elif frequency == "hourly_digest":
+        due = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    else:
+        due = now
+
+    start = preferences.get("do_not_disturb_start")
+    end = preferences.get("do_not_disturb_end")
+    if preferences.get("do_not_disturb_enabled", False) and in_quiet_hours(start, end, due):
+        due = _next_time_of_day(end, due)
+
+    return None if due == now else due
+
+
+def digest_content(scheduled: Dict) -> Tuple[str, str, Dict[str, str]]:
+    """
+    延後推播的內容：只有一則事件時原樣推播，多則時合併為摘要
+
+    Args:
+        scheduled: scheduled_pushes 文件
+
+    Returns:
+        Tuple[str, str, Dict]: (標題, 內容, data payload)
+    """
+    event = scheduled["last_event"]
+    if scheduled["event_count"] == 1:
+        return event["title"], event["message"], event["data"]
+
+    parts = [
+        f"{count} 則{NOTIFICATION_TYPE_LABELS.get(notification_type, '通知')}"
+        for notification_type, count in sorted(scheduled["counts"].items())
+        if count
+    ]
+    return (
+        f"你有 {scheduled['event_count']} 則新通知",
+        "、".join(parts),
+        {"notification_type": "digest"}
+    )
+
+
+class DeferredPushScheduler:
+    """延後推播排程器"""
+
+    def __init__(
+        self,
+        batch_size: int = 200,
+        poll_interval: float = 60.0,
+        lease_seconds: int = 60,
+        push_queue=None
+    ):
+        """
+        Args:
+            batch_size: 每次領取的到期項目上限
+            poll_interval: 最長睡眠時間 (秒)，用於發現其他 process 排入的項目
+            lease_seconds: 領取後的租約時間，逾時未完成 (worker 中斷) 的項目會被重新領取
+            push_queue: 推播發送佇列 (預設為 push_delivery_queue)
+        """
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.push_queue = push_queue or push_delivery_queue
+
+        self.db: Optional[AsyncIOMotorDatabase] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._due_heap: List[datetime] = []
+        self._due_set = set()
+
+        self._scheduled_events = 0
+        self._fired = 0
+        self._fired_events = 0
+
+    def start(self, db: AsyncIOMotorDatabase):
+        """啟動 worker (應用程式啟動時呼叫)"""
+        if self._worker:
+            return
+        self.db = db
+        self._wakeup = asyncio.Event()
+        self._worker = asyncio.create_task(self._worker_loop(), name="deferred-push-scheduler")
+
+    async def stop(self):
+        """停止 worker，未到期項目保留在資料庫"""
+        if self._worker:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+
+    def _track_due(self, due_at: datetime):
+        """記錄到期時間 (去重)；比目前最近的到期時間更早時喚醒 worker"""
+        if due_at in self._due_set:
+            return
+        if not self._due_heap or due_at < self._due_heap[0]:
+            self._wakeup.set()
+        heapq.heappush(self._due_heap, due_at)
+        self._due_set.add(due_at)
+
+    async def schedule(
+        self,
+        db: AsyncIOMotorDatabase,
+        recipients: List[Tuple[str, datetime]],
+        notification_type: str,
+        title: str,
+        message: str,
+        data: Dict[str, str]
+    ) -> int:
+        """
+        排入延後推播：同一使用者、同一到期時間的事件合併為一筆 (單一 bulk_write)
+
+        Args:
+            db: 資料庫連線
+            recipients: [(接收者 ID, 推播時間)]
+            notification_type: 通知類型
+            title: 通知標題
+            message: 通知內容
+            data: FCM data payload
+
+        Returns:
+            int: 排入的事件數量
+        """
+        if not recipients:
+            return 0
+
+        now = datetime.now(timezone.utc)
+        event = {
+            "notification_type": notification_type,
+            "title": title,
+            "message": message,
+            "data": data,
+            "created_at": now,
+        }
+        operations = [
+            UpdateOne(
+                {"user_id": ObjectId(user_id), "due_at": due_at},
+                {
+                    "$setOnInsert": {"status": SCHEDULED, "created_at": now},
+                    "$set": {"last_event": event},
+                    "$inc": {"event_count": 1, f"counts.{notification_type}": 1},
+                },
+                upsert=True
+            )
+            for user_id, due_at in recipients
+        ]
+        await db.scheduled_pushes.bulk_write(operations, ordered=False)
+
+        self._scheduled_events += len(recipients)
+        self._track_due(min(due_at for _, due_at in recipients))
+        return len(recipients)
+
+    async def _worker_loop(self):
+        """睡到下一個到期時間，醒來後發送所有到期項目"""
+        while True:
+            self._wakeup.clear()
+            try:
+                if await self.fire_due() >= self.batch_size:
+                    continue
+                await self._load_next_due()
+            except Exception:
+                # 記錄錯誤但不中斷 worker；未完成的項目於租約到期後重新領取
+                logger.exception("Deferred push scheduler error")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._sleep_seconds())
+            except asyncio.TimeoutError:
+                pass
+
+    async def _load_next_due(self):
+        """由 due_at 索引讀取最近的到期時間 (啟動或其他 process 排入時)"""
+        earliest = await self.db.scheduled_pushes.find_one(
+            {"status": SCHEDULED},
+            projection={"due_at": 1},
+            sort=[("due_at", 1)]
+        )
+        if earliest:
+            self._track_due(as_utc(earliest["due_at"]))
+
+    def _sleep_seconds(self) -> float:
+        """距離下一個到期時間的秒數 (不超過 poll_interval)"""
+        now = datetime.now(timezone.utc)
+        while self._due_heap and self._due_heap[0] <= now:
+            self._due_set.discard(heapq.heappop(self._due_heap))
+        if not self._due_heap:
+            return self.poll_interval
+        return min(self.poll_interval, (self._due_heap[0] - now).total_seconds())
+
+    def _claimable(self, now: datetime) -> Dict:
+        return {
+            "due_at": {"$lte": now},
+            "$or": [
+                {"status": SCHEDULED},
+                {"status": FIRING, "lease_expires_at": {"$lt": now}},
+            ],
+        }
+
+    async def fire_due(self) -> int:
+        """
+        領取並發送到期項目 (最多 batch_size 筆)
+
+        內容相同的推播 (例如單一事件的延後推播) 合併為同一個推播工作
+
+        Returns:
+            int: 發送的項目數量
+        """
+        now = datetime.now(timezone.utc)
+        candidates = await self.db.scheduled_pushes.find(
+            self._claimable(now),
+            projection={"_id": 1}
+        ).sort("due_at", 1).limit(self.batch_size).to_list(self.batch_size)
+        if not candidates:
+            return 0
+
+        ids = [item["_id"] for item in candidates]
+        claim_id = ObjectId()
+        await self.db.scheduled_pushes.update_many(
+            {"_id": {"$in": ids}, **self._claimable(now)},
+            {"$set": {
+                "status": FIRING,
+                "claim_id": claim_id,
+                "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+            }}
+        )
+        claimed = await self.db.scheduled_pushes.find(
+            {"_id": {"$in": ids}, "claim_id": claim_id}
+        ).to_list(len(ids))
+
+        pushes: Dict[Tuple, List[str]] = {}
+        for scheduled in claimed:
+            title, body, data = digest_content(scheduled)
+            key = (title, body, tuple(sorted(data.items())))
+            pushes.setdefault(key, []).append(str(scheduled["user_id"]))
+
+        for (title, body, data), user_ids in pushes.items():
+            await self.push_queue.enqueue(self.db, user_ids, title, body, dict(data))
+
+        await self.db.scheduled_pushes.delete_many({"_id": {"$in": ids}, "claim_id": claim_id})
+
+        self._fired += len(claimed)
+        self._fired_events += sum(scheduled["event_count"] for scheduled in claimed)
+        return len(claimed)
+
+    async def get_metrics(self) -> Dict:
+        """
+        排程指標
+
+        Returns:
+            Dict: 待發送項目數、下一個到期時間、已排入/已發送事件數與合併推播數
+        """
+        pending = 0
+        if self.db is not None:
+            pending = await self.db.scheduled_pushes.estimated_document_count()
+        return {
+            "pending": pending,
+            "next_due_at": self._due_heap[0].isoformat() if self._due_heap else None,
+            "scheduled_events": self._scheduled_events,
+            "fired": self._fired,
+            "fired_events": self._fired_events,
+        }
+
+
+# 單例實例
+deferred_push_scheduler = DeferredPushScheduler()
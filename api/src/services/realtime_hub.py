@@ -0,0 +1,218 @@
+"""
+Realtime Hub
+即時推送：每個客戶端以單一 WebSocket / SSE 連線接收自己的事件
+(新通知、好友新動態、排名變動)，取代輪詢未讀數、動態牆與排行榜
+
+每個 worker 維護本機連線 (user_id -> 連線)，使用者第一條連線建立時訂閱其
+broker channel、最後一條連線關閉時取消訂閱；事件經 broker 發布，
+由持有該使用者連線的 worker 分派。每條連線有固定大小的緩衝佇列，
+慢速客戶端只會丟棄最舊的事件，不會拖慢發布端
+"""
+
+import asyncio
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from ..core.pubsub import EventBroker, create_event_broker
+
+logger = logging.getLogger(__name__)
+
+# 事件類型
+EVENT_NOTIFICATION = "notification"
+EVENT_FEED_ITEM = "feed_item"
+EVENT_RANK_CHANGE = "rank_change"
+
+CHANNEL_PREFIX = "motionstory:user:"
+
+
+def user_channel(user_id) -> str:
+    return f"{CHANNEL_PREFIX}{user_id}"
+
+
+def _serialize(event_type: str, data: Dict) -> str:
+    return json.dumps({
+        "type": event_type,
+        "data": data,
+        "sent_at": datetime.now(timezone.utc).isoformat(),
+    }, default=str)
+
+
+class RealtimeConnection:
+    """單一客戶端連線的事件緩衝"""
+
+    __slots__ = ("user_id", "_queue", "dropped")
+
+    def __init__(self, user_id: str, max_pending: int):
+        self.user_id = user_id
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self.dropped = 0
+
+    def push(self, message: str):
+        """放入事件；緩衝已滿時丟棄最舊的事件"""
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(message)
+
+    async def next_message(self, timeout: float) -> Optional[str]:
+        """
+        等待下一個事件
+
+        Args:
+            timeout: 最長等待時間 (秒)
+
+        Returns:
+            Optional[str]: 已序列化的事件，逾時 (應送出 heartbeat) 時為 None
+        """
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class RealtimeHub:
+    """即時推送中心 (每個 worker 一個)"""
+
+    def __init__(
+        self,
+        broker: Optional[EventBroker] = None,
+        max_pending: int = 100,
+        heartbeat_seconds: float = 25.0
+    ):
+        """
+        Args:
+            broker: pub/sub broker (預設依 REALTIME_BROKER 設定建立)
+            max_pending: 每條連線緩衝的事件上限
+            heartbeat_seconds: 閒置連線送出 heartbeat 的間隔 (秒)，避免被 proxy 關閉
+        """
+        self.broker = broker or create_event_broker()
+        self.max_pending = max_pending
+        self.heartbeat_seconds = heartbeat_seconds
+
+        self._connections: Dict[str, Set[RealtimeConnection]] = {}
+        self._started = False
+
+        self._published = 0
+        self._delivered = 0
+        self._dropped = 0
+        self._publish_errors = 0
+
+    async def start(self):
+        """連線 broker (應用程式啟動時呼叫)"""
+        if self._started:
+            return
+        await self.broker.start(self._dispatch)
+        self._started = True
+
+    async def stop(self):
+        """中斷 broker 連線"""
+        if not self._started:
+            return
+        self._started = False
+        await self.broker.stop()
+        self._connections.clear()
+
+    async def connect(self, user_id: str) -> RealtimeConnection:
+        """
+        註冊客戶端連線
+
+        Args:
+            user_id: 使用者 ID
+
+        Returns:
+            RealtimeConnection: 連線的事件緩衝
+        """
+        connection = RealtimeConnection(user_id, self.max_pending)
+        connections = self._connections.get(user_id)
+        if connections is None:
+            connections = self._connections[user_id] = set()
+            await self.broker.subscribe(user_channel(user_id))
+        connections.add(connection)
+        return connection
+
+    async def disconnect(self, connection: RealtimeConnection):
+        """移除客戶端連線；使用者沒有其他連線時取消訂閱"""
+        self._dropped += connection.dropped
+        connections = self._connections.get(connection.user_id)
+        if connections is None:
+            return
+        connections.discard(connection)
+        if not connections:
+            del self._connections[connection.user_id]
+            await self.broker.unsubscribe(user_channel(connection.user_id))
+
+    async def publish(self, user_ids: Iterable[str], event_type: str, data: Dict):
+        """
+        發布事件給多位使用者 (單次 broker 呼叫)
+
+        發布失敗只記錄錯誤，不影響呼叫端 (客戶端重新連線時會重新同步)
+
+        Args:
+            user_ids: 接收者 ID
+            event_type: 事件類型
+            data: 事件內容
+        """
+        message = _serialize(event_type, data)
+        await self._publish_messages([(user_channel(user_id), message) for user_id in user_ids])
+
+    async def publish_each(self, event_type: str, data_by_user: Dict[str, Dict]):
+        """
+        發布各使用者內容不同的事件 (例如排名變動，單次 broker 呼叫)
+
+        Args:
+            event_type: 事件類型
+            data_by_user: 使用者 ID -> 事件內容
+        """
+        await self._publish_messages([
+            (user_channel(user_id), _serialize(event_type, data))
+            for user_id, data in data_by_user.items()
+        ])
+
+    async def _publish_messages(self, messages: List[Tuple[str, str]]):
+        if not messages:
+            return
+        try:
+            await self.broker.publish_many(messages)
+        except Exception:
+            self._publish_errors += 1
+            logger.exception("Realtime publish failed")
+            return
+        self._published += len(messages)
+
+    def _dispatch(self, channel: str, message: str):
+        """broker 收到訊息：放入該使用者所有本機連線的緩衝"""
+        connections = self._connections.get(channel[len(CHANNEL_PREFIX):])
+        if not connections:
+            return
+        for connection in connections:
+            connection.push(message)
+        self._delivered += len(connections)
+
+    def get_metrics(self) -> Dict:
+        """
+        即時推送指標
+
+        Returns:
+            Dict: 連線數、連線使用者數、已發布/已送達/已丟棄事件數
+        """
+        connections = sum(len(connections) for connections in self._connections.values())
+        dropped = self._dropped + sum(
+            connection.dropped
+            for connections in self._connections.values()
+            for connection in connections
+        )
+        return {
+            "broker": self.broker.name,
+            "connections": connections,
+            "connected_users": len(self._connections),
+            "published": self._published,
+            "delivered": self._delivered,
+            "dropped": dropped,
+            "publish_errors": self._publish_errors,
+        }
+
+
+# 單例實例
+realtime_hub = RealtimeHub()
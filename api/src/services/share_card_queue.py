@@ -0,0 +1,262 @@
+"""
+Share Card Render Queue
+分享卡片背景繪製佇列：工作狀態直接存於 share_cards 文件，
+worker 以 find_one_and_update 領取工作，繪製並上傳後更新文件
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+
+from ..core.database import as_utc
+from ..core.performance import METRICS_WINDOW_SECONDS, summarize_samples
+from .share_card_service import (
+    ShareCardService,
+    SHARE_CARD_PENDING,
+    SHARE_CARD_RENDERING,
+    SHARE_CARD_READY,
+    SHARE_CARD_FAILED,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ShareCardRenderQueue:
+    """分享卡片背景繪製佇列"""
+
+    def __init__(
+        self,
+        concurrency: int = 2,
+        poll_interval: float = 1.0,
+        lease_seconds: int = 60,
+        max_attempts: int = 3,
+        backoff_base_seconds: float = 2.0,
+        backoff_max_seconds: float = 300.0,
+        service_factory=ShareCardService
+    ):
+        """
+        Args:
+            concurrency: worker 數量
+            poll_interval: 無工作時的輪詢間隔 (秒)，同一 process 的新工作會立即喚醒 worker
+            lease_seconds: 領取後的租約時間，逾時未完成 (worker 中斷) 的工作會被重新領取
+            max_attempts: 最多嘗試次數 (含租約逾時)，超過後標記為 failed
+            backoff_base_seconds: 第一次重試的等待時間，之後每次加倍
+            backoff_max_seconds: 重試等待時間上限
+            service_factory: 建立 ShareCardService 的函式 (db) -> service
+        """
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.service_factory = service_factory
+
+        self.db: Optional[AsyncIOMotorDatabase] = None
+        self._workers: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._next_lease_sweep_at: Optional[datetime] = None
+
+        self._completed = 0
+        self._failed = 0
+        self._retried = 0
+        self._completion_times = deque()
+        self._queue_latencies = deque(maxlen=1000)
+        self._processing_times = deque(maxlen=1000)
+
+    def start(self, db: AsyncIOMotorDatabase):
+        """啟動 workers (應用程式啟動時呼叫)"""
+        if self._workers:
+            return
+        self.db = db
+        self._wakeup = asyncio.Event()
+        self._workers = [
+            asyncio.create_task(self._worker_loop(), name=f"share-card-render-{i}")
+            for i in range(self.concurrency)
+        ]
+
+    async def stop(self):
+        """停止 workers，進行中的工作租約到期後由其他 process 接手"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def notify(self):
+        """通知 workers 有新工作"""
+        self._wakeup.set()
+
+    async def _worker_loop(self):
+        """持續領取並處理工作"""
+        while True:
+            # 先清除再領取，領取期間的 notify 不會遺失
+            self._wakeup.clear()
+            try:
+                job = await self.claim_job()
+                if job:
+                    await self.process_job(job)
+                    continue
+            except Exception:
+                # 記錄錯誤但不中斷 worker；未完成的工作於租約到期後重新領取
+                logger.exception("Share card render worker error")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def claim_job(self) -> Optional[Dict]:
+        """
+        領取最早排入且已到重試時間的待處理工作 (含租約已過期且未達嘗試上限的工作)
+
+        Returns:
+            Optional[Dict]: 分享卡片文件，無工作時為 None
+        """
+        now = datetime.now(timezone.utc)
+        if self._next_lease_sweep_at is None or now >= self._next_lease_sweep_at:
+            self._next_lease_sweep_at = now + timedelta(seconds=self.lease_seconds)
+            await self.fail_exhausted_leases(now)
+
+        return await self.db.share_cards.find_one_and_update(
+            {
+                "$or": [
+                    # 尚未失敗過的工作沒有 next_attempt_at
+                    {"status": SHARE_CARD_PENDING, "next_attempt_at": {"$not": {"$gt": now}}},
+                    {
+                        "status": SHARE_CARD_RENDERING,
+                        "render_lease_expires_at": {"$lt": now},
+                        "render_attempts": {"$lt": self.max_attempts},
+                    },
+                ]
+            },
+            {
+                "$set": {
+                    "status": SHARE_CARD_RENDERING,
+                    "render_started_at": now,
+                    "render_lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                },
+                "$inc": {"render_attempts": 1},
+            },
+            sort=[("queued_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def fail_exhausted_leases(self, now: datetime) -> int:
+        """
+        租約逾時且已達嘗試上限的工作標記為 failed (繪製使 worker 中斷的工作不再重試)
+
+        由 claim_job 每個租約時間最多執行一次
+
+        Returns:
+            int: 標記為 failed 的工作數量
+        """
+        result = await self.db.share_cards.update_many(
+            {
+                "status": SHARE_CARD_RENDERING,
+                "render_lease_expires_at": {"$lt": now},
+                "render_attempts": {"$gte": self.max_attempts},
+            },
+            {
+                "$set": {"status": SHARE_CARD_FAILED, "render_error": "Render lease expired"},
+                "$unset": {"render_lease_expires_at": ""},
+            }
+        )
+        self._failed += result.modified_count
+        return result.modified_count
+
+    async def process_job(self, job: Dict):
+        """
+        繪製並上傳單一分享卡片，完成後更新所有相同內容的待處理記錄
+
+        Args:
+            job: claim_job 領取的分享卡片文件
+        """
+        started = time.perf_counter()
+        if job.get("queued_at"):
+            self._queue_latencies.append(
+                (as_utc(job["render_started_at"]) - as_utc(job["queued_at"])).total_seconds()
+            )
+
+        render_job = job["render_job"]
+        try:
+            card_object = await self.service_factory(self.db).resolve_card_object(
+                render_job["template"], render_job["data"], render_job["user_name"]
+            )
+        except Exception as e:
+            logger.exception("Share card render failed: %s", job["_id"])
+            attempts = job.get("render_attempts", 1)
+            exhausted = attempts >= self.max_attempts
+            update = {
+                "status": SHARE_CARD_FAILED if exhausted else SHARE_CARD_PENDING,
+                "render_error": str(e),
+            }
+            if not exhausted:
+                update["next_attempt_at"] = datetime.now(timezone.utc) + timedelta(
+                    seconds=self._backoff(attempts)
+                )
+            await self.db.share_cards.update_one(
+                {"_id": job["_id"], "status": SHARE_CARD_RENDERING},
+                {"$set": update, "$unset": {"render_lease_expires_at": ""}}
+            )
+            if exhausted:
+                self._failed += 1
+            else:
+                self._retried += 1
+            return
+
+        await self.db.share_cards.update_many(
+            {
+                "content_hash": job["content_hash"],
+                "status": {"$in": [SHARE_CARD_PENDING, SHARE_CARD_RENDERING]},
+            },
+            {
+                "$set": {
+                    "status": SHARE_CARD_READY,
+                    "card_url": card_object["card_url"],
+                    "r2_key": card_object["r2_key"],
+                    "image_variants": card_object["image_variants"],
+                    "generated_at": datetime.now(timezone.utc),
+                },
+                "$unset": {"render_lease_expires_at": "", "render_error": "", "next_attempt_at": ""},
+            }
+        )
+
+        self._completed += 1
+        self._completion_times.append(time.monotonic())
+        self._processing_times.append(time.perf_counter() - started)
+
+    def _backoff(self, attempts: int) -> float:
+        """第 attempts 次失敗後的重試等待時間 (指數退避，加上隨機抖動避免同時重試)"""
+        delay = min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def get_metrics(self) -> Dict:
+        """
+        佇列指標
+
+        Returns:
+            Dict: 完成/失敗數、近一分鐘吞吐量、排隊延遲與處理時間
+        """
+        cutoff = time.monotonic() - METRICS_WINDOW_SECONDS
+        while self._completion_times and self._completion_times[0] < cutoff:
+            self._completion_times.popleft()
+
+        return {
+            "workers": len(self._workers),
+            "completed": self._completed,
+            "failed": self._failed,
+            "retried": self._retried,
+            "renders_per_minute": len(self._completion_times),
+            "queue_latency_seconds": summarize_samples(self._queue_latencies),
+            "processing_seconds": summarize_samples(self._processing_times),
+        }
+
+
+# 單例實例
+share_card_render_queue = ShareCardRenderQueue()
@@ -0,0 +1,329 @@
+"""
+Share Card Service
+分享卡片生成：以內容雜湊定址，相同內容只繪製與上傳一次；
+需要繪製時建立 pending 記錄，由 share_card_queue 於背景完成
+"""
+
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from bson import ObjectId
+
+from ..core.database import user_id_query
+from ..core.performance import LRUCache
+from ..models import ShareCardInDB, ShareCardResponse
+from ..utils.share_card_generator import (
+    ACHIEVEMENT_CARD_TEMPLATES,
+    SHARE_CARD_RENDERER_VERSION,
+    share_card_generator,
+)
+from ..utils.image_derivatives import image_derivative_generator
+
+# 分享卡片繪製狀態
+SHARE_CARD_PENDING = "pending"
+SHARE_CARD_RENDERING = "rendering"
+SHARE_CARD_READY = "ready"
+SHARE_CARD_FAILED = "failed"
+
+# 分享卡片連結有效期
+SHARE_CARD_TTL_DAYS = 30
+
+# 卡片衍生版本 (WebP/AVIF) object key 前綴
+SHARE_CARD_KEY_PREFIX = "share-cards"
+
+# content_hash -> (r2_key, card_url, image_variants)，命中時跳過繪製、上傳與資料庫查詢
+_card_object_cache = LRUCache(maxsize=2048)
+
+
+def card_content_hash(template: str, data: Dict, user_name: str) -> str:
+    """
+    計算分享卡片內容雜湊 (模板、正規化資料、使用者名稱、繪製版本)
+
+    Args:
+        template: 繪製模板
+        data: 卡片資料
+        user_name: 使用者顯示名稱
+
+    Returns:
+        str: SHA-256 hex digest
+    """
+    payload = json.dumps(
+        {
+            "template": template,
+            "data": data,
+            "user_name": user_name,
+            "renderer_version": SHARE_CARD_RENDERER_VERSION,
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def card_object_key(content_hash: str) -> str:
+    """內容定址的 R2 object key"""
+    return f"{SHARE_CARD_KEY_PREFIX}/{content_hash[:2]}/{content_hash}.png"
+
+
+def achievement_card_data(achievement: Dict, custom_message: Optional[str] = None) -> Dict:
+    """由成就文件建立卡片資料 (僅包含會繪製的欄位)"""
+    metadata = achievement.get("metadata") or {}
+    achieved_at = achievement.get("achieved_at")
+    description = custom_message or metadata.get("description", "")
+
+    return {
+        "title": metadata.get("title", "成就達成"),
+        "achievement_name": metadata.get("title", achievement.get("achievement_type", "")),
+        "description": description,
+        "subtitle": description,
+        "value": metadata.get("value", ""),
+        "achieved_at": achieved_at.strftime("%Y-%m-%d") if isinstance(achieved_at, datetime) else "",
+    }
+
+
+def share_card_to_response(record: Dict) -> ShareCardResponse:
+    """將分享卡片文件轉換為 API 回應"""
+    return ShareCardResponse(**{
+        **record,
+        "_id": str(record["_id"]),
+        "user_id": str(record["user_id"]),
+        "achievement_id": str(record["achievement_id"]),
+    })
+
+
+class ShareCardService:
+    """分享卡片服務"""
+
+    def __init__(self, db: AsyncIOMotorDatabase, generator=None, storage=None, images=None):
+        """
+        Args:
+            db: 資料庫連線
+            generator: 分享卡片生成器 (預設為 share_card_generator)
+            storage: 物件儲存 (預設為 r2_storage)
+            images: 衍生版本生成器 (預設為 image_derivative_generator)
+        """
+        if storage is None:
+            from ..core.storage import r2_storage
+            storage = r2_storage
+
+        self.db = db
+        self.share_cards = db.share_cards
+        self.users = db.users
+        self.generator = generator or share_card_generator
+        self.storage = storage
+        self.images = images or image_derivative_generator
+
+    async def find_card_object(self, content_hash: str) -> Optional[Dict]:
+        """
+        由本機 LRU 或既有 (已完成) 分享卡片記錄取得圖片物件，不存取物件儲存
+
+        Args:
+            content_hash: 內容雜湊
+
+        Returns:
+            Optional[Dict]: {content_hash, r2_key, card_url, image_variants, cache_hit}，未找到時為 None
+        """
+        cached = _card_object_cache.get(content_hash)
+        if cached:
+            return self._card_object(content_hash, *cached, cache_hit="memory")
+
+        existing = await self.share_cards.find_one(
+            {"content_hash": content_hash, "status": SHARE_CARD_READY},
+            projection={"r2_key": 1, "card_url": 1, "image_variants": 1}
+        )
+        if existing:
+            cached = (existing["r2_key"], existing["card_url"], existing.get("image_variants"))
+            _card_object_cache.set(content_hash, cached)
+            return self._card_object(content_hash, *cached, cache_hit="database")
+
+        return None
+
+    async def resolve_card_object(self, template: str, data: Dict, user_name: str) -> Dict:
+        """
+        取得卡片圖片物件，必要時才繪製並上傳
+
+        查詢順序：本機 LRU -> 既有分享卡片記錄 -> 物件儲存 -> 繪製並上傳
+
+        Args:
+            template: 繪製模板
+            data: 卡片資料
+            user_name: 使用者顯示名稱
+
+        Returns:
+            Dict: {content_hash, r2_key, card_url, image_variants, cache_hit}
+                  cache_hit 為 memory / database / storage，繪製時為 None
+
+        衍生版本 (WebP/AVIF) 先於 PNG 上傳，PNG 存在即代表衍生版本皆已上傳
+        """
+        content_hash = card_content_hash(template, data, user_name)
+
+        known = await self.find_card_object(content_hash)
+        if known:
+            return known
+
+        r2_key = card_object_key(content_hash)
+        if await self.storage.object_exists(r2_key):
+            cached = (
+                r2_key,
+                self.storage.public_url(r2_key),
+                self.images.variant_urls(SHARE_CARD_KEY_PREFIX, content_hash),
+            )
+            _card_object_cache.set(content_hash, cached)
+            return self._card_object(content_hash, *cached, cache_hit="storage")
+
+        image = await self.generator.generate_card(template, data, user_name)
+        image_variants = await self.images.create(
+            image.getvalue(), SHARE_CARD_KEY_PREFIX, content_hash=content_hash
+        )
+        card_url = await self.storage.upload_file(
+            image,
+            r2_key,
+            content_type="image/png",
+            metadata={"content-hash": content_hash}
+        )
+        _card_object_cache.set(content_hash, (r2_key, card_url, image_variants))
+        return self._card_object(content_hash, r2_key, card_url, image_variants, cache_hit=None)
+
+    def _card_object(
+        self,
+        content_hash: str,
+        r2_key: str,
+        card_url: str,
+        image_variants: Optional[Dict],
+        cache_hit: Optional[str]
+    ) -> Dict:
+        return {
+            "content_hash": content_hash,
+            "r2_key": r2_key,
+            "card_url": card_url,
+            "image_variants": image_variants,
+            "cache_hit": cache_hit,
+        }
+
+    async def create_achievement_share_card(
+        self,
+        user_id: str,
+        achievement: Dict,
+        template: str = "basic",
+        custom_message: Optional[str] = None
+    ) -> ShareCardResponse:
+        """
+        建立成就分享卡片
+
+        圖片已存在時直接回傳 ready；否則建立 pending 記錄，由背景繪製佇列完成。
+        相同成就、相同內容只保留一筆記錄 (更新有效期)，圖片物件跨記錄共用
+
+        Args:
+            user_id: 使用者 ID
+            achievement: 成就文件
+            template: 卡片模板 (basic, fireworks, epic)
+            custom_message: 自訂訊息
+
+        Returns:
+            ShareCardResponse: 分享卡片 (status 為 ready 或 pending)
+        """
+        user = await self.users.find_one(
+            {"_id": ObjectId(user_id)},
+            projection={"display_name": 1}
+        )
+        user_name = user.get("display_name", "") if user else ""
+
+        render_template = ACHIEVEMENT_CARD_TEMPLATES[template]
+        data = achievement_card_data(achievement, custom_message)
+        content_hash = card_content_hash(render_template, data, user_name)
+        card_object = await self.find_card_object(content_hash)
+
+        metadata = achievement.get("metadata") or {}
+        now = datetime.now(timezone.utc)
+        share_card = ShareCardInDB(
+            achievement_id=achievement["_id"],
+            user_id=ObjectId(user_id),
+            achievement_type=achievement["achievement_type"],
+            template=template,
+            title=metadata.get("title", "成就達成"),
+            description=metadata.get("description", ""),
+            metadata=metadata,
+            content_hash=content_hash,
+            status=SHARE_CARD_PENDING,
+            queued_at=now,
+            render_job={
+                "template": render_template,
+                "data": data,
+                "user_name": user_name,
+            },
+            includes_location=False,  # 根據隱私設定
+            includes_detailed_stats=True,
+            generated_at=now,
+            expires_at=now + timedelta(days=SHARE_CARD_TTL_DAYS)
+        )
+
+        document = share_card.dict(by_alias=True)
+        document.pop("_id", None)
+        refreshed = {
+            "template": document.pop("template"),
+            "expires_at": document.pop("expires_at"),
+        }
+
+        if card_object:
+            # 圖片已存在：直接建立 ready 記錄，不排入佇列
+            for field in ("status", "queued_at", "render_job", "card_url", "r2_key", "image_variants"):
+                document.pop(field)
+            refreshed.update({
+                "status": SHARE_CARD_READY,
+                "card_url": card_object["card_url"],
+                "r2_key": card_object["r2_key"],
+                "image_variants": card_object["image_variants"],
+            })
+
+        # 只寫入資料庫指標：相同內容沿用既有記錄
+        record = await self.share_cards.find_one_and_update(
+            {
+                "user_id": document["user_id"],
+                "achievement_id": document["achievement_id"],
+                "content_hash": content_hash,
+            },
+            {"$setOnInsert": document, "$set": refreshed},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+        if record.get("status") == SHARE_CARD_FAILED:
+            # 先前繪製失敗，重新排入佇列
+            record = await self.share_cards.find_one_and_update(
+                {"_id": record["_id"], "status": SHARE_CARD_FAILED},
+                {
+                    "$set": {
+                        "status": SHARE_CARD_PENDING,
+                        "queued_at": now,
+                        "render_attempts": 0,
+                    },
+                    "$unset": {"render_error": "", "next_attempt_at": ""},
+                },
+                return_document=ReturnDocument.AFTER
+            ) or record
+
+        return share_card_to_response(record)
+
+    async def get_share_card(self, card_id: str, user_id: str) -> Optional[ShareCardResponse]:
+        """
+        取得分享卡片 (供客戶端輪詢繪製狀態)
+
+        Args:
+            card_id: 分享卡片 ID
+            user_id: 使用者 ID
+
+        Returns:
+            Optional[ShareCardResponse]: 分享卡片，不存在時為 None
+        """
+        record = await self.share_cards.find_one(
+            {"_id": ObjectId(card_id), "user_id": user_id_query(user_id)},
+            projection={"render_job": 0}
+        )
+        if not record:
+            return None
+        return share_card_to_response(record)
@@ -20,6 +20,9 @@ from ..models import (
     CommentInDB,
     CommentResponse,
 )
+from .block_cache import block_cache
+from .friend_graph import friend_graph
+from .realtime_hub import EVENT_FEED_ITEM, realtime_hub
 
 
 class SocialService:
@@ -31,7 +34,12 @@ class SocialService:
         "spam", "scam", "fake", "porn", "violence"
     ]
 
-    def __init__(self, db: AsyncIOMotorDatabase):
+    def __init__(self, db: AsyncIOMotorDatabase, realtime=None):
+        """
+        Args:
+            db: 資料庫連線
+            realtime: 即時推送中心 (預設為 realtime_hub)
+        """
         self.db = db
         self.activities = db.activities
         self.likes = db.likes
@@ -41,6 +49,7 @@ class SocialService:
         self.workouts = db.workouts
         self.achievements = db.achievements
         self.challenges = db.challenges
+        self.realtime = realtime or realtime_hub
 
     async def get_feed(
         self,
@@ -70,8 +79,11 @@ class SocialService:
         # 限制 limit 範圍
         limit = min(limit, 50)
 
-        # 取得好友 ID 列表
+        # 取得好友 ID 列表，排除有封鎖關係的使用者 (封鎖名單快取)
         friend_ids = await self._get_friend_ids(user_id)
+        blocked_ids = await block_cache.blocked_ids(self.db, user_id)
+        if blocked_ids:
+            friend_ids = [friend_id for friend_id in friend_ids if str(friend_id) not in blocked_ids]
 
         if not friend_ids:
             return {
@@ -135,6 +147,7 @@ class SocialService:
                 reference_id=str(activity["reference_id"]),
                 content=activity.get("content", {}),
                 image_url=activity.get("image_url"),
+                image_variants=activity.get("image_variants"),
                 caption=activity.get("caption"),
                 likes_count=like_count,
                 comments_count=comment_count,
@@ -184,7 +197,9 @@ class SocialService:
             if caption is not None:
                 update_data["caption"] = caption
             if image_url is not None:
+                # 外部圖片 URL 取代已上傳的配圖，衍生版本一併失效
                 update_data["image_url"] = image_url
+                update_data["image_variants"] = None
 
             await self.activities.update_one(
                 {"_id": existing["_id"]},
@@ -202,6 +217,7 @@ class SocialService:
                 reference_id=reference_id,
                 content=existing.get("content", {}),
                 image_url=image_url or existing.get("image_url"),
+                image_variants=None if image_url is not None else existing.get("image_variants"),
                 caption=caption or existing.get("caption"),
                 likes_count=existing.get("likes_count", 0),
                 comments_count=existing.get("comments_count", 0),
@@ -227,6 +243,7 @@ class SocialService:
         result = await self.activities.insert_one(activity_doc)
 
         user = await self.users.find_one({"_id": ObjectId(user_id)})
+        await self._publish_feed_item(user_id, str(result.inserted_id), activity_type)
 
         return ActivityResponse(
             activity_id=str(result.inserted_id),
@@ -454,28 +471,22 @@ class SocialService:
 
     async def _get_friend_ids(self, user_id: str) -> List:
         """取得好友 ID 列表 (包含自己) - 同時回傳 ObjectId 和字串格式以相容舊資料"""
-        friendships_cursor = self.friendships.find({
-            "$or": [
-                {"user_id": ObjectId(user_id)},
-                {"friend_id": ObjectId(user_id)}
-            ],
-            "status": "accepted"
-        })
-
-        friendships = await friendships_cursor.to_list(length=1000)
         # 同時包含 ObjectId 和字串格式以相容舊資料
         friend_ids = [ObjectId(user_id), user_id]  # 包含自己的動態
-
-        for friendship in friendships:
-            if str(friendship["user_id"]) == user_id:
-                friend_id = friendship["friend_id"]
-                friend_ids.extend([friend_id, str(friend_id)])
-            else:
-                friend_id = friendship["user_id"]
-                friend_ids.extend([friend_id, str(friend_id)])
+        for friend_id in await friend_graph.friend_ids(self.db, user_id):
+            friend_ids.extend([ObjectId(friend_id), friend_id])
 
         return friend_ids
 
+    async def _publish_feed_item(self, user_id: str, activity_id: str, activity_type: str):
+        """即時推送好友新動態 (只推送事件，客戶端收到後重新讀取動態牆)"""
+        friend_ids = await friend_graph.friend_ids(self.db, user_id)
+        await self.realtime.publish(friend_ids, EVENT_FEED_ITEM, {
+            "activity_id": activity_id,
+            "user_id": user_id,
+            "activity_type": activity_type,
+        })
+
     def _filter_sensitive_words(self, content: str) -> tuple[bool, str]:
         """
         T241: 內容審核 - 敏感詞彙過濾
@@ -567,6 +578,7 @@ class SocialService:
                 reference_id=str(activity["reference_id"]),
                 content=activity.get("content", {}),
                 image_url=activity.get("image_url"),
+                image_variants=activity.get("image_variants"),
                 caption=activity.get("caption"),
                 likes_count=like_count,
                 comments_count=comment_count,
@@ -585,7 +597,8 @@ class SocialService:
         user_id: str,
         activity_id: str,
         caption: Optional[str] = None,
-        image_url: Optional[str] = None
+        image_url: Optional[str] = None,
+        image_variants: Optional[Dict[str, Dict[str, str]]] = None
     ) -> ActivityResponse:
         """
         更新動態
@@ -595,6 +608,7 @@ class SocialService:
             activity_id: 動態 ID
             caption: 新的說明文字
             image_url: 新的圖片 URL
+            image_variants: 新圖片的衍生版本 URL (外部圖片 URL 時為 None)
 
         Returns:
             ActivityResponse: 更新後的動態
@@ -621,6 +635,7 @@ class SocialService:
             update_data["caption"] = caption
         if image_url is not None:
             update_data["image_url"] = image_url
+            update_data["image_variants"] = image_variants
 
         await self.activities.update_one(
             {"_id": ObjectId(activity_id)},
@@ -644,6 +659,7 @@ class SocialService:
             reference_id=str(activity["reference_id"]),
             content=activity.get("content", {}),
             image_url=activity.get("image_url"),
+            image_variants=activity.get("image_variants"),
             caption=activity.get("caption"),
             likes_count=like_count,
             comments_count=comment_count,
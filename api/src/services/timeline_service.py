@@ -3,22 +3,56 @@ Timeline Service
 時間軸與年度回顧處理
 """
 
-from datetime import datetime, timezone, timedelta
-from typing import List, Optional, Dict
+from datetime import datetime, timezone
+from typing import Optional, Dict, Tuple
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
-from collections import defaultdict
 
 from ..models import (
     MilestoneInDB,
     MilestoneResponse,
-    AnnualReviewInDB,
+    MilestoneListResponse,
+    MilestoneMonthCount,
+    TimelineSummaryResponse,
     AnnualReviewResponse,
-    MonthlyUsageStats,
-    WorkoutTypeSummary,
-    TrendAnalysis,
     MilestoneSummary,
+    MultiYearSummaryResponse,
 )
+from ..core.database import user_id_query
+from .annual_review_service import AnnualReviewService
+
+
+# 時間軸每頁里程碑數量 (初次載入只取一個畫面)
+DEFAULT_MILESTONE_PAGE_SIZE = 20
+MAX_MILESTONE_PAGE_SIZE = 100
+
+
+def encode_milestone_cursor(milestone: Dict) -> str:
+    """以最後一筆里程碑的 (achieved_at, _id) 建立分頁游標"""
+    return f"{milestone['achieved_at'].isoformat()}_{milestone['_id']}"
+
+
+def decode_milestone_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """
+    解析分頁游標
+
+    Raises:
+        ValueError: 游標格式錯誤
+    """
+    achieved_at, _, milestone_id = cursor.rpartition("_")
+    if not achieved_at or not ObjectId.is_valid(milestone_id):
+        raise ValueError("Invalid cursor")
+    return datetime.fromisoformat(achieved_at), ObjectId(milestone_id)
+
+
+def milestone_to_response(milestone: Dict) -> MilestoneResponse:
+    """將里程碑文件轉換為 API 回應"""
+    return MilestoneResponse(**{
+        **milestone,
+        "_id": str(milestone["_id"]),
+        "user_id": str(milestone["user_id"]),
+        "workout_id": str(milestone["workout_id"]) if milestone.get("workout_id") else None,
+    })
 
 
 class TimelineService:
@@ -36,21 +70,115 @@ class TimelineService:
         user_id: str,
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None,
-        highlighted_only: bool = False
-    ) -> List[MilestoneResponse]:
+        highlighted_only: bool = False,
+        cursor: Optional[str] = None,
+        limit: int = DEFAULT_MILESTONE_PAGE_SIZE
+    ) -> MilestoneListResponse:
         """
-        列出時間軸里程碑
+        列出時間軸里程碑 (cursor-based pagination)
+
+        依 (achieved_at, _id) 由新到舊排序，每次只載入一頁
 
         Args:
             user_id: 使用者 ID
             start_date: 開始日期
             end_date: 結束日期
             highlighted_only: 只顯示高亮項目
+            cursor: 分頁游標 (上一頁最後一筆的 achieved_at 與 _id)
+            limit: 每頁數量 (最大 MAX_MILESTONE_PAGE_SIZE)
+
+        Returns:
+            MilestoneListResponse: 里程碑列表與下一頁游標
+
+        Raises:
+            ValueError: 游標格式錯誤
+        """
+        limit = max(1, min(limit, MAX_MILESTONE_PAGE_SIZE))
+        query = self._milestone_query(user_id, start_date, end_date, highlighted_only)
+
+        if cursor:
+            cursor_time, cursor_id = decode_milestone_cursor(cursor)
+            query["$or"] = [
+                {"achieved_at": {"$lt": cursor_time}},
+                {"achieved_at": cursor_time, "_id": {"$lt": cursor_id}},
+            ]
+
+        milestones = await self.milestones_collection.find(query).sort(
+            [("achieved_at", -1), ("_id", -1)]
+        ).limit(limit + 1).to_list(length=limit + 1)
+
+        has_more = len(milestones) > limit
+        if has_more:
+            milestones = milestones[:limit]
+
+        next_cursor = None
+        if has_more and milestones:
+            next_cursor = encode_milestone_cursor(milestones[-1])
+
+        return MilestoneListResponse(
+            milestones=[milestone_to_response(m) for m in milestones],
+            next_cursor=next_cursor,
+            has_more=has_more
+        )
+
+    async def get_timeline_summary(
+        self,
+        user_id: str,
+        highlighted_only: bool = False
+    ) -> TimelineSummaryResponse:
+        """
+        時間軸摘要 (各月份里程碑數量，供時間軸捲動列使用)
+
+        Args:
+            user_id: 使用者 ID
+            highlighted_only: 只統計高亮項目
 
         Returns:
-            List[MilestoneResponse]: 里程碑列表
+            TimelineSummaryResponse: 各月份統計
         """
-        query = {"user_id": ObjectId(user_id)}
+        pipeline = [
+            {"$match": self._milestone_query(user_id, None, None, highlighted_only)},
+            {
+                "$group": {
+                    "_id": {
+                        "year": {"$year": "$achieved_at"},
+                        "month": {"$month": "$achieved_at"}
+                    },
+                    "count": {"$sum": 1},
+                    "highlighted_count": {
+                        "$sum": {"$cond": [{"$eq": ["$highlighted", True]}, 1, 0]}
+                    }
+                }
+            },
+            {"$sort": {"_id.year": -1, "_id.month": -1}}
+        ]
+
+        rows = await self.milestones_collection.aggregate(pipeline).to_list(length=None)
+
+        months = [
+            MilestoneMonthCount(
+                year=row["_id"]["year"],
+                month=row["_id"]["month"],
+                count=row["count"],
+                highlighted_count=row["highlighted_count"]
+            )
+            for row in rows
+        ]
+
+        return TimelineSummaryResponse(
+            months=months,
+            total=sum(m.count for m in months)
+        )
+
+    def _milestone_query(
+        self,
+        user_id: str,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        highlighted_only: bool
+    ) -> Dict:
+        """建立里程碑查詢條件 (欄位順序對應 idx_user_highlighted_achieved_at)"""
+        query = {"user_id": user_id_query(user_id)}
 
         if highlighted_only:
             query["highlighted"] = True
@@ -62,19 +190,7 @@ class TimelineService:
             if end_date:
                 query["achieved_at"]["$lte"] = end_date
 
-        milestones = await self.milestones_collection.find(query).sort(
-            "achieved_at", -1
-        ).to_list(length=None)
-
-        # Convert ObjectIds to strings for response
-        def convert_milestone(m):
-            m["_id"] = str(m["_id"])
-            m["user_id"] = str(m["user_id"])
-            if m.get("workout_id"):
-                m["workout_id"] = str(m["workout_id"])
-            return m
-
-        return [MilestoneResponse(**convert_milestone(m)) for m in milestones]
+        return query
 
     async def create_milestone(
         self,
@@ -109,18 +225,35 @@ class TimelineService:
             achieved_at=datetime.now(timezone.utc)
         )
 
-        result = await self.milestones_collection.insert_one(
-            milestone.dict(by_alias=True)
-        )
+        # 移除 _id 讓 MongoDB 產生 ObjectId (分頁游標以 _id 作為同時間排序依據)
+        milestone_dict = milestone.dict(by_alias=True)
+        milestone_dict.pop("_id", None)
+        result = await self.milestones_collection.insert_one(milestone_dict)
 
         milestone.id = result.inserted_id
+
+        # 同步至該年度的年度回顧
+        await AnnualReviewService(self.db).add_milestone(
+            user_id,
+            MilestoneSummary(
+                milestone_id=str(milestone.id),
+                milestone_type=milestone.milestone_type,
+                title=milestone.title,
+                achieved_at=milestone.achieved_at
+            )
+        )
+
         return milestone
 
     async def generate_annual_review(
         self, user_id: str, year: int
     ) -> AnnualReviewResponse:
         """
-        生成年度回顧
+        取得年度回顧
+
+        年度回顧文件隨運動記錄建立、更新、刪除、復原增量維護，
+        讀取只需一次 find_one 且永遠是最新資料；
+        僅在文件不存在或結構版本變更時完整重建
 
         Args:
             user_id: 使用者 ID
@@ -131,196 +264,22 @@ class TimelineService:
 
         Performance: 應在 3 秒內完成 (FR-035)
         """
-        # 檢查快取
-        cached_review = await self.annual_reviews_collection.find_one({
-            "user_id": ObjectId(user_id),
-            "year": year,
-            "cache_expires_at": {"$gte": datetime.now(timezone.utc)}
-        })
-
-        if cached_review:
-            return AnnualReviewResponse(**cached_review)
-
-        # 生成新的年度回顧
-        start_date = datetime(year, 1, 1, tzinfo=timezone.utc)
-        end_date = datetime(year, 12, 31, 23, 59, 59, tzinfo=timezone.utc)
-
-        # 取得該年度所有運動記錄
-        workouts = await self.workouts_collection.find({
-            "user_id": ObjectId(user_id),
-            "start_time": {"$gte": start_date, "$lte": end_date},
-            "is_deleted": False
-        }).to_list(length=None)
-
-        # 計算總體統計
-        total_workouts = len(workouts)
-        total_duration_minutes = sum(w.get("duration_minutes", 0) for w in workouts)
-        total_distance_km = sum(w.get("distance_km", 0.0) for w in workouts)
-        total_calories = sum(w.get("calories", 0) for w in workouts)
-
-        # 計算月度統計
-        monthly_stats_dict = defaultdict(lambda: {
-            "workout_count": 0,
-            "total_duration_minutes": 0,
-            "total_distance_km": 0.0,
-            "heart_rates": []
-        })
-
-        for workout in workouts:
-            month = workout["start_time"].month
-            monthly_stats_dict[month]["workout_count"] += 1
-            monthly_stats_dict[month]["total_duration_minutes"] += workout.get("duration_minutes", 0)
-            monthly_stats_dict[month]["total_distance_km"] += workout.get("distance_km", 0.0)
-            if workout.get("avg_heart_rate"):
-                monthly_stats_dict[month]["heart_rates"].append(workout["avg_heart_rate"])
-
-        monthly_stats = [
-            MonthlyUsageStats(
-                month=month,
-                workout_count=stats["workout_count"],
-                total_duration_minutes=stats["total_duration_minutes"],
-                total_distance_km=stats["total_distance_km"],
-                avg_heart_rate=sum(stats["heart_rates"]) // len(stats["heart_rates"]) if stats["heart_rates"] else None
-            )
-            for month, stats in sorted(monthly_stats_dict.items())
-        ]
+        return await AnnualReviewService(self.db).get_review(user_id, year)
 
-        # 計算運動類型統計
-        workout_type_dict = defaultdict(lambda: {
-            "count": 0,
-            "total_distance_km": 0.0,
-            "total_duration_minutes": 0
-        })
-
-        for workout in workouts:
-            workout_type = workout.get("workout_type", "unknown")
-            workout_type_dict[workout_type]["count"] += 1
-            workout_type_dict[workout_type]["total_distance_km"] += workout.get("distance_km", 0.0)
-            workout_type_dict[workout_type]["total_duration_minutes"] += workout.get("duration_minutes", 0)
-
-        workout_type_summary = [
-            WorkoutTypeSummary(
-                workout_type=workout_type,
-                count=stats["count"],
-                total_distance_km=stats["total_distance_km"],
-                total_duration_minutes=stats["total_duration_minutes"]
-            )
-            for workout_type, stats in workout_type_dict.items()
-        ]
-
-        # 趨勢分析
-        trends = await self._analyze_trends(monthly_stats)
-
-        # 里程碑
-        milestones = await self.milestones_collection.find({
-            "user_id": ObjectId(user_id),
-            "achieved_at": {"$gte": start_date, "$lte": end_date}
-        }).to_list(length=None)
-
-        milestone_summaries = [
-            MilestoneSummary(
-                milestone_id=str(m["_id"]),
-                milestone_type=m["milestone_type"],
-                title=m["title"],
-                achieved_at=m["achieved_at"]
-            )
-            for m in milestones
-        ]
-
-        # 個人紀錄
-        personal_records = await self._calculate_personal_records(workouts)
-
-        # 有運動記錄的月份
-        usage_months = sorted(list(set(w["start_time"].month for w in workouts)))
-
-        # 建立年度回顧
-        annual_review = AnnualReviewInDB(
-            user_id=ObjectId(user_id),
-            year=year,
-            usage_months=usage_months,
-            total_workouts=total_workouts,
-            total_duration_minutes=total_duration_minutes,
-            total_distance_km=total_distance_km,
-            total_calories=total_calories,
-            monthly_stats=monthly_stats,
-            workout_type_summary=workout_type_summary,
-            trends=trends,
-            milestones=milestone_summaries,
-            personal_records=personal_records,
-            cache_expires_at=datetime.now(timezone.utc) + timedelta(days=7)  # 快取 7 天
-        )
+    async def get_multi_year_summary(
+        self, user_id: str, start_year: int, end_year: int
+    ) -> MultiYearSummaryResponse:
+        """
+        取得多年度回顧比較 (各年度總計、類型統計、個人紀錄與相鄰年度差異)
 
-        # 儲存至資料庫
-        await self.annual_reviews_collection.delete_many({
-            "user_id": ObjectId(user_id),
-            "year": year
-        })
+        Args:
+            user_id: 使用者 ID
+            start_year: 起始年份
+            end_year: 結束年份 (含)
 
-        result = await self.annual_reviews_collection.insert_one(
-            annual_review.dict(by_alias=True)
+        Returns:
+            MultiYearSummaryResponse: 多年度比較
+        """
+        return await AnnualReviewService(self.db).get_multi_year_summary(
+            user_id, start_year, end_year
         )
-
-        annual_review.id = result.inserted_id
-        return AnnualReviewResponse(**annual_review.dict(by_alias=True))
-
-    async def _analyze_trends(self, monthly_stats: List[MonthlyUsageStats]) -> List[TrendAnalysis]:
-        """分析趨勢"""
-        if len(monthly_stats) < 2:
-            return []
-
-        trends = []
-
-        # 距離趨勢
-        distances = [s.total_distance_km for s in monthly_stats]
-        first_half_avg = sum(distances[:len(distances)//2]) / (len(distances)//2) if len(distances) > 1 else 0
-        second_half_avg = sum(distances[len(distances)//2:]) / (len(distances) - len(distances)//2)
-
-        if second_half_avg > first_half_avg * 1.1:
-            change_pct = ((second_half_avg - first_half_avg) / first_half_avg * 100) if first_half_avg > 0 else 0
-            trends.append(TrendAnalysis(
-                metric="distance",
-                trend="increasing",
-                change_percentage=change_pct,
-                insight=f"運動距離增加了 {change_pct:.1f}%"
-            ))
-        elif second_half_avg < first_half_avg * 0.9:
-            change_pct = ((first_half_avg - second_half_avg) / first_half_avg * 100) if first_half_avg > 0 else 0
-            trends.append(TrendAnalysis(
-                metric="distance",
-                trend="decreasing",
-                change_percentage=-change_pct,
-                insight=f"運動距離減少了 {change_pct:.1f}%"
-            ))
-        else:
-            trends.append(TrendAnalysis(
-                metric="distance",
-                trend="stable",
-                change_percentage=0.0,
-                insight="運動距離保持穩定"
-            ))
-
-        return trends
-
-    async def _calculate_personal_records(self, workouts: List[Dict]) -> Dict:
-        """計算個人紀錄"""
-        if not workouts:
-            return {}
-
-        records = {}
-
-        # 最長距離
-        max_distance = max((w.get("distance_km", 0.0) for w in workouts), default=0.0)
-        if max_distance > 0:
-            records["longest_distance_km"] = max_distance
-
-        # 最長時間
-        max_duration = max((w.get("duration_minutes", 0) for w in workouts), default=0)
-        if max_duration > 0:
-            records["longest_duration_minutes"] = max_duration
-
-        # 最快配速
-        paces = [w.get("pace_min_per_km", 0.0) for w in workouts if w.get("pace_min_per_km", 0.0) > 0]
-        if paces:
-            records["fastest_pace_min_per_km"] = min(paces)
-
-        return records
@@ -0,0 +1,256 @@
+"""
+Upload Service
+直傳儲存的上傳工作階段：API 只簽發 presigned PUT URL 與驗證上傳結果，
+圖片資料由客戶端直接上傳至儲存，衍生版本由 derivative pool worker 讀取原圖產生
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from bson import ObjectId
+
+from ..core.database import user_id_query
+from ..models import UploadSessionCreate, UploadSessionInDB, UploadSessionResponse
+from ..utils.image_derivatives import MAX_SOURCE_IMAGE_BYTES, image_derivative_generator
+
+# presigned URL 有效期
+UPLOAD_SESSION_TTL_SECONDS = 15 * 60
+
+# 各用途的圖片大小上限
+MAX_UPLOAD_BYTES = {
+    "activity_image": MAX_SOURCE_IMAGE_BYTES,
+    "avatar": 5 * 1024 * 1024,
+}
+
+# 各用途的衍生版本 object key 前綴
+UPLOAD_DERIVATIVE_PREFIXES = {
+    "activity_image": "activity-images",
+    "avatar": "avatars",
+}
+
+
+def upload_session_to_response(session: Dict, upload: Optional[Dict] = None) -> UploadSessionResponse:
+    """
+    將上傳工作階段文件轉換為 API 回應
+
+    Args:
+        session: 上傳工作階段文件
+        upload: presign_put 結果 (僅建立時提供)
+    """
+    return UploadSessionResponse(
+        session_id=str(session["_id"]),
+        purpose=session["purpose"],
+        status=session["status"],
+        upload_url=upload["url"] if upload else None,
+        upload_method=upload["method"] if upload else "PUT",
+        upload_headers=upload["headers"] if upload else {},
+        expires_at=session["expires_at"],
+        image_variants=session.get("image_variants"),
+        error=session.get("error"),
+    )
+
+
+class UploadService:
+    """上傳工作階段服務"""
+
+    def __init__(self, db: AsyncIOMotorDatabase, storage=None, images=None):
+        """
+        Args:
+            db: 資料庫連線
+            storage: 物件儲存 (預設為 r2_storage)
+            images: 衍生版本生成器 (預設為 image_derivative_generator)
+        """
+        if storage is None:
+            from ..core.storage import r2_storage
+            storage = r2_storage
+
+        self.db = db
+        self.upload_sessions = db.upload_sessions
+        self.activities = db.activities
+        self.users = db.users
+        self.storage = storage
+        self.images = images or image_derivative_generator
+
+    async def create_session(self, user_id: str, request: UploadSessionCreate) -> UploadSessionResponse:
+        """
+        建立上傳工作階段並簽發 presigned PUT URL
+
+        Args:
+            user_id: 使用者 ID
+            request: 用途、MIME type 與大小
+
+        Returns:
+            UploadSessionResponse: 含 upload_url 與必須帶上的 header
+
+        Raises:
+            ValueError: 圖片過大、動態不存在或無權限
+        """
+        max_bytes = MAX_UPLOAD_BYTES[request.purpose]
+        if request.content_length > max_bytes:
+            raise ValueError(f"Image exceeds the {max_bytes // (1024 * 1024)} MB limit")
+
+        activity_id = None
+        if request.purpose == "activity_image":
+            if not ObjectId.is_valid(request.activity_id):
+                raise ValueError("Activity not found")
+            activity_id = ObjectId(request.activity_id)
+            activity = await self.activities.find_one(
+                {"_id": activity_id, "user_id": user_id_query(user_id)},
+                projection={"_id": 1}
+            )
+            if not activity:
+                raise ValueError("Activity not found")
+
+        session_id = ObjectId()
+        now = datetime.now(timezone.utc)
+        session = UploadSessionInDB(
+            user_id=ObjectId(user_id),
+            purpose=request.purpose,
+            activity_id=activity_id,
+            object_key=f"uploads/{request.purpose}/{user_id}/{session_id}",
+            content_type=request.content_type,
+            content_length=request.content_length,
+            created_at=now,
+            expires_at=now + timedelta(seconds=UPLOAD_SESSION_TTL_SECONDS)
+        )
+
+        document = session.dict(by_alias=True)
+        document["_id"] = session_id
+        await self.upload_sessions.insert_one(document)
+
+        upload = self.storage.presign_put(
+            document["object_key"],
+            request.content_type,
+            request.content_length,
+            expires_in=UPLOAD_SESSION_TTL_SECONDS
+        )
+        return upload_session_to_response(document, upload)
+
+    async def get_session(self, session_id: str, user_id: str) -> Optional[UploadSessionResponse]:
+        """
+        取得上傳工作階段 (供客戶端輪詢處理狀態)
+
+        Args:
+            session_id: 工作階段 ID
+            user_id: 使用者 ID
+
+        Returns:
+            Optional[UploadSessionResponse]: 工作階段，不存在時為 None
+        """
+        session = await self.upload_sessions.find_one(
+            {"_id": ObjectId(session_id), "user_id": user_id_query(user_id)}
+        )
+        if not session:
+            return None
+        return upload_session_to_response(session)
+
+    async def complete_session(self, session_id: str, user_id: str) -> Optional[UploadSessionResponse]:
+        """
+        完成上傳：驗證物件存在且大小、MIME type 與簽發時一致，通過後標記為 processing
+
+        重複呼叫不會重新處理 (非 pending 狀態直接回傳目前狀態)
+
+        Args:
+            session_id: 工作階段 ID
+            user_id: 使用者 ID
+
+        Returns:
+            Optional[UploadSessionResponse]: 工作階段，不存在時為 None
+
+        Raises:
+            ValueError: 工作階段已過期、物件不存在或與簽發條件不符
+        """
+        session = await self.upload_sessions.find_one(
+            {"_id": ObjectId(session_id), "user_id": user_id_query(user_id)}
+        )
+        if not session:
+            return None
+        if session["status"] != "pending":
+            return upload_session_to_response(session)
+
+        stat = await self.storage.stat_object(session["object_key"])
+        if stat is None:
+            expires_at = session["expires_at"]
+            if expires_at.tzinfo is None:
+                expires_at = expires_at.replace(tzinfo=timezone.utc)
+            if expires_at < datetime.now(timezone.utc):
+                await self._fail(session["_id"], "Upload session expired")
+                raise ValueError("Upload session expired")
+            raise ValueError("Uploaded object not found")
+
+        if stat["size"] != session["content_length"] or stat["content_type"] != session["content_type"]:
+            await self.storage.delete_file(session["object_key"])
+            await self._fail(session["_id"], "Uploaded object does not match the upload session")
+            raise ValueError("Uploaded object does not match the upload session")
+
+        updated = await self.upload_sessions.find_one_and_update(
+            {"_id": session["_id"], "status": "pending"},
+            {"$set": {"status": "processing"}},
+            return_document=ReturnDocument.AFTER
+        )
+        return upload_session_to_response(updated or session)
+
+    async def process_session(self, session_id: str):
+        """
+        產生衍生版本並套用至動態配圖或頭像 (complete_session 後於背景執行)
+
+        Args:
+            session_id: 工作階段 ID
+        """
+        session = await self.upload_sessions.find_one({"_id": ObjectId(session_id), "status": "processing"})
+        if not session:
+            return
+
+        try:
+            image_variants = await self.images.create_from_object(
+                session["object_key"], UPLOAD_DERIVATIVE_PREFIXES[session["purpose"]]
+            )
+            await self._apply(session, image_variants)
+        except Exception as e:
+            await self._fail(session["_id"], str(e))
+            return
+
+        await self.upload_sessions.update_one(
+            {"_id": session["_id"]},
+            {"$set": {
+                "status": "ready",
+                "image_variants": image_variants,
+                "completed_at": datetime.now(timezone.utc),
+            }}
+        )
+
+    async def _apply(self, session: Dict, image_variants: Dict[str, Dict[str, str]]):
+        """
+        將衍生版本寫入動態或使用者頭像
+
+        工作階段的 user_id / activity_id 以字串儲存 (PyObjectId 序列化)，比對前轉回 ObjectId
+
+        Raises:
+            ValueError: 動態或使用者已不存在
+        """
+        now = datetime.now(timezone.utc)
+        if session["purpose"] == "activity_image":
+            result = await self.activities.update_one(
+                {"_id": ObjectId(str(session["activity_id"]))},
+                {"$set": {
+                    "image_url": image_variants["full"]["webp"],
+                    "image_variants": image_variants,
+                    "updated_at": now,
+                }}
+            )
+            if result.matched_count == 0:
+                raise ValueError("Activity not found")
+        else:
+            result = await self.users.update_one(
+                {"_id": ObjectId(str(session["user_id"]))},
+                {"$set": {"avatar_url": image_variants["thumb"]["webp"], "updated_at": now}}
+            )
+            if result.matched_count == 0:
+                raise ValueError("User not found")
+
+    async def _fail(self, session_id: ObjectId, error: str):
+        await self.upload_sessions.update_one(
+            {"_id": session_id},
+            {"$set": {"status": "failed", "error": error, "completed_at": datetime.now(timezone.utc)}}
+        )
@@ -6,10 +6,13 @@ Workout Service
 from datetime import datetime, timedelta, timezone
 from typing import List, Optional, Dict, Union
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
 from bson import ObjectId
 import csv
 import io
+import logging
 
+from ..core.database import user_id_query
 from ..models import (
     WorkoutInDB,
     WorkoutCreate,
@@ -18,17 +21,10 @@ from ..models import (
     WorkoutStatsResponse,
     WorkoutBatchCreate,
 )
+from .annual_review_service import AnnualReviewService
+from .challenge_service import ChallengeService
 
-
-def user_id_query(user_id: str) -> Dict:
-    """
-    Creates a query filter that matches user_id stored as either string or ObjectId.
-    This is needed because PyObjectId serializes to string when saving to MongoDB.
-    """
-    try:
-        return {"$in": [user_id, ObjectId(user_id)]}
-    except Exception:
-        return user_id
+logger = logging.getLogger(__name__)
 
 
 class WorkoutService:
@@ -39,6 +35,24 @@ class WorkoutService:
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
         self.workouts_collection = db.workouts
+        self.annual_review_service = AnnualReviewService(db)
+        self.challenge_service = ChallengeService(db)
+
+    async def _on_workout_changed(self, before: Optional[Dict], after: Optional[Dict]):
+        """
+        運動記錄異動後同步衍生資料 (年度回顧計數器、挑戰進度)
+
+        衍生資料失敗不影響運動記錄本身的寫入
+        """
+        try:
+            await self.annual_review_service.apply_workout_change(before, after)
+        except Exception:
+            logger.exception("Failed to apply workout change to annual review")
+
+        try:
+            await self.challenge_service.apply_workout_change(before, after)
+        except Exception:
+            logger.exception("Failed to apply workout change to challenge progress")
 
     async def create_workout(
         self, user_id: str, workout_data: WorkoutCreate
@@ -64,6 +78,7 @@ class WorkoutService:
         result = await self.workouts_collection.insert_one(workout_dict)
 
         workout.id = result.inserted_id
+        await self._on_workout_changed(None, {**workout_dict, "_id": result.inserted_id})
         return workout
 
     async def get_workout(self, workout_id: str, user_id: str) -> Optional[WorkoutInDB]:
@@ -173,20 +188,23 @@ class WorkoutService:
         update_data = workout_data.dict(exclude_unset=True)
         update_data["updated_at"] = datetime.now(timezone.utc)
 
-        result = await self.workouts_collection.find_one_and_update(
+        before = await self.workouts_collection.find_one_and_update(
             {
                 "_id": ObjectId(workout_id),
                 "user_id": user_id_query(user_id),
                 "is_deleted": False
             },
             {"$set": update_data},
-            return_document=True
+            return_document=ReturnDocument.BEFORE
         )
 
-        if not result:
+        if not before:
             return None
 
-        return WorkoutInDB(**result)
+        after = {**before, **update_data}
+        await self._on_workout_changed(before, after)
+
+        return WorkoutInDB(**after)
 
     async def soft_delete_workout(self, workout_id: str, user_id: str) -> bool:
         """
@@ -202,7 +220,7 @@ class WorkoutService:
         now = datetime.now(timezone.utc)
         delete_after = now + timedelta(days=self.SOFT_DELETE_RETENTION_DAYS)
 
-        result = await self.workouts_collection.update_one(
+        before = await self.workouts_collection.find_one_and_update(
             {
                 "_id": ObjectId(workout_id),
                 "user_id": user_id_query(user_id),
@@ -214,10 +232,15 @@ class WorkoutService:
                     "deleted_at": now,
                     "delete_after": delete_after
                 }
-            }
+            },
+            return_document=ReturnDocument.BEFORE
         )
 
-        return result.modified_count > 0
+        if not before:
+            return False
+
+        await self._on_workout_changed(before, None)
+        return True
 
     async def restore_workout(self, workout_id: str, user_id: str) -> Optional[WorkoutInDB]:
         """
@@ -230,25 +253,18 @@ class WorkoutService:
         Returns:
             Optional[WorkoutInDB]: 復原的運動記錄，超過期限回傳 None
         """
-        workout = await self.workouts_collection.find_one({
-            "_id": ObjectId(workout_id),
-            "user_id": user_id_query(user_id),
-            "is_deleted": True
-        })
-
-        if not workout:
-            return None
-
-        # 檢查是否超過復原期限
-        now = datetime.now(timezone.utc)
-        delete_after = workout.get("delete_after")
-
-        if delete_after and now > delete_after:
-            return None
-
-        # 復原
-        result = await self.workouts_collection.find_one_and_update(
-            {"_id": ObjectId(workout_id)},
+        # 條件式更新：並行的復原或垃圾桶清除只會有一方成功，變更 hook 只觸發一次
+        before = await self.workouts_collection.find_one_and_update(
+            {
+                "_id": ObjectId(workout_id),
+                "user_id": user_id_query(user_id),
+                "is_deleted": True,
+                # 未超過復原期限 (無 delete_after 的舊資料視為可復原)
+                "$or": [
+                    {"delete_after": None},
+                    {"delete_after": {"$gte": datetime.now(timezone.utc)}}
+                ]
+            },
             {
                 "$set": {
                     "is_deleted": False
@@ -258,10 +274,20 @@ class WorkoutService:
                     "delete_after": ""
                 }
             },
-            return_document=True
+            return_document=ReturnDocument.BEFORE
         )
 
-        return WorkoutInDB(**result)
+        if not before:
+            return None
+
+        after = {
+            key: value for key, value in before.items()
+            if key not in ("deleted_at", "delete_after")
+        }
+        after["is_deleted"] = False
+        await self._on_workout_changed(before, after)
+
+        return WorkoutInDB(**after)
 
     async def list_trash(self, user_id: str) -> List[Dict]:
         """
@@ -295,6 +321,19 @@ class WorkoutService:
 
         return trash_items
 
+    async def purge_expired_trash(self) -> int:
+        """
+        永久刪除超過保留期限的垃圾桶記錄 (排程工作，idx_trash_delete_after 索引)
+
+        Returns:
+            int: 刪除的記錄數量
+        """
+        result = await self.workouts_collection.delete_many({
+            "is_deleted": True,
+            "delete_after": {"$lt": datetime.now(timezone.utc)}
+        })
+        return result.deleted_count
+
     async def get_stats(
         self,
         user_id: str,
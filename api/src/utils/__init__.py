@@ -4,7 +4,9 @@ Utilities
 """
 
 from .fcm_helper import (
+    FCM_MULTICAST_MAX_TOKENS,
     FCMHelper,
+    FakeFCMHelper,
     fcm_helper,
     send_push_notification,
     send_multicast_notification,
@@ -12,20 +14,60 @@ from .fcm_helper import (
 
 from .share_card_generator import (
     ShareCardTemplate,
+    SHARE_CARD_RENDERER_VERSION,
+    ACHIEVEMENT_CARD_TEMPLATES,
     ShareCardGenerator,
+    ShareCardRenderPool,
     share_card_generator,
     generate_share_card,
 )
 
+from .process_pool import BoundedProcessPool
+
+from .image_derivatives import (
+    IMAGE_DERIVATIVE_SIZES,
+    ImageDerivativePool,
+    ImageDerivativeGenerator,
+    image_derivative_generator,
+    image_derivative_key,
+)
+
+from .user_search import (
+    name_grams,
+    query_grams,
+    search_fields,
+    email_prefix_filter,
+    name_filter,
+)
+
 __all__ = [
     # FCM Helper
+    "FCM_MULTICAST_MAX_TOKENS",
     "FCMHelper",
+    "FakeFCMHelper",
     "fcm_helper",
     "send_push_notification",
     "send_multicast_notification",
     # Share Card Generator
     "ShareCardTemplate",
+    "SHARE_CARD_RENDERER_VERSION",
+    "ACHIEVEMENT_CARD_TEMPLATES",
     "ShareCardGenerator",
+    "ShareCardRenderPool",
     "share_card_generator",
     "generate_share_card",
+    # Process Pool
+    "BoundedProcessPool",
+    # Image Derivatives
+    "IMAGE_DERIVATIVE_SIZES",
+    "ImageDerivativePool",
+    "ImageDerivativeGenerator",
+    "image_derivative_generator",
+    "image_derivative_key",
+    # User Search
+    "name_grams",
+    "query_grams",
+    "search_fields",
+    "email_prefix_filter",
+    "name_filter",
 ]
@@ -7,6 +7,9 @@ from typing import Optional, Dict, List
 from datetime import datetime, timezone
 import asyncio
 
+# FCM 單次 multicast 的 token 上限
+FCM_MULTICAST_MAX_TOKENS = 500
+
 
 class FCMHelper:
     """Firebase Cloud Messaging 輔助類"""
@@ -86,7 +89,8 @@ class FCMHelper:
                 token=token
             )
 
-            response = messaging.send(message)
+            # Admin SDK 為同步 HTTP 呼叫，移至執行緒避免阻塞 event loop
+            response = await asyncio.to_thread(messaging.send, message)
             print(f"Successfully sent message: {response}")
             return True
 
@@ -102,7 +106,7 @@ class FCMHelper:
         data: Optional[Dict] = None
     ) -> Dict:
         """
-        批次發送推播通知
+        批次發送推播通知 (單次最多 FCM_MULTICAST_MAX_TOKENS 個 token)
 
         Args:
             tokens: FCM 裝置 token 列表
@@ -111,13 +115,20 @@ class FCMHelper:
             data: 額外資料
 
         Returns:
-            Dict: 發送結果統計
+            Dict: 發送結果統計 {success_count, failure_count, failed_tokens, unregistered_tokens}
+                  unregistered_tokens 為已失效 (應刪除) 的 token，其餘失敗可重試
+
+        Raises:
+            ValueError: token 數量超過上限
         """
+        if len(tokens) > FCM_MULTICAST_MAX_TOKENS:
+            raise ValueError(f"At most {FCM_MULTICAST_MAX_TOKENS} tokens per multicast")
+
         if not self._initialized:
             await self.initialize()
 
         if not tokens:
-            return {"success_count": 0, "failure_count": 0}
+            return {"success_count": 0, "failure_count": 0, "failed_tokens": [], "unregistered_tokens": []}
 
         try:
             from firebase_admin import messaging
@@ -133,16 +144,33 @@ class FCMHelper:
                 tokens=tokens
             )
 
-            response = messaging.send_multicast(message)
+            # Admin SDK 為同步 HTTP 呼叫，移至執行緒避免阻塞 event loop
+            response = await asyncio.to_thread(messaging.send_each_for_multicast, message)
 
+            failed = [
+                (token, result.exception)
+                for token, result in zip(tokens, response.responses)
+                if not result.success
+            ]
             return {
                 "success_count": response.success_count,
-                "failure_count": response.failure_count
+                "failure_count": response.failure_count,
+                "failed_tokens": [token for token, _ in failed],
+                "unregistered_tokens": [
+                    token
+                    for token, error in failed
+                    if isinstance(error, (messaging.UnregisteredError, messaging.SenderIdMismatchError))
+                ]
             }
 
         except Exception as e:
             print(f"Failed to send multicast FCM: {e}")
-            return {"success_count": 0, "failure_count": len(tokens)}
+            return {
+                "success_count": 0,
+                "failure_count": len(tokens),
+                "failed_tokens": list(tokens),
+                "unregistered_tokens": []
+            }
 
     async def send_topic_notification(
         self,
@@ -247,8 +275,82 @@ class FCMHelper:
             return False
 
 
+class FakeFCMHelper(FCMHelper):
+    """
+    本機 FCM 替身 (開發與測試用)：不連線 Firebase，記錄所有發送內容
+
+    unregistered_tokens 模擬已失效的 token；failing_tokens 模擬暫時性失敗 (可重試)
+    """
+
+    def __init__(
+        self,
+        unregistered_tokens: Optional[List[str]] = None,
+        failing_tokens: Optional[List[str]] = None
+    ):
+        """
+        Args:
+            unregistered_tokens: 模擬已失效的裝置 token
+            failing_tokens: 模擬暫時性發送失敗的裝置 token
+        """
+        super().__init__()
+        self._initialized = True
+        self.unregistered_tokens = set(unregistered_tokens or [])
+        self.failing_tokens = set(failing_tokens or [])
+        self.sent: List[Dict] = []
+
+    async def send_notification(
+        self,
+        token: str,
+        title: str,
+        body: str,
+        data: Optional[Dict] = None,
+        image_url: Optional[str] = None
+    ) -> bool:
+        self.sent.append({"tokens": [token], "title": title, "body": body, "data": data or {}})
+        return token not in self.unregistered_tokens and token not in self.failing_tokens
+
+    async def send_multicast(
+        self,
+        tokens: List[str],
+        title: str,
+        body: str,
+        data: Optional[Dict] = None
+    ) -> Dict:
+        if len(tokens) > FCM_MULTICAST_MAX_TOKENS:
+            raise ValueError(f"At most {FCM_MULTICAST_MAX_TOKENS} tokens per multicast")
+
+        self.sent.append({"tokens": list(tokens), "title": title, "body": body, "data": data or {}})
+        unregistered = [token for token in tokens if token in self.unregistered_tokens]
+        failed = unregistered + [token for token in tokens if token in self.failing_tokens]
+        return {
+            "success_count": len(tokens) - len(failed),
+            "failure_count": len(failed),
+            "failed_tokens": failed,
+            "unregistered_tokens": unregistered
+        }
+
+    @property
+    def delivered_tokens(self) -> List[str]:
+        """已成功送達的 token"""
+        return [
+            token
+            for message in self.sent
+            for token in message["tokens"]
+            if token not in self.unregistered_tokens and token not in self.failing_tokens
+        ]
+
+
+def create_fcm_helper() -> FCMHelper:
+    """依設定建立 FCM helper (FCM_BACKEND=firebase | fake)"""
+    from ..core.config import settings
+
+    if settings.FCM_BACKEND == "fake":
+        return FakeFCMHelper()
+    return FCMHelper()
+
+
 # 單例實例
-fcm_helper = FCMHelper()
+fcm_helper = create_fcm_helper()
 
 
 # 便捷函數
@@ -0,0 +1,340 @@
+"""
+Image Derivatives
+圖片衍生版本：縮圖、動態牆、全尺寸三種尺寸，輸出 WebP (環境支援時另輸出 AVIF)
+
+解碼、縮放與編碼於 process pool 執行；衍生版本以內容雜湊決定 object key，
+相同圖片只產生與上傳一次。直傳儲存的圖片 (upload session) 由 worker 直接
+讀取原圖並寫入衍生版本，API process 不經手圖片資料
+"""
+
+from typing import Dict, Optional, Tuple
+from concurrent.futures import Executor
+from functools import lru_cache
+from io import BytesIO
+import asyncio
+import hashlib
+import time
+
+from .process_pool import BoundedProcessPool
+
+# 各尺寸長邊上限 (px)，依尺寸由大到小排列 (較小尺寸由上一個尺寸縮放)
+IMAGE_DERIVATIVE_SIZES = {
+    "full": 2048,
+    "feed": 1080,
+    "thumb": 320,
+}
+
+# 編碼參數
+IMAGE_ENCODE_OPTIONS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "avif": {"format": "AVIF", "quality": 55, "speed": 6},
+}
+
+IMAGE_CONTENT_TYPES = {
+    "webp": "image/webp",
+    "avif": "image/avif",
+}
+
+# 原始圖片大小上限
+MAX_SOURCE_IMAGE_BYTES = 20 * 1024 * 1024
+
+# Derivative pool 預設設定
+DEFAULT_DERIVATIVE_WORKERS = 2
+DEFAULT_DERIVATIVE_QUEUE_DEPTH = 16
+DEFAULT_DERIVATIVE_TIMEOUT_SECONDS = 30.0
+
+# 上傳順序最後的衍生版本：存在即代表整組衍生版本皆已上傳
+_COMPLETION_MARKER = ("full", "webp")
+
+# worker process 內的物件儲存 (首次使用時依設定建立)
+_worker_storage = None
+
+
+@lru_cache(maxsize=1)
+def image_derivative_formats() -> Tuple[str, ...]:
+    """
+    可輸出的衍生格式 (WebP 必定輸出；Pillow 支援 AVIF 時另輸出 AVIF)
+
+    Returns:
+        Tuple[str, ...]: 格式名稱
+    """
+    try:
+        import pillow_avif  # noqa: F401  Pillow < 11.2 的 AVIF plugin (optional)
+    except ImportError:
+        pass
+
+    from PIL import Image
+    Image.init()
+    return ("webp", "avif") if "AVIF" in Image.SAVE else ("webp",)
+
+
+def image_derivative_key(prefix: str, content_hash: str, size: str, fmt: str) -> str:
+    """內容定址的衍生版本 object key"""
+    return f"{prefix}/{content_hash[:2]}/{content_hash}/{size}.{fmt}"
+
+
+def render_image_derivatives(
+    source: bytes,
+    formats: Tuple[str, ...]
+) -> Tuple[Dict[str, Dict[str, bytes]], float]:
+    """
+    產生所有尺寸與格式的衍生版本 (derivative pool worker 進入點，module-level 以便 pickle)
+
+    Args:
+        source: 原始圖片資料
+        formats: 輸出格式
+
+    Returns:
+        Tuple[Dict, float]: ({size: {format: 圖片資料}}, 耗時毫秒)
+
+    Raises:
+        ValueError: 無法解碼的圖片
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    started = time.perf_counter()
+    try:
+        image = Image.open(BytesIO(source))
+        # JPEG 以 DCT 縮放解碼至接近最大輸出尺寸，減少解碼與縮放成本
+        largest = max(IMAGE_DERIVATIVE_SIZES.values())
+        image.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(image)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        raise ValueError(f"Unsupported image: {e}")
+
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    variant = image.convert("RGBA" if has_alpha else "RGB")
+
+    derivatives = {}
+    for size, max_edge in IMAGE_DERIVATIVE_SIZES.items():
+        # thumbnail 不會放大，且保持長寬比
+        variant = variant.copy()
+        variant.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+        encoded = {}
+        for fmt in formats:
+            buffer = BytesIO()
+            variant.save(buffer, **IMAGE_ENCODE_OPTIONS[fmt])
+            encoded[fmt] = buffer.getvalue()
+        derivatives[size] = encoded
+
+    return derivatives, (time.perf_counter() - started) * 1000
+
+
+def _get_worker_storage():
+    """取得 worker process 的物件儲存"""
+    global _worker_storage
+    if _worker_storage is None:
+        from ..core.storage import create_object_storage
+        _worker_storage = create_object_storage()
+    return _worker_storage
+
+
+def process_stored_image(
+    source_key: str,
+    prefix: str,
+    formats: Tuple[str, ...]
+) -> Tuple[str, float]:
+    """
+    讀取已上傳的原圖，產生並寫入衍生版本 (derivative pool worker 進入點)
+
+    Args:
+        source_key: 原圖 object key
+        prefix: 衍生版本 object key 前綴
+        formats: 輸出格式
+
+    Returns:
+        Tuple[str, float]: (原圖內容雜湊, 耗時毫秒)
+
+    Raises:
+        ValueError: 無法解碼的圖片
+    """
+    started = time.perf_counter()
+    storage = _get_worker_storage()
+    source = storage._get_object(source_key)
+    content_hash = hashlib.sha256(source).hexdigest()
+
+    if not storage._head_object(image_derivative_key(prefix, content_hash, *_COMPLETION_MARKER)):
+        derivatives, _ = render_image_derivatives(source, formats)
+        keys = [
+            (size, fmt)
+            for size in derivatives
+            for fmt in derivatives[size]
+            if (size, fmt) != _COMPLETION_MARKER
+        ]
+        for size, fmt in keys + [_COMPLETION_MARKER]:
+            storage._put_object(
+                image_derivative_key(prefix, content_hash, size, fmt),
+                derivatives[size][fmt],
+                IMAGE_CONTENT_TYPES[fmt],
+                {"content-hash": content_hash}
+            )
+
+    return content_hash, (time.perf_counter() - started) * 1000
+
+
+class ImageDerivativePool(BoundedProcessPool):
+    """圖片衍生版本 process pool"""
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_DERIVATIVE_WORKERS,
+        max_queue_depth: int = DEFAULT_DERIVATIVE_QUEUE_DEPTH,
+        timeout_seconds: float = DEFAULT_DERIVATIVE_TIMEOUT_SECONDS,
+        executor: Optional[Executor] = None
+    ):
+        """
+        Args:
+            max_workers: worker process 數量
+            max_queue_depth: 進行中與等待中的工作上限
+            timeout_seconds: 單張圖片處理等待上限 (秒)
+            executor: 自訂 executor (預設於首次使用時建立 ProcessPoolExecutor)
+        """
+        super().__init__(
+            service_name="image_derivatives",
+            max_workers=max_workers,
+            max_queue_depth=max_queue_depth,
+            timeout_seconds=timeout_seconds,
+            executor=executor
+        )
+
+    async def render(self, source: bytes, formats: Tuple[str, ...]) -> Dict[str, Dict[str, bytes]]:
+        """
+        於 worker process 產生衍生版本
+
+        Args:
+            source: 原始圖片資料
+            formats: 輸出格式
+
+        Returns:
+            Dict: {size: {format: 圖片資料}}
+
+        Raises:
+            ValueError: 無法解碼的圖片
+            ExternalServiceError: 佇列已滿、逾時或 worker 異常終止
+        """
+        return await self.run("derivatives", render_image_derivatives, source, formats)
+
+    async def process_stored(self, source_key: str, prefix: str, formats: Tuple[str, ...]) -> str:
+        """
+        於 worker process 讀取已上傳的原圖並寫入衍生版本
+
+        Args:
+            source_key: 原圖 object key
+            prefix: 衍生版本 object key 前綴
+            formats: 輸出格式
+
+        Returns:
+            str: 原圖內容雜湊
+
+        Raises:
+            ValueError: 無法解碼的圖片
+            ExternalServiceError: 佇列已滿、逾時或 worker 異常終止
+        """
+        return await self.run("stored_derivatives", process_stored_image, source_key, prefix, formats)
+
+
+class ImageDerivativeGenerator:
+    """產生並上傳圖片衍生版本"""
+
+    def __init__(self, storage=None, pool: Optional[ImageDerivativePool] = None):
+        """
+        Args:
+            storage: 物件儲存 (預設為 r2_storage)
+            pool: 衍生版本 process pool (預設建立新的 pool)
+        """
+        self._storage = storage
+        self.pool = pool or ImageDerivativePool()
+
+    @property
+    def storage(self):
+        if self._storage is None:
+            from ..core.storage import r2_storage
+            self._storage = r2_storage
+        return self._storage
+
+    def variant_urls(self, prefix: str, content_hash: str) -> Dict[str, Dict[str, str]]:
+        """
+        衍生版本 URL (由內容雜湊決定，不需查詢儲存)
+
+        Returns:
+            Dict: {size: {format: url}}
+        """
+        return {
+            size: {
+                fmt: self.storage.public_url(image_derivative_key(prefix, content_hash, size, fmt))
+                for fmt in image_derivative_formats()
+            }
+            for size in IMAGE_DERIVATIVE_SIZES
+        }
+
+    async def create(
+        self,
+        source: bytes,
+        prefix: str,
+        content_hash: Optional[str] = None
+    ) -> Dict[str, Dict[str, str]]:
+        """
+        產生並上傳所有衍生版本；已上傳過的圖片直接回傳 URL
+
+        Args:
+            source: 原始圖片資料
+            prefix: object key 前綴 (e.g., "activity-images")
+            content_hash: 內容雜湊 (預設為原始圖片的 SHA-256)
+
+        Returns:
+            Dict: {size: {format: url}}
+
+        Raises:
+            ValueError: 無法解碼的圖片
+            ExternalServiceError: 衍生版本處理失敗
+        """
+        content_hash = content_hash or hashlib.sha256(source).hexdigest()
+        variants = self.variant_urls(prefix, content_hash)
+
+        marker_key = image_derivative_key(prefix, content_hash, *_COMPLETION_MARKER)
+        if await self.storage.object_exists(marker_key):
+            return variants
+
+        formats = image_derivative_formats()
+        derivatives = await self.pool.render(source, formats)
+
+        def upload(size: str, fmt: str):
+            return self.storage.upload_file(
+                BytesIO(derivatives[size][fmt]),
+                image_derivative_key(prefix, content_hash, size, fmt),
+                content_type=IMAGE_CONTENT_TYPES[fmt],
+                metadata={"content-hash": content_hash}
+            )
+
+        await asyncio.gather(*[
+            upload(size, fmt)
+            for size in derivatives
+            for fmt in derivatives[size]
+            if (size, fmt) != _COMPLETION_MARKER
+        ])
+        await upload(*_COMPLETION_MARKER)
+
+        return variants
+
+    async def create_from_object(self, source_key: str, prefix: str) -> Dict[str, Dict[str, str]]:
+        """
+        由已上傳至儲存的原圖產生衍生版本 (讀取與寫入皆於 worker process 進行)
+
+        Args:
+            source_key: 原圖 object key
+            prefix: 衍生版本 object key 前綴
+
+        Returns:
+            Dict: {size: {format: url}}
+
+        Raises:
+            ValueError: 無法解碼的圖片
+            ExternalServiceError: 衍生版本處理失敗
+        """
+        content_hash = await self.pool.process_stored(source_key, prefix, image_derivative_formats())
+        return self.variant_urls(prefix, content_hash)
+
+
+# 單例實例
+image_derivative_generator = ImageDerivativeGenerator()
@@ -0,0 +1,172 @@
+"""
+Bounded Process Pool
+CPU 密集工作 (圖片繪製、編碼) 的 process pool，避免阻塞 event loop
+
+- 佇列深度上限：進行中與等待中的工作達上限時直接拒絕，避免請求堆積
+- 逾時：等待超過 timeout_seconds 即回傳錯誤 (已開始的工作仍會在 worker 中完成，
+  並持續佔用佇列名額直到結束)
+"""
+
+from typing import Any, Callable, Dict, Optional
+from collections import defaultdict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import multiprocessing
+
+from ..core.error_handlers import ExternalServiceError
+
+
+class BoundedProcessPool:
+    """
+    有佇列深度上限與逾時的 process pool
+
+    工作函式須為 module-level (以便 pickle)，並回傳 (結果, worker 內耗時毫秒)
+    """
+
+    def __init__(
+        self,
+        service_name: str,
+        max_workers: int,
+        max_queue_depth: int,
+        timeout_seconds: float,
+        executor: Optional[Executor] = None,
+        initializer: Optional[Callable[[], None]] = None
+    ):
+        """
+        Args:
+            service_name: 錯誤回報使用的服務名稱
+            max_workers: worker process 數量
+            max_queue_depth: 進行中與等待中的工作上限
+            timeout_seconds: 單次工作等待上限 (秒)
+            executor: 自訂 executor (預設於首次使用時建立 ProcessPoolExecutor)
+            initializer: worker process 啟動時執行 (預先載入資源)
+        """
+        self.service_name = service_name
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        self.timeout_seconds = timeout_seconds
+        self.initializer = initializer
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._pending = 0
+        self._run_stats = defaultdict(lambda: {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+
+    @property
+    def pending(self) -> int:
+        """進行中與等待中的工作數量"""
+        return self._pending
+
+    def _get_executor(self) -> Executor:
+        """取得 executor，使用 spawn 避免 fork 複製 event loop 與資料庫連線狀態"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=self.initializer
+            )
+        return self._executor
+
+    def _error(self, message: str, reason: str, **details) -> ExternalServiceError:
+        return ExternalServiceError(
+            service_name=self.service_name,
+            message=message,
+            details={"reason": reason, **details}
+        )
+
+    async def run(self, label: str, func: Callable[..., Any], *args) -> Any:
+        """
+        於 worker process 執行工作
+
+        Args:
+            label: 統計分類 (例如模板名稱)
+            func: module-level 工作函式，回傳 (結果, 耗時毫秒)
+            *args: 工作函式參數
+
+        Returns:
+            Any: 工作結果
+
+        Raises:
+            ExternalServiceError: 佇列已滿、逾時或 worker 異常終止
+        """
+        if self._pending >= self.max_queue_depth:
+            raise self._error(
+                f"{self.service_name} queue is full",
+                "queue_full",
+                max_queue_depth=self.max_queue_depth
+            )
+
+        loop = asyncio.get_running_loop()
+        try:
+            future = self._get_executor().submit(func, *args)
+        except BrokenProcessPool:
+            self._reset_executor()
+            raise self._error(f"{self.service_name} pool is unavailable", "broken_pool")
+
+        # 以實際工作完成時間釋放佇列名額 (逾時後仍在執行的工作持續佔用)
+        self._pending += 1
+        future.add_done_callback(lambda _: self._release_from(loop))
+
+        try:
+            result, elapsed_ms = await asyncio.wait_for(
+                asyncio.wrap_future(future), timeout=self.timeout_seconds
+            )
+        except asyncio.TimeoutError:
+            raise self._error(
+                f"{self.service_name} timed out",
+                "timeout",
+                timeout_seconds=self.timeout_seconds
+            )
+        except BrokenProcessPool:
+            self._reset_executor()
+            raise self._error(f"{self.service_name} pool is unavailable", "broken_pool")
+
+        self._record_run(label, elapsed_ms)
+        return result
+
+    def _record_run(self, label: str, elapsed_ms: float):
+        """記錄單次工作在 worker 中的耗時"""
+        stats = self._run_stats[label]
+        stats["count"] += 1
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+
+    def get_run_stats(self) -> Dict[str, Dict]:
+        """
+        各分類耗時統計
+
+        Returns:
+            Dict: {label: {count, avg_ms, max_ms}}
+        """
+        return {
+            label: {
+                "count": stats["count"],
+                "avg_ms": round(stats["total_ms"] / stats["count"], 2),
+                "max_ms": round(stats["max_ms"], 2),
+            }
+            for label, stats in self._run_stats.items()
+        }
+
+    def _release(self):
+        """釋放一個佇列名額"""
+        self._pending -= 1
+
+    def _release_from(self, loop: asyncio.AbstractEventLoop):
+        """於 executor 執行緒完成時，回到 event loop 釋放名額"""
+        try:
+            loop.call_soon_threadsafe(self._release)
+        except RuntimeError:
+            # event loop 已關閉
+            self._release()
+
+    def _reset_executor(self):
+        """worker 異常終止後捨棄 executor，下次使用時重建"""
+        if self._owns_executor and self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def shutdown(self, wait: bool = True):
+        """關閉 worker processes (應用程式結束時呼叫)"""
+        if self._owns_executor and self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
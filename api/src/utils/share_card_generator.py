@@ -1,12 +1,26 @@
 """
 Share Card Generator (T275)
 分享卡片生成器 - 5 種模板
+
+Pillow 繪圖與 PNG 編碼為 CPU 密集工作，於獨立的 process pool 執行，
+避免阻塞 event loop
 """
 
-from typing import Optional, Dict
+from typing import Optional, Dict, Tuple
 from datetime import datetime
 from io import BytesIO
-import asyncio
+from concurrent.futures import Executor
+import time
+
+from .process_pool import BoundedProcessPool
+
+# 繪製結果版本：模板版面或繪製邏輯變更時調升，使內容定址快取失效
+SHARE_CARD_RENDERER_VERSION = 2
+
+# Render pool 預設設定
+DEFAULT_RENDER_WORKERS = 2
+DEFAULT_RENDER_QUEUE_DEPTH = 16
+DEFAULT_RENDER_TIMEOUT_SECONDS = 10.0
 
 
 class ShareCardTemplate:
@@ -18,6 +32,71 @@ class ShareCardTemplate:
     ANNUAL = "annual"            # 年度回顧
 
 
+# 成就分享卡片模板 (ShareCardCreateRequest.template) 對應的繪製模板
+ACHIEVEMENT_CARD_TEMPLATES = {
+    "basic": ShareCardTemplate.MINIMAL,
+    "fireworks": ShareCardTemplate.ACHIEVEMENT,
+    "epic": ShareCardTemplate.ACHIEVEMENT,
+}
+
+
+class ShareCardAssets:
+    """
+    模板素材快取 (每個 process 只載入一次)
+
+    字體與各模板的靜態底圖於首次使用 (或 worker 啟動時 preload) 建立，
+    每張卡片只需複製底圖
+    """
+
+    FONT_PATHS = {
+        "large": ("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 48),
+        "medium": ("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 32),
+        "small": ("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 24),
+    }
+
+    _fonts: Optional[Dict] = None
+    _base_layers: Dict = {}
+
+    @classmethod
+    def fonts(cls) -> Dict:
+        """取得字體 (large, medium, small)"""
+        if cls._fonts is None:
+            from PIL import ImageFont
+
+            # 載入字體（使用系統預設字體或下載的字體）
+            try:
+                cls._fonts = {
+                    name: ImageFont.truetype(path, size)
+                    for name, (path, size) in cls.FONT_PATHS.items()
+                }
+            except OSError:
+                default_font = ImageFont.load_default()
+                cls._fonts = {name: default_font for name in cls.FONT_PATHS}
+        return cls._fonts
+
+    @classmethod
+    def base_layer(cls, template: str):
+        """取得模板靜態底圖的副本 (可直接繪製)"""
+        if template not in cls._base_layers:
+            cls._base_layers[template] = ShareCardGenerator.draw_base_layer(template, cls.fonts())
+        return cls._base_layers[template].copy()
+
+    @classmethod
+    def preload(cls):
+        """預先載入字體並繪製所有模板底圖 (render pool worker initializer)"""
+        try:
+            for template in ShareCardGenerator.TEMPLATES:
+                cls.base_layer(template)
+        except ImportError:
+            pass
+
+    @classmethod
+    def clear(cls):
+        """清除快取"""
+        cls._fonts = None
+        cls._base_layers = {}
+
+
 class ShareCardGenerator:
     """分享卡片生成器"""
 
@@ -60,14 +139,16 @@ class ShareCardGenerator:
         }
     }
 
-    def __init__(self, r2_client=None):
+    def __init__(self, storage=None, render_pool: Optional["ShareCardRenderPool"] = None):
         """
         初始化分享卡片生成器
 
         Args:
-            r2_client: Cloudflare R2 客戶端
+            storage: 物件儲存 (core.storage.ObjectStorage)
+            render_pool: 卡片繪製 process pool (預設建立新的 pool)
         """
-        self.r2_client = r2_client
+        self.storage = storage
+        self.render_pool = render_pool or ShareCardRenderPool()
 
     async def generate_card(
         self,
@@ -77,7 +158,7 @@ class ShareCardGenerator:
         avatar_url: Optional[str] = None
     ) -> BytesIO:
         """
-        生成分享卡片
+        生成分享卡片 (於 render pool 繪製，不阻塞 event loop)
 
         Args:
             template: 模板類型
@@ -87,62 +168,103 @@ class ShareCardGenerator:
 
         Returns:
             BytesIO: 圖片二進位資料
+
+        Raises:
+            ExternalServiceError: 繪製佇列已滿或繪製逾時
         """
-        template_config = self.TEMPLATES.get(template, self.TEMPLATES[ShareCardTemplate.MINIMAL])
+        png = await self.render_pool.render(template, data, user_name)
+        return BytesIO(png)
 
-        # 使用 Pillow 生成圖片
-        try:
-            from PIL import Image, ImageDraw, ImageFont
+    @classmethod
+    def render_png(cls, template: str, data: Dict, user_name: str) -> bytes:
+        """
+        繪製分享卡片並編碼為 PNG (同步，於 render pool worker 中執行)
 
-            # 建立畫布
-            width = template_config["width"]
-            height = template_config["height"]
-            bg_color = template_config["bg_color"]
+        Args:
+            template: 模板類型
+            data: 卡片資料
+            user_name: 使用者名稱
 
-            img = Image.new("RGB", (width, height), bg_color)
+        Returns:
+            bytes: PNG 圖片資料 (Pillow 未安裝時為空)
+        """
+        base_template = template if template in cls.TEMPLATES else ShareCardTemplate.MINIMAL
+        template_config = cls.TEMPLATES[base_template]
+
+        try:
+            from PIL import ImageDraw
+
+            # 複製預先繪製的靜態底圖，只繪製動態文字
+            img = ShareCardAssets.base_layer(base_template)
             draw = ImageDraw.Draw(img)
 
-            # 載入字體（使用系統預設字體或下載的字體）
-            try:
-                font_large = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 48)
-                font_medium = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 32)
-                font_small = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 24)
-            except:
-                font_large = ImageFont.load_default()
-                font_medium = ImageFont.load_default()
-                font_small = ImageFont.load_default()
+            fonts = ShareCardAssets.fonts()
+            font_large = fonts["large"]
+            font_medium = fonts["medium"]
+            font_small = fonts["small"]
 
+            width = template_config["width"]
+            height = template_config["height"]
             text_color = template_config["text_color"]
             accent_color = template_config["accent_color"]
 
             # 根據模板類型繪製內容
             if template == ShareCardTemplate.MINIMAL:
-                await self._draw_minimal_template(draw, data, user_name, width, height, font_large, font_medium, text_color, accent_color)
+                cls._draw_minimal_template(draw, data, user_name, width, height, font_large, font_medium, text_color, accent_color)
             elif template == ShareCardTemplate.ACHIEVEMENT:
-                await self._draw_achievement_template(draw, data, user_name, width, height, font_large, font_medium, font_small, text_color, accent_color)
+                cls._draw_achievement_template(draw, data, user_name, width, height, font_large, font_medium, font_small, text_color, accent_color)
             elif template == ShareCardTemplate.WORKOUT:
-                await self._draw_workout_template(draw, data, user_name, width, height, font_large, font_medium, font_small, text_color, accent_color)
+                cls._draw_workout_template(draw, data, user_name, width, height, font_large, font_medium, font_small, text_color, accent_color)
             elif template == ShareCardTemplate.STREAK:
-                await self._draw_streak_template(draw, data, user_name, width, height, font_large, font_medium, text_color, accent_color)
+                cls._draw_streak_template(draw, data, user_name, width, height, font_large, font_medium, text_color, accent_color)
             elif template == ShareCardTemplate.ANNUAL:
-                await self._draw_annual_template(draw, data, user_name, width, height, font_large, font_medium, font_small, text_color, accent_color)
+                cls._draw_annual_template(draw, data, user_name, width, height, font_large, font_medium, font_small, text_color, accent_color)
 
-            # 添加 MotionStory Logo/浮水印
-            draw.text((width - 150, height - 30), "MotionStory", fill=text_color, font=font_small)
-
-            # 轉換為 BytesIO
+            # 編碼為 PNG
             buffer = BytesIO()
             img.save(buffer, format="PNG", optimize=True)
-            buffer.seek(0)
 
-            return buffer
+            return buffer.getvalue()
 
         except ImportError:
             # Pillow 未安裝時的 fallback
             print("Pillow not installed, returning placeholder")
-            return BytesIO(b"")
+            return b""
+
+    @classmethod
+    def draw_base_layer(cls, template: str, fonts: Dict):
+        """
+        繪製模板的靜態底圖 (背景、固定標籤、MotionStory 浮水印)
+
+        Args:
+            template: 模板類型
+            fonts: ShareCardAssets.fonts() 載入的字體
+
+        Returns:
+            Image: 靜態底圖
+        """
+        from PIL import Image, ImageDraw
+
+        template_config = cls.TEMPLATES[template]
+        width = template_config["width"]
+        height = template_config["height"]
+        text_color = template_config["text_color"]
+
+        img = Image.new("RGB", (width, height), template_config["bg_color"])
+        draw = ImageDraw.Draw(img)
+
+        if template == ShareCardTemplate.ACHIEVEMENT:
+            draw.text((width // 2 - 100, 50), "🎉", font=fonts["large"])
+        elif template == ShareCardTemplate.STREAK:
+            draw.text((width // 2 - 60, 250), "天連續運動", fill=text_color, font=fonts["medium"])
 
-    async def _draw_minimal_template(self, draw, data, user_name, width, height, font_large, font_medium, text_color, accent_color):
+        # 添加 MotionStory Logo/浮水印
+        draw.text((width - 150, height - 30), "MotionStory", fill=text_color, font=fonts["small"])
+
+        return img
+
+    @staticmethod
+    def _draw_minimal_template(draw, data, user_name, width, height, font_large, font_medium, text_color, accent_color):
         """繪製極簡模板"""
         title = data.get("title", "運動成就")
         value = data.get("value", "")
@@ -160,15 +282,15 @@ class ShareCardGenerator:
         # 使用者名稱
         draw.text((50, height - 80), f"by {user_name}", fill=text_color, font=font_medium)
 
-    async def _draw_achievement_template(self, draw, data, user_name, width, height, font_large, font_medium, font_small, text_color, accent_color):
+    @staticmethod
+    def _draw_achievement_template(draw, data, user_name, width, height, font_large, font_medium, font_small, text_color, accent_color):
         """繪製成就慶祝模板"""
         title = data.get("title", "成就解鎖")
         achievement_name = data.get("achievement_name", "")
         description = data.get("description", "")
         achieved_at = data.get("achieved_at", "")
 
-        # 慶祝標題
-        draw.text((width // 2 - 100, 50), "🎉", font=font_large)
+        # 慶祝標題 (🎉 位於靜態底圖)
         draw.text((width // 2 - 100, 120), title, fill=accent_color, font=font_large)
 
         # 成就名稱
@@ -184,7 +306,8 @@ class ShareCardGenerator:
         # 使用者
         draw.text((50, height - 60), user_name, fill=text_color, font=font_medium)
 
-    async def _draw_workout_template(self, draw, data, user_name, width, height, font_large, font_medium, font_small, text_color, accent_color):
+    @staticmethod
+    def _draw_workout_template(draw, data, user_name, width, height, font_large, font_medium, font_small, text_color, accent_color):
         """繪製運動記錄模板"""
         workout_type = data.get("workout_type", "運動")
         distance = data.get("distance_km", 0)
@@ -220,15 +343,15 @@ class ShareCardGenerator:
         # 日期和使用者
         draw.text((50, height - 80), f"{date} | {user_name}", fill=text_color, font=font_small)
 
-    async def _draw_streak_template(self, draw, data, user_name, width, height, font_large, font_medium, text_color, accent_color):
+    @staticmethod
+    def _draw_streak_template(draw, data, user_name, width, height, font_large, font_medium, text_color, accent_color):
         """繪製連續天數模板"""
         streak_days = data.get("streak_days", 0)
 
         # 大數字
         draw.text((width // 2 - 80, 150), str(streak_days), fill=accent_color, font=font_large)
 
-        # 標籤
-        draw.text((width // 2 - 60, 250), "天連續運動", fill=text_color, font=font_medium)
+        # 「天連續運動」標籤位於靜態底圖
 
         # 鼓勵語
         if streak_days >= 100:
@@ -245,7 +368,8 @@ class ShareCardGenerator:
         # 使用者
         draw.text((50, height - 60), user_name, fill=text_color, font=font_medium)
 
-    async def _draw_annual_template(self, draw, data, user_name, width, height, font_large, font_medium, font_small, text_color, accent_color):
+    @staticmethod
+    def _draw_annual_template(draw, data, user_name, width, height, font_large, font_medium, font_small, text_color, accent_color):
         """繪製年度回顧模板"""
         year = data.get("year", datetime.now().year)
         total_workouts = data.get("total_workouts", 0)
@@ -278,40 +402,97 @@ class ShareCardGenerator:
     async def upload_to_r2(
         self,
         image_buffer: BytesIO,
-        key: str,
-        bucket: str = "motionstory-share-cards"
+        key: str
     ) -> Optional[str]:
         """
-        上傳圖片到 Cloudflare R2
+        上傳圖片到 Cloudflare R2 (於儲存 thread pool 執行，不阻塞 event loop)
 
         Args:
             image_buffer: 圖片二進位資料
             key: 儲存路徑
-            bucket: R2 bucket 名稱
 
         Returns:
             str: 圖片 URL，或 None（上傳失敗）
         """
-        if not self.r2_client:
-            print("R2 client not configured")
+        if not self.storage:
+            print("R2 storage not configured")
             return None
 
         try:
-            self.r2_client.upload_fileobj(
-                image_buffer,
-                bucket,
-                key,
-                ExtraArgs={"ContentType": "image/png"}
-            )
-
-            # 返回公開 URL
-            return f"https://r2.motionstory.app/{key}"
+            return await self.storage.upload_file(image_buffer, key, content_type="image/png")
 
         except Exception as e:
             print(f"Failed to upload to R2: {e}")
             return None
 
 
+def render_share_card(template: str, data: Dict, user_name: str) -> Tuple[bytes, float]:
+    """
+    Render pool worker 進入點 (module-level 以便 pickle)
+
+    Returns:
+        Tuple[bytes, float]: (PNG 圖片資料, 繪製耗時毫秒)
+    """
+    started = time.perf_counter()
+    png = ShareCardGenerator.render_png(template, data, user_name)
+    return png, (time.perf_counter() - started) * 1000
+
+
+class ShareCardRenderPool(BoundedProcessPool):
+    """分享卡片繪製 process pool (worker 啟動時預先載入字型與模板底圖)"""
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_RENDER_WORKERS,
+        max_queue_depth: int = DEFAULT_RENDER_QUEUE_DEPTH,
+        timeout_seconds: float = DEFAULT_RENDER_TIMEOUT_SECONDS,
+        executor: Optional[Executor] = None
+    ):
+        """
+        初始化 render pool
+
+        Args:
+            max_workers: worker process 數量
+            max_queue_depth: 進行中與等待中的繪製工作上限
+            timeout_seconds: 單次繪製等待上限 (秒)
+            executor: 自訂 executor (預設於首次使用時建立 ProcessPoolExecutor)
+        """
+        super().__init__(
+            service_name="share_card_renderer",
+            max_workers=max_workers,
+            max_queue_depth=max_queue_depth,
+            timeout_seconds=timeout_seconds,
+            executor=executor,
+            initializer=ShareCardAssets.preload
+        )
+
+    async def render(self, template: str, data: Dict, user_name: str) -> bytes:
+        """
+        於 worker process 繪製分享卡片
+
+        Args:
+            template: 模板類型
+            data: 卡片資料
+            user_name: 使用者名稱
+
+        Returns:
+            bytes: PNG 圖片資料
+
+        Raises:
+            ExternalServiceError: 繪製佇列已滿、繪製逾時或 worker 異常終止
+        """
+        return await self.run(template, render_share_card, template, data, user_name)
+
+    def get_render_stats(self) -> Dict[str, Dict]:
+        """
+        各模板繪製耗時統計
+
+        Returns:
+            Dict: {template: {count, avg_ms, max_ms}}
+        """
+        return self.get_run_stats()
+
+
 # 單例實例
 share_card_generator = ShareCardGenerator()
 
@@ -0,0 +1,138 @@
+"""
+User Search Terms
+使用者搜尋索引欄位：正規化 Email (前綴查詢) 與顯示名稱 n-gram (支援中日韓姓名)
+
+- email_normalized: NFKC + casefold 後的 Email，以 idx_email_normalized 做錨定前綴範圍查詢
+- name_grams: 顯示名稱的索引詞 (idx_name_grams 多鍵索引)
+  - 拉丁字母/數字詞：詞首前綴 (edge n-gram)，"Alice Chen" 可由 "ali"、"che" 找到
+  - 中日韓字元：單字與相鄰二字 (bigram)，"王小明" 可由 "小明"、"王" 找到
+
+查詢只使用索引範圍與等值比對，不將使用者輸入放入 $regex
+"""
+
+import re
+import sys
+import unicodedata
+from typing import Dict, List, Optional
+
+# 拉丁詞前綴長度上限 (更長的查詢截斷為此長度，結果由其他詞與上限筆數限制)
+MAX_PREFIX_LENGTH = 20
+
+_CJK_RANGES = (
+    "\u3040-\u30ff"  # 平假名、片假名
+    "\u3400-\u4dbf"  # CJK 擴充 A
+    "\u4e00-\u9fff"  # CJK 統一表意文字
+    "\uac00-\ud7af"  # 韓文音節
+    "\uf900-\ufaff"  # CJK 相容表意文字
+)
+_SEGMENT_PATTERN = re.compile(rf"([{_CJK_RANGES}]+)|([^\W_{_CJK_RANGES}]+)")
+
+
+def normalize_text(value: str) -> str:
+    """NFKC 正規化 (全形轉半形) 並轉為小寫"""
+    return unicodedata.normalize("NFKC", value or "").casefold().strip()
+
+
+def _segments(value: str):
+    """切分為 (片段, 是否為中日韓) 序列，其他字元視為分隔"""
+    for match in _SEGMENT_PATTERN.finditer(normalize_text(value)):
+        cjk, word = match.groups()
+        yield (cjk, True) if cjk else (word, False)
+
+
+def name_grams(display_name: str) -> List[str]:
+    """
+    顯示名稱的索引詞
+
+    Args:
+        display_name: 顯示名稱
+
+    Returns:
+        List[str]: 排序後不重複的索引詞
+    """
+    grams = set()
+    for segment, is_cjk in _segments(display_name):
+        if is_cjk:
+            grams.update(segment)
+            grams.update(segment[i:i + 2] for i in range(len(segment) - 1))
+        else:
+            grams.update(segment[:n] for n in range(1, min(len(segment), MAX_PREFIX_LENGTH) + 1))
+    return sorted(grams)
+
+
+def query_grams(query: str) -> List[str]:
+    """
+    查詢字串須全部命中的索引詞 (較長者在前，讓 $all 以最具選擇性的詞走索引)
+
+    Args:
+        query: 使用者輸入
+
+    Returns:
+        List[str]: 索引詞；無可搜尋字元時為空列表
+    """
+    grams = set()
+    for segment, is_cjk in _segments(query):
+        if not is_cjk:
+            grams.add(segment[:MAX_PREFIX_LENGTH])
+        elif len(segment) == 1:
+            grams.add(segment)
+        else:
+            grams.update(segment[i:i + 2] for i in range(len(segment) - 1))
+    return sorted(grams, key=lambda gram: (-len(gram), gram))
+
+
+def search_fields(email: str, display_name: str) -> Dict:
+    """使用者文件的搜尋欄位 (建立使用者與修改顯示名稱時寫入)"""
+    return {
+        "email_normalized": normalize_text(email),
+        "name_grams": name_grams(display_name),
+    }
+
+
+def _prefix_upper_bound(prefix: str) -> Optional[str]:
+    """
+    大於所有以 prefix 開頭字串的最小字串 (前綴範圍的上界)
+
+    最後一個字元沒有下一個字元 (U+10FFFF) 時捨去並遞增前一個字元；
+    跳過代理字元區段 (U+D800-U+DFFF 無法編碼為 BSON/UTF-8)
+
+    Returns:
+        Optional[str]: 上界；prefix 全由 U+10FFFF 組成時為 None (範圍無上界)
+    """
+    for index in range(len(prefix) - 1, -1, -1):
+        code = ord(prefix[index]) + 1
+        if 0xD800 <= code <= 0xDFFF:
+            code = 0xE000
+        if code <= sys.maxunicode:
+            return prefix[:index] + chr(code)
+    return None
+
+
+def email_prefix_filter(query: str) -> Optional[Dict]:
+    """
+    Email 錨定前綴查詢條件 ([prefix, prefix 的下一個字串) 範圍，走 idx_email_normalized)
+
+    Returns:
+        Optional[Dict]: 查詢條件；查詢字串為空時為 None
+    """
+    prefix = normalize_text(query)
+    if not prefix:
+        return None
+    condition = {"$gte": prefix}
+    upper = _prefix_upper_bound(prefix)
+    if upper is not None:
+        condition["$lt"] = upper
+    return {"email_normalized": condition}
+
+
+def name_filter(query: str) -> Optional[Dict]:
+    """
+    顯示名稱 n-gram 查詢條件 (走 idx_name_grams)
+
+    Returns:
+        Optional[Dict]: 查詢條件；查詢字串沒有可搜尋字元時為 None
+    """
+    grams = query_grams(query)
+    if not grams:
+        return None
+    return {"name_grams": {"$all": grams}}
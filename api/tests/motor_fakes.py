@@ -0,0 +1,46 @@
+"""
+Motor 替身
+單元測試與效能測試共用的 Motor cursor 替身 (tests/ 目錄由 pytest 加入 sys.path)
+"""
+
+import asyncio
+
+
+class AsyncCursor:
+    """
+    Motor cursor 替身
+
+    支援 to_list、async for，以及 sort / skip / limit 鏈式呼叫 (limit 會截斷結果)
+    """
+
+    def __init__(self, documents, delay: float = 0):
+        """
+        Args:
+            documents: 查詢結果文件
+            delay: to_list 前模擬的查詢延遲 (秒)
+        """
+        self.documents = list(documents)
+        self.delay = delay
+
+    def sort(self, *args, **kwargs):
+        return self
+
+    def skip(self, *args):
+        return self
+
+    def limit(self, length):
+        if length:
+            self.documents = self.documents[:length]
+        return self
+
+    async def to_list(self, length=None):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self.documents
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield document
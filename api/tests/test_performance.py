@@ -8,6 +8,7 @@ from unittest.mock import Mock, patch, AsyncMock
 
 from src.core.performance import (
     CacheManager,
+    LRUCache,
     cache_response,
     QueryProfiler,
     optimize_mongodb_query,
@@ -15,8 +16,28 @@ from src.core.performance import (
 )
 from src.services.annual_review_optimizer import (
     AnnualReviewOptimizer,
+    AnnualReviewBulkBuilder,
     create_annual_review_indexes
 )
+from src.utils.share_card_generator import (
+    ShareCardAssets,
+    ShareCardGenerator,
+    ShareCardRenderPool,
+)
+from src.core.error_handlers import ExternalServiceError
+from src.core.storage import LocalStorage
+from src.utils.fcm_helper import FakeFCMHelper
+from src.services.push_queue import PushDeliveryQueue
+from src.services.realtime_hub import RealtimeHub
+from src.core.pubsub import LocalBroker
+from io import BytesIO
+from bson import ObjectId
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from motor_fakes import AsyncCursor
 
 
 class TestCacheManager:
@@ -52,6 +73,33 @@ class TestCacheManager:
         assert CacheManager.get("user:456:workouts") == "data3"
 
 
+class TestLRUCache:
+    """Test bounded in-process LRU cache"""
+
+    def test_evicts_least_recently_used(self):
+        """The least recently used entry is evicted when full"""
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert "b" not in cache
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert len(cache) == 2
+
+    def test_ttl_expiry(self):
+        """Entries expire after the TTL"""
+        cache = LRUCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+
+        with patch("src.core.performance.time.monotonic", return_value=time.monotonic() + 61):
+            assert cache.get("a") is None
+
+        assert cache.misses == 1
+
+
 class TestCacheDecorator:
     """Test cache decorator"""
 
@@ -262,6 +310,686 @@ class TestAnnualReviewOptimizer:
         assert update_info["should_regenerate"] is True
 
 
+def _user_group(user_id: str, workout_count: int = 2):
+    return {
+        "_id": user_id,
+        "workouts": [
+            {
+                "_id": ObjectId(),
+                "user_id": user_id,
+                "workout_type": "running",
+                "start_time": datetime(2024, 5, 1 + i),
+                "duration_minutes": 30,
+                "distance_km": 5.0,
+                "is_deleted": False
+            }
+            for i in range(workout_count)
+        ]
+    }
+
+
+@pytest.mark.asyncio
+class TestAnnualReviewBulkBuilder:
+    """Test bulk annual review pre-generation"""
+
+    def _mock_db(self, groups, checkpoint=None, current=()):
+        db = Mock()
+        db.workouts.aggregate = Mock(return_value=AsyncCursor(groups))
+        db.milestones.find = Mock(return_value=Mock(to_list=AsyncMock(return_value=[])))
+        db.annual_reviews.find = Mock(return_value=AsyncCursor([{"user_id": ObjectId(u)} for u in current]))
+        db.annual_reviews.bulk_write = AsyncMock()
+        db.job_checkpoints.find_one = AsyncMock(return_value=checkpoint)
+        db.job_checkpoints.update_one = AsyncMock()
+        return db
+
+    async def test_batches_and_checkpoints(self):
+        """Users are written in bulk_write batches and the checkpoint advances"""
+        user_ids = sorted(str(ObjectId()) for _ in range(5))
+        db = self._mock_db([_user_group(u) for u in user_ids])
+
+        builder = AnnualReviewBulkBuilder(db, batch_size=2, max_in_flight=2)
+        stats = await builder.run(2024)
+
+        assert stats["users"] == 5
+        assert stats["batches"] == 3
+        assert stats["users_per_second"] > 0
+        assert db.annual_reviews.bulk_write.await_count == 3
+
+        operations = db.annual_reviews.bulk_write.await_args_list[0][0][0]
+        assert len(operations) == 2
+        assert operations[0]._doc["$set"]["total_workouts"] == 2
+        assert stats["written_users"] == 5
+
+        final_update = db.job_checkpoints.update_one.await_args_list[-1][0][1]["$set"]
+        assert final_update["last_user_id"] == user_ids[-1]
+        assert final_update["processed_users"] == 5
+        assert final_update["completed_at"] is not None
+
+    async def test_current_reviews_are_not_rewritten(self):
+        """Reviews already at the current schema version are skipped; only missing/outdated ones upsert"""
+        from pymongo.errors import BulkWriteError
+        from src.services.annual_review_service import REVIEW_SCHEMA_VERSION
+
+        user_ids = sorted(str(ObjectId()) for _ in range(3))
+        db = self._mock_db([_user_group(u) for u in user_ids], current=user_ids[:1])
+        # A concurrent rebuild made one more review current between the read and the write
+        db.annual_reviews.bulk_write = AsyncMock(side_effect=BulkWriteError({
+            "writeErrors": [{"index": 0, "code": 11000, "errmsg": "duplicate key"}],
+            "writeConcernErrors": [],
+        }))
+
+        stats = await AnnualReviewBulkBuilder(db).run(2024)
+
+        operations = db.annual_reviews.bulk_write.await_args[0][0]
+        assert [op._filter["user_id"] for op in operations] == [ObjectId(u) for u in user_ids[1:]]
+        assert operations[0]._filter["schema_version"] == {"$ne": REVIEW_SCHEMA_VERSION}
+        assert stats["users"] == 3
+        assert stats["written_users"] == 1
+
+    async def test_resume_from_checkpoint(self):
+        """An unfinished checkpoint resumes after the last written user"""
+        last_user_id = str(ObjectId())
+        db = self._mock_db(
+            [_user_group(str(ObjectId()))],
+            checkpoint={"last_user_id": last_user_id, "processed_users": 1000, "completed_at": None}
+        )
+
+        stats = await AnnualReviewBulkBuilder(db).run(2024)
+
+        pipeline = db.workouts.aggregate.call_args[0][0]
+        assert {"$match": {"_id": {"$gt": last_user_id}}} in pipeline
+        assert stats["resumed_from"] == last_user_id
+        assert stats["total_users"] == 1001
+
+    async def test_failed_batch_keeps_last_checkpoint(self):
+        """A failing batch leaves the checkpoint at the last completed batch"""
+        user_ids = sorted(str(ObjectId()) for _ in range(4))
+        db = self._mock_db([_user_group(u) for u in user_ids])
+        db.annual_reviews.bulk_write = AsyncMock(side_effect=[None, RuntimeError("write failed")])
+
+        builder = AnnualReviewBulkBuilder(db, batch_size=2, max_in_flight=1)
+        with pytest.raises(RuntimeError):
+            await builder.run(2024)
+
+        progress = db.job_checkpoints.update_one.await_args_list[-1][0][1]["$set"]
+        assert progress["last_user_id"] == user_ids[1]
+        assert progress["processed_users"] == 2
+
+
+ANNUAL_CARD_DATA = {
+    "year": 2024,
+    "total_workouts": 180,
+    "total_distance_km": 1234.5,
+    "total_duration_hours": 150.5,
+    "total_calories": 98000,
+    "favorite_workout_type": "running",
+}
+
+
+async def _event_loop_lag_p99(duration: float, interval: float = 0.005) -> float:
+    """Sample event loop scheduling lag (an unrelated request's wait) and return the p99"""
+    lags = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+    lags.sort()
+    return lags[int(len(lags) * 0.99) - 1]
+
+
+class TestShareCardAssets:
+    """Test template asset caching"""
+
+    def setup_method(self):
+        """Reset asset cache before each test"""
+        pytest.importorskip("PIL")
+        ShareCardAssets.clear()
+
+    def test_fonts_and_base_layers_load_once(self):
+        """Fonts are loaded once and each card copies the cached base layer"""
+        from PIL import ImageFont
+
+        with patch.object(ImageFont, "truetype", wraps=ImageFont.truetype) as truetype:
+            for _ in range(3):
+                ShareCardGenerator.render_png("streak", {"streak_days": 30}, "Runner")
+                ShareCardGenerator.render_png("annual", ANNUAL_CARD_DATA, "Runner")
+
+        assert truetype.call_count == len(ShareCardAssets.FONT_PATHS)
+        assert set(ShareCardAssets._base_layers) == {"streak", "annual"}
+
+        card = ShareCardAssets.base_layer("streak")
+        card.putpixel((0, 0), (0, 0, 0))
+        assert ShareCardAssets._base_layers["streak"].getpixel((0, 0)) != (0, 0, 0)
+
+    def test_per_template_render_time(self):
+        """Benchmark: cached render time per template"""
+        ShareCardAssets.preload()
+        samples = {
+            "minimal": {"title": "5K", "value": "25:30", "subtitle": "PR"},
+            "achievement": {"achievement_name": "First 10K", "description": "Done"},
+            "workout": {"workout_type": "running", "distance_km": 10.0, "duration_minutes": 55},
+            "streak": {"streak_days": 42},
+            "annual": ANNUAL_CARD_DATA,
+        }
+
+        for template, data in samples.items():
+            started = time.perf_counter()
+            for _ in range(5):
+                assert ShareCardGenerator.render_png(template, data, "Runner").startswith(b"\x89PNG")
+            print(f"\n{template}: {(time.perf_counter() - started) / 5 * 1000:.1f}ms/card")
+
+
+@pytest.mark.asyncio
+class TestShareCardRenderPool:
+    """Test off-event-loop share card rendering"""
+
+    async def test_render_in_process_pool(self):
+        """Cards are rendered in a worker process and returned as PNG"""
+        pytest.importorskip("PIL")
+        pool = ShareCardRenderPool(max_workers=1)
+        try:
+            card = await ShareCardGenerator(render_pool=pool).generate_card(
+                "annual", ANNUAL_CARD_DATA, "Runner"
+            )
+        finally:
+            pool.shutdown()
+
+        assert card.getvalue().startswith(b"\x89PNG")
+
+    async def test_queue_depth_is_bounded(self):
+        """Requests beyond the queue depth are rejected instead of piling up"""
+        release = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=1)
+        pool = ShareCardRenderPool(max_queue_depth=2, executor=executor)
+
+        with patch(
+            "src.utils.share_card_generator.render_share_card",
+            side_effect=lambda *args: release.wait(5) and (b"png", 12.5)
+        ):
+            tasks = [asyncio.create_task(pool.render("minimal", {}, "u")) for _ in range(2)]
+            await asyncio.sleep(0)
+            assert pool.pending == 2
+
+            with pytest.raises(ExternalServiceError) as exc_info:
+                await pool.render("minimal", {}, "u")
+            assert exc_info.value.details["reason"] == "queue_full"
+
+            release.set()
+            assert await asyncio.gather(*tasks) == [b"png", b"png"]
+
+        await asyncio.sleep(0)
+        assert pool.pending == 0
+        assert pool.get_render_stats()["minimal"] == {"count": 2, "avg_ms": 12.5, "max_ms": 12.5}
+        executor.shutdown()
+
+    async def test_render_timeout(self):
+        """Slow renders fail with a timeout error"""
+        release = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=1)
+        pool = ShareCardRenderPool(timeout_seconds=0.05, executor=executor)
+
+        with patch(
+            "src.utils.share_card_generator.render_share_card",
+            side_effect=lambda *args: release.wait(5) and (b"png", 12.5)
+        ):
+            with pytest.raises(ExternalServiceError) as exc_info:
+                await pool.render("minimal", {}, "u")
+
+        assert exc_info.value.details["reason"] == "timeout"
+        release.set()
+        executor.shutdown()
+
+    @pytest.mark.slow
+    async def test_event_loop_latency_while_rendering(self):
+        """Benchmark: p99 loop lag stays flat during a burst of card renders"""
+        pytest.importorskip("PIL")
+        pool = ShareCardRenderPool(max_workers=2, max_queue_depth=32)
+        try:
+            # 預熱 worker process
+            await pool.render("annual", ANNUAL_CARD_DATA, "Runner")
+
+            idle_p99 = await _event_loop_lag_p99(0.3)
+
+            burst = asyncio.gather(*[
+                pool.render("annual", ANNUAL_CARD_DATA, f"Runner {i}") for i in range(16)
+            ])
+            rendering_p99 = await _event_loop_lag_p99(0.5)
+            cards = await burst
+        finally:
+            pool.shutdown()
+
+        print(f"\nloop lag p99 idle={idle_p99 * 1000:.2f}ms rendering={rendering_p99 * 1000:.2f}ms")
+        assert all(card.startswith(b"\x89PNG") for card in cards)
+        assert rendering_p99 < max(idle_p99 * 5, 0.05)
+
+
+class _SlowNetworkStorage(LocalStorage):
+    """Local storage whose writes take a fixed time, standing in for network transfer"""
+
+    def __init__(self, root_dir, delay: float, **kwargs):
+        super().__init__(root_dir, **kwargs)
+        self.delay = delay
+
+    def _put_object(self, object_key, body, content_type, metadata):
+        time.sleep(self.delay)
+        super()._put_object(object_key, body, content_type, metadata)
+
+
+@pytest.mark.asyncio
+class TestObjectStorageConcurrency:
+    """Test uploads do not block the event loop"""
+
+    @pytest.mark.slow
+    async def test_event_loop_latency_while_uploading(self, tmp_path):
+        """Benchmark: p99 loop lag stays flat while uploads are in flight"""
+        storage = _SlowNetworkStorage(str(tmp_path), delay=0.1, max_connections=8)
+        try:
+            idle_p99 = await _event_loop_lag_p99(0.3)
+
+            started = time.perf_counter()
+            uploads = asyncio.gather(*[
+                storage.upload_file(BytesIO(b"x" * 1024), f"cards/{i}.png") for i in range(16)
+            ])
+            uploading_p99 = await _event_loop_lag_p99(0.15)
+            urls = await uploads
+            elapsed = time.perf_counter() - started
+        finally:
+            storage.close()
+
+        print(f"\nloop lag p99 idle={idle_p99 * 1000:.2f}ms uploading={uploading_p99 * 1000:.2f}ms "
+              f"16 uploads in {elapsed:.2f}s")
+        assert len(urls) == 16
+        # 8 條連線平行上傳：約 2 輪而非 16 輪
+        assert elapsed < 16 * 0.1 / 2
+        assert uploading_p99 < max(idle_p99 * 5, 0.05)
+
+
+class TestImageDerivatives:
+    """Test multi-size image derivatives"""
+
+    def test_feed_payload_size(self):
+        """Benchmark: thumb/feed derivatives are an order of magnitude smaller than the upload"""
+        pytest.importorskip("PIL")
+        from PIL import Image, ImageFilter
+        from src.utils.image_derivatives import render_image_derivatives
+
+        # 含雜訊的照片尺寸圖片 (純色圖片壓縮率不具代表性)
+        photo = Image.effect_noise((4000, 3000), 40).convert("RGB").filter(ImageFilter.GaussianBlur(1))
+        buffer = BytesIO()
+        photo.save(buffer, format="JPEG", quality=90)
+        source = buffer.getvalue()
+
+        started = time.perf_counter()
+        derivatives, render_ms = render_image_derivatives(source, ("webp",))
+        elapsed = time.perf_counter() - started
+
+        sizes = {size: len(encoded["webp"]) for size, encoded in derivatives.items()}
+        print(f"\nsource={len(source) / 1024:.0f}KB " +
+              " ".join(f"{size}={length / 1024:.0f}KB" for size, length in sizes.items()) +
+              f" in {elapsed * 1000:.0f}ms")
+        assert sizes["feed"] * 10 < len(source)
+        assert sizes["thumb"] * 100 < len(source)
+
+
+@pytest.mark.asyncio
+class TestNotificationFanOut:
+    """Test notification fan-out query and push batching"""
+
+    async def test_friend_activity_preference_queries(self):
+        """Benchmark: fan-out to 500 friends costs a constant number of queries"""
+        from unittest.mock import MagicMock
+        from src.services.notification_service import NotificationService, _preference_cache
+
+        _preference_cache.clear()
+        owner_id = str(ObjectId())
+        friend_ids = {str(ObjectId()) for _ in range(500)}
+
+        db = MagicMock()
+        db.users.find_one = AsyncMock(return_value={"_id": ObjectId(owner_id), "display_name": "Runner"})
+        db.users.find = MagicMock(side_effect=lambda *a, **k: AsyncCursor(
+            {"_id": ObjectId(friend_id), "fcm_token": f"token-{friend_id}"} for friend_id in friend_ids
+        ))
+        db.notifications.insert_many = AsyncMock()
+        db.notification_counters.bulk_write = AsyncMock()
+        db.push_jobs.insert_many = AsyncMock()
+        db.push_jobs.update_one = AsyncMock()
+        db.users.update_many = AsyncMock()
+        db.notification_preferences.find_one = AsyncMock(return_value=None)
+        db.notification_preferences.find = MagicMock(side_effect=lambda *a, **k: AsyncCursor([]))
+        fcm = FakeFCMHelper()
+        push_queue = PushDeliveryQueue(fcm=fcm)
+
+        with patch(
+            "src.services.friend_service.FriendService.get_friend_ids",
+            AsyncMock(return_value=friend_ids)
+        ):
+            service = NotificationService(db, push_queue=push_queue)
+            started = time.perf_counter()
+            await service.notify_friend_activity(owner_id, str(ObjectId()), "workout")
+            elapsed = time.perf_counter() - started
+
+        # 背景 worker 發送排入的推播
+        jobs = [
+            {**job, "_id": ObjectId(), "claim_id": ObjectId(), "attempts": 1}
+            for job in db.push_jobs.insert_many.await_args[0][0]
+        ]
+        push_queue.db = db
+        await push_queue.process_jobs(jobs)
+
+        queries = (
+            db.users.find_one.await_count
+            + db.notification_preferences.find.call_count
+            + db.notification_preferences.find_one.await_count
+            + db.notifications.insert_many.await_count
+            + db.notification_counters.bulk_write.await_count
+            + db.push_jobs.insert_many.await_count
+        )
+        print(f"\n500-friend fan-out: {elapsed * 1000:.0f}ms, queries={queries}, "
+              f"multicasts={len(fcm.sent)}")
+        assert db.notification_preferences.find.call_count == 1
+        db.notification_preferences.find_one.assert_not_awaited()
+        db.notifications.insert_many.assert_awaited_once()
+        assert len(db.notifications.insert_many.await_args[0][0]) == 500
+        assert queries == 5
+        db.users.find.assert_called_once()
+        # 送達後以單一寫入清除失敗計數
+        db.users.update_many.assert_awaited_once()
+        assert len(fcm.sent) == 1 and len(fcm.delivered_tokens) == 500
+        _preference_cache.clear()
+
+
+class _RoundTripCountingDB:
+    """Database stand-in counting every query issued against any collection"""
+
+    QUERY_METHODS = ("find", "find_one", "aggregate", "count_documents")
+
+    def __init__(self, results):
+        self.results = results
+        self.round_trips = 0
+
+    def __getattr__(self, collection):
+        documents = self.results.get(collection, [])
+        db = self
+
+        class _Collection:
+            def __getattr__(self, method):
+                if method not in db.QUERY_METHODS:
+                    raise AttributeError(method)
+                db.round_trips += 1
+                if method == "find_one":
+                    return AsyncMock(return_value=documents[0] if documents else None)
+                if method == "count_documents":
+                    return AsyncMock(return_value=len(documents))
+
+                def query(pipeline_or_filter=None, *args, **kwargs):
+                    results = documents
+                    if method == "aggregate" and "$count" in pipeline_or_filter[-1]:
+                        results = [{"count": len(documents)}]
+                    return Mock(to_list=AsyncMock(return_value=results))
+
+                return query
+
+        return _Collection()
+
+
+@pytest.mark.asyncio
+class TestChallengeReadRoundTrips:
+    """Regression: challenge list, detail and leaderboard cost a constant number of queries"""
+
+    @staticmethod
+    def challenge(participant_count, day=1):
+        creator_id = ObjectId()
+        return {
+            "_id": ObjectId(),
+            "creator_id": creator_id,
+            "challenge_type": "total_distance",
+            "target_value": 50.0,
+            "start_date": datetime(2024, 5, day),
+            "end_date": datetime(2024, 5, day + 7),
+            "privacy": "public",
+            "status": "active",
+            "participant_count": participant_count,
+            "created_at": datetime(2024, 4, 1),
+            "creator": [{"_id": creator_id, "display_name": "Coach"}],
+            "participants": [
+                {
+                    "_id": ObjectId(),
+                    "user_id": ObjectId(),
+                    "joined_at": datetime(2024, 4, 2),
+                    "current_progress": float(i),
+                    "completion_percentage": float(i) * 2,
+                    "rank": i + 1,
+                    "status": "active",
+                    "user": {"display_name": f"Runner {i}"},
+                }
+                for i in range(participant_count)
+            ],
+            "my_participation": {"completion_percentage": 20.0, "rank": 3},
+        }
+
+    @pytest.mark.parametrize("size", [5, 100])
+    async def test_constant_round_trips(self, size):
+        from src.services.challenge_service import ChallengeService, encode_challenge_cursor
+
+        user_id = str(ObjectId())
+        challenges = [self.challenge(size, day=1 + i % 20) for i in range(size)]
+        page = challenges[:21]
+
+        for role in ("all", "creator", "participant"):
+            # 第一頁：頁面與總數各一次；之後的 cursor 頁面只查頁面
+            db = _RoundTripCountingDB({"challenges": page, "participants": page})
+            items, total, next_cursor = await ChallengeService(db).get_challenges(user_id, role=role, limit=20)
+            assert len(items) == min(size, 20)
+            assert total == len(page)
+            assert db.round_trips == 2, role
+
+            db = _RoundTripCountingDB({"challenges": page, "participants": page})
+            cursor = next_cursor or encode_challenge_cursor(challenges[0])
+            _, total, _ = await ChallengeService(db).get_challenges(user_id, role=role, limit=20, cursor=cursor)
+            assert total is None
+            assert db.round_trips == 1, role
+
+        db = _RoundTripCountingDB({"challenges": challenges[:1]})
+        detail = await ChallengeService(db).get_challenge_detail(str(challenges[0]["_id"]), user_id)
+        assert len(detail.participants) == size
+        assert db.round_trips == 1
+
+        db = _RoundTripCountingDB({"challenges": challenges[:1]})
+        leaderboard = await ChallengeService(db).get_leaderboard(str(challenges[0]["_id"]))
+        assert len(leaderboard["participants"]) == size
+        assert db.round_trips == 1
+
+
+@pytest.mark.asyncio
+class TestRealtimeIdleConnections:
+    """Load test: idle realtime connections per worker"""
+
+    async def test_10k_idle_connections(self):
+        """Benchmark: 10k idle connections waiting for events, then targeted and broadcast publishes"""
+        import tracemalloc
+
+        connection_count = 10000
+        hub = RealtimeHub(LocalBroker(), heartbeat_seconds=30)
+        await hub.start()
+        user_ids = [str(ObjectId()) for _ in range(connection_count)]
+
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        connections = [await hub.connect(user_id) for user_id in user_ids]
+        # 每條連線一個等待事件的 task (與 WebSocket sender loop 相同)
+        waiters = [
+            asyncio.create_task(connection.next_message(hub.heartbeat_seconds))
+            for connection in connections
+        ]
+        # wait_for 於下一輪 event loop 才建立內部 task，讓所有連線進入等待狀態
+        for _ in range(3):
+            await asyncio.sleep(0)
+        per_connection = (tracemalloc.get_traced_memory()[0] - before) / connection_count
+        tracemalloc.stop()
+
+        # 閒置連線不應造成 event loop 延遲
+        started = time.perf_counter()
+        await asyncio.sleep(0.01)
+        loop_lag = time.perf_counter() - started - 0.01
+
+        started = time.perf_counter()
+        await hub.publish([user_ids[0]], "notification", {"title": "t"})
+        targeted = await waiters[0]
+        targeted_latency = time.perf_counter() - started
+
+        started = time.perf_counter()
+        await hub.publish(user_ids[1:], "rank_change", {"rank": 1})
+        delivered = await asyncio.gather(*waiters[1:])
+        broadcast_latency = time.perf_counter() - started
+
+        print(f"\n10k idle connections: {per_connection / 1024:.1f}KB/connection, "
+              f"loop lag={loop_lag * 1000:.1f}ms, targeted={targeted_latency * 1000:.2f}ms, "
+              f"broadcast={broadcast_latency * 1000:.0f}ms")
+        assert hub.get_metrics()["connections"] == connection_count
+        assert targeted is not None
+        assert all(message is not None for message in delivered)
+        assert per_connection < 8 * 1024
+        assert loop_lag < 0.05
+        assert broadcast_latency < 2.0
+
+        for connection in connections:
+            await hub.disconnect(connection)
+        assert hub.get_metrics()["connected_users"] == 0
+        await hub.stop()
+
+
+@pytest.mark.asyncio
+class TestChallengeRankingThroughput:
+    """Test batch challenge ranking at scale"""
+
+    async def test_ranks_thousands_of_challenges(self):
+        """Benchmark: 2000 active challenges x 20 participants, aggregation and writes batched"""
+        from src.services.challenge_ranking import ChallengeRankingJob
+
+        challenge_count, participant_count = 2000, 20
+        challenges = [
+            {"_id": ObjectId(), "challenge_type": "total_distance" if i % 2 else "total_duration"}
+            for i in range(challenge_count)
+        ]
+        end_date = datetime.utcnow() + timedelta(days=7)
+
+        def ranked(pipeline):
+            return AsyncCursor(
+                {
+                    "_id": ObjectId(),
+                    "challenge_id": challenge_id,
+                    "user_id": ObjectId(),
+                    "current_progress": float(participant_count - rank),
+                    "rank": rank,
+                    "previous_rank": rank if rank % 5 else rank + 1,
+                    "target_value": 10.0,
+                    "end_date": end_date,
+                }
+                for challenge_id in pipeline[0]["$match"]["challenge_id"]["$in"]
+                if isinstance(challenge_id, ObjectId)
+                for rank in range(1, participant_count + 1)
+            )
+
+        db = Mock()
+        db.challenges.find = Mock(return_value=AsyncCursor(challenges))
+        db.participants.aggregate = Mock(side_effect=ranked)
+        db.participants.bulk_write = AsyncMock()
+        realtime = Mock(publish_each=AsyncMock())
+
+        started = time.perf_counter()
+        result = await ChallengeRankingJob(db, realtime=realtime).run()
+        elapsed = time.perf_counter() - started
+
+        print(f"\nRanked {result['participants']} participants in {challenge_count} challenges: "
+              f"{elapsed * 1000:.0f}ms, {db.participants.aggregate.call_count} aggregations")
+        # 每種類型每 500 個挑戰一次 aggregation，每個挑戰一次 bulk_write
+        assert db.participants.aggregate.call_count == 4
+        assert db.participants.bulk_write.await_count == challenge_count
+        assert result["participants"] == challenge_count * participant_count
+        assert result["rank_changes"] == challenge_count * 4
+        assert elapsed < 5.0
+
+
+@pytest.mark.slow
+@pytest.mark.asyncio
+class TestUserSearchIndex:
+    """Benchmark: friend search lookups against a live MongoDB with 1M users"""
+
+    USERS = int(os.environ.get("USER_SEARCH_BENCHMARK_USERS", 1_000_000))
+    SURNAMES = "王李張劉陳楊黃趙吳周徐孫馬朱胡郭何林羅高"
+    GIVEN = "小明華芳婷偉強麗敏靜杰磊洋勇軍娜秀英"
+    FIRST = ["alice", "bob", "carol", "dave", "erin", "frank", "grace", "heidi", "ivan", "judy"]
+    LAST = ["chen", "lin", "wang", "huang", "wu", "tsai", "lee", "chang", "liu", "yang"]
+
+    @pytest.fixture
+    async def users(self):
+        from motor.motor_asyncio import AsyncIOMotorClient
+        from src.core.config import settings
+
+        client = AsyncIOMotorClient(settings.MONGODB_URI, serverSelectionTimeoutMS=1000)
+        try:
+            await client.admin.command("ping")
+        except Exception:
+            client.close()
+            pytest.skip("MongoDB not available")
+
+        db = client[f"{settings.DB_NAME}_user_search_benchmark"]
+        await db.users.drop()
+        await self.seed(db.users)
+        yield db.users
+        await client.drop_database(db.name)
+        client.close()
+
+    async def seed(self, users, batch_size=10000):
+        from src.utils.user_search import search_fields
+
+        for start in range(0, self.USERS, batch_size):
+            batch = []
+            for i in range(start, min(start + batch_size, self.USERS)):
+                if i % 2:
+                    name = f"{self.FIRST[i // 2 % 10].title()} {self.LAST[i // 10 % 10].title()}{i}"
+                else:
+                    name = self.SURNAMES[i % 20] + self.GIVEN[i // 20 % 20] + self.GIVEN[i // 400 % 20]
+                email = f"{self.FIRST[i % 10]}.{self.LAST[i // 10 % 10]}{i}@example.com"
+                batch.append({"email": email, "display_name": name, **search_fields(email, name)})
+            await users.insert_many(batch, ordered=False)
+        await users.create_index("email_normalized", name="idx_email_normalized")
+        await users.create_index("name_grams", name="idx_name_grams")
+
+    async def test_lookups_under_10ms(self, users):
+        from src.services.friend_service import SEARCH_LIMIT
+        from src.utils.user_search import email_prefix_filter, name_filter
+
+        queries = (
+            [email_prefix_filter(f"{first}.{last}{i}") for i, (first, last) in
+             enumerate(zip(self.FIRST * 10, self.LAST * 10))]
+            + [name_filter(query) for query in ("王小", "小明", "李華芳", "alice", "bob chen", "grace wang12")]
+        )
+        for search_filter in queries:
+            await users.find(search_filter).limit(SEARCH_LIMIT).to_list(SEARCH_LIMIT)
+
+        timings = []
+        for _ in range(5):
+            for search_filter in queries:
+                start = time.perf_counter()
+                results = await users.find(
+                    search_filter, projection={"display_name": 1, "avatar_url": 1}
+                ).limit(SEARCH_LIMIT).to_list(SEARCH_LIMIT)
+                timings.append(time.perf_counter() - start)
+                assert len(results) <= SEARCH_LIMIT
+        timings.sort()
+        p95 = timings[int(len(timings) * 0.95)]
+        print(f"\nuser search over {self.USERS} users: p50 {timings[len(timings) // 2] * 1000:.2f}ms, "
+              f"p95 {p95 * 1000:.2f}ms")
+        assert p95 < 0.010
+
+        # 錨定前綴只掃描索引範圍內的文件
+        plan = await users.find(email_prefix_filter("alice.chen1")).limit(SEARCH_LIMIT).explain()
+        assert plan["executionStats"]["totalDocsExamined"] <= SEARCH_LIMIT
+        assert "IXSCAN" in str(plan["queryPlanner"]["winningPlan"])
+
+
 # Fixtures
 
 @pytest.fixture
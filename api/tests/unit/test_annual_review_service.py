@@ -0,0 +1,307 @@
+"""
+Annual Review Service 增量維護測試
+測試運動記錄異動時的年度回顧差量計算
+"""
+
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock
+from bson import ObjectId
+
+from src.services.annual_review_service import (
+    AnnualReviewService,
+    REVIEW_SCHEMA_VERSION,
+    build_review_state,
+    grouped_rows_to_year_summaries,
+    review_to_response,
+)
+
+
+def make_workout(user_id, **overrides):
+    """建立測試用運動記錄文件"""
+    workout = {
+        "_id": ObjectId(),
+        "user_id": str(user_id),
+        "workout_type": "running",
+        "start_time": datetime(2024, 3, 10, 7, 0, tzinfo=timezone.utc),
+        "duration_minutes": 30,
+        "distance_km": 5.0,
+        "pace_min_per_km": 6.0,
+        "avg_heart_rate": 150,
+        "calories": 300,
+        "is_deleted": False,
+    }
+    workout.update(overrides)
+    return workout
+
+
+class TestBuildReviewState:
+    """測試完整重建的計數器計算"""
+
+    def test_build_review_state_counters(self):
+        """測試月度、類型計數器與個人紀錄候選"""
+        user_id = ObjectId()
+        workouts = [
+            make_workout(user_id),
+            make_workout(user_id, distance_km=10.0, pace_min_per_km=5.5, avg_heart_rate=160),
+            make_workout(
+                user_id,
+                workout_type="cycling",
+                start_time=datetime(2024, 7, 1, tzinfo=timezone.utc),
+                duration_minutes=90,
+                distance_km=40.0,
+                pace_min_per_km=None,
+                avg_heart_rate=None,
+            ),
+            make_workout(user_id, is_deleted=True, distance_km=100.0),
+        ]
+
+        state = build_review_state(workouts)
+
+        assert state["total_workouts"] == 3
+        assert state["total_duration_minutes"] == 150
+        assert state["total_distance_km"] == 55.0
+        assert state["monthly_counters"]["3"]["workout_count"] == 2
+        assert state["monthly_counters"]["3"]["heart_rate_sum"] == 310
+        assert state["type_counters"]["cycling"]["count"] == 1
+        assert state["pr_candidates"]["distance_km"][0]["value"] == 40.0
+        assert state["pr_candidates"]["pace_min_per_km"][0]["value"] == 5.5
+
+    def test_review_to_response_derives_fields(self):
+        """測試由計數器推導回應欄位"""
+        user_id = ObjectId()
+        state = build_review_state([
+            make_workout(user_id),
+            make_workout(user_id, start_time=datetime(2024, 9, 1, tzinfo=timezone.utc), distance_km=8.0),
+        ])
+        state.update({
+            "_id": ObjectId(),
+            "user_id": user_id,
+            "year": 2024,
+            "schema_version": REVIEW_SCHEMA_VERSION,
+            "milestones": [],
+            "generated_at": datetime.now(timezone.utc),
+        })
+
+        review = review_to_response(state)
+
+        assert review.usage_months == [3, 9]
+        assert [s.month for s in review.monthly_stats] == [3, 9]
+        assert review.monthly_stats[0].avg_heart_rate == 150
+        assert review.personal_records["longest_distance_km"] == 8.0
+        assert review.trends[0].trend == "increasing"
+
+
+class TestApplyWorkoutChange:
+    """測試運動記錄異動的差量套用"""
+
+    @pytest.fixture
+    def mock_db(self):
+        """模擬資料庫連線"""
+        db = MagicMock()
+        db.annual_reviews = AsyncMock()
+        db.workouts = MagicMock()
+        return db
+
+    @pytest.fixture
+    def service(self, mock_db):
+        """Annual Review Service fixture"""
+        return AnnualReviewService(mock_db)
+
+    @pytest.mark.asyncio
+    async def test_create_applies_single_update(self, service, mock_db):
+        """建立運動記錄 - 單次 $inc + $push"""
+        user_id = ObjectId()
+        workout = make_workout(user_id)
+
+        await service.apply_workout_change(None, workout)
+
+        mock_db.annual_reviews.update_one.assert_called_once()
+        review_filter, update = mock_db.annual_reviews.update_one.call_args[0]
+        assert review_filter == {
+            "user_id": user_id,
+            "year": 2024,
+            "schema_version": REVIEW_SCHEMA_VERSION,
+        }
+        assert update["$inc"]["total_workouts"] == 1
+        assert update["$inc"]["monthly_counters.3.workout_count"] == 1
+        assert update["$inc"]["type_counters.running.total_distance_km"] == 5.0
+        assert update["$push"]["pr_candidates.distance_km"]["$each"][0]["value"] == 5.0
+
+    @pytest.mark.asyncio
+    async def test_deleted_workout_is_ignored(self, service, mock_db):
+        """已刪除記錄的復原前狀態不計入"""
+        user_id = ObjectId()
+        workout = make_workout(user_id, is_deleted=True)
+
+        await service.apply_workout_change(workout, None)
+
+        mock_db.annual_reviews.update_one.assert_not_called()
+        mock_db.annual_reviews.find_one_and_update.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_update_notes_only_is_noop(self, service, mock_db):
+        """僅更新備註 - 不需寫入年度回顧"""
+        user_id = ObjectId()
+        before = make_workout(user_id)
+        after = {**before, "notes": "晨跑"}
+
+        await service.apply_workout_change(before, after)
+
+        mock_db.annual_reviews.update_one.assert_not_called()
+        mock_db.annual_reviews.find_one_and_update.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_update_moves_between_months(self, service, mock_db):
+        """更新開始時間 - 月度計數器搬移，總計不變"""
+        user_id = ObjectId()
+        before = make_workout(user_id, distance_km=None, pace_min_per_km=None)
+        after = {**before, "start_time": datetime(2024, 4, 2, tzinfo=timezone.utc)}
+
+        await service.apply_workout_change(before, after)
+
+        update = mock_db.annual_reviews.update_one.call_args[0][1]
+        assert "total_workouts" not in update["$inc"]
+        assert update["$inc"]["monthly_counters.3.workout_count"] == -1
+        assert update["$inc"]["monthly_counters.4.workout_count"] == 1
+
+    @pytest.mark.asyncio
+    async def test_delete_record_holder_refills_candidates(self, service, mock_db):
+        """刪除個人紀錄保持者 - 從資料庫遞補候選清單"""
+        user_id = ObjectId()
+        workout = make_workout(user_id, distance_km=42.2)
+
+        mock_db.annual_reviews.find_one_and_update = AsyncMock(return_value={
+            "pr_candidates": {
+                "distance_km": [{"workout_id": workout["_id"], "value": 42.2}],
+            }
+        })
+        cursor = MagicMock()
+        cursor.sort.return_value = cursor
+        cursor.limit.return_value = cursor
+        cursor.to_list = AsyncMock(return_value=[{"_id": ObjectId(), "distance_km": 21.1}])
+        mock_db.workouts.find = MagicMock(return_value=cursor)
+
+        await service.apply_workout_change(workout, None)
+
+        update = mock_db.annual_reviews.find_one_and_update.call_args[0][1]
+        assert update["$inc"]["total_workouts"] == -1
+        assert "pr_candidates.distance_km" in update["$pull"]
+
+        follow_up = mock_db.annual_reviews.update_one.call_args[0][1]
+        assert follow_up["$set"]["pr_candidates.distance_km"][0]["value"] == 21.1
+        assert "pr_candidates.distance_km" not in follow_up.get("$push", {})
+
+    @pytest.mark.asyncio
+    async def test_get_review_rebuilds_stale_schema(self, service, mock_db):
+        """結構版本過舊 - 完整重建"""
+        user_id = ObjectId()
+        mock_db.annual_reviews.find_one = AsyncMock(return_value={"schema_version": 1})
+        service.rebuild_review = AsyncMock(return_value={
+            "_id": ObjectId(),
+            "user_id": user_id,
+            "year": 2024,
+            "schema_version": REVIEW_SCHEMA_VERSION,
+        })
+
+        review = await service.get_review(str(user_id), 2024)
+
+        service.rebuild_review.assert_called_once_with(str(user_id), 2024)
+        assert review.total_workouts == 0
+
+
+class TestMultiYearSummary:
+    """測試多年度回顧比較"""
+
+    @pytest.fixture
+    def mock_db(self):
+        """模擬資料庫連線"""
+        db = MagicMock()
+        db.annual_reviews = MagicMock()
+        db.workouts = MagicMock()
+        return db
+
+    @pytest.fixture
+    def service(self, mock_db):
+        """Annual Review Service fixture"""
+        return AnnualReviewService(mock_db)
+
+    def test_grouped_rows_to_year_summaries(self):
+        """測試分組聚合結果合併為年度摘要"""
+        rows = [
+            {
+                "_id": {"year": 2022, "month": 1, "workout_type": "running"},
+                "count": 3, "total_duration_minutes": 90, "total_distance_km": 15.0,
+                "total_calories": 900, "distance_km": 6.0, "duration_minutes": 35,
+                "pace_min_per_km": 5.8,
+            },
+            {
+                "_id": {"year": 2022, "month": 2, "workout_type": "running"},
+                "count": 1, "total_duration_minutes": 50, "total_distance_km": 10.0,
+                "total_calories": 500, "distance_km": 10.0, "duration_minutes": 50,
+                "pace_min_per_km": 5.0,
+            },
+            {
+                "_id": {"year": 2022, "month": 2, "workout_type": "yoga"},
+                "count": 2, "total_duration_minutes": 120, "total_distance_km": 0,
+                "total_calories": 200, "distance_km": None, "duration_minutes": 60,
+                "pace_min_per_km": None,
+            },
+        ]
+
+        summary = grouped_rows_to_year_summaries(rows)[2022]
+
+        assert summary.total_workouts == 6
+        assert summary.active_months == 2
+        assert summary.workout_type_summary[0].workout_type == "running"
+        assert summary.workout_type_summary[0].count == 4
+        assert summary.personal_records == {
+            "longest_distance_km": 10.0,
+            "longest_duration_minutes": 60,
+            "fastest_pace_min_per_km": 5.0,
+        }
+
+    @pytest.mark.asyncio
+    async def test_summary_reads_reviews_and_fills_missing_years(self, service, mock_db):
+        """已有回顧文件的年份直接讀取，缺少的年份以一次聚合補齊"""
+        user_id = ObjectId()
+        review_2023 = build_review_state([make_workout(user_id)] * 2)
+        review_2023.update({"year": 2023, "schema_version": REVIEW_SCHEMA_VERSION})
+
+        reviews_cursor = MagicMock()
+        reviews_cursor.to_list = AsyncMock(return_value=[review_2023])
+        mock_db.annual_reviews.find = MagicMock(return_value=reviews_cursor)
+
+        aggregate_cursor = MagicMock()
+        aggregate_cursor.to_list = AsyncMock(return_value=[{
+            "_id": {"year": 2024, "month": 5, "workout_type": "running"},
+            "count": 4, "total_duration_minutes": 120, "total_distance_km": 20.0,
+            "total_calories": 1200, "distance_km": 5.0, "duration_minutes": 30,
+            "pace_min_per_km": 6.0,
+        }])
+        mock_db.workouts.aggregate = MagicMock(return_value=aggregate_cursor)
+
+        result = await service.get_multi_year_summary(str(user_id), 2022, 2024)
+
+        mock_db.annual_reviews.find.assert_called_once()
+        mock_db.workouts.aggregate.assert_called_once()
+        pipeline = mock_db.workouts.aggregate.call_args[0][0]
+        assert pipeline[1]["$match"]["$expr"]["$in"][1] == [2022, 2024]
+
+        assert [y.year for y in result.years] == [2022, 2023, 2024]
+        assert result.years[0].total_workouts == 0
+        assert result.years[1].total_workouts == 2
+        assert result.deltas[0].workouts_change == 2
+        assert result.deltas[0].workouts_change_percentage is None
+        assert result.deltas[1].workouts_change == 2
+        assert result.deltas[1].workouts_change_percentage == 100.0
+        assert result.deltas[1].distance_km_change == 10.0
+
+    @pytest.mark.asyncio
+    async def test_summary_rejects_invalid_range(self, service):
+        """年份範圍無效"""
+        with pytest.raises(ValueError):
+            await service.get_multi_year_summary(str(ObjectId()), 2025, 2024)
+
+        with pytest.raises(ValueError):
+            await service.get_multi_year_summary(str(ObjectId()), 2020, 2040)
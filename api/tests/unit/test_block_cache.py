@@ -0,0 +1,227 @@
+"""
+Block Cache 單元測試
+測試雙向封鎖集合快取、Bloom filter 前置過濾與封鎖時的同步
+"""
+
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from bson import ObjectId
+
+from src.core.performance import BloomFilter
+from src.core.pubsub import LocalBroker
+from src.services.block_cache import INVALIDATION_CHANNEL, BlockCache
+
+from motor_fakes import AsyncCursor
+
+
+@pytest.fixture
+def users():
+    return [str(ObjectId()) for _ in range(4)]
+
+
+@pytest.fixture
+def db(users):
+    """users[0] 封鎖 users[1]，users[2] 封鎖 users[0]"""
+    me, a, b, _ = users
+    blocks = [
+        {"user_id": ObjectId(me), "blocked_user_id": ObjectId(a)},
+        {"user_id": ObjectId(b), "blocked_user_id": ObjectId(me)},
+    ]
+    db = MagicMock()
+    db.blocklist.find = MagicMock(side_effect=lambda *args, **kwargs: AsyncCursor(blocks))
+    return db
+
+
+class TestBloomFilter:
+    """測試 Bloom filter"""
+
+    def test_no_false_negatives_and_low_false_positive_rate(self):
+        bloom = BloomFilter(capacity=10000, error_rate=0.01)
+        members = [str(ObjectId()) for _ in range(10000)]
+        for member in members:
+            bloom.add(member)
+
+        assert all(member in bloom for member in members)
+        false_positives = sum(str(ObjectId()) in bloom for _ in range(10000))
+        assert false_positives < 300
+        # 約 9.6 bits/項目
+        assert bloom.nbytes < 10000 * 10 // 8 + 1
+
+
+class TestBlockCache:
+    """測試封鎖集合查詢與快取"""
+
+    @pytest.mark.asyncio
+    async def test_blocked_ids_cover_both_directions(self, db, users):
+        me, a, b, stranger = users
+        cache = BlockCache()
+
+        assert await cache.blocked_ids(db, me) == {a, b}
+        assert await cache.is_blocked(db, me, b)
+        assert not await cache.is_blocked(db, me, stranger)
+
+        db.blocklist.find.assert_called_once()
+        query = db.blocklist.find.call_args[0][0]
+        assert query == {"$or": [{"user_id": ObjectId(me)}, {"blocked_user_id": ObjectId(me)}]}
+        assert cache.get_metrics()["hits"] == 2
+
+    @pytest.mark.asyncio
+    async def test_filter_skips_users_without_blocks(self, db, users):
+        """不在 Bloom filter 中的使用者不查詢資料庫也不佔用快取"""
+        me, a, _, stranger = users
+        cache = BlockCache(filter_capacity=1000)
+        await cache.load_filter(db)
+        db.blocklist.find.reset_mock()
+
+        assert await cache.blocked_ids(db, stranger) == frozenset()
+        db.blocklist.find.assert_not_called()
+        assert cache.get_metrics()["cached_users"] == 0
+
+        assert await cache.is_blocked(db, a, me)
+        db.blocklist.find.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_record_block_adds_to_filter_and_evicts(self, db, users):
+        me, _, _, stranger = users
+        cache = BlockCache(filter_capacity=1000)
+        await cache.load_filter(db)
+        await cache.blocked_ids(db, me)
+
+        await cache.record_block(stranger, me)
+
+        assert cache.get_metrics()["cached_users"] == 0
+        db.blocklist.find.reset_mock()
+        await cache.blocked_ids(db, stranger)
+        db.blocklist.find.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_is_blocked_does_not_trust_filter(self, db, users):
+        """漏接封鎖通知時，個人檔案與邀請檢查 (is_blocked) 仍以資料庫為準"""
+        me, a, b, stranger = users
+        cache = BlockCache(filter_capacity=1000)
+        db.blocklist.find = MagicMock(side_effect=lambda *args, **kwargs: AsyncCursor([]))
+        await cache.load_filter(db)
+
+        # 其他 worker 寫入的封鎖，此 worker 未收到通知
+        missed = [{"user_id": ObjectId(stranger), "blocked_user_id": ObjectId(me)}]
+        db.blocklist.find = MagicMock(side_effect=lambda *args, **kwargs: AsyncCursor(missed))
+
+        assert await cache.blocked_ids(db, me) == frozenset()
+        assert await cache.is_blocked(db, me, stranger)
+
+    @pytest.mark.asyncio
+    async def test_rebuild_picks_up_missed_blocks(self, db, users):
+        """定期重建 filter 納入漏接的封鎖，重建期間的封鎖不會遺漏"""
+        me, a, b, stranger = users
+        cache = BlockCache(filter_capacity=1000)
+        db.blocklist.find = MagicMock(side_effect=lambda *args, **kwargs: AsyncCursor([]))
+        await cache.load_filter(db)
+        assert await cache.blocked_ids(db, me) == frozenset()
+
+        late = str(ObjectId())
+
+        class _RacingCursor(AsyncCursor):
+            async def _iterate(self):
+                # 重建期間發生的封鎖
+                await cache.record_block(late, stranger)
+                for document in self.documents:
+                    yield document
+
+        missed = [{"user_id": ObjectId(stranger), "blocked_user_id": ObjectId(me)}]
+        db.blocklist.find = MagicMock(side_effect=lambda *args, **kwargs: _RacingCursor(missed))
+        await cache.load_filter(db)
+
+        assert await cache.blocked_ids(db, me) == {stranger}
+        db.blocklist.find = MagicMock(side_effect=lambda *args, **kwargs: AsyncCursor([]))
+        await cache.blocked_ids(db, late)
+        db.blocklist.find.assert_called_once()
+        assert cache.get_metrics()["filter_builds"] == 2
+
+    @pytest.mark.asyncio
+    async def test_filter_is_refreshed_periodically(self, db, users):
+        cache = BlockCache(filter_capacity=1000, refresh_seconds=0.01, broker=LocalBroker())
+        await cache.start(db)
+        try:
+            await asyncio.sleep(0.05)
+            assert cache.get_metrics()["filter_builds"] >= 2
+        finally:
+            await cache.stop()
+
+    @pytest.mark.asyncio
+    async def test_block_is_broadcast(self, db, users):
+        """封鎖經由 broker 同步到其他 worker"""
+        me, _, _, stranger = users
+        broker = LocalBroker()
+        broker.publish_many = AsyncMock(wraps=broker.publish_many)
+        cache = BlockCache(filter_capacity=1000, broker=broker)
+        await cache.start(db)
+        try:
+            await cache.record_block(me, stranger)
+            broker.publish_many.assert_awaited_once_with([(INVALIDATION_CHANNEL, f"{me},{stranger}")])
+
+            # 其他 worker 發布的封鎖：新使用者加入 filter
+            other = str(ObjectId())
+            assert await cache.blocked_ids(db, other) == frozenset()
+            cache._on_invalidation(INVALIDATION_CHANNEL, f"{other},{me}")
+            db.blocklist.find.reset_mock()
+            await cache.blocked_ids(db, other)
+            db.blocklist.find.assert_called_once()
+        finally:
+            await cache.stop()
+
+
+class TestBlockFiltering:
+    """測試搜尋、封鎖與動態牆使用封鎖名單快取"""
+
+    @pytest.mark.asyncio
+    async def test_search_excludes_users_who_blocked_me(self, users):
+        from src.services.friend_service import FriendService
+
+        me, a, b, _ = users
+        db = MagicMock()
+        db.users.find = MagicMock(return_value=MagicMock(limit=MagicMock(return_value=AsyncCursor([
+            {"_id": ObjectId(a), "display_name": "A"},
+            {"_id": ObjectId(b), "display_name": "B"},
+        ]))))
+        graph = MagicMock(friend_ids=AsyncMock(return_value=frozenset()))
+        blocks = MagicMock(blocked_ids=AsyncMock(return_value=frozenset({b})))
+
+        results = await FriendService(db, graph=graph, blocks=blocks).search_friends(me, "user_id", a)
+
+        assert [result.user_id for result in results] == [a]
+        db.blocklist.find.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_block_user_records_block(self, users):
+        from src.services.friend_service import FriendService
+
+        me, a, _, _ = users
+        db = MagicMock()
+        db.blocklist.find_one = AsyncMock(return_value=None)
+        db.blocklist.insert_one = AsyncMock()
+        db.friendships.delete_many = AsyncMock()
+        graph = MagicMock(invalidate=AsyncMock())
+        blocks = MagicMock(record_block=AsyncMock())
+
+        await FriendService(db, graph=graph, blocks=blocks).block_user(me, a)
+
+        blocks.record_block.assert_awaited_once_with(me, a)
+
+    @pytest.mark.asyncio
+    async def test_feed_excludes_blocked_friends(self, users, monkeypatch):
+        from src.services import social_service
+        from src.services.social_service import SocialService
+
+        me, a, b, _ = users
+        monkeypatch.setattr(social_service.friend_graph, "friend_ids", AsyncMock(return_value=frozenset({a, b})))
+        monkeypatch.setattr(social_service.block_cache, "blocked_ids", AsyncMock(return_value=frozenset({b})))
+        db = MagicMock()
+        activities = MagicMock()
+        activities.sort.return_value.limit.return_value = AsyncCursor([])
+        db.activities.find = MagicMock(return_value=activities)
+
+        await SocialService(db).get_feed(me)
+
+        friend_ids = db.activities.find.call_args[0][0]["user_id"]["$in"]
+        assert {str(friend_id) for friend_id in friend_ids} == {me, a}
@@ -4,9 +4,11 @@ T212: Challenge Service 邏輯測試
 """
 
 import pytest
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from unittest.mock import AsyncMock, MagicMock, patch
 
+from motor_fakes import AsyncCursor
+
 
 class TestChallengeService:
     """Challenge Service 單元測試"""
@@ -160,3 +162,554 @@ class TestChallengeRankingService:
         # 完成者: challenger
         # 超過 150%: super_challenger
         assert service is not None
+
+
+class TestWorkoutDrivenProgress:
+    """運動記錄異動時的挑戰進度差量更新測試"""
+
+    START = datetime(2024, 5, 1)
+    END = datetime(2024, 5, 31)
+
+    @pytest.fixture
+    def mock_db(self):
+        """Mock 資料庫"""
+        db = MagicMock()
+        db.challenges = MagicMock()
+        db.participants = MagicMock()
+        db.participants.bulk_write = AsyncMock()
+        db.participants.update_one = AsyncMock()
+        db.workouts = MagicMock()
+        return db
+
+    def challenge(self, challenge_type, target_value=100.0, **extra):
+        from bson import ObjectId
+        return {
+            "_id": ObjectId(),
+            "challenge_type": challenge_type,
+            "target_value": target_value,
+            "start_date": self.START,
+            "end_date": self.END,
+            "status": "active",
+            **extra,
+        }
+
+    @staticmethod
+    def workout(user_id, day, **fields):
+        from bson import ObjectId
+        return {
+            "_id": ObjectId(),
+            "user_id": user_id,
+            "workout_type": "running",
+            "start_time": datetime(2024, 5, day, 7, 0),
+            "duration_minutes": 30,
+            "distance_km": 5.0,
+            "is_deleted": False,
+            **fields,
+        }
+
+    def with_participations(self, mock_db, user_id, challenges, synced=True):
+        from bson import ObjectId
+        participations = [
+            {"_id": ObjectId(), "challenge_id": challenge["_id"],
+             "progress_synced_at": datetime(2024, 4, 30) if synced else None}
+            for challenge in challenges
+        ]
+        mock_db.participants.find = MagicMock(return_value=AsyncCursor(participations))
+        mock_db.challenges.find = MagicMock(return_value=AsyncCursor(challenges))
+        return participations
+
+    @pytest.mark.asyncio
+    async def test_create_applies_deltas_in_one_bulk_write(self, mock_db):
+        """新增運動記錄：以索引查詢參與記錄，累加型挑戰以單一 bulk_write 差量更新"""
+        from bson import ObjectId
+        from src.services.challenge_service import ChallengeService
+
+        user_id = ObjectId()
+        distance = self.challenge("total_distance")
+        duration = self.challenge("total_duration")
+        cycling = self.challenge("specific_workout_type", target_value=10, workout_type="cycling")
+        participations = self.with_participations(mock_db, user_id, [distance, duration, cycling])
+
+        updated = await ChallengeService(mock_db).apply_workout_change(None, self.workout(user_id, 3))
+
+        assert updated == 2
+        query = mock_db.participants.find.call_args[0][0]
+        assert query == {"user_id": {"$in": [str(user_id), user_id]}, "status": {"$in": ["active", "completed"]}}
+        challenge_query = mock_db.challenges.find.call_args[0][0]
+        # 只讀取期間涵蓋該運動記錄的進行中挑戰
+        assert challenge_query["status"] == {"$ne": "completed"}
+        assert challenge_query["start_date"]["$lte"] == challenge_query["end_date"]["$gte"]
+
+        operations = mock_db.participants.bulk_write.await_args[0][0]
+        assert [op._filter["_id"] for op in operations] == [participations[0]["_id"], participations[1]["_id"]]
+        assert operations[0]._doc[0]["$set"]["current_progress"] == {"$max": [0, {"$add": ["$current_progress", 5.0]}]}
+        assert operations[1]._doc[0]["$set"]["current_progress"] == {"$max": [0, {"$add": ["$current_progress", 30]}]}
+
+    @pytest.mark.asyncio
+    async def test_applies_to_participant_as_stored(self, mock_db):
+        """_add_participant 寫入的參與記錄 (字串 ID) 與字串 user_id 的運動記錄皆能對應"""
+        from bson import ObjectId
+        from src.services.challenge_service import ChallengeService
+
+        user_id = str(ObjectId())
+        challenge = self.challenge("total_distance")
+        service = ChallengeService(mock_db)
+        mock_db.participants.insert_one = AsyncMock()
+        await service._add_participant(str(challenge["_id"]), user_id)
+        stored = {"_id": ObjectId(), **mock_db.participants.insert_one.await_args[0][0]}
+        assert isinstance(stored["challenge_id"], str)
+
+        mock_db.participants.find = MagicMock(return_value=AsyncCursor([stored]))
+        mock_db.challenges.find = MagicMock(return_value=AsyncCursor([challenge]))
+
+        assert await service.apply_workout_change(None, self.workout(user_id, 3)) == 1
+        assert mock_db.participants.find.call_args[0][0]["user_id"] == {"$in": [user_id, ObjectId(user_id)]}
+        assert mock_db.challenges.find.call_args[0][0]["_id"] == {"$in": [challenge["_id"]]}
+        assert mock_db.participants.bulk_write.await_args[0][0][0]._filter == {"_id": stored["_id"]}
+
+    @pytest.mark.asyncio
+    async def test_update_and_delete_apply_differences(self, mock_db):
+        """更新套用前後差值；刪除扣除原本的貢獻；未變動時不寫入"""
+        from bson import ObjectId
+        from src.services.challenge_service import ChallengeService
+
+        user_id = ObjectId()
+        self.with_participations(mock_db, user_id, [self.challenge("total_distance")])
+        service = ChallengeService(mock_db)
+        before = self.workout(user_id, 3)
+
+        await service.apply_workout_change(before, {**before, "distance_km": 8.0})
+        operation = mock_db.participants.bulk_write.await_args[0][0][0]
+        assert operation._doc[0]["$set"]["current_progress"]["$max"][1]["$add"][1] == pytest.approx(3.0)
+
+        await service.apply_workout_change(before, None)
+        operation = mock_db.participants.bulk_write.await_args[0][0][0]
+        assert operation._doc[0]["$set"]["current_progress"]["$max"][1]["$add"][1] == -5.0
+
+        mock_db.participants.bulk_write.reset_mock()
+        assert await service.apply_workout_change(before, {**before, "notes": "easy run"}) == 0
+        mock_db.participants.bulk_write.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_workout_outside_window_is_ignored(self, mock_db):
+        from bson import ObjectId
+        from src.services.challenge_service import ChallengeService
+
+        user_id = ObjectId()
+        self.with_participations(mock_db, user_id, [self.challenge("total_distance")])
+        workout = {**self.workout(user_id, 1), "start_time": datetime(2024, 6, 2)}
+
+        assert await ChallengeService(mock_db).apply_workout_change(None, workout) == 0
+        mock_db.participants.bulk_write.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_consecutive_days_from_calendar(self, mock_db):
+        """連續天數挑戰：更新運動日曆後重新計算最長連續天數"""
+        from bson import ObjectId
+        from src.services.challenge_service import ChallengeService
+
+        user_id = ObjectId()
+        participations = self.with_participations(mock_db, user_id, [self.challenge("consecutive_days", 7)])
+        mock_db.participants.find_one_and_update = AsyncMock(return_value={
+            "active_days": {"2024-05-01": 1, "2024-05-02": 2, "2024-05-03": 1, "2024-05-05": 1, "2024-05-06": 0},
+        })
+
+        await ChallengeService(mock_db).apply_workout_change(None, self.workout(user_id, 3))
+
+        query, update = mock_db.participants.find_one_and_update.await_args[0]
+        assert query == {"_id": participations[0]["_id"]}
+        assert update["$inc"] == {"active_days.2024-05-03": 1}
+        assert update["$set"]["last_updated"] == mock_db.participants.update_one.await_args[0][1]["$set"]["last_updated"]
+        progress = mock_db.participants.update_one.await_args[0][1]["$set"]
+        assert progress["current_progress"] == 3
+        assert progress["completion_percentage"] == pytest.approx(300 / 7)
+
+    @pytest.mark.asyncio
+    async def test_unsynced_participant_is_recomputed(self, mock_db):
+        """尚未同步的參與者：完整計算一次並標記同步時間"""
+        from bson import ObjectId
+        from src.services.challenge_service import ChallengeService
+
+        user_id = ObjectId()
+        challenge = self.challenge("total_distance", target_value=20)
+        self.with_participations(mock_db, user_id, [challenge], synced=False)
+        mock_db.workouts.aggregate = MagicMock(return_value=AsyncCursor([{"_id": None, "total": 12.5}]))
+
+        await ChallengeService(mock_db).apply_workout_change(None, self.workout(user_id, 3))
+
+        update = mock_db.participants.update_one.await_args[0][1]["$set"]
+        assert update["current_progress"] == 12.5
+        assert update["completion_percentage"] == 62.5
+        assert update["progress_synced_at"] is not None
+        mock_db.participants.bulk_write.assert_not_awaited()
+
+    def test_longest_streak(self):
+        from src.services.challenge_service import _longest_streak
+
+        assert _longest_streak([]) == 0
+        assert _longest_streak(["2024-05-03", "2024-05-01", "2024-05-02", "2024-05-10"]) == 3
+        assert _longest_streak(["2024-04-30", "2024-05-01"]) == 2
+
+
+class TestChallengeRankingJob:
+    """挑戰排名批次計算測試"""
+
+    @pytest.fixture
+    def mock_db(self):
+        """Mock 資料庫"""
+        db = MagicMock()
+        db.participants.bulk_write = AsyncMock()
+        return db
+
+    @staticmethod
+    def ranked(challenge_id, rank, progress, previous_rank=None, end_date=None, **extra):
+        from bson import ObjectId
+        return {
+            "_id": ObjectId(),
+            "challenge_id": challenge_id,
+            "user_id": ObjectId(),
+            "current_progress": progress,
+            "rank": rank,
+            "previous_rank": previous_rank,
+            "target_value": 20.0,
+            "end_date": end_date or datetime.utcnow() + timedelta(days=3),
+            **extra,
+        }
+
+    @pytest.mark.asyncio
+    async def test_one_aggregation_per_type_and_one_bulk_write_per_challenge(self, mock_db):
+        """同類型挑戰共用一次 aggregation，每個挑戰一次 bulk_write"""
+        from bson import ObjectId
+        from src.services.challenge_ranking import ChallengeRankingJob
+
+        distance = [{"_id": ObjectId(), "challenge_type": "total_distance"} for _ in range(3)]
+        streak = [{"_id": ObjectId(), "challenge_type": "consecutive_days"}]
+        mock_db.challenges.find = MagicMock(return_value=AsyncCursor(distance + streak))
+        ranked = {
+            "total_distance": [
+                self.ranked(distance[0]["_id"], 1, 30.0, previous_rank=1),
+                self.ranked(distance[0]["_id"], 2, 12.0, previous_rank=1),
+                self.ranked(distance[1]["_id"], 1, 5.0),
+            ],
+            "consecutive_days": [
+                self.ranked(streak[0]["_id"], 1, 2, previous_rank=1, active_days={"2024-05-01": 1}),
+            ],
+        }
+        mock_db.participants.aggregate = MagicMock(
+            side_effect=lambda pipeline: AsyncCursor(ranked["consecutive_days" if any(
+                "workout_days" in str(stage) for stage in pipeline
+            ) else "total_distance"])
+        )
+        realtime = MagicMock(publish_each=AsyncMock())
+
+        result = await ChallengeRankingJob(mock_db, realtime=realtime).run()
+
+        assert mock_db.participants.aggregate.call_count == 2
+        pipeline = mock_db.participants.aggregate.call_args_list[0][0][0]
+        ids = [c["_id"] for c in distance]
+        # 參與記錄的 challenge_id 以字串儲存：兩種型別皆比對，$lookup 轉回 ObjectId
+        assert pipeline[0]["$match"]["challenge_id"] == {"$in": ids + [str(i) for i in ids]}
+        assert pipeline[1]["$lookup"]["let"] == {"cid": {"$toObjectId": "$challenge_id"}}
+        assert any("$setWindowFields" in stage for stage in pipeline)
+        assert mock_db.participants.bulk_write.await_count == 3
+        assert result == {"challenges": 3, "participants": 4, "rank_changes": 2}
+
+        # 每位參與者：排名 / 徽章，以及只在未被差量更新時寫回的校正進度
+        first = mock_db.participants.bulk_write.await_args_list[0][0][0]
+        assert first[2]._doc["$set"] == {"rank": 2, "badge": None}
+        assert first[3]._doc["$set"]["completion_percentage"] == 60.0
+        streak_update = mock_db.participants.bulk_write.await_args_list[2][0][0][1]._doc["$set"]
+        assert streak_update["active_days"] == {"2024-05-01": 1}
+
+    @pytest.mark.asyncio
+    async def test_progress_write_skips_concurrent_deltas(self, mock_db):
+        """校正進度以 last_updated 不晚於計算時間為條件，不覆蓋期間內的差量更新"""
+        from bson import ObjectId
+        from src.services.challenge_ranking import ChallengeRankingJob
+
+        challenge_id = ObjectId()
+        participant = self.ranked(challenge_id, 1, 12.0)
+        mock_db.participants.aggregate = MagicMock(return_value=AsyncCursor([participant]))
+
+        started = datetime.now(timezone.utc)
+        await ChallengeRankingJob(mock_db, realtime=MagicMock(publish_each=AsyncMock())).rank_batch(
+            "total_distance", [challenge_id]
+        )
+
+        rank_op, progress_op = mock_db.participants.bulk_write.await_args[0][0]
+        assert rank_op._filter == {"_id": participant["_id"]}
+        assert "current_progress" not in rank_op._doc["$set"]
+        guard = progress_op._filter["$or"]
+        assert guard[1] == {"last_updated": None}
+        assert started <= guard[0]["last_updated"]["$lte"] <= progress_op._doc["$set"]["last_updated"]
+
+    @pytest.mark.asyncio
+    async def test_batches_large_challenge_sets(self, mock_db):
+        """挑戰數量超過批次上限時分批 aggregation"""
+        from bson import ObjectId
+        from src.services.challenge_ranking import ChallengeRankingJob
+
+        challenges = [{"_id": ObjectId(), "challenge_type": "total_duration"} for _ in range(5)]
+        mock_db.challenges.find = MagicMock(return_value=AsyncCursor(challenges))
+        mock_db.participants.aggregate = MagicMock(side_effect=lambda pipeline: AsyncCursor([]))
+
+        await ChallengeRankingJob(mock_db, batch_size=2, realtime=MagicMock()).run()
+
+        assert mock_db.participants.aggregate.call_count == 3
+
+    @pytest.mark.asyncio
+    async def test_rank_changes_are_published(self, mock_db):
+        """排名變動的參與者收到 rank_change 事件"""
+        from bson import ObjectId
+        from src.services.challenge_ranking import ChallengeRankingJob
+        from src.services.realtime_hub import EVENT_RANK_CHANGE
+
+        challenge_id = ObjectId()
+        climber = self.ranked(challenge_id, 1, 25.0, previous_rank=2)
+        steady = self.ranked(challenge_id, 3, 4.0, previous_rank=3)
+        mock_db.participants.aggregate = MagicMock(return_value=AsyncCursor([climber, steady]))
+        realtime = MagicMock(publish_each=AsyncMock())
+
+        await ChallengeRankingJob(mock_db, realtime=realtime).rank_batch("total_distance", [challenge_id])
+
+        event_type, changed = realtime.publish_each.await_args[0]
+        assert event_type == EVENT_RANK_CHANGE
+        assert changed == {str(climber["user_id"]): {
+            "challenge_id": str(challenge_id), "rank": 1, "previous_rank": 2, "current_progress": 25.0,
+        }}
+
+    @pytest.mark.asyncio
+    async def test_badges_only_after_challenge_ends(self, mock_db):
+        """挑戰結束後才頒發徽章"""
+        from bson import ObjectId
+        from src.services.challenge_ranking import ChallengeRankingJob
+
+        challenge_id = ObjectId()
+        ended = datetime.utcnow() - timedelta(minutes=1)
+        mock_db.participants.aggregate = MagicMock(return_value=AsyncCursor([
+            self.ranked(challenge_id, 1, 40.0, end_date=ended),
+            self.ranked(challenge_id, 4, 31.0, end_date=ended),
+            self.ranked(challenge_id, 5, 20.0, end_date=ended),
+        ]))
+
+        await ChallengeRankingJob(mock_db, realtime=MagicMock(publish_each=AsyncMock())).rank_batch(
+            "total_distance", [challenge_id]
+        )
+
+        operations = mock_db.participants.bulk_write.await_args[0][0]
+        badges = [op._doc["$set"]["badge"] for op in operations if "badge" in op._doc["$set"]]
+        assert badges == ["gold", "super_challenger", "challenger"]
+
+    def test_challenge_badge(self):
+        from src.services.challenge_ranking import challenge_badge
+
+        assert challenge_badge(1, 10, 20, final=False) is None
+        assert challenge_badge(2, 10, 20, final=True) == "silver"
+        assert challenge_badge(3, 0, 20, final=True) is None
+        assert challenge_badge(7, 19, 20, final=True) is None
+
+    def test_pipeline_filters_specific_workout_type(self):
+        from bson import ObjectId
+        from src.services.challenge_ranking import ranking_pipeline
+
+        pipeline = ranking_pipeline("specific_workout_type", [ObjectId()])
+        lookup = next(stage["$lookup"] for stage in pipeline if stage.get("$lookup", {}).get("from") == "workouts")
+
+        conditions = lookup["pipeline"][0]["$match"]["$expr"]["$and"]
+        assert {"$eq": ["$workout_type", "$$workout_type"]} in conditions[-1]["$or"]
+        assert lookup["pipeline"][1]["$group"]["total"] == {"$sum": 1}
+
+
+class TestChallengeReads:
+    """挑戰清單、詳情與排行榜的批次查詢測試"""
+
+    @pytest.fixture
+    def mock_db(self):
+        """Mock 資料庫"""
+        return MagicMock()
+
+    @staticmethod
+    def challenge(day, **extra):
+        from bson import ObjectId
+        return {
+            "_id": ObjectId(),
+            "challenge_type": "total_distance",
+            "target_value": 20.0,
+            "start_date": datetime(2024, 5, day),
+            "end_date": datetime(2024, 5, day + 7),
+            "status": "active",
+            "participant_count": 3,
+            **extra,
+        }
+
+    @staticmethod
+    def participant(rank, **extra):
+        from bson import ObjectId
+        return {
+            "_id": ObjectId(),
+            "user_id": ObjectId(),
+            "joined_at": datetime(2024, 4, 30),
+            "current_progress": 10.0,
+            "completion_percentage": 50.0,
+            "rank": rank,
+            "status": "active",
+            "user": {"display_name": f"Runner {rank}", "avatar_url": None},
+            **extra,
+        }
+
+    @pytest.mark.asyncio
+    async def test_list_pages_by_index_and_returns_next_cursor(self, mock_db):
+        """頁面以索引條件、排序與 limit 直接查詢，多取的一筆產生下一頁游標；第一頁另計總數"""
+        from bson import ObjectId
+        from src.services.challenge_service import ChallengeService, decode_challenge_cursor
+
+        page = [
+            self.challenge(3, my_participation={"completion_percentage": 40.0, "rank": 2}),
+            self.challenge(2),
+            self.challenge(1),
+        ]
+        mock_db.challenges.aggregate = MagicMock(return_value=AsyncCursor(page))
+        mock_db.challenges.count_documents = AsyncMock(return_value=7)
+
+        items, total, next_cursor = await ChallengeService(mock_db).get_challenges(
+            str(ObjectId()), role="creator", limit=2
+        )
+
+        assert total == 7
+        assert [item.challenge_id for item in items] == [str(page[0]["_id"]), str(page[1]["_id"])]
+        assert (items[0].my_progress, items[0].my_rank) == (40.0, 2)
+        assert (items[1].my_progress, items[1].my_rank) == (0, None)
+        start_date, last_id = decode_challenge_cursor(next_cursor)
+        assert last_id == page[1]["_id"]
+        assert start_date.replace(tzinfo=None) == page[1]["start_date"]
+
+        pipeline = mock_db.challenges.aggregate.call_args[0][0]
+        assert "creator_id" in pipeline[0]["$match"]
+        assert pipeline[1:3] == [{"$sort": {"start_date": -1, "_id": -1}}, {"$limit": 3}]
+        assert pipeline[3]["$lookup"]["from"] == "participants"
+        assert not any("$facet" in stage for stage in pipeline)
+        assert mock_db.challenges.count_documents.call_args[0][0] == pipeline[0]["$match"]
+
+    @pytest.mark.asyncio
+    async def test_cursor_page_skips_total(self, mock_db):
+        """傳入 cursor：keyset 條件併入索引 $match，不再計算總數"""
+        from bson import ObjectId
+        from src.services.challenge_service import ChallengeService, encode_challenge_cursor
+
+        mock_db.challenges.aggregate = MagicMock(return_value=AsyncCursor([]))
+        mock_db.challenges.count_documents = AsyncMock()
+        cursor = encode_challenge_cursor(self.challenge(5))
+
+        items, total, next_cursor = await ChallengeService(mock_db).get_challenges(
+            str(ObjectId()), cursor=cursor
+        )
+
+        assert (items, total, next_cursor) == ([], None, None)
+        match = mock_db.challenges.aggregate.call_args[0][0][0]["$match"]
+        assert match["status"] == "active" and "$or" in match
+        mock_db.challenges.count_documents.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_participant_role_starts_from_participations(self, mock_db):
+        """role=participant：由參與記錄 $lookup 挑戰，以 keyset 條件取代 skip"""
+        from bson import ObjectId
+        from src.services.challenge_service import ChallengeService, encode_challenge_cursor
+
+        mock_db.participants.aggregate = MagicMock(return_value=AsyncCursor([]))
+        cursor = encode_challenge_cursor(self.challenge(5))
+
+        items, total, next_cursor = await ChallengeService(mock_db).get_challenges(
+            str(ObjectId()), role="participant", offset=40, cursor=cursor
+        )
+
+        assert (items, total, next_cursor) == ([], None, None)
+        mock_db.participants.aggregate.assert_called_once()
+        pipeline = mock_db.participants.aggregate.call_args[0][0]
+        assert pipeline[1]["$lookup"]["from"] == "challenges"
+        assert "$or" in pipeline[1]["$lookup"]["pipeline"][0]["$match"]
+        assert pipeline[-2:] == [{"$sort": {"start_date": -1, "_id": -1}}, {"$limit": 21}]
+        assert not any("$skip" in stage or "$facet" in stage for stage in pipeline)
+
+    @pytest.mark.asyncio
+    async def test_invalid_cursor(self, mock_db):
+        from bson import ObjectId
+        from src.services.challenge_service import ChallengeService
+
+        with pytest.raises(ValueError, match="Invalid cursor"):
+            await ChallengeService(mock_db).get_challenges(str(ObjectId()), cursor="not-a-cursor")
+
+    @pytest.mark.asyncio
+    async def test_detail_includes_user_cards(self, mock_db):
+        """詳情：創建者與參與者使用者卡片隨挑戰一併取得"""
+        from bson import ObjectId
+        from src.services.challenge_service import ChallengeService
+
+        creator_id = ObjectId()
+        challenge = self.challenge(
+            1, creator_id=creator_id, privacy="public", created_at=datetime(2024, 4, 1),
+            creator=[{"_id": creator_id, "display_name": "Coach"}],
+            participants=[self.participant(1), self.participant(2)],
+        )
+        mock_db.challenges.aggregate = MagicMock(return_value=AsyncCursor([challenge]))
+
+        detail = await ChallengeService(mock_db).get_challenge_detail(str(challenge["_id"]), str(creator_id))
+
+        assert detail.creator["display_name"] == "Coach"
+        assert [p["display_name"] for p in detail.participants] == ["Runner 1", "Runner 2"]
+
+    @pytest.mark.asyncio
+    async def test_leaderboard_not_found(self, mock_db):
+        from bson import ObjectId
+        from src.services.challenge_service import ChallengeService
+
+        mock_db.challenges.aggregate = MagicMock(return_value=AsyncCursor([]))
+
+        with pytest.raises(ValueError, match="Challenge not found"):
+            await ChallengeService(mock_db).get_leaderboard(str(ObjectId()))
+
+
+class TestChallengeLifecycle:
+    """挑戰狀態轉換測試"""
+
+    @pytest.fixture
+    def mock_db(self):
+        """Mock 資料庫"""
+        db = MagicMock()
+        db.challenges.update_many = AsyncMock(
+            side_effect=lambda query, update: MagicMock(modified_count=len(query["_id"]["$in"]))
+        )
+        return db
+
+    @pytest.mark.asyncio
+    async def test_transitions_use_indexed_batches(self, mock_db):
+        """到期挑戰以 (status, start_date) 條件分批轉換；結束的挑戰先計算最終排名"""
+        from bson import ObjectId
+        from src.services.challenge_lifecycle import ChallengeLifecycle
+
+        upcoming = [{"_id": ObjectId(), "challenge_type": "total_distance"} for _ in range(3)]
+        ended = [
+            {"_id": ObjectId(), "challenge_type": "total_distance"},
+            {"_id": ObjectId(), "challenge_type": "consecutive_days"},
+        ]
+        batches = {"upcoming": [upcoming[:2], upcoming[2:]], "active": [ended]}
+        queries = []
+
+        def find(query, projection=None):
+            queries.append(query)
+            return AsyncCursor(batches[query["status"]].pop(0) if batches[query["status"]] else [])
+
+        mock_db.challenges.find = MagicMock(side_effect=find)
+        ranking = MagicMock(rank_batch=AsyncMock())
+        now = datetime(2024, 6, 1)
+
+        result = await ChallengeLifecycle(mock_db, batch_size=2, ranking=ranking).advance(now)
+
+        assert result == {"activated": 3, "completed": 2}
+        assert all(query["start_date"] == {"$lte": now} for query in queries)
+        assert queries[-1]["end_date"] == {"$lte": now}
+        ranked = {call[0][0]: call[0][1] for call in ranking.rank_batch.await_args_list}
+        assert ranked == {"total_distance": [ended[0]["_id"]], "consecutive_days": [ended[1]["_id"]]}
+
+        query, update = mock_db.challenges.update_many.await_args_list[-1][0]
+        assert query["status"] == "active"
+        assert update["$set"]["status"] == "completed"
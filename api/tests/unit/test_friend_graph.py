@@ -0,0 +1,150 @@
+"""
+Friend Graph 單元測試
+測試好友關係快取、清除與跨 worker 清除通知
+"""
+
+import asyncio
+from datetime import datetime, timezone
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from bson import ObjectId
+
+from src.core.pubsub import LocalBroker
+from src.services.friend_graph import INVALIDATION_CHANNEL, FriendGraph
+
+from motor_fakes import AsyncCursor
+
+
+@pytest.fixture
+def users():
+    return [str(ObjectId()) for _ in range(4)]
+
+
+@pytest.fixture
+def db(users):
+    """users[0] 與 users[1]、users[2] 為好友"""
+    me, a, b, _ = users
+    db = MagicMock()
+    db.friendships.find = MagicMock(side_effect=lambda *args, **kwargs: AsyncCursor([
+        {"user_id": ObjectId(me), "friend_id": ObjectId(a)},
+        {"user_id": ObjectId(b), "friend_id": ObjectId(me)},
+    ]))
+    return db
+
+
+class TestFriendGraph:
+    """測試好友關係查詢與快取"""
+
+    @pytest.mark.asyncio
+    async def test_queries_share_one_load(self, db, users):
+        me, a, b, stranger = users
+        graph = FriendGraph()
+
+        assert await graph.friend_ids(db, me) == {a, b}
+        assert await graph.are_friends(db, me, a)
+        assert not await graph.are_friends(db, me, stranger)
+        assert await graph.friend_count(db, me) == 2
+
+        db.friendships.find.assert_called_once()
+        query = db.friendships.find.call_args[0][0]
+        assert query["status"] == "accepted"
+        assert graph.get_metrics()["hits"] == 3
+
+    @pytest.mark.asyncio
+    async def test_lru_is_bounded(self, db, users):
+        graph = FriendGraph(maxsize=2)
+        for user_id in users[:3]:
+            await graph.friend_ids(db, user_id)
+
+        assert graph.get_metrics()["cached_users"] == 2
+
+    @pytest.mark.asyncio
+    async def test_invalidate_evicts_both_users(self, db, users):
+        me, a, _, _ = users
+        graph = FriendGraph()
+        await graph.friend_ids(db, me)
+        await graph.friend_ids(db, a)
+
+        await graph.invalidate(me, ObjectId(a))
+
+        assert graph.get_metrics()["cached_users"] == 0
+
+    @pytest.mark.asyncio
+    async def test_load_racing_invalidation_is_not_cached(self, db, users):
+        """載入期間發生清除時不寫入快取"""
+        me = users[0]
+        db.friendships.find = MagicMock(return_value=AsyncCursor([], delay=0.01))
+        graph = FriendGraph()
+
+        load = asyncio.create_task(graph.friend_ids(db, me))
+        await asyncio.sleep(0)
+        await graph.invalidate(me)
+        await load
+
+        assert graph.get_metrics()["cached_users"] == 0
+
+    @pytest.mark.asyncio
+    async def test_invalidation_is_broadcast(self, db, users):
+        """清除通知經由 broker 送到其他 worker"""
+        me, a, _, _ = users
+        broker = LocalBroker()
+        broker.publish_many = AsyncMock(wraps=broker.publish_many)
+        graph = FriendGraph(broker=broker)
+        await graph.start()
+        try:
+            await graph.friend_ids(db, me)
+            await graph.invalidate(me, a)
+
+            broker.publish_many.assert_awaited_once_with([(INVALIDATION_CHANNEL, f"{me},{a}")])
+
+            # 其他 worker 發布的清除通知
+            await graph.friend_ids(db, me)
+            graph._on_invalidation(INVALIDATION_CHANNEL, me)
+            assert graph.get_metrics()["cached_users"] == 0
+        finally:
+            await graph.stop()
+
+
+class TestFriendServiceInvalidation:
+    """測試好友關係異動時清除快取"""
+
+    @pytest.mark.asyncio
+    async def test_accept_and_remove_invalidate(self, users):
+        from src.services.friend_service import FriendService
+
+        me, a, _, _ = users
+        friendship = {
+            "_id": ObjectId(),
+            "user_id": ObjectId(a),
+            "friend_id": ObjectId(me),
+            "status": "pending",
+            "invited_at": datetime.now(timezone.utc),
+        }
+        db = MagicMock()
+        db.friendships.find_one = AsyncMock(return_value=friendship)
+        db.friendships.update_one = AsyncMock()
+        db.friendships.delete_one = AsyncMock()
+        graph = MagicMock(invalidate=AsyncMock())
+        service = FriendService(db, graph=graph)
+
+        await service.accept_friend_request(me, str(friendship["_id"]))
+        await service.remove_friend(me, str(friendship["_id"]))
+
+        assert graph.invalidate.await_count == 2
+        assert graph.invalidate.await_args[0] == (ObjectId(a), ObjectId(me))
+
+    @pytest.mark.asyncio
+    async def test_friend_cap_uses_cached_count(self, users):
+        from src.services.friend_service import FriendService
+
+        me, a, _, _ = users
+        db = MagicMock()
+        db.users.find_one = AsyncMock(return_value={"_id": ObjectId(a)})
+        db.friendships.count_documents = AsyncMock()
+        graph = MagicMock(friend_count=AsyncMock(return_value=200))
+        blocks = MagicMock(is_blocked=AsyncMock(return_value=False))
+
+        with pytest.raises(ValueError, match="Friend limit reached"):
+            await FriendService(db, graph=graph, blocks=blocks).send_friend_invite(me, a)
+
+        db.friendships.count_documents.assert_not_awaited()
@@ -0,0 +1,114 @@
+"""
+Image Derivatives 單元測試
+測試衍生版本尺寸與格式、內容定址 key 與上傳順序
+"""
+
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from unittest.mock import AsyncMock, MagicMock
+
+from src.core.storage import LocalStorage
+from src.utils import image_derivatives
+from src.utils.image_derivatives import (
+    IMAGE_DERIVATIVE_SIZES,
+    ImageDerivativeGenerator,
+    ImageDerivativePool,
+    image_derivative_formats,
+    image_derivative_key,
+    render_image_derivatives,
+)
+
+PIL = pytest.importorskip("PIL")
+from PIL import Image  # noqa: E402
+
+
+def make_jpeg(width: int, height: int) -> bytes:
+    buffer = BytesIO()
+    Image.new("RGB", (width, height), (200, 80, 40)).save(buffer, format="JPEG", quality=95)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def storage():
+    """模擬物件儲存"""
+    storage = MagicMock()
+    storage.object_exists = AsyncMock(return_value=False)
+    storage.upload_file = AsyncMock(side_effect=lambda image, key, **kwargs: f"https://cdn/{key}")
+    storage.public_url = MagicMock(side_effect=lambda key: f"https://cdn/{key}")
+    return storage
+
+
+@pytest.fixture
+def generator(storage):
+    """以 thread pool 執行的衍生版本生成器"""
+    executor = ThreadPoolExecutor(max_workers=2)
+    yield ImageDerivativeGenerator(storage=storage, pool=ImageDerivativePool(executor=executor))
+    executor.shutdown()
+
+
+class TestRenderImageDerivatives:
+    """測試衍生版本繪製"""
+
+    def test_sizes_keep_aspect_ratio(self):
+        """各尺寸長邊不超過上限並保持長寬比，小圖不放大"""
+        derivatives, elapsed_ms = render_image_derivatives(make_jpeg(3000, 2000), ("webp",))
+
+        assert set(derivatives) == set(IMAGE_DERIVATIVE_SIZES)
+        for size, max_edge in IMAGE_DERIVATIVE_SIZES.items():
+            with Image.open(BytesIO(derivatives[size]["webp"])) as image:
+                assert image.format == "WEBP"
+                assert max(image.size) == max_edge
+                assert abs(image.width / image.height - 1.5) < 0.01
+        assert elapsed_ms > 0
+
+        small, _ = render_image_derivatives(make_jpeg(200, 100), ("webp",))
+        with Image.open(BytesIO(small["full"]["webp"])) as image:
+            assert image.size == (200, 100)
+
+    def test_rejects_non_image(self):
+        """無法解碼的資料回報 ValueError"""
+        with pytest.raises(ValueError):
+            render_image_derivatives(b"not an image", ("webp",))
+
+
+class TestImageDerivativeGenerator:
+    """測試衍生版本上傳"""
+
+    @pytest.mark.asyncio
+    async def test_uploads_all_variants_marker_last(self, generator, storage):
+        """上傳所有尺寸與格式，全尺寸 WebP 最後上傳"""
+        variants = await generator.create(make_jpeg(1200, 800), "activity-images", content_hash="abcdef")
+
+        formats = image_derivative_formats()
+        keys = [call.args[1] for call in storage.upload_file.await_args_list]
+        assert len(keys) == len(IMAGE_DERIVATIVE_SIZES) * len(formats)
+        assert keys[-1] == image_derivative_key("activity-images", "abcdef", "full", "webp")
+        assert variants["thumb"]["webp"] == "https://cdn/activity-images/ab/abcdef/thumb.webp"
+
+    @pytest.mark.asyncio
+    async def test_existing_variants_skip_render(self, generator, storage):
+        """衍生版本已存在 - 不重新產生與上傳"""
+        storage.object_exists = AsyncMock(return_value=True)
+        generator.pool.render = AsyncMock()
+
+        variants = await generator.create(b"any", "activity-images", content_hash="abcdef")
+
+        generator.pool.render.assert_not_called()
+        storage.upload_file.assert_not_called()
+        assert set(variants) == set(IMAGE_DERIVATIVE_SIZES)
+
+    @pytest.mark.asyncio
+    async def test_create_from_stored_object(self, generator, tmp_path, monkeypatch):
+        """由已上傳的原圖產生衍生版本，讀寫皆經由 worker 的儲存"""
+        worker_storage = LocalStorage(str(tmp_path), public_base_url="https://cdn")
+        monkeypatch.setattr(image_derivatives, "_worker_storage", worker_storage)
+        worker_storage._put_object("uploads/avatar/u1/s1", make_jpeg(800, 800), "image/jpeg", None)
+
+        variants = await generator.create_from_object("uploads/avatar/u1/s1", "avatars")
+
+        content_hash = variants["thumb"]["webp"].split("/")[-2]
+        for size in IMAGE_DERIVATIVE_SIZES:
+            assert worker_storage._head_object(image_derivative_key("avatars", content_hash, size, "webp"))
+        assert generator.pool.get_run_stats()["stored_derivatives"]["count"] == 1
+        worker_storage.close()
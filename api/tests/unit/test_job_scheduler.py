@@ -0,0 +1,207 @@
+"""
+Job Scheduler 單元測試
+測試 cron 觸發、Mongo 租約選出單一執行者、租約延長與失敗記錄
+"""
+
+import asyncio
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+from pymongo.errors import DuplicateKeyError
+
+from src.services.job_scheduler import JobScheduler, register_default_jobs
+
+
+class _FakeLeases:
+    """job_leases 集合替身 (支援本模組使用的 update_one 條件與 upsert)"""
+
+    def __init__(self):
+        self.documents = {}
+
+    @staticmethod
+    def _matches(document, query):
+        for field, condition in query.items():
+            value = document.get(field)
+            if isinstance(condition, dict):
+                if "$lte" in condition and not value <= condition["$lte"]:
+                    return False
+                if "$lt" in condition and not value < condition["$lt"]:
+                    return False
+            elif value != condition:
+                return False
+        return True
+
+    async def update_one(self, query, update, upsert=False):
+        document = self.documents.get(query["_id"])
+        if document is not None and self._matches(document, query):
+            document.update(update["$set"])
+            return MagicMock(matched_count=1)
+        if upsert:
+            if document is not None:
+                raise DuplicateKeyError("E11000 duplicate key error")
+            self.documents[query["_id"]] = {"_id": query["_id"], **update["$set"]}
+            return MagicMock(matched_count=0)
+        return MagicMock(matched_count=0)
+
+
+@pytest.fixture
+def db():
+    db = MagicMock()
+    db.job_leases = _FakeLeases()
+    return db
+
+
+def _scheduler(db, owner, **kwargs):
+    scheduler = JobScheduler(owner_id=owner, **kwargs)
+    scheduler.db = db
+    return scheduler
+
+
+class TestLeaderElection:
+    """測試租約選出單一執行者"""
+
+    @pytest.mark.asyncio
+    async def test_one_worker_runs_each_fire_time(self, db):
+        """多個 worker 同一觸發時間只有一個執行"""
+        calls = []
+
+        async def job(_db):
+            calls.append(1)
+            return {"ok": True}
+
+        workers = [_scheduler(db, f"worker-{i}") for i in range(3)]
+        for worker in workers:
+            worker.add_job("ranking", "*/5 * * * *", job)
+        fire_time = datetime(2024, 5, 1, 12, 5, tzinfo=timezone.utc)
+
+        results = await asyncio.gather(*(worker.run_job("ranking", fire_time) for worker in workers))
+
+        assert len(calls) == 1
+        assert sorted(results, key=bool) == [None, None, {"ok": True}]
+        assert sum(worker.jobs["ranking"].skipped for worker in workers) == 2
+        lease = db.job_leases.documents["ranking"]
+        assert lease["last_status"] == "succeeded"
+        assert lease["last_result"] == {"ok": True}
+
+        # 下一次觸發可由任一 worker 執行
+        await workers[1].run_job("ranking", fire_time + timedelta(minutes=5))
+        assert len(calls) == 2
+        assert db.job_leases.documents["ranking"]["owner"] == "worker-1"
+
+    @pytest.mark.asyncio
+    async def test_unexpired_lease_blocks_next_fire(self, db):
+        """執行中斷 (租約未釋放) 時，租約到期前其他 worker 不會重複執行"""
+        now = datetime.now(timezone.utc)
+        db.job_leases.documents["trash_purge"] = {
+            "_id": "trash_purge",
+            "owner": "crashed",
+            "scheduled_at": now - timedelta(minutes=1),
+            "expires_at": now + timedelta(minutes=1),
+        }
+        calls = []
+
+        async def job(_db):
+            calls.append(1)
+
+        worker = _scheduler(db, "worker-1")
+        worker.add_job("trash_purge", "* * * * *", job)
+
+        await worker.run_job("trash_purge", now)
+        assert calls == []
+
+        db.job_leases.documents["trash_purge"]["expires_at"] = now - timedelta(seconds=1)
+        await worker.run_job("trash_purge", now)
+        assert calls == [1]
+
+    @pytest.mark.asyncio
+    async def test_lease_renewed_while_running_and_lost_lease_cancels(self, db):
+        """長時間工作定期延長租約；租約被取走時取消工作"""
+        cancelled = asyncio.Event()
+
+        async def job(_db):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        worker = _scheduler(db, "worker-1")
+        worker.add_job("annual_review", "0 4 * 12 *", job, lease_seconds=0.06)
+        run = asyncio.create_task(worker.run_job("annual_review"))
+
+        await asyncio.sleep(0.05)
+        lease = db.job_leases.documents["annual_review"]
+        assert lease["expires_at"] > lease["started_at"] + timedelta(seconds=0.06)
+
+        lease["owner"] = "another-worker"
+        assert await run is None
+        assert cancelled.is_set()
+        assert worker.jobs["annual_review"].failures == 1
+
+    @pytest.mark.asyncio
+    async def test_failure_is_recorded_and_lease_released(self, db):
+        async def job(_db):
+            raise RuntimeError("boom")
+
+        worker = _scheduler(db, "worker-1")
+        worker.add_job("leaderboard_snapshots", "0 * * * *", job)
+
+        assert await worker.run_job("leaderboard_snapshots") is None
+
+        lease = db.job_leases.documents["leaderboard_snapshots"]
+        assert (lease["last_status"], lease["last_error"]) == ("failed", "boom")
+        assert lease["expires_at"] <= datetime.now(timezone.utc)
+        metrics = worker.get_metrics()["jobs"]["leaderboard_snapshots"]
+        assert (metrics["runs"], metrics["failures"]) == (1, 1)
+
+
+class TestTriggers:
+    """測試 cron 觸發"""
+
+    def test_invalid_cron_and_duplicate_name(self):
+        scheduler = JobScheduler(owner_id="w")
+        with pytest.raises(ValueError):
+            scheduler.add_job("bad", "every minute", MagicMock())
+        scheduler.add_job("job", "* * * * *", MagicMock())
+        with pytest.raises(ValueError, match="already registered"):
+            scheduler.add_job("job", "*/5 * * * *", MagicMock())
+
+    def test_missed_fire_times_are_coalesced(self):
+        scheduler = JobScheduler(owner_id="w")
+        scheduler.add_job("job", "*/5 * * * *", MagicMock())
+        job = scheduler.jobs["job"]
+
+        job.schedule_next(datetime(2024, 5, 1, 12, 5, tzinfo=timezone.utc))
+        assert job.next_run_at == datetime(2024, 5, 1, 12, 10, tzinfo=timezone.utc)
+
+        job.schedule_next(datetime(2024, 5, 1, 13, 2, 30, tzinfo=timezone.utc))
+        assert job.next_run_at == datetime(2024, 5, 1, 13, 5, tzinfo=timezone.utc)
+
+    @pytest.mark.asyncio
+    async def test_worker_runs_due_jobs(self, db):
+        ran = asyncio.Event()
+
+        async def job(_db):
+            ran.set()
+
+        scheduler = JobScheduler(owner_id="w", max_sleep=0.01)
+        scheduler.add_job("job", "0 0 1 1 *", job)
+        scheduler.start(db)
+        try:
+            scheduler.jobs["job"].next_run_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+            await asyncio.wait_for(ran.wait(), timeout=1)
+            assert scheduler.jobs["job"].next_run_at > datetime.now(timezone.utc)
+        finally:
+            await scheduler.stop()
+
+    def test_default_jobs(self):
+        scheduler = JobScheduler(owner_id="w")
+        register_default_jobs(scheduler)
+
+        assert set(scheduler.jobs) == {
+            "challenge_lifecycle",
+            "challenge_ranking",
+            "leaderboard_snapshots",
+            "trash_purge",
+            "annual_review_pregeneration",
+        }
@@ -7,6 +7,10 @@ import pytest
 from datetime import datetime, time
 from unittest.mock import AsyncMock, MagicMock, patch
 
+from src.utils.fcm_helper import FCM_MULTICAST_MAX_TOKENS, FakeFCMHelper
+
+from motor_fakes import AsyncCursor
+
 
 class TestNotificationService:
     """Notification Service 單元測試"""
@@ -196,3 +200,590 @@ class TestFCMIntegration:
         service = NotificationService(mock_db)
         # 驗證每日摘要邏輯
         assert service is not None
+
+
+class TestNotificationPreferenceCache:
+    """通知偏好設定快取與批次讀取測試"""
+
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        from src.services.notification_service import _preference_cache
+        _preference_cache.clear()
+        yield
+        _preference_cache.clear()
+
+    @pytest.fixture
+    def mock_db(self):
+        """Mock 資料庫"""
+        db = MagicMock()
+        db.notifications = AsyncMock()
+        db.notification_counters = AsyncMock()
+        db.notification_preferences = MagicMock()
+        db.users = AsyncMock()
+        return db
+
+    @pytest.mark.asyncio
+    async def test_preferences_cached(self, mock_db):
+        """偏好設定 - 第二次讀取命中快取"""
+        from bson import ObjectId
+        from src.services.notification_service import NotificationService
+
+        user_id = str(ObjectId())
+        mock_db.notification_preferences.find_one = AsyncMock(return_value={
+            "friend_activity_enabled": False
+        })
+
+        service = NotificationService(mock_db)
+        first = await service.get_notification_preferences(user_id)
+        second = await service.get_notification_preferences(user_id)
+
+        assert first == second
+        assert second["friend_activity_enabled"] is False
+        assert second["interaction_enabled"] is True
+        mock_db.notification_preferences.find_one.assert_awaited_once()
+
+        # 回傳副本，修改不影響快取
+        second["interaction_enabled"] = False
+        third = await service.get_notification_preferences(user_id)
+        assert third["interaction_enabled"] is True
+
+    @pytest.mark.asyncio
+    async def test_update_invalidates_cache(self, mock_db):
+        """更新偏好設定 - 快取失效"""
+        from bson import ObjectId
+        from src.services.notification_service import NotificationService
+
+        user_id = str(ObjectId())
+        mock_db.notification_preferences.find_one = AsyncMock(side_effect=[
+            {"interaction_enabled": True},
+            {"interaction_enabled": False},
+        ])
+        mock_db.notification_preferences.update_one = AsyncMock()
+
+        service = NotificationService(mock_db)
+        assert (await service.get_notification_preferences(user_id))["interaction_enabled"] is True
+
+        updated = await service.update_notification_preferences(
+            user_id, {"interaction_enabled": False}
+        )
+
+        assert updated["interaction_enabled"] is False
+        assert mock_db.notification_preferences.find_one.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_batch_loads_misses_in_one_query(self, mock_db):
+        """批次讀取 - 快取未命中以單一 $in 查詢載入，缺少文件使用預設值"""
+        from bson import ObjectId
+        from src.services.notification_service import NotificationService
+
+        cached_id, stored_id, missing_id = (str(ObjectId()) for _ in range(3))
+        mock_db.notification_preferences.find_one = AsyncMock(return_value=None)
+        mock_db.notification_preferences.find = MagicMock(return_value=AsyncCursor([
+            {"user_id": ObjectId(stored_id), "challenge_update_enabled": False}
+        ]))
+
+        service = NotificationService(mock_db)
+        await service.get_notification_preferences(cached_id)
+        result = await service.get_notification_preferences_batch(
+            [cached_id, stored_id, missing_id, stored_id]
+        )
+
+        assert set(result) == {cached_id, stored_id, missing_id}
+        assert result[stored_id]["challenge_update_enabled"] is False
+        assert result[missing_id]["challenge_update_enabled"] is True
+
+        mock_db.notification_preferences.find.assert_called_once()
+        query = mock_db.notification_preferences.find.call_args[0][0]
+        assert query["user_id"]["$in"] == [ObjectId(stored_id), ObjectId(missing_id)]
+
+        # 批次載入後皆已快取
+        await service.get_notification_preferences_batch([stored_id, missing_id])
+        mock_db.notification_preferences.find.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_challenge_participants_skip_disabled(self, mock_db):
+        """挑戰通知 - 依批次載入的偏好設定略過關閉通知的參與者"""
+        from bson import ObjectId
+        from src.services.notification_service import NotificationService
+
+        enabled_id, disabled_id = str(ObjectId()), str(ObjectId())
+        mock_db.notification_preferences.find = MagicMock(return_value=AsyncCursor([
+            {"user_id": ObjectId(disabled_id), "challenge_update_enabled": False}
+        ]))
+        mock_db.notification_preferences.find_one = AsyncMock()
+        mock_db.notifications.insert_many = AsyncMock()
+
+        service = NotificationService(mock_db, push_queue=MagicMock(enqueue=AsyncMock()))
+        await service.notify_challenge_participants(
+            [enabled_id, disabled_id], str(ObjectId()), "milestone", "挑戰進度 50%"
+        )
+
+        mock_db.notification_preferences.find_one.assert_not_awaited()
+        documents = mock_db.notifications.insert_many.await_args[0][0]
+        assert [str(document["user_id"]) for document in documents] == [enabled_id]
+
+
+class TestBulkFanOut:
+    """批次 fan-out 測試"""
+
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        from src.services.notification_service import _preference_cache
+        _preference_cache.clear()
+        yield
+        _preference_cache.clear()
+
+    @pytest.fixture
+    def mock_db(self):
+        """Mock 資料庫"""
+        db = MagicMock()
+        db.notifications = AsyncMock()
+        db.notification_counters = AsyncMock()
+        db.notification_preferences = MagicMock()
+        db.users = MagicMock()
+        return db
+
+    @pytest.mark.asyncio
+    async def test_bulk_filters_and_inserts_once(self, mock_db):
+        """批次建立 - 記憶體內篩選偏好，單一 insert_many；免打擾與摘要模式延後推播"""
+        from bson import ObjectId
+        from datetime import timedelta, timezone
+        from src.services.notification_service import NotificationService
+
+        realtime_id, digest_id, disabled_id, dnd_id, off_id = (str(ObjectId()) for _ in range(5))
+        now = datetime.now(timezone.utc)
+        mock_db.notification_preferences.find = MagicMock(return_value=AsyncCursor([
+            {"user_id": ObjectId(digest_id), "notification_frequency": "daily_digest"},
+            {"user_id": ObjectId(disabled_id), "friend_activity_enabled": False},
+            {"user_id": ObjectId(dnd_id), "do_not_disturb_enabled": True,
+             "do_not_disturb_start": (now - timedelta(hours=1)).strftime("%H:%M"),
+             "do_not_disturb_end": (now + timedelta(hours=1)).strftime("%H:%M")},
+            {"user_id": ObjectId(off_id), "notification_frequency": "off"},
+        ]))
+        mock_db.notifications.insert_many = AsyncMock()
+        push_queue = MagicMock(enqueue=AsyncMock())
+        push_scheduler = MagicMock(schedule=AsyncMock(return_value=2))
+        activity_id = str(ObjectId())
+
+        service = NotificationService(mock_db, push_queue=push_queue, push_scheduler=push_scheduler)
+        result = await service.create_notifications_bulk(
+            [realtime_id, digest_id, disabled_id, dnd_id, off_id],
+            "friend_activity", "好友動態", "Runner 分享了運動記錄",
+            reference_type="activity", reference_id=activity_id
+        )
+
+        assert result == {"notification_count": 4, "push_recipient_count": 1, "deferred_push_count": 2}
+        mock_db.notifications.insert_many.assert_awaited_once()
+        documents = mock_db.notifications.insert_many.await_args[0][0]
+        assert {str(document["user_id"]) for document in documents} == {
+            realtime_id, digest_id, dnd_id, off_id
+        }
+
+        # 即時模式接收者排入推播佇列
+        data = {"notification_type": "friend_activity", "reference_type": "activity", "reference_id": activity_id}
+        push_queue.enqueue.assert_awaited_once_with(
+            mock_db, [realtime_id], "好友動態", "Runner 分享了運動記錄", data
+        )
+
+        # 免打擾與摘要模式延後推播，關閉推播者略過
+        deferred = dict(push_scheduler.schedule.await_args[0][1])
+        assert set(deferred) == {digest_id, dnd_id}
+        assert all(due_at > now for due_at in deferred.values())
+
+    @pytest.mark.asyncio
+    async def test_enqueue_failure_does_not_raise(self, mock_db):
+        """推播排入失敗 - 通知仍已寫入，不中斷主流程"""
+        from bson import ObjectId
+        from src.services.notification_service import NotificationService
+
+        mock_db.notification_preferences.find = MagicMock(return_value=AsyncCursor([]))
+        mock_db.notifications.insert_many = AsyncMock()
+        push_queue = MagicMock(enqueue=AsyncMock(side_effect=RuntimeError("mongo down")))
+
+        service = NotificationService(mock_db, push_queue=push_queue)
+        result = await service.create_notifications_bulk(
+            [str(ObjectId())], "challenge_update", "挑戰更新", "挑戰進度 50%"
+        )
+
+        assert result == {"notification_count": 1, "push_recipient_count": 0, "deferred_push_count": 0}
+
+    @pytest.mark.asyncio
+    async def test_fake_fcm_rejects_oversized_multicast(self):
+        """Fake FCM - 與 FCM 相同的 token 數量上限"""
+        fcm = FakeFCMHelper()
+
+        with pytest.raises(ValueError):
+            await fcm.send_multicast(["token"] * (FCM_MULTICAST_MAX_TOKENS + 1), "title", "body")
+
+
+class _FindCursor(AsyncCursor):
+    """記錄 sort / skip / limit 呼叫的 cursor 替身"""
+
+    def __init__(self, documents):
+        super().__init__(documents)
+        self.calls = []
+
+    def sort(self, *args):
+        self.calls.append(("sort", args))
+        return self
+
+    def skip(self, value):
+        self.calls.append(("skip", value))
+        return self
+
+    def limit(self, value):
+        self.calls.append(("limit", value))
+        return super().limit(value)
+
+
+class TestUnreadCountersAndInbox:
+    """未讀計數與 keyset 分頁測試"""
+
+    @pytest.fixture
+    def mock_db(self):
+        """Mock 資料庫"""
+        db = MagicMock()
+        db.notifications = MagicMock()
+        db.notification_counters = MagicMock()
+        db.notification_counters.update_one = AsyncMock()
+        db.notification_counters.bulk_write = AsyncMock()
+        db.users = MagicMock()
+        return db
+
+    @staticmethod
+    def counters(unread=None, total=None):
+        from datetime import timezone
+        return {
+            "unread": unread or {},
+            "total": total or {},
+            "recounted_at": datetime.now(timezone.utc),
+        }
+
+    @pytest.mark.asyncio
+    async def test_unread_count_single_read(self, mock_db):
+        """未讀數量 - 單一主鍵查詢"""
+        from bson import ObjectId
+        from src.services.notification_service import NotificationService
+
+        user_id = str(ObjectId())
+        mock_db.notification_counters.find_one = AsyncMock(return_value=self.counters(
+            unread={"interaction": 3, "friend_request": 1, "challenge_update": -1}
+        ))
+        mock_db.notifications.count_documents = AsyncMock()
+        mock_db.notifications.aggregate = MagicMock()
+
+        result = await NotificationService(mock_db).get_unread_count(user_id)
+
+        assert result == {
+            "unread_count": 4,
+            "count_by_type": {"friend_request": 1, "friend_activity": 0, "interaction": 3, "challenge_update": 0}
+        }
+        mock_db.notification_counters.find_one.assert_awaited_once_with({"_id": ObjectId(user_id)})
+        mock_db.notifications.count_documents.assert_not_awaited()
+        mock_db.notifications.aggregate.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_missing_counters_recounted(self, mock_db):
+        """未讀數量 - 尚無計數時由通知記錄重新計算"""
+        from bson import ObjectId
+        from src.services.notification_service import NotificationService
+
+        mock_db.notification_counters.find_one = AsyncMock(return_value=None)
+        aggregate = MagicMock()
+        aggregate.to_list = AsyncMock(return_value=[
+            {"_id": "interaction", "total": 5, "unread": 2}
+        ])
+        mock_db.notifications.aggregate = MagicMock(return_value=aggregate)
+        mock_db.notification_counters.find_one_and_update = AsyncMock(side_effect=lambda query, update, **kw: update["$set"])
+
+        result = await NotificationService(mock_db).get_unread_count(str(ObjectId()))
+
+        assert result["unread_count"] == 2
+        update = mock_db.notification_counters.find_one_and_update.await_args[0][1]
+        assert update["$set"]["total"] == {"interaction": 5}
+        assert mock_db.notification_counters.find_one_and_update.await_args[1]["upsert"] is True
+
+    @pytest.mark.asyncio
+    async def test_mark_as_read_decrements_once(self, mock_db):
+        """標記已讀 - 僅未讀 -> 已讀時扣減；已讀通知不重複扣減"""
+        from bson import ObjectId
+        from src.services.notification_service import NotificationService
+
+        user_id = str(ObjectId())
+        mock_db.notifications.find_one_and_update = AsyncMock(side_effect=[
+            {"_id": ObjectId(), "notification_type": "interaction"},
+            None,
+        ])
+        service = NotificationService(mock_db)
+
+        await service.mark_as_read(user_id, str(ObjectId()))
+        await service.mark_as_read(user_id, str(ObjectId()))
+
+        mock_db.notification_counters.update_one.assert_awaited_once_with(
+            {"_id": ObjectId(user_id)}, {"$inc": {"unread.interaction": -1}}
+        )
+        query = mock_db.notifications.find_one_and_update.await_args_list[0][0][0]
+        assert query["is_read"] is False
+
+    @pytest.mark.asyncio
+    async def test_mark_all_as_read_uses_modified_counts(self, mock_db):
+        """全部已讀 - 以各類型實際更新數量扣減"""
+        from bson import ObjectId
+        from src.services.notification_service import NotificationService
+
+        modified = {"friend_request": 0, "friend_activity": 2, "interaction": 5, "challenge_update": 0}
+        mock_db.notifications.update_many = AsyncMock(side_effect=lambda query, update: MagicMock(
+            modified_count=modified[query["notification_type"]]
+        ))
+
+        count = await NotificationService(mock_db).mark_all_as_read(str(ObjectId()))
+
+        assert count == 7
+        update = mock_db.notification_counters.update_one.await_args[0][1]
+        assert update == {"$inc": {"unread.friend_activity": -2, "unread.interaction": -5}}
+
+    @pytest.mark.asyncio
+    async def test_delete_unread_decrements_both(self, mock_db):
+        """刪除通知 - 未讀通知同時扣減未讀與總數，已讀通知只扣減總數"""
+        from bson import ObjectId
+        from src.services.notification_service import NotificationService
+
+        mock_db.notifications.find_one_and_delete = AsyncMock(side_effect=[
+            {"notification_type": "interaction", "is_read": False},
+            {"notification_type": "interaction", "is_read": True},
+        ])
+        service = NotificationService(mock_db)
+
+        await service.delete_notification(str(ObjectId()), str(ObjectId()))
+        await service.delete_notification(str(ObjectId()), str(ObjectId()))
+
+        first, second = mock_db.notification_counters.update_one.await_args_list
+        assert first[0][1] == {"$inc": {"unread.interaction": -1, "total.interaction": -1}}
+        assert second[0][1] == {"$inc": {"total.interaction": -1}}
+
+    @pytest.mark.asyncio
+    async def test_create_increments_counters(self, mock_db):
+        """建立通知 - 未讀與總數加一"""
+        from bson import ObjectId
+        from src.services.notification_service import NotificationService, _preference_cache
+
+        _preference_cache.clear()
+        user_id = str(ObjectId())
+        mock_db.notification_preferences.find_one = AsyncMock(return_value={"notification_frequency": "off"})
+        mock_db.notifications.insert_one = AsyncMock(return_value=MagicMock(inserted_id=ObjectId()))
+
+        await NotificationService(mock_db).create_notification(
+            user_id, "friend_request", "新的好友邀請", "Runner 想成為你的好友"
+        )
+        _preference_cache.clear()
+
+        operation = mock_db.notification_counters.bulk_write.await_args[0][0][0]
+        assert operation._filter == {"_id": ObjectId(user_id)}
+        assert operation._doc == {"$inc": {"unread.friend_request": 1, "total.friend_request": 1}}
+
+    @pytest.mark.asyncio
+    async def test_inbox_keyset_page(self, mock_db):
+        """通知清單 - keyset 分頁與批次發送者查詢"""
+        from bson import ObjectId
+        from datetime import timedelta
+        from src.services.notification_service import (
+            NotificationService,
+            decode_notification_cursor,
+        )
+
+        user_id = ObjectId()
+        sender_id = ObjectId()
+        base = datetime(2024, 5, 1, 12, 0, 0, 123000)
+        notifications = [
+            {"_id": ObjectId(), "user_id": user_id, "notification_type": "interaction",
+             "title": "t", "message": "m", "sender_id": sender_id, "is_read": False,
+             "created_at": base - timedelta(minutes=i)}
+            for i in range(3)
+        ]
+        cursor = _FindCursor(notifications)
+        mock_db.notifications.find = MagicMock(return_value=cursor)
+        mock_db.users.find = MagicMock(return_value=AsyncCursor([
+            {"_id": sender_id, "display_name": "Runner"}
+        ]))
+        mock_db.notification_counters.find_one = AsyncMock(return_value=self.counters(
+            unread={"interaction": 3}, total={"interaction": 10}
+        ))
+
+        result = await NotificationService(mock_db).get_notifications(str(user_id), limit=2)
+
+        assert len(result["notifications"]) == 2
+        assert result["notifications"][0].sender["display_name"] == "Runner"
+        assert result["total_count"] == 10 and result["unread_count"] == 3
+        assert ("sort", ([("created_at", -1), ("_id", -1)],)) in cursor.calls
+        assert ("limit", 3) in cursor.calls
+        mock_db.users.find.assert_called_once()
+
+        created_at, last_id = decode_notification_cursor(result["next_cursor"])
+        assert last_id == notifications[1]["_id"]
+        assert created_at.replace(tzinfo=None) == notifications[1]["created_at"]
+
+        # 下一頁以游標查詢
+        mock_db.notifications.find = MagicMock(return_value=_FindCursor(notifications[2:]))
+        mock_db.users.find = MagicMock(return_value=AsyncCursor([]))
+        page = await NotificationService(mock_db).get_notifications(
+            str(user_id), read_status="unread", limit=2, cursor=result["next_cursor"]
+        )
+        query = mock_db.notifications.find.call_args[0][0]
+        assert query["$or"][1] == {"created_at": created_at, "_id": {"$lt": last_id}}
+        assert page["next_cursor"] is None
+        assert page["total_count"] == 3
+
+    @pytest.mark.asyncio
+    async def test_invalid_cursor(self, mock_db):
+        """通知清單 - 無效游標"""
+        from bson import ObjectId
+        from src.services.notification_service import NotificationService
+
+        with pytest.raises(ValueError):
+            await NotificationService(mock_db).get_notifications(str(ObjectId()), cursor="garbage")
+
+
+class TestInteractionCoalescing:
+    """按讚 / 留言通知合併測試"""
+
+    @pytest.fixture
+    def mock_db(self):
+        """Mock 資料庫"""
+        db = MagicMock()
+        db.notifications = MagicMock()
+        db.notification_counters = MagicMock()
+        db.notification_counters.update_one = AsyncMock()
+        db.notification_counters.bulk_write = AsyncMock()
+        db.users = MagicMock()
+        db.users.find_one = AsyncMock(return_value={"display_name": "Runner"})
+        return db
+
+    @staticmethod
+    def upsert_result(actor_count, new=False, became_unread=False, push=False):
+        """依 pipeline 寫入的時間產生 find_one_and_update 回傳的文件"""
+        from bson import ObjectId
+        from datetime import timedelta
+
+        def find_one_and_update(key, pipeline, **kwargs):
+            now = pipeline[0]["$set"]["created_at"]
+            earlier = (now - timedelta(minutes=5)).replace(tzinfo=None)
+            return {
+                "_id": ObjectId(),
+                "actor_count": actor_count,
+                "message": "Runner 和其他 2 人對你的動態按讚" if actor_count > 1 else "Runner 對你的動態按讚",
+                "first_event_at": now.replace(tzinfo=None) if new else earlier,
+                "unread_since": now.replace(tzinfo=None) if new or became_unread else earlier,
+                "last_push_at": now.replace(tzinfo=None) if push else earlier,
+            }
+        return AsyncMock(side_effect=find_one_and_update)
+
+    @staticmethod
+    def service(mock_db):
+        from src.services.notification_service import NotificationService
+
+        service = NotificationService(mock_db, realtime=MagicMock(publish=AsyncMock()))
+        service.get_notification_preferences = AsyncMock(return_value={
+            "interaction_enabled": True, "notification_frequency": "realtime"
+        })
+        service._dispatch_push = AsyncMock()
+        return service
+
+    @pytest.mark.asyncio
+    async def test_first_like_creates_and_pushes(self, mock_db):
+        """時段內第一個讚：以 (接收者, 動態, 類型, 時段) upsert，計數加一並推播"""
+        from bson import ObjectId
+        from src.services.notification_service import INTERACTION_WINDOW_SECONDS
+
+        owner, liker, activity = str(ObjectId()), str(ObjectId()), str(ObjectId())
+        mock_db.notifications.find_one_and_update = self.upsert_result(1, new=True, push=True)
+        service = self.service(mock_db)
+
+        result = await service.notify_like(liker, owner, activity)
+
+        assert result["actor_count"] == 1 and result["pushed"] is True
+        key, pipeline = mock_db.notifications.find_one_and_update.await_args[0]
+        assert key["user_id"] == ObjectId(owner)
+        assert key["reference_type"] == "like"
+        assert key["reference_id"] == ObjectId(activity)
+        assert key["window_start"].timestamp() % INTERACTION_WINDOW_SECONDS == 0
+        assert mock_db.notifications.find_one_and_update.await_args[1]["upsert"] is True
+        mock_db.notification_counters.bulk_write.assert_awaited_once()
+        service._dispatch_push.assert_awaited_once()
+        assert service._dispatch_push.await_args[0][3] == "Runner 對你的動態按讚"
+        service.realtime.publish.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_like_storm_is_coalesced_and_throttled(self, mock_db):
+        """後續的讚更新同一筆通知：不增加計數，推播間隔內不再推播"""
+        from bson import ObjectId
+
+        mock_db.notifications.find_one_and_update = self.upsert_result(3)
+        service = self.service(mock_db)
+
+        result = await service.notify_like(str(ObjectId()), str(ObjectId()), str(ObjectId()))
+
+        assert result["actor_count"] == 3 and result["pushed"] is False
+        mock_db.notification_counters.bulk_write.assert_not_awaited()
+        mock_db.notification_counters.update_one.assert_not_awaited()
+        service._dispatch_push.assert_not_awaited()
+        assert service.realtime.publish.await_args[0][2]["actor_count"] == 3
+
+    @pytest.mark.asyncio
+    async def test_read_notification_becomes_unread(self, mock_db):
+        """已讀的合併通知有新互動時重新變為未讀，未讀計數加一"""
+        from bson import ObjectId
+
+        owner = str(ObjectId())
+        mock_db.notifications.find_one_and_update = self.upsert_result(2, became_unread=True, push=True)
+        service = self.service(mock_db)
+
+        await service.notify_comment(str(ObjectId()), owner, str(ObjectId()), "跑得好快！")
+
+        query, update = mock_db.notification_counters.update_one.await_args[0]
+        assert query == {"_id": ObjectId(owner)}
+        assert update == {"$inc": {"unread.interaction": 1}}
+        mock_db.notification_counters.bulk_write.assert_not_awaited()
+        assert mock_db.notifications.find_one_and_update.await_args[0][0]["reference_type"] == "comment"
+
+    @pytest.mark.asyncio
+    async def test_actor_names_are_literals(self, mock_db):
+        """顯示名稱以 $literal 寫入 pipeline (避免被當成欄位路徑)"""
+        from bson import ObjectId
+
+        mock_db.users.find_one = AsyncMock(return_value={"display_name": "$actor_ids"})
+        mock_db.notifications.find_one_and_update = self.upsert_result(1, new=True)
+        service = self.service(mock_db)
+
+        await service.notify_like(str(ObjectId()), str(ObjectId()), str(ObjectId()))
+
+        pipeline = mock_db.notifications.find_one_and_update.await_args[0][1]
+        message = pipeline[1]["$set"]["message"]["$cond"]
+        assert message[1]["$concat"][0] == {"$literal": "$actor_ids"}
+        assert message[2] == {"$literal": "$actor_ids 對你的動態按讚"}
+
+    @pytest.mark.asyncio
+    async def test_concurrent_insert_retries(self, mock_db):
+        """同時建立同一筆合併通知：唯一索引衝突後改為更新"""
+        from bson import ObjectId
+        from pymongo.errors import DuplicateKeyError
+
+        update = self.upsert_result(2)
+        mock_db.notifications.find_one_and_update = AsyncMock(side_effect=[
+            DuplicateKeyError("E11000"), await update("key", [{"$set": {"created_at": datetime.now()}}]),
+        ])
+        service = self.service(mock_db)
+
+        result = await service.notify_like(str(ObjectId()), str(ObjectId()), str(ObjectId()))
+
+        assert result["actor_count"] == 2
+        assert mock_db.notifications.find_one_and_update.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_self_like_is_ignored(self, mock_db):
+        from bson import ObjectId
+
+        user_id = str(ObjectId())
+        mock_db.notifications.find_one_and_update = AsyncMock()
+
+        assert await self.service(mock_db).notify_like(user_id, user_id, str(ObjectId())) is None
+        mock_db.notifications.find_one_and_update.assert_not_awaited()
@@ -0,0 +1,278 @@
+"""
+Push Delivery Queue 單元測試
+測試排入、批次領取、multicast 發送、失效 token 移除、指數退避重試與指標
+"""
+
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock
+from bson import ObjectId
+
+from src.services.push_queue import (
+    MAX_TOKEN_FAILURES,
+    PUSH_JOB_MAX_RECIPIENTS,
+    PushDeliveryQueue,
+)
+from src.utils.fcm_helper import FCM_MULTICAST_MAX_TOKENS, FakeFCMHelper
+
+from motor_fakes import AsyncCursor
+
+
+@pytest.fixture
+def mock_db():
+    """模擬資料庫連線"""
+    db = MagicMock()
+    db.push_jobs = MagicMock()
+    db.push_jobs.insert_many = AsyncMock()
+    db.push_jobs.update_one = AsyncMock()
+    db.push_jobs.update_many = AsyncMock(return_value=MagicMock(modified_count=0))
+    db.users = MagicMock()
+    db.users.update_many = AsyncMock(return_value=MagicMock(modified_count=1))
+    return db
+
+
+@pytest.fixture
+def fcm():
+    return FakeFCMHelper(unregistered_tokens=["token-dead"], failing_tokens=["token-flaky"])
+
+
+@pytest.fixture
+def queue(mock_db, fcm):
+    """Push Delivery Queue fixture (不啟動 workers)"""
+    queue = PushDeliveryQueue(max_attempts=3, backoff_base_seconds=2.0, fcm=fcm)
+    queue.db = mock_db
+    return queue
+
+
+def make_job(user_ids, attempts: int = 1):
+    now = datetime.now(timezone.utc)
+    return {
+        "_id": ObjectId(),
+        "claim_id": ObjectId(),
+        "user_ids": user_ids,
+        "title": "好友動態",
+        "body": "Runner 分享了運動記錄",
+        "data": {"notification_type": "friend_activity"},
+        "status": "sending",
+        "attempts": attempts,
+        "queued_at": now - timedelta(seconds=3),
+        "next_attempt_at": now,
+    }
+
+
+def with_tokens(mock_db, tokens_by_user):
+    mock_db.users.find = MagicMock(return_value=AsyncCursor([
+        {"_id": user_id, "fcm_token": token} for user_id, token in tokens_by_user.items()
+    ]))
+
+
+class TestEnqueue:
+    """測試排入工作"""
+
+    @pytest.mark.asyncio
+    async def test_splits_recipients_into_jobs(self, queue, mock_db):
+        """每 PUSH_JOB_MAX_RECIPIENTS 位接收者一筆工作，單一 insert_many"""
+        user_ids = [str(ObjectId()) for _ in range(PUSH_JOB_MAX_RECIPIENTS + 10)]
+        queue.notify = MagicMock()
+
+        count = await queue.enqueue(mock_db, user_ids, "title", "body", {"notification_type": "interaction"})
+
+        assert count == 2
+        jobs = mock_db.push_jobs.insert_many.await_args[0][0]
+        assert [len(job["user_ids"]) for job in jobs] == [PUSH_JOB_MAX_RECIPIENTS, 10]
+        assert all(job["status"] == "pending" and job["attempts"] == 0 for job in jobs)
+        queue.notify.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_empty_recipients(self, queue, mock_db):
+        """沒有接收者時不寫入"""
+        assert await queue.enqueue(mock_db, [], "title", "body") == 0
+        mock_db.push_jobs.insert_many.assert_not_awaited()
+
+
+class TestClaimJobs:
+    """測試批次領取"""
+
+    @pytest.mark.asyncio
+    async def test_claims_due_jobs_with_claim_id(self, queue, mock_db):
+        """領取到期或租約過期的工作，以 claim_id 取回本次領取的工作"""
+        ids = [ObjectId(), ObjectId()]
+        claimed = [{"_id": job_id} for job_id in ids]
+        mock_db.push_jobs.find = MagicMock(side_effect=[
+            AsyncCursor([{"_id": job_id} for job_id in ids]),
+            AsyncCursor(claimed),
+        ])
+
+        jobs = await queue.claim_jobs()
+
+        assert jobs == claimed
+        query, update = mock_db.push_jobs.update_many.await_args[0]
+        assert query["_id"] == {"$in": ids}
+        assert query["$or"][0]["status"] == "pending"
+        assert query["$or"][1]["status"] == "sending"
+        assert query["$or"][1]["attempts"] == {"$lt": queue.max_attempts}
+        assert update["$set"]["status"] == "sending"
+        assert update["$inc"] == {"attempts": 1}
+        fetch = mock_db.push_jobs.find.call_args_list[1][0][0]
+        assert fetch["claim_id"] == update["$set"]["claim_id"]
+
+    @pytest.mark.asyncio
+    async def test_no_due_jobs(self, queue, mock_db):
+        """沒有到期工作時只執行租約清理，不領取"""
+        mock_db.push_jobs.find = MagicMock(return_value=AsyncCursor([]))
+
+        assert await queue.claim_jobs() == []
+        mock_db.push_jobs.update_many.assert_awaited_once()
+        query, update = mock_db.push_jobs.update_many.await_args[0]
+        assert query["attempts"] == {"$gte": queue.max_attempts}
+        assert update["$set"]["status"] == "failed"
+
+    @pytest.mark.asyncio
+    async def test_exhausted_leases_marked_failed_once_per_lease(self, queue, mock_db):
+        """租約逾時且已達嘗試上限的工作標記為 failed，清理每個租約時間最多執行一次"""
+        mock_db.push_jobs.update_many = AsyncMock(return_value=MagicMock(modified_count=2))
+        mock_db.push_jobs.find = MagicMock(return_value=AsyncCursor([]))
+
+        await queue.claim_jobs()
+        await queue.claim_jobs()
+
+        mock_db.push_jobs.update_many.assert_awaited_once()
+        assert queue._failed == 2
+
+
+class TestProcessJobs:
+    """測試發送"""
+
+    @pytest.mark.asyncio
+    async def test_sent(self, queue, mock_db, fcm):
+        """全部送達：標記為 sent 並記錄送達延遲"""
+        users = [ObjectId(), ObjectId(), ObjectId()]
+        with_tokens(mock_db, {users[0]: "token-a", users[1]: "token-b"})
+        job = make_job(users)
+
+        await queue.process_jobs([job])
+
+        assert fcm.sent[0]["tokens"] == ["token-a", "token-b"]
+        assert fcm.sent[0]["data"] == {"notification_type": "friend_activity"}
+        update = mock_db.push_jobs.update_one.await_args[0][1]
+        assert update["$set"]["status"] == "sent"
+        metrics = queue._delivery_latencies
+        assert len(metrics) == 1 and metrics[0] >= 3
+
+    @pytest.mark.asyncio
+    async def test_tokens_resolved_once_per_batch(self, queue, mock_db, fcm):
+        """一批工作的 token 以單一 projection 查詢取得"""
+        users = [ObjectId() for _ in range(4)]
+        with_tokens(mock_db, {user_id: f"token-{i}" for i, user_id in enumerate(users)})
+
+        await queue.process_jobs([make_job(users[:2]), make_job(users[2:])])
+
+        mock_db.users.find.assert_called_once()
+        assert mock_db.users.find.call_args[1]["projection"] == {"fcm_token": 1}
+        assert len(fcm.sent) == 2
+
+    @pytest.mark.asyncio
+    async def test_multicast_chunks(self, queue, mock_db, fcm):
+        """token 超過 multicast 上限時分批發送"""
+        users = [ObjectId() for _ in range(FCM_MULTICAST_MAX_TOKENS + 1)]
+        with_tokens(mock_db, {user_id: f"token-{i}" for i, user_id in enumerate(users)})
+
+        await queue.process_jobs([make_job(users)])
+
+        assert [len(message["tokens"]) for message in fcm.sent] == [FCM_MULTICAST_MAX_TOKENS, 1]
+
+    @pytest.mark.asyncio
+    async def test_prunes_unregistered_token(self, queue, mock_db):
+        """失效 token 立即移除 (僅在 token 未更新時)，不重試"""
+        alive, dead = ObjectId(), ObjectId()
+        with_tokens(mock_db, {alive: "token-a", dead: "token-dead"})
+
+        await queue.process_jobs([make_job([alive, dead])])
+
+        query, update = mock_db.users.update_many.await_args[0]
+        assert query == {"_id": {"$in": [dead]}, "fcm_token": {"$in": ["token-dead"]}}
+        assert "fcm_token" in update["$unset"]
+        assert mock_db.push_jobs.update_one.await_args[0][1]["$set"]["status"] == "sent"
+        assert queue._pruned_tokens == 1
+
+    @pytest.mark.asyncio
+    async def test_retries_failed_recipients_with_backoff(self, queue, mock_db):
+        """暫時性失敗：只重送失敗的接收者，依嘗試次數指數退避"""
+        alive, flaky = ObjectId(), ObjectId()
+        with_tokens(mock_db, {alive: "token-a", flaky: "token-flaky"})
+        job = make_job([alive, flaky], attempts=2)
+
+        before = datetime.now(timezone.utc)
+        await queue.process_jobs([job])
+
+        update = mock_db.push_jobs.update_one.await_args[0][1]
+        assert update["$set"]["status"] == "pending"
+        assert update["$set"]["user_ids"] == [flaky]
+        delay = (update["$set"]["next_attempt_at"] - before).total_seconds()
+        # 第 2 次失敗：2 * 2 秒，抖動 50%~100%
+        assert 2.0 <= delay <= 4.1
+        assert queue._retried == 1
+
+    @pytest.mark.asyncio
+    async def test_exhausted_attempts(self, queue, mock_db):
+        """重試耗盡：標記為 failed，累計 token 失敗次數並移除達上限的 token"""
+        flaky = ObjectId()
+        with_tokens(mock_db, {flaky: "token-flaky"})
+
+        await queue.process_jobs([make_job([flaky], attempts=3)])
+
+        assert mock_db.push_jobs.update_one.await_args[0][1]["$set"]["status"] == "failed"
+        increment, prune = mock_db.users.update_many.await_args_list
+        assert increment[0][1] == {"$inc": {"fcm_token_failures": 1}}
+        assert prune[0][0]["fcm_token_failures"] == {"$gte": MAX_TOKEN_FAILURES}
+        assert queue._failed == 1
+
+    @pytest.mark.asyncio
+    async def test_delivery_resets_token_failures(self, queue, mock_db):
+        """送達成功時清除失敗計數，只有連續失敗會移除 token"""
+        alive, flaky = ObjectId(), ObjectId()
+        with_tokens(mock_db, {alive: "token-a", flaky: "token-flaky"})
+
+        await queue.process_jobs([make_job([alive, flaky], attempts=3)])
+
+        reset = mock_db.users.update_many.await_args_list[0]
+        assert reset[0][0] == {
+            "_id": {"$in": [alive]},
+            "fcm_token": {"$in": ["token-a"]},
+            "fcm_token_failures": {"$exists": True},
+        }
+        assert reset[0][1] == {"$unset": {"fcm_token_failures": ""}}
+
+    @pytest.mark.asyncio
+    async def test_fcm_exception_is_retried(self, queue, mock_db):
+        """FCM 例外視為暫時性失敗"""
+        user_id = ObjectId()
+        with_tokens(mock_db, {user_id: "token-a"})
+        queue.fcm = MagicMock()
+        queue.fcm.send_multicast = AsyncMock(side_effect=RuntimeError("connection reset"))
+
+        await queue.process_jobs([make_job([user_id])])
+
+        update = mock_db.push_jobs.update_one.await_args[0][1]
+        assert update["$set"]["status"] == "pending"
+        assert update["$set"]["user_ids"] == [user_id]
+
+
+class TestMetrics:
+    """測試指標"""
+
+    @pytest.mark.asyncio
+    async def test_metrics(self, queue, mock_db):
+        """佇列深度與送達延遲"""
+        mock_db.push_jobs.count_documents = AsyncMock(return_value=7)
+        user_id = ObjectId()
+        with_tokens(mock_db, {user_id: "token-a"})
+        await queue.process_jobs([make_job([user_id])])
+
+        metrics = await queue.get_metrics()
+
+        assert metrics["queue_depth"] == 7
+        assert metrics["sent"] == 1
+        assert metrics["delivered_tokens"] == 1
+        assert metrics["jobs_per_minute"] == 1
+        assert metrics["delivery_latency_seconds"]["max"] >= 3
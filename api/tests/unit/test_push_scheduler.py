@@ -0,0 +1,215 @@
+"""
+Deferred Push Scheduler 單元測試
+測試推播時間計算、摘要內容、排程合併、到期發送與 heap 喚醒
+"""
+
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock
+from bson import ObjectId
+
+from src.services.push_scheduler import (
+    DeferredPushScheduler,
+    digest_content,
+    in_quiet_hours,
+    push_due_at,
+)
+
+from motor_fakes import AsyncCursor
+
+
+NOW = datetime(2024, 5, 1, 23, 30, 15, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def mock_db():
+    """模擬資料庫連線"""
+    db = MagicMock()
+    db.scheduled_pushes = MagicMock()
+    db.scheduled_pushes.bulk_write = AsyncMock()
+    db.scheduled_pushes.update_many = AsyncMock()
+    db.scheduled_pushes.delete_many = AsyncMock()
+    return db
+
+
+@pytest.fixture
+def push_queue():
+    return MagicMock(enqueue=AsyncMock())
+
+
+@pytest.fixture
+def scheduler(mock_db, push_queue):
+    """Deferred Push Scheduler fixture (不啟動 worker)"""
+    scheduler = DeferredPushScheduler(batch_size=10, poll_interval=60.0, push_queue=push_queue)
+    scheduler.db = mock_db
+    return scheduler
+
+
+class TestPushDueAt:
+    """測試推播時間計算"""
+
+    def test_realtime_is_immediate(self):
+        assert push_due_at({"notification_frequency": "realtime"}, NOW) is None
+
+    def test_dnd_defers_to_window_end(self):
+        """跨日免打擾時段：延到隔天結束時間"""
+        preferences = {
+            "do_not_disturb_enabled": True,
+            "do_not_disturb_start": "22:00",
+            "do_not_disturb_end": "07:00",
+        }
+        assert push_due_at(preferences, NOW) == datetime(2024, 5, 2, 7, 0, tzinfo=timezone.utc)
+
+    def test_dnd_disabled_is_immediate(self):
+        preferences = {
+            "do_not_disturb_enabled": False,
+            "do_not_disturb_start": "22:00",
+            "do_not_disturb_end": "07:00",
+        }
+        assert push_due_at(preferences, NOW) is None
+
+    def test_hourly_digest(self):
+        due = push_due_at({"notification_frequency": "hourly_digest"}, NOW)
+        assert due == datetime(2024, 5, 2, 0, 0, tzinfo=timezone.utc)
+
+    def test_daily_digest(self):
+        preferences = {"notification_frequency": "daily_digest", "daily_digest_time": "08:00"}
+        assert push_due_at(preferences, NOW) == datetime(2024, 5, 2, 8, 0, tzinfo=timezone.utc)
+
+    def test_digest_inside_dnd_moves_to_window_end(self):
+        """摘要時間落在免打擾時段內時延到時段結束"""
+        preferences = {
+            "notification_frequency": "hourly_digest",
+            "do_not_disturb_enabled": True,
+            "do_not_disturb_start": "23:00",
+            "do_not_disturb_end": "06:30",
+        }
+        assert push_due_at(preferences, NOW) == datetime(2024, 5, 2, 6, 30, tzinfo=timezone.utc)
+
+    def test_quiet_hours_end_is_exclusive(self):
+        at = datetime(2024, 5, 2, 7, 0, 30, tzinfo=timezone.utc)
+        assert in_quiet_hours("22:00", "07:00", at) is False
+        assert in_quiet_hours("22:00", "07:00", at - timedelta(minutes=1)) is True
+        assert in_quiet_hours(None, "07:00", at) is False
+
+
+class TestDigestContent:
+    """測試摘要內容"""
+
+    def test_single_event_pushed_as_is(self):
+        scheduled = {
+            "event_count": 1,
+            "counts": {"interaction": 1},
+            "last_event": {"title": "有人按讚了你的動態", "message": "Runner 對你的動態按讚",
+                           "data": {"notification_type": "interaction"}},
+        }
+        assert digest_content(scheduled) == (
+            "有人按讚了你的動態", "Runner 對你的動態按讚", {"notification_type": "interaction"}
+        )
+
+    def test_many_events_coalesced(self):
+        scheduled = {
+            "event_count": 5,
+            "counts": {"interaction": 3, "friend_activity": 2},
+            "last_event": {"title": "t", "message": "m", "data": {}},
+        }
+        title, body, data = digest_content(scheduled)
+        assert title == "你有 5 則新通知"
+        assert body == "2 則好友動態、3 則互動"
+        assert data == {"notification_type": "digest"}
+
+
+class TestSchedule:
+    """測試排入延後推播"""
+
+    @pytest.mark.asyncio
+    async def test_upserts_one_bulk_write(self, scheduler, mock_db):
+        """每位使用者每個到期時間一筆 upsert，單一 bulk_write"""
+        due = NOW + timedelta(hours=1)
+        recipients = [(str(ObjectId()), due), (str(ObjectId()), due + timedelta(hours=1))]
+
+        count = await scheduler.schedule(
+            mock_db, recipients, "interaction", "title", "message", {"notification_type": "interaction"}
+        )
+
+        assert count == 2
+        operations = mock_db.scheduled_pushes.bulk_write.await_args[0][0]
+        assert len(operations) == 2
+        assert operations[0]._filter == {"user_id": ObjectId(recipients[0][0]), "due_at": due}
+        assert operations[0]._doc["$inc"] == {"event_count": 1, "counts.interaction": 1}
+        assert operations[0]._upsert is True
+        assert scheduler._due_heap[0] == due
+
+    @pytest.mark.asyncio
+    async def test_earlier_due_wakes_worker(self, scheduler, mock_db):
+        """較早的到期時間喚醒 worker；相同或較晚的不喚醒"""
+        later = datetime.now(timezone.utc) + timedelta(hours=2)
+        earlier = later - timedelta(hours=1)
+
+        await scheduler.schedule(mock_db, [(str(ObjectId()), later)], "interaction", "t", "m", {})
+        scheduler._wakeup.clear()
+        await scheduler.schedule(mock_db, [(str(ObjectId()), later)], "interaction", "t", "m", {})
+        assert not scheduler._wakeup.is_set()
+        assert len(scheduler._due_heap) == 1
+
+        await scheduler.schedule(mock_db, [(str(ObjectId()), earlier)], "interaction", "t", "m", {})
+        assert scheduler._wakeup.is_set()
+
+        # 最近的到期時間在一小時後：睡眠時間以 poll_interval 為上限
+        assert scheduler._due_heap[0] == earlier
+        assert scheduler._sleep_seconds() == 60.0
+
+
+class TestFireDue:
+    """測試發送到期項目"""
+
+    @pytest.mark.asyncio
+    async def test_fires_and_groups_identical_pushes(self, scheduler, mock_db, push_queue):
+        """領取到期項目，內容相同的推播合併為同一個推播工作，完成後刪除"""
+        users = [ObjectId(), ObjectId(), ObjectId()]
+        single = {"title": "挑戰更新", "message": "挑戰即將結束", "data": {"notification_type": "challenge_update"}}
+        claimed = [
+            {"_id": ObjectId(), "user_id": users[0], "event_count": 1,
+             "counts": {"challenge_update": 1}, "last_event": single},
+            {"_id": ObjectId(), "user_id": users[1], "event_count": 1,
+             "counts": {"challenge_update": 1}, "last_event": single},
+            {"_id": ObjectId(), "user_id": users[2], "event_count": 4,
+             "counts": {"interaction": 4}, "last_event": single},
+        ]
+        ids = [item["_id"] for item in claimed]
+        mock_db.scheduled_pushes.find = MagicMock(side_effect=[
+            AsyncCursor([{"_id": item_id} for item_id in ids]),
+            AsyncCursor(claimed),
+        ])
+
+        assert await scheduler.fire_due() == 3
+
+        query = mock_db.scheduled_pushes.find.call_args_list[0][0][0]
+        assert "$lte" in query["due_at"]
+        pushes = {call[0][2]: call[0][1] for call in push_queue.enqueue.await_args_list}
+        assert pushes == {
+            "挑戰更新": [str(users[0]), str(users[1])],
+            "你有 4 則新通知": [str(users[2])],
+        }
+        delete_query = mock_db.scheduled_pushes.delete_many.await_args[0][0]
+        assert delete_query["_id"] == {"$in": ids}
+        assert scheduler._fired_events == 6
+
+    @pytest.mark.asyncio
+    async def test_nothing_due(self, scheduler, mock_db, push_queue):
+        mock_db.scheduled_pushes.find = MagicMock(return_value=AsyncCursor([]))
+
+        assert await scheduler.fire_due() == 0
+        mock_db.scheduled_pushes.update_many.assert_not_awaited()
+        push_queue.enqueue.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_restart_loads_next_due_from_index(self, scheduler, mock_db):
+        """重啟後由 due_at 索引取得最近的到期時間"""
+        due = datetime.now(timezone.utc) + timedelta(seconds=30)
+        mock_db.scheduled_pushes.find_one = AsyncMock(return_value={"due_at": due.replace(tzinfo=None)})
+
+        await scheduler._load_next_due()
+
+        assert scheduler._due_heap == [due]
+        assert 0 < scheduler._sleep_seconds() <= 30
@@ -0,0 +1,184 @@
+"""
+Realtime Hub 單元測試
+測試連線訂閱、事件分派、慢速客戶端緩衝、Redis broker 與 WebSocket 端點
+"""
+
+import json
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.core.pubsub import LocalBroker, RedisBroker
+from src.core.security import create_access_token
+from src.routers.realtime import router as realtime_router
+from src.services.realtime_hub import (
+    EVENT_NOTIFICATION,
+    EVENT_RANK_CHANGE,
+    RealtimeHub,
+    user_channel,
+)
+
+
+@pytest.fixture
+async def hub():
+    """使用本機 broker 的 Realtime Hub"""
+    hub = RealtimeHub(LocalBroker(), max_pending=3, heartbeat_seconds=0.05)
+    await hub.start()
+    yield hub
+    await hub.stop()
+
+
+class TestConnections:
+    """測試連線與訂閱"""
+
+    @pytest.mark.asyncio
+    async def test_subscribes_once_per_user(self, hub):
+        """同一使用者多條連線只訂閱一次，最後一條連線關閉時取消訂閱"""
+        first = await hub.connect("u1")
+        second = await hub.connect("u1")
+        assert hub.broker._channels == {user_channel("u1")}
+
+        await hub.disconnect(first)
+        assert hub.broker._channels == {user_channel("u1")}
+        await hub.disconnect(second)
+        assert hub.broker._channels == set()
+        assert hub.get_metrics()["connections"] == 0
+
+
+class TestPublish:
+    """測試事件發布與分派"""
+
+    @pytest.mark.asyncio
+    async def test_delivers_to_every_connection_of_recipient(self, hub):
+        """事件送到接收者的所有連線，其他使用者收不到"""
+        phone = await hub.connect("u1")
+        tablet = await hub.connect("u1")
+        other = await hub.connect("u2")
+
+        await hub.publish(["u1", "u3"], EVENT_NOTIFICATION, {"title": "新的好友邀請"})
+
+        for connection in (phone, tablet):
+            event = json.loads(await connection.next_message(timeout=0.1))
+            assert event["type"] == EVENT_NOTIFICATION
+            assert event["data"] == {"title": "新的好友邀請"}
+        assert await other.next_message(timeout=0.01) is None
+
+        metrics = hub.get_metrics()
+        assert metrics["published"] == 2
+        assert metrics["delivered"] == 2
+
+    @pytest.mark.asyncio
+    async def test_publish_each(self, hub):
+        """各使用者不同內容的事件"""
+        connection = await hub.connect("u1")
+
+        await hub.publish_each(EVENT_RANK_CHANGE, {"u1": {"rank": 2}, "u2": {"rank": 1}})
+
+        assert json.loads(await connection.next_message(timeout=0.1))["data"] == {"rank": 2}
+
+    @pytest.mark.asyncio
+    async def test_slow_client_drops_oldest(self, hub):
+        """緩衝已滿時丟棄最舊的事件"""
+        connection = await hub.connect("u1")
+        for i in range(5):
+            await hub.publish(["u1"], EVENT_NOTIFICATION, {"i": i})
+
+        received = [json.loads(await connection.next_message(timeout=0.1))["data"]["i"] for _ in range(3)]
+
+        assert received == [2, 3, 4]
+        assert hub.get_metrics()["dropped"] == 2
+
+    @pytest.mark.asyncio
+    async def test_broker_failure_does_not_raise(self, hub):
+        """發布失敗不影響呼叫端"""
+        hub.broker.publish_many = AsyncMock(side_effect=ConnectionError("broker down"))
+
+        await hub.publish(["u1"], EVENT_NOTIFICATION, {})
+
+        assert hub.get_metrics()["publish_errors"] == 1
+
+    @pytest.mark.asyncio
+    async def test_idle_connection_times_out_for_heartbeat(self, hub):
+        connection = await hub.connect("u1")
+        assert await connection.next_message(timeout=0.01) is None
+
+
+class TestRedisBroker:
+    """測試 Redis broker"""
+
+    @pytest.mark.asyncio
+    async def test_publish_uses_single_pipeline(self):
+        """多則訊息以單一 pipeline 送出"""
+        pipe = MagicMock(execute=AsyncMock())
+        pipe.__aenter__ = AsyncMock(return_value=pipe)
+        pipe.__aexit__ = AsyncMock(return_value=False)
+        broker = RedisBroker("redis://localhost:6379/0")
+        broker._client = MagicMock(pipeline=MagicMock(return_value=pipe))
+
+        await broker.publish_many([("a", "1"), ("b", "2")])
+
+        assert [call[0] for call in pipe.publish.call_args_list] == [("a", "1"), ("b", "2")]
+        pipe.execute.assert_awaited_once()
+
+
+class TestNotificationEvents:
+    """測試通知建立時推送事件"""
+
+    @pytest.mark.asyncio
+    async def test_bulk_notifications_publish_once(self):
+        from src.services.notification_service import NotificationService
+
+        recipients = [str(ObjectId()), str(ObjectId())]
+        db = MagicMock()
+        db.notifications.insert_many = AsyncMock()
+        db.notification_counters.bulk_write = AsyncMock()
+        realtime = MagicMock(publish=AsyncMock())
+        service = NotificationService(db, push_queue=MagicMock(enqueue=AsyncMock()), realtime=realtime)
+        service.get_notification_preferences_batch = AsyncMock(return_value={
+            user_id: {"friend_activity_enabled": True, "notification_frequency": "off"}
+            for user_id in recipients
+        })
+
+        await service.create_notifications_bulk(recipients, "friend_activity", "好友動態", "Runner 分享了運動記錄")
+
+        realtime.publish.assert_awaited_once()
+        user_ids, event_type, data = realtime.publish.await_args[0]
+        assert sorted(user_ids) == sorted(recipients)
+        assert event_type == EVENT_NOTIFICATION
+        assert data["notification_type"] == "friend_activity"
+
+
+class TestWebSocketEndpoint:
+    """測試 WebSocket 端點"""
+
+    @pytest.fixture
+    def client(self):
+        app = FastAPI()
+        app.include_router(realtime_router)
+        with TestClient(app) as client:
+            yield client
+
+    def test_receives_published_events(self, client):
+        hub = RealtimeHub(LocalBroker(), heartbeat_seconds=5)
+        client.portal.call(hub.start)
+        token = create_access_token({"user_id": "u1"})
+
+        with patch("src.routers.realtime.realtime_hub", hub):
+            with client.websocket_connect(f"/realtime/ws?token={token}") as websocket:
+                # accept 前已完成訂閱
+                assert hub.get_metrics()["connected_users"] == 1
+                client.portal.call(hub.publish, ["u1"], EVENT_NOTIFICATION, {"title": "t"})
+                event = websocket.receive_json()
+
+        assert event["type"] == EVENT_NOTIFICATION
+        assert event["data"] == {"title": "t"}
+
+    def test_rejects_invalid_token(self, client):
+        from starlette.websockets import WebSocketDisconnect
+
+        with pytest.raises(WebSocketDisconnect) as exc_info:
+            with client.websocket_connect("/realtime/ws?token=invalid"):
+                pass
+        assert exc_info.value.code == 1008
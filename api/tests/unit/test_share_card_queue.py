@@ -0,0 +1,148 @@
+"""
+Share Card Render Queue 單元測試
+測試工作領取、完成後更新相同內容記錄、失敗重試與指標
+"""
+
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock
+from bson import ObjectId
+
+from src.services.share_card_queue import ShareCardRenderQueue
+
+
+CARD_OBJECT = {
+    "content_hash": "abc",
+    "r2_key": "share-cards/ab/abc.png",
+    "card_url": "https://cdn/share-cards/ab/abc.png",
+    "image_variants": {"thumb": {"webp": "https://cdn/share-cards/ab/abc/thumb.webp"}},
+    "cache_hit": None,
+}
+
+
+@pytest.fixture
+def mock_db():
+    """模擬資料庫連線"""
+    db = MagicMock()
+    db.share_cards = AsyncMock()
+    return db
+
+
+@pytest.fixture
+def card_service():
+    """模擬 ShareCardService"""
+    service = MagicMock()
+    service.resolve_card_object = AsyncMock(return_value=CARD_OBJECT)
+    return service
+
+
+@pytest.fixture
+def queue(mock_db, card_service):
+    """Share Card Render Queue fixture (不啟動 workers)"""
+    queue = ShareCardRenderQueue(max_attempts=3, service_factory=lambda db: card_service)
+    queue.db = mock_db
+    return queue
+
+
+def make_job(attempts: int = 1):
+    now = datetime.now(timezone.utc)
+    return {
+        "_id": ObjectId(),
+        "content_hash": "abc",
+        "status": "rendering",
+        "render_attempts": attempts,
+        "queued_at": now - timedelta(seconds=2),
+        "render_started_at": now,
+        "render_job": {"template": "minimal", "data": {"title": "First 10K"}, "user_name": "Runner"},
+    }
+
+
+class TestClaimJob:
+    """測試領取工作"""
+
+    @pytest.mark.asyncio
+    async def test_claims_pending_or_expired_lease(self, queue, mock_db):
+        """領取已到重試時間的 pending 或租約過期的 rendering 工作，依排入時間排序"""
+        mock_db.share_cards.find_one_and_update = AsyncMock(return_value=None)
+
+        before = datetime.now(timezone.utc)
+        assert await queue.claim_job() is None
+
+        query, update = mock_db.share_cards.find_one_and_update.call_args[0]
+        kwargs = mock_db.share_cards.find_one_and_update.call_args[1]
+        assert query["$or"][0]["status"] == "pending"
+        assert query["$or"][0]["next_attempt_at"]["$not"]["$gt"] >= before
+        assert query["$or"][1]["status"] == "rendering"
+        assert query["$or"][1]["render_attempts"] == {"$lt": 3}
+        assert update["$set"]["status"] == "rendering"
+        assert update["$inc"] == {"render_attempts": 1}
+        assert kwargs["sort"] == [("queued_at", 1)]
+
+    @pytest.mark.asyncio
+    async def test_exhausted_expired_leases_are_failed(self, queue, mock_db):
+        """繪製使 worker 中斷的工作達嘗試上限後標記為 failed，每個租約時間最多清理一次"""
+        mock_db.share_cards.find_one_and_update = AsyncMock(return_value=None)
+        mock_db.share_cards.update_many = AsyncMock(return_value=MagicMock(modified_count=2))
+
+        await queue.claim_job()
+        await queue.claim_job()
+
+        mock_db.share_cards.update_many.assert_awaited_once()
+        query, update = mock_db.share_cards.update_many.await_args[0]
+        assert query["status"] == "rendering"
+        assert query["render_attempts"] == {"$gte": 3}
+        assert "$lt" in query["render_lease_expires_at"]
+        assert update["$set"]["status"] == "failed"
+        assert queue.get_metrics()["failed"] == 2
+
+
+class TestProcessJob:
+    """測試處理工作"""
+
+    @pytest.mark.asyncio
+    async def test_success_marks_same_content_ready(self, queue, mock_db, card_service):
+        """完成後所有相同內容的待處理記錄一併更新為 ready"""
+        await queue.process_job(make_job())
+
+        card_service.resolve_card_object.assert_awaited_once_with(
+            "minimal", {"title": "First 10K"}, "Runner"
+        )
+        query, update = mock_db.share_cards.update_many.call_args[0]
+        assert query["content_hash"] == "abc"
+        assert update["$set"]["status"] == "ready"
+        assert update["$set"]["card_url"] == CARD_OBJECT["card_url"]
+        assert update["$set"]["image_variants"] == CARD_OBJECT["image_variants"]
+
+        metrics = queue.get_metrics()
+        assert metrics["completed"] == 1
+        assert metrics["renders_per_minute"] == 1
+        assert metrics["queue_latency_seconds"]["max"] >= 2
+
+    @pytest.mark.asyncio
+    async def test_failure_is_retried(self, queue, mock_db, card_service):
+        """失敗且未達嘗試上限 - 回到 pending，以指數退避延後重試"""
+        card_service.resolve_card_object = AsyncMock(side_effect=RuntimeError("R2 upload failed"))
+
+        before = datetime.now(timezone.utc)
+        await queue.process_job(make_job(attempts=2))
+
+        update = mock_db.share_cards.update_one.call_args[0][1]
+        assert update["$set"]["status"] == "pending"
+        assert update["$set"]["render_error"] == "R2 upload failed"
+        # 第二次失敗：base 2 秒 * 2，隨機抖動 0.5 ~ 1.0 倍
+        delay = (update["$set"]["next_attempt_at"] - before).total_seconds()
+        assert 2.0 <= delay <= 4.1
+        mock_db.share_cards.update_many.assert_not_called()
+        assert queue.get_metrics()["retried"] == 1
+
+    @pytest.mark.asyncio
+    async def test_failure_after_max_attempts(self, queue, mock_db, card_service):
+        """達嘗試上限 - 標記為 failed"""
+        card_service.resolve_card_object = AsyncMock(side_effect=RuntimeError("timeout"))
+
+        await queue.process_job(make_job(attempts=3))
+
+        update = mock_db.share_cards.update_one.call_args[0][1]
+        assert update["$set"]["status"] == "failed"
+        assert "next_attempt_at" not in update["$set"]
+        assert queue.get_metrics()["failed"] == 1
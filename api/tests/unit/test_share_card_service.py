@@ -0,0 +1,244 @@
+"""
+Share Card Service 單元測試
+測試內容定址快取：命中時跳過繪製與上傳；未命中時排入背景繪製佇列
+"""
+
+import pytest
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+from unittest.mock import AsyncMock, MagicMock
+from bson import ObjectId
+
+from src.services import share_card_service
+from src.services.share_card_service import (
+    ShareCardService,
+    card_content_hash,
+    card_object_key,
+)
+
+
+CARD_DATA = {"title": "First 10K", "value": "10 km", "subtitle": "PR"}
+
+ACHIEVEMENT = {
+    "_id": ObjectId(),
+    "achievement_type": "first_10k",
+    "metadata": {"title": "First 10K", "description": "Done"},
+    "achieved_at": datetime(2024, 5, 1, tzinfo=timezone.utc),
+}
+
+
+@pytest.fixture(autouse=True)
+def clear_card_cache():
+    """每個測試使用空的本機快取"""
+    share_card_service._card_object_cache.clear()
+    yield
+    share_card_service._card_object_cache.clear()
+
+
+@pytest.fixture
+def mock_db():
+    """模擬資料庫連線"""
+    db = MagicMock()
+    db.share_cards = AsyncMock()
+    db.share_cards.find_one = AsyncMock(return_value=None)
+    db.users = AsyncMock()
+    return db
+
+
+@pytest.fixture
+def generator():
+    """模擬分享卡片生成器"""
+    generator = MagicMock()
+    generator.generate_card = AsyncMock(return_value=BytesIO(b"\x89PNG"))
+    return generator
+
+
+@pytest.fixture
+def storage():
+    """模擬物件儲存"""
+    storage = MagicMock()
+    storage.object_exists = AsyncMock(return_value=False)
+    storage.upload_file = AsyncMock(side_effect=lambda image, key, **kwargs: f"https://cdn/{key}")
+    storage.public_url = MagicMock(side_effect=lambda key: f"https://cdn/{key}")
+    return storage
+
+
+@pytest.fixture
+def images():
+    """模擬衍生版本生成器"""
+    images = MagicMock()
+    images.create = AsyncMock(return_value={"thumb": {"webp": "https://cdn/thumb.webp"}})
+    images.variant_urls = MagicMock(return_value={"thumb": {"webp": "https://cdn/thumb.webp"}})
+    return images
+
+
+@pytest.fixture
+def service(mock_db, generator, storage, images):
+    """Share Card Service fixture"""
+    return ShareCardService(mock_db, generator=generator, storage=storage, images=images)
+
+
+class TestContentHash:
+    """測試內容雜湊"""
+
+    def test_hash_ignores_key_order(self):
+        """資料欄位順序不影響雜湊"""
+        reordered = dict(reversed(list(CARD_DATA.items())))
+        assert card_content_hash("minimal", CARD_DATA, "Runner") == \
+            card_content_hash("minimal", reordered, "Runner")
+
+    def test_hash_covers_template_and_name(self):
+        """模板或使用者名稱不同時雜湊不同"""
+        base = card_content_hash("minimal", CARD_DATA, "Runner")
+        assert card_content_hash("achievement", CARD_DATA, "Runner") != base
+        assert card_content_hash("minimal", CARD_DATA, "Walker") != base
+
+
+class TestResolveCardObject:
+    """測試卡片物件查詢順序"""
+
+    @pytest.mark.asyncio
+    async def test_miss_renders_and_uploads_once(self, service, generator, storage, images):
+        """未命中 - 繪製並上傳 (含衍生版本)，第二次由本機 LRU 命中"""
+        first = await service.resolve_card_object("minimal", CARD_DATA, "Runner")
+        second = await service.resolve_card_object("minimal", CARD_DATA, "Runner")
+
+        assert first["cache_hit"] is None
+        assert first["r2_key"] == card_object_key(first["content_hash"])
+        assert second["cache_hit"] == "memory"
+        assert second["card_url"] == first["card_url"]
+        assert second["image_variants"] == first["image_variants"] == images.create.return_value
+        generator.generate_card.assert_awaited_once()
+        storage.upload_file.assert_awaited_once()
+        images.create.assert_awaited_once_with(
+            b"\x89PNG", "share-cards", content_hash=first["content_hash"]
+        )
+
+    @pytest.mark.asyncio
+    async def test_database_hit_skips_render(self, service, mock_db, generator, storage):
+        """既有分享卡片記錄 - 沿用圖片物件"""
+        mock_db.share_cards.find_one = AsyncMock(return_value={
+            "r2_key": "share-cards/ab/abc.png",
+            "card_url": "https://cdn/share-cards/ab/abc.png",
+        })
+
+        result = await service.resolve_card_object("minimal", CARD_DATA, "Runner")
+
+        assert result["cache_hit"] == "database"
+        generator.generate_card.assert_not_called()
+        storage.upload_file.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_storage_hit_skips_render(self, service, generator, storage, images):
+        """物件儲存已有圖片 - 不重新繪製與上傳，衍生版本 URL 由內容雜湊推得"""
+        storage.object_exists = AsyncMock(return_value=True)
+
+        result = await service.resolve_card_object("minimal", CARD_DATA, "Runner")
+
+        assert result["cache_hit"] == "storage"
+        assert result["image_variants"] == images.variant_urls.return_value
+        images.create.assert_not_called()
+        generator.generate_card.assert_not_called()
+        storage.upload_file.assert_not_called()
+
+
+class TestCreateAchievementShareCard:
+    """測試建立成就分享卡片"""
+
+    @pytest.mark.asyncio
+    async def test_upserts_record_by_content_hash(self, service, mock_db):
+        """相同成就與內容只保留一筆記錄"""
+        user_id = ObjectId()
+        achievement = {
+            "_id": ObjectId(),
+            "achievement_type": "first_10k",
+            "metadata": {"title": "First 10K", "description": "Done"},
+            "achieved_at": datetime(2024, 5, 1, tzinfo=timezone.utc),
+        }
+        mock_db.users.find_one = AsyncMock(return_value={"display_name": "Runner"})
+
+        async def upsert(query, update, **kwargs):
+            return {"_id": ObjectId(), **update["$setOnInsert"], **update["$set"]}
+
+        mock_db.share_cards.find_one_and_update = AsyncMock(side_effect=upsert)
+
+        card = await service.create_achievement_share_card(
+            str(user_id), achievement, template="fireworks"
+        )
+
+        query, update = mock_db.share_cards.find_one_and_update.call_args[0]
+        assert query["achievement_id"] == str(achievement["_id"])
+        assert query["content_hash"] == update["$setOnInsert"]["content_hash"]
+        assert update["$set"]["template"] == "fireworks"
+        assert "expires_at" not in update["$setOnInsert"]
+        assert card.template == "fireworks"
+
+    @pytest.mark.asyncio
+    async def test_new_content_is_queued(self, service, mock_db, generator):
+        """圖片尚未存在 - 建立 pending 記錄，不在請求中繪製"""
+        mock_db.users.find_one = AsyncMock(return_value={"display_name": "Runner"})
+
+        async def upsert(query, update, **kwargs):
+            return {"_id": ObjectId(), **update["$setOnInsert"], **update["$set"]}
+
+        mock_db.share_cards.find_one_and_update = AsyncMock(side_effect=upsert)
+
+        card = await service.create_achievement_share_card(str(ObjectId()), ACHIEVEMENT)
+
+        update = mock_db.share_cards.find_one_and_update.call_args[0][1]
+        assert update["$setOnInsert"]["status"] == "pending"
+        assert update["$setOnInsert"]["render_job"]["template"] == "minimal"
+        assert card.status == "pending"
+        assert card.card_url is None
+        generator.generate_card.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_known_content_is_ready(self, service, mock_db, generator):
+        """圖片已存在 - 直接回傳 ready 記錄"""
+        mock_db.users.find_one = AsyncMock(return_value={"display_name": "Runner"})
+        mock_db.share_cards.find_one = AsyncMock(return_value={
+            "r2_key": "share-cards/ab/abc.png",
+            "card_url": "https://cdn/share-cards/ab/abc.png",
+        })
+
+        async def upsert(query, update, **kwargs):
+            return {"_id": ObjectId(), **update["$setOnInsert"], **update["$set"]}
+
+        mock_db.share_cards.find_one_and_update = AsyncMock(side_effect=upsert)
+
+        card = await service.create_achievement_share_card(str(ObjectId()), ACHIEVEMENT)
+
+        update = mock_db.share_cards.find_one_and_update.call_args[0][1]
+        assert "render_job" not in update["$setOnInsert"]
+        assert card.status == "ready"
+        assert card.card_url == "https://cdn/share-cards/ab/abc.png"
+        generator.generate_card.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_failed_record_is_requeued(self, service, mock_db):
+        """先前繪製失敗 - 重新排入佇列"""
+        mock_db.users.find_one = AsyncMock(return_value=None)
+        card_id = ObjectId()
+        failed = {
+            "_id": card_id,
+            "user_id": ObjectId(),
+            "achievement_id": ACHIEVEMENT["_id"],
+            "achievement_type": "first_10k",
+            "template": "basic",
+            "title": "First 10K",
+            "description": "Done",
+            "metadata": {},
+            "status": "failed",
+            "generated_at": datetime.now(timezone.utc),
+            "expires_at": datetime.now(timezone.utc) + timedelta(days=30),
+        }
+        mock_db.share_cards.find_one_and_update = AsyncMock(
+            side_effect=[failed, {**failed, "status": "pending"}]
+        )
+
+        card = await service.create_achievement_share_card(str(ObjectId()), ACHIEVEMENT)
+
+        requeue_query, requeue_update = mock_db.share_cards.find_one_and_update.call_args[0]
+        assert requeue_query == {"_id": card_id, "status": "failed"}
+        assert requeue_update["$set"]["render_attempts"] == 0
+        assert card.status == "pending"
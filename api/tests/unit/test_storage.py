@@ -0,0 +1,254 @@
+"""
+Object Storage 單元測試
+測試本機儲存、multipart 分段與平行上傳、R2 client 呼叫流程
+"""
+
+import logging
+import os
+import time
+import pytest
+from io import BytesIO
+from unittest.mock import MagicMock
+
+from botocore.exceptions import ClientError
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.core.storage import LocalStorage, ObjectStorage, R2Storage, MIN_MULTIPART_CHUNK_SIZE
+from src.routers.local_storage import create_local_storage_router
+
+
+@pytest.fixture
+def local_storage(tmp_path):
+    """小分段設定的本機儲存 (以少量資料觸發 multipart)"""
+    storage = LocalStorage(
+        str(tmp_path),
+        public_base_url="http://cdn.test",
+        upload_base_url="http://testserver/_local-storage",
+        signing_key="test-signing-key",
+        max_connections=8,
+        multipart_threshold=64 * 1024,
+        multipart_chunk_size=32 * 1024,
+        multipart_concurrency=3
+    )
+    yield storage
+    storage.close()
+
+
+class TestLocalStorage:
+    """測試本機檔案系統儲存"""
+
+    @pytest.mark.asyncio
+    async def test_small_object_round_trip(self, local_storage):
+        """小物件單次寫入，可查詢與刪除"""
+        url = await local_storage.upload_file(BytesIO(b"\x89PNG"), "cards/a.png", content_type="image/png")
+
+        assert url == "http://cdn.test/cards/a.png"
+        assert local_storage.object_path("cards/a.png").read_bytes() == b"\x89PNG"
+        assert await local_storage.object_exists("cards/a.png") is True
+
+        assert await local_storage.delete_file("cards/a.png") is True
+        assert await local_storage.object_exists("cards/a.png") is False
+
+    @pytest.mark.asyncio
+    async def test_large_object_uses_parallel_multipart(self, local_storage):
+        """大型物件分段平行上傳，組合後內容一致"""
+        payload = os.urandom(300 * 1024)
+        in_flight = 0
+        max_in_flight = 0
+        part_numbers = []
+        original_upload_part = local_storage._upload_part
+
+        def tracking_upload_part(object_key, upload_id, part_number, body):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            try:
+                time.sleep(0.02)
+                part_numbers.append(part_number)
+                return original_upload_part(object_key, upload_id, part_number, body)
+            finally:
+                in_flight -= 1
+
+        local_storage._upload_part = tracking_upload_part
+
+        await local_storage.upload_file(BytesIO(payload), "videos/run.mp4")
+
+        assert local_storage.object_path("videos/run.mp4").read_bytes() == payload
+        assert sorted(part_numbers) == list(range(1, 11))
+        assert 1 < max_in_flight <= local_storage.multipart_concurrency
+        assert not any((local_storage.root / ".multipart").iterdir())
+
+    @pytest.mark.asyncio
+    async def test_failed_part_aborts_upload(self, local_storage):
+        """分段失敗時中止上傳，不留下物件與暫存分段"""
+        def failing_upload_part(object_key, upload_id, part_number, body):
+            if part_number == 3:
+                raise OSError("disk full")
+            return "etag"
+
+        local_storage._upload_part = failing_upload_part
+
+        with pytest.raises(RuntimeError, match="upload failed"):
+            await local_storage.upload_file(BytesIO(os.urandom(200 * 1024)), "videos/run.mp4")
+
+        assert await local_storage.object_exists("videos/run.mp4") is False
+        assert not any((local_storage.root / ".multipart").iterdir())
+
+    @pytest.mark.asyncio
+    async def test_stat_object(self, local_storage):
+        """物件大小與 MIME type"""
+        await local_storage.upload_file(BytesIO(b"abc"), "a.webp", content_type="image/webp")
+
+        assert await local_storage.stat_object("a.webp") == {"size": 3, "content_type": "image/webp"}
+        assert await local_storage.stat_object("missing.webp") is None
+
+    def test_rejects_key_outside_root(self, local_storage):
+        """object key 不可跳出儲存根目錄"""
+        with pytest.raises(ValueError):
+            local_storage.object_path("../escape.png")
+
+
+class TestR2Storage:
+    """測試 R2 (S3 API) 呼叫流程"""
+
+    def _storage(self, client):
+        return R2Storage(
+            bucket_name="bucket",
+            public_base_url="https://cdn.test",
+            client=client,
+            multipart_threshold=MIN_MULTIPART_CHUNK_SIZE,
+            multipart_chunk_size=MIN_MULTIPART_CHUNK_SIZE
+        )
+
+    def test_rejects_small_chunk_size(self):
+        """分段小於 S3 下限時拒絕"""
+        with pytest.raises(ValueError):
+            R2Storage(client=MagicMock(), multipart_chunk_size=1024)
+
+    @pytest.mark.asyncio
+    async def test_small_object_uses_put_object(self):
+        """小物件使用單次 put_object"""
+        client = MagicMock()
+        storage = self._storage(client)
+
+        url = await storage.upload_file(BytesIO(b"data"), "a.png", content_type="image/png", metadata={"k": "v"})
+
+        assert url == "https://cdn.test/a.png"
+        client.put_object.assert_called_once_with(
+            Bucket="bucket", Key="a.png", Body=b"data", ContentType="image/png", Metadata={"k": "v"}
+        )
+        client.create_multipart_upload.assert_not_called()
+        storage.close()
+
+    @pytest.mark.asyncio
+    async def test_large_object_uses_multipart(self):
+        """大型物件使用 multipart upload，依分段編號完成"""
+        client = MagicMock()
+        client.create_multipart_upload.return_value = {"UploadId": "u1"}
+        client.upload_part.side_effect = lambda **kwargs: {"ETag": f"e{kwargs['PartNumber']}"}
+        storage = self._storage(client)
+
+        size = MIN_MULTIPART_CHUNK_SIZE * 2 + 10
+        await storage.upload_file(BytesIO(b"x" * size), "big.bin")
+
+        assert client.upload_part.call_count == 3
+        parts = client.complete_multipart_upload.call_args.kwargs["MultipartUpload"]["Parts"]
+        assert parts == [{"PartNumber": n, "ETag": f"e{n}"} for n in (1, 2, 3)]
+        client.put_object.assert_not_called()
+        storage.close()
+
+    def test_abort_failure_is_logged(self, caplog):
+        """中止 multipart 失敗時記錄警告，不拋出例外"""
+        client = MagicMock()
+        client.abort_multipart_upload.side_effect = ClientError({"Error": {"Code": "500"}}, "AbortMultipartUpload")
+        storage = self._storage(client)
+
+        with caplog.at_level(logging.WARNING, logger="src.core.storage"):
+            storage._abort_multipart_upload("big.bin", "u1")
+
+        assert "R2 abort multipart failed" in caplog.text
+        storage.close()
+
+    def test_base_class_is_abstract(self):
+        """未實作 primitives 的儲存類別無法建立"""
+        with pytest.raises(TypeError):
+            ObjectStorage()
+
+
+class TestPresignedPut:
+    """測試 presigned PUT 與本機上傳端點"""
+
+    @pytest.fixture
+    def client(self, local_storage):
+        app = FastAPI()
+        app.include_router(create_local_storage_router(local_storage))
+        return TestClient(app)
+
+    def test_upload_with_signed_constraints(self, local_storage, client):
+        """依簽發的 header 上傳成功，物件大小與 MIME type 符合"""
+        upload = local_storage.presign_put("uploads/avatar/u1/s1", "image/jpeg", 4)
+
+        response = client.put(upload["url"], content=b"\xff\xd8\xff\xe0", headers=upload["headers"])
+
+        assert response.status_code == 200
+        assert local_storage._stat_object("uploads/avatar/u1/s1") == {"size": 4, "content_type": "image/jpeg"}
+
+    def test_rejects_mismatched_headers(self, local_storage, client):
+        """Content-Type 或大小與簽章不符時拒絕"""
+        upload = local_storage.presign_put("uploads/avatar/u1/s1", "image/jpeg", 4)
+
+        wrong_type = client.put(upload["url"], content=b"1234", headers={"Content-Type": "image/png"})
+        too_large = client.put(upload["url"], content=b"12345", headers={"Content-Type": "image/jpeg"})
+
+        assert wrong_type.status_code == 403
+        assert too_large.status_code == 403
+        assert local_storage._stat_object("uploads/avatar/u1/s1") is None
+
+    def test_rejects_expired_url(self, local_storage):
+        """過期的 presigned URL 無效"""
+        upload = local_storage.presign_put("a.jpg", "image/jpeg", 4, expires_in=-1)
+        query = dict(part.split("=") for part in upload["url"].split("?")[1].split("&"))
+
+        assert local_storage.verify_presigned_put(
+            "a.jpg", "image/jpeg", 4, int(query["expires"]), query["signature"]
+        ) is False
+
+    def test_unsigned_storage_refuses_presign(self, tmp_path):
+        """未設定 STORAGE_SIGNING_KEY 時不簽發也不接受 presigned URL (不沿用 JWT 金鑰)"""
+        storage = LocalStorage(str(tmp_path))
+
+        with pytest.raises(RuntimeError, match="STORAGE_SIGNING_KEY"):
+            storage.presign_put("a.jpg", "image/jpeg", 4)
+        assert storage.verify_presigned_put("a.jpg", "image/jpeg", 4, int(time.time()) + 60, "sig") is False
+        storage.close()
+
+    def test_local_backend_requires_signing_key(self, monkeypatch):
+        from src.core import storage as storage_module
+
+        monkeypatch.setattr(storage_module.settings, "STORAGE_BACKEND", "local")
+        monkeypatch.setattr(storage_module.settings, "STORAGE_SIGNING_KEY", None)
+
+        with pytest.raises(ValueError, match="STORAGE_SIGNING_KEY"):
+            storage_module.create_object_storage()
+
+    def test_r2_presign_signs_length_and_type(self):
+        """R2 presigned URL 簽章涵蓋 Content-Type 與 Content-Length"""
+        client = MagicMock()
+        client.generate_presigned_url.return_value = "https://r2/presigned"
+        storage = R2Storage(bucket_name="bucket", client=client)
+
+        upload = storage.presign_put("uploads/a.jpg", "image/jpeg", 1024, expires_in=600)
+
+        client.generate_presigned_url.assert_called_once_with(
+            "put_object",
+            Params={"Bucket": "bucket", "Key": "uploads/a.jpg", "ContentType": "image/jpeg", "ContentLength": 1024},
+            ExpiresIn=600
+        )
+        assert upload == {
+            "url": "https://r2/presigned",
+            "method": "PUT",
+            "headers": {"Content-Type": "image/jpeg", "Content-Length": "1024"},
+        }
+        storage.close()
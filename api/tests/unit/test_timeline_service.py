@@ -0,0 +1,121 @@
+"""
+Timeline Service 單元測試
+測試里程碑游標分頁與時間軸摘要
+"""
+
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock
+from bson import ObjectId
+
+from src.services.timeline_service import (
+    TimelineService,
+    decode_milestone_cursor,
+    encode_milestone_cursor,
+)
+
+
+def make_milestone(user_id, achieved_at, **overrides):
+    """建立測試用里程碑文件"""
+    milestone = {
+        "_id": ObjectId(),
+        "user_id": str(user_id),
+        "milestone_type": "custom",
+        "title": "里程碑",
+        "description": None,
+        "metadata": {},
+        "achieved_at": achieved_at,
+        "created_at": achieved_at,
+        "highlighted": False,
+    }
+    milestone.update(overrides)
+    return milestone
+
+
+class TestListMilestones:
+    """測試里程碑游標分頁"""
+
+    @pytest.fixture
+    def mock_db(self):
+        """模擬資料庫連線"""
+        db = MagicMock()
+        db.milestones = MagicMock()
+        return db
+
+    @pytest.fixture
+    def service(self, mock_db):
+        """Timeline Service fixture"""
+        return TimelineService(mock_db)
+
+    def mock_find(self, mock_db, documents):
+        """模擬 find().sort().limit().to_list() 查詢鏈"""
+        cursor = MagicMock()
+        cursor.sort.return_value = cursor
+        cursor.limit.return_value = cursor
+        cursor.to_list = AsyncMock(return_value=documents)
+        mock_db.milestones.find = MagicMock(return_value=cursor)
+        return cursor
+
+    @pytest.mark.asyncio
+    async def test_first_page_fetches_one_screen(self, service, mock_db):
+        """第一頁 - 只取 limit + 1 筆並回傳下一頁游標"""
+        user_id = ObjectId()
+        now = datetime(2024, 6, 1, tzinfo=timezone.utc)
+        documents = [make_milestone(user_id, now - timedelta(days=i)) for i in range(3)]
+        cursor = self.mock_find(mock_db, documents)
+
+        result = await service.list_milestones(str(user_id), limit=2)
+
+        cursor.limit.assert_called_once_with(3)
+        cursor.sort.assert_called_once_with([("achieved_at", -1), ("_id", -1)])
+        assert len(result.milestones) == 2
+        assert result.has_more is True
+        assert result.next_cursor == encode_milestone_cursor(documents[1])
+
+    @pytest.mark.asyncio
+    async def test_cursor_builds_keyset_query(self, service, mock_db):
+        """帶游標 - 以 (achieved_at, _id) 建立 keyset 條件"""
+        user_id = ObjectId()
+        last = make_milestone(user_id, datetime(2024, 6, 1, tzinfo=timezone.utc))
+        self.mock_find(mock_db, [])
+
+        result = await service.list_milestones(
+            str(user_id),
+            highlighted_only=True,
+            cursor=encode_milestone_cursor(last)
+        )
+
+        query = mock_db.milestones.find.call_args[0][0]
+        assert query["highlighted"] is True
+        assert query["$or"] == [
+            {"achieved_at": {"$lt": last["achieved_at"]}},
+            {"achieved_at": last["achieved_at"], "_id": {"$lt": last["_id"]}},
+        ]
+        assert result.has_more is False
+        assert result.next_cursor is None
+
+    def test_invalid_cursor(self):
+        """游標格式錯誤"""
+        with pytest.raises(ValueError):
+            decode_milestone_cursor("not-a-cursor")
+
+
+class TestTimelineSummary:
+    """測試時間軸月份摘要"""
+
+    @pytest.mark.asyncio
+    async def test_summary_counts_per_month(self):
+        """各月份數量與總數"""
+        db = MagicMock()
+        cursor = MagicMock()
+        cursor.to_list = AsyncMock(return_value=[
+            {"_id": {"year": 2024, "month": 6}, "count": 3, "highlighted_count": 1},
+            {"_id": {"year": 2024, "month": 2}, "count": 2, "highlighted_count": 0},
+        ])
+        db.milestones.aggregate = MagicMock(return_value=cursor)
+
+        result = await TimelineService(db).get_timeline_summary(str(ObjectId()))
+
+        assert result.total == 5
+        assert [(m.year, m.month) for m in result.months] == [(2024, 6), (2024, 2)]
+        assert result.months[0].highlighted_count == 1
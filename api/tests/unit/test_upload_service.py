@@ -0,0 +1,238 @@
+"""
+Upload Service 單元測試
+測試上傳工作階段簽發、完成驗證與衍生版本套用
+"""
+
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock
+from bson import ObjectId
+
+from src.models import UploadSessionCreate, UploadSessionInDB
+from src.services.upload_service import UploadService
+
+VARIANTS = {
+    size: {"webp": f"https://cdn/avatars/ab/abc/{size}.webp"}
+    for size in ("full", "feed", "thumb")
+}
+
+
+@pytest.fixture
+def mock_db():
+    """模擬資料庫連線"""
+    db = MagicMock()
+    db.upload_sessions = AsyncMock()
+    db.activities = AsyncMock()
+    db.activities.update_one = AsyncMock(return_value=MagicMock(matched_count=1))
+    db.users = AsyncMock()
+    db.users.update_one = AsyncMock(return_value=MagicMock(matched_count=1))
+    return db
+
+
+@pytest.fixture
+def storage():
+    """模擬物件儲存"""
+    storage = MagicMock()
+    storage.presign_put = MagicMock(side_effect=lambda key, content_type, length, **kwargs: {
+        "url": f"https://r2/{key}?signature=x",
+        "method": "PUT",
+        "headers": {"Content-Type": content_type, "Content-Length": str(length)},
+    })
+    storage.stat_object = AsyncMock(return_value={"size": 1024, "content_type": "image/jpeg"})
+    storage.delete_file = AsyncMock(return_value=True)
+    return storage
+
+
+@pytest.fixture
+def images():
+    """模擬衍生版本生成器"""
+    images = MagicMock()
+    images.create_from_object = AsyncMock(return_value=VARIANTS)
+    return images
+
+
+@pytest.fixture
+def service(mock_db, storage, images):
+    """Upload Service fixture"""
+    return UploadService(mock_db, storage=storage, images=images)
+
+
+def make_session(user_id, status="pending", purpose="avatar", **overrides):
+    """與 create_session 相同方式序列化的工作階段文件 (ID 欄位為字串)"""
+    document = UploadSessionInDB(
+        user_id=ObjectId(user_id),
+        purpose=purpose,
+        object_key=f"uploads/{purpose}/{user_id}/s1",
+        content_type="image/jpeg",
+        content_length=1024,
+        status=status,
+        expires_at=datetime.now(timezone.utc) + timedelta(minutes=10),
+        **overrides,
+    ).dict(by_alias=True)
+    document["_id"] = ObjectId()
+    return document
+
+
+class TestCreateSession:
+    """測試建立上傳工作階段"""
+
+    @pytest.mark.asyncio
+    async def test_returns_presigned_put(self, service, mock_db, storage):
+        """簽發 presigned PUT，物件 key 以工作階段 ID 命名"""
+        user_id = str(ObjectId())
+
+        session = await service.create_session(
+            user_id, UploadSessionCreate(purpose="avatar", content_type="image/jpeg", content_length=1024)
+        )
+
+        document = mock_db.upload_sessions.insert_one.call_args[0][0]
+        assert document["object_key"] == f"uploads/avatar/{user_id}/{session.session_id}"
+        assert document["status"] == "pending"
+        assert session.upload_headers == {"Content-Type": "image/jpeg", "Content-Length": "1024"}
+        storage.presign_put.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_rejects_oversized_avatar(self, service, mock_db):
+        """超過用途大小上限時拒絕"""
+        with pytest.raises(ValueError, match="limit"):
+            await service.create_session(
+                str(ObjectId()),
+                UploadSessionCreate(purpose="avatar", content_type="image/png", content_length=6 * 1024 * 1024)
+            )
+        mock_db.upload_sessions.insert_one.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_requires_own_activity(self, service, mock_db):
+        """動態配圖只能上傳至自己的動態"""
+        mock_db.activities.find_one = AsyncMock(return_value=None)
+
+        with pytest.raises(ValueError, match="Activity not found"):
+            await service.create_session(
+                str(ObjectId()),
+                UploadSessionCreate(
+                    purpose="activity_image",
+                    content_type="image/jpeg",
+                    content_length=1024,
+                    activity_id=str(ObjectId())
+                )
+            )
+
+
+class TestCompleteSession:
+    """測試完成上傳"""
+
+    @pytest.mark.asyncio
+    async def test_verified_upload_is_processing(self, service, mock_db):
+        """物件與簽發條件一致 - 標記為 processing"""
+        user_id = str(ObjectId())
+        session = make_session(user_id)
+        mock_db.upload_sessions.find_one = AsyncMock(return_value=session)
+        mock_db.upload_sessions.find_one_and_update = AsyncMock(return_value={**session, "status": "processing"})
+
+        result = await service.complete_session(str(session["_id"]), user_id)
+
+        query, update = mock_db.upload_sessions.find_one_and_update.call_args[0]
+        assert query == {"_id": session["_id"], "status": "pending"}
+        assert update == {"$set": {"status": "processing"}}
+        assert result.status == "processing"
+
+    @pytest.mark.asyncio
+    async def test_mismatched_upload_is_rejected(self, service, mock_db, storage):
+        """大小或 MIME type 不符 - 刪除物件並標記失敗"""
+        user_id = str(ObjectId())
+        session = make_session(user_id)
+        mock_db.upload_sessions.find_one = AsyncMock(return_value=session)
+        storage.stat_object = AsyncMock(return_value={"size": 2048, "content_type": "image/jpeg"})
+
+        with pytest.raises(ValueError, match="does not match"):
+            await service.complete_session(str(session["_id"]), user_id)
+
+        storage.delete_file.assert_awaited_once_with(session["object_key"])
+        assert mock_db.upload_sessions.update_one.call_args[0][1]["$set"]["status"] == "failed"
+
+    @pytest.mark.asyncio
+    async def test_missing_object(self, service, mock_db, storage):
+        """物件尚未上傳 - 保持 pending 以便重試"""
+        user_id = str(ObjectId())
+        session = make_session(user_id)
+        mock_db.upload_sessions.find_one = AsyncMock(return_value=session)
+        storage.stat_object = AsyncMock(return_value=None)
+
+        with pytest.raises(ValueError, match="not found"):
+            await service.complete_session(str(session["_id"]), user_id)
+
+        mock_db.upload_sessions.update_one.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_repeat_completion_is_idempotent(self, service, mock_db, storage):
+        """已處理的工作階段直接回傳目前狀態"""
+        user_id = str(ObjectId())
+        session = make_session(user_id, status="ready", image_variants=VARIANTS)
+        mock_db.upload_sessions.find_one = AsyncMock(return_value=session)
+
+        result = await service.complete_session(str(session["_id"]), user_id)
+
+        assert result.status == "ready"
+        storage.stat_object.assert_not_called()
+
+
+class TestProcessSession:
+    """測試衍生版本產生與套用"""
+
+    @pytest.mark.asyncio
+    async def test_avatar_is_updated(self, service, mock_db, images):
+        """頭像 - 以縮圖 WebP 更新使用者頭像"""
+        user_id = str(ObjectId())
+        session = make_session(user_id, status="processing")
+        mock_db.upload_sessions.find_one = AsyncMock(return_value=session)
+
+        await service.process_session(str(session["_id"]))
+
+        images.create_from_object.assert_awaited_once_with(session["object_key"], "avatars")
+        user_query, user_update = mock_db.users.update_one.call_args[0]
+        assert user_query == {"_id": ObjectId(user_id)}
+        assert user_update["$set"]["avatar_url"] == VARIANTS["thumb"]["webp"]
+        session_update = mock_db.upload_sessions.update_one.call_args[0][1]
+        assert session_update["$set"]["status"] == "ready"
+        assert session_update["$set"]["image_variants"] == VARIANTS
+
+    @pytest.mark.asyncio
+    async def test_activity_image_is_updated(self, service, mock_db):
+        """動態配圖 - 寫入 image_url 與 image_variants"""
+        activity_id = ObjectId()
+        session = make_session(str(ObjectId()), status="processing", purpose="activity_image", activity_id=activity_id)
+        mock_db.upload_sessions.find_one = AsyncMock(return_value=session)
+
+        await service.process_session(str(session["_id"]))
+
+        query, update = mock_db.activities.update_one.call_args[0]
+        assert query == {"_id": activity_id}
+        assert update["$set"]["image_url"] == VARIANTS["full"]["webp"]
+        assert update["$set"]["image_variants"] == VARIANTS
+
+    @pytest.mark.asyncio
+    async def test_deleted_activity_fails_session(self, service, mock_db):
+        """動態已刪除 (未比對到文件) - 標記失敗而非 ready"""
+        session = make_session(str(ObjectId()), status="processing", purpose="activity_image", activity_id=ObjectId())
+        mock_db.upload_sessions.find_one = AsyncMock(return_value=session)
+        mock_db.activities.update_one = AsyncMock(return_value=MagicMock(matched_count=0))
+
+        await service.process_session(str(session["_id"]))
+
+        update = mock_db.upload_sessions.update_one.call_args[0][1]
+        assert update["$set"]["status"] == "failed"
+        assert update["$set"]["error"] == "Activity not found"
+
+    @pytest.mark.asyncio
+    async def test_undecodable_image_fails(self, service, mock_db, images):
+        """無法解碼的圖片 - 標記失敗"""
+        session = make_session(str(ObjectId()), status="processing")
+        mock_db.upload_sessions.find_one = AsyncMock(return_value=session)
+        images.create_from_object = AsyncMock(side_effect=ValueError("Unsupported image"))
+
+        await service.process_session(str(session["_id"]))
+
+        update = mock_db.upload_sessions.update_one.call_args[0][1]
+        assert update["$set"]["status"] == "failed"
+        assert update["$set"]["error"] == "Unsupported image"
+        mock_db.users.update_one.assert_not_called()
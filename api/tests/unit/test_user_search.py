@@ -0,0 +1,131 @@
+"""
+User Search 單元測試
+測試 Email 前綴與顯示名稱 n-gram 索引詞、查詢條件與好友搜尋查詢形狀
+"""
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from bson import ObjectId
+
+from src.utils.user_search import (
+    MAX_PREFIX_LENGTH,
+    email_prefix_filter,
+    name_filter,
+    name_grams,
+    query_grams,
+    search_fields,
+)
+
+
+class TestSearchTerms:
+    """測試索引詞產生"""
+
+    def test_latin_names_index_word_prefixes(self):
+        grams = name_grams("Alice Chen")
+        assert {"a", "ali", "alice", "c", "che", "chen"} <= set(grams)
+        assert "lice" not in grams
+        assert set(query_grams("ALI che")) <= set(grams)
+
+    def test_cjk_names_index_unigrams_and_bigrams(self):
+        grams = name_grams("王小明")
+        assert grams == sorted({"王", "小", "明", "王小", "小明"})
+        for query in ("王", "小明", "王小明"):
+            assert set(query_grams(query)) <= set(grams)
+        assert not set(query_grams("王明")) <= set(grams)
+
+    def test_mixed_and_fullwidth_names(self):
+        grams = name_grams("Ａｍｙ王 さくら")
+        assert {"amy", "王", "さく", "くら"} <= set(grams)
+        assert set(query_grams("amy さくら")) <= set(grams)
+
+    def test_long_words_are_truncated(self):
+        word = "a" * 40
+        assert max(map(len, name_grams(word))) == MAX_PREFIX_LENGTH
+        assert query_grams(word) == [word[:MAX_PREFIX_LENGTH]]
+
+    def test_search_fields(self):
+        fields = search_fields("Runner@Example.COM", "Runner")
+        assert fields["email_normalized"] == "runner@example.com"
+        assert "run" in fields["name_grams"]
+
+
+class TestSearchFilters:
+    """測試查詢條件只使用索引範圍與等值比對"""
+
+    def test_email_prefix_is_anchored_range(self):
+        assert email_prefix_filter("  Foo.Bar ") == {
+            "email_normalized": {"$gte": "foo.bar", "$lt": "foo.bas"}
+        }
+
+    def test_upper_bound_skips_invalid_successors(self):
+        """上界不產生代理字元，也不超出 U+10FFFF"""
+        import bson
+
+        assert email_prefix_filter("a\ud7ff")["email_normalized"]["$lt"] == "a\ue000"
+        assert email_prefix_filter("ab\U0010ffff")["email_normalized"]["$lt"] == "ac"
+        assert email_prefix_filter("\U0010ffff\U0010ffff") == {
+            "email_normalized": {"$gte": "\U0010ffff\U0010ffff"}
+        }
+        for query in ("a\ud7ff", "ab\U0010ffff", "\U0010ffff"):
+            bson.encode(email_prefix_filter(query))
+
+    def test_regex_metacharacters_are_literal(self):
+        search_filter = email_prefix_filter(".*(a+)+$")
+        assert search_filter["email_normalized"]["$gte"] == ".*(a+)+$"
+        assert "$regex" not in str(search_filter)
+        assert name_filter(".*(") is None
+
+    def test_empty_queries(self):
+        assert email_prefix_filter("   ") is None
+        assert name_filter("!!!") is None
+
+    def test_most_selective_gram_first(self):
+        assert name_filter("王小明 alice")["name_grams"]["$all"] == ["alice", "小明", "王小"]
+
+
+class TestFriendSearch:
+    """測試好友搜尋使用搜尋索引欄位"""
+
+    @pytest.fixture
+    def db(self):
+        db = MagicMock()
+        cursor = MagicMock()
+        cursor.limit.return_value = cursor
+        cursor.to_list = AsyncMock(return_value=[{"_id": ObjectId(), "display_name": "王小明"}])
+        db.users.find = MagicMock(return_value=cursor)
+        return db
+
+    @staticmethod
+    def service(db):
+        from src.services.friend_service import FriendService
+
+        graph = MagicMock(friend_ids=AsyncMock(return_value=frozenset()))
+        blocks = MagicMock(blocked_ids=AsyncMock(return_value=frozenset()))
+        return FriendService(db, graph=graph, blocks=blocks)
+
+    @pytest.mark.asyncio
+    async def test_email_search_is_bounded_prefix_lookup(self, db):
+        from src.services.friend_service import SEARCH_LIMIT
+
+        user_id = str(ObjectId())
+        results = await self.service(db).search_friends(user_id, "email", "Runner@")
+
+        assert len(results) == 1
+        search_filter = db.users.find.call_args[0][0]
+        assert search_filter == {
+            "email_normalized": {"$gte": "runner@", "$lt": "runnerA"},
+            "_id": {"$ne": ObjectId(user_id)},
+        }
+        db.users.find.return_value.limit.assert_called_once_with(SEARCH_LIMIT)
+
+    @pytest.mark.asyncio
+    async def test_name_search_uses_grams(self, db):
+        results = await self.service(db).search_friends(str(ObjectId()), "name", "小明")
+
+        assert results[0].display_name == "王小明"
+        assert db.users.find.call_args[0][0]["name_grams"] == {"$all": ["小明"]}
+
+    @pytest.mark.asyncio
+    async def test_unsearchable_query_skips_database(self, db):
+        assert await self.service(db).search_friends(str(ObjectId()), "name", "***") == []
+        db.users.find.assert_not_called()
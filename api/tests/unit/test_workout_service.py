@@ -138,14 +138,20 @@ class TestWorkoutServiceCRUD:
         user_id = str(ObjectId())
         workout_id = str(ObjectId())
 
-        mock_result = MagicMock()
-        mock_result.modified_count = 1
-        mock_db.workouts.update_one = AsyncMock(return_value=mock_result)
+        mock_workout = {
+            "_id": ObjectId(workout_id),
+            "user_id": ObjectId(user_id),
+            "workout_type": "running",
+            "start_time": datetime.now(timezone.utc),
+            "duration_minutes": 45,
+            "is_deleted": False,
+        }
+        mock_db.workouts.find_one_and_update = AsyncMock(return_value=mock_workout)
 
         result = await workout_service.soft_delete_workout(workout_id, user_id)
 
         assert result is True
-        mock_db.workouts.update_one.assert_called_once()
+        mock_db.workouts.find_one_and_update.assert_called_once()
 
     @pytest.mark.asyncio
     async def test_restore_workout_success(self, workout_service, mock_db):
@@ -162,16 +168,17 @@ class TestWorkoutServiceCRUD:
             "delete_after": datetime.now(timezone.utc) + timedelta(days=30),
         }
 
-        mock_restored = {**mock_deleted_workout, "is_deleted": False}
-
-        mock_db.workouts.find_one = AsyncMock(return_value=mock_deleted_workout)
-        mock_db.workouts.find_one_and_update = AsyncMock(return_value=mock_restored)
+        mock_db.workouts.find_one_and_update = AsyncMock(return_value=mock_deleted_workout)
 
         result = await workout_service.restore_workout(workout_id, user_id)
 
         assert result is not None
-        mock_db.workouts.find_one.assert_called_once()
+        assert result.is_deleted is False
         mock_db.workouts.find_one_and_update.assert_called_once()
+        query = mock_db.workouts.find_one_and_update.call_args[0][0]
+        assert query["is_deleted"] is True
+        assert "user_id" in query
+        assert query["$or"][1]["delete_after"]["$gte"] <= datetime.now(timezone.utc)
 
     @pytest.mark.asyncio
     async def test_restore_workout_expired(self, workout_service, mock_db):
@@ -179,20 +186,51 @@ class TestWorkoutServiceCRUD:
         user_id = str(ObjectId())
         workout_id = str(ObjectId())
 
-        mock_deleted_workout = {
+        # 超過期限的記錄不符合更新條件
+        mock_db.workouts.find_one_and_update = AsyncMock(return_value=None)
+
+        result = await workout_service.restore_workout(workout_id, user_id)
+
+        assert result is None
+
+    @pytest.mark.asyncio
+    async def test_concurrent_restore_applies_change_once(self, workout_service, mock_db):
+        """測試並行復原 (或復原期間被清除) 只有一方觸發變更 hook"""
+        user_id = str(ObjectId())
+        workout_id = str(ObjectId())
+        deleted_workout = {
             "_id": ObjectId(workout_id),
             "user_id": ObjectId(user_id),
             "workout_type": "running",
+            "start_time": datetime.now(timezone.utc),
+            "duration_minutes": 30,
             "is_deleted": True,
-            "deleted_at": datetime.now(timezone.utc) - timedelta(days=31),
-            "delete_after": datetime.now(timezone.utc) - timedelta(days=1),  # 已過期
+            "deleted_at": datetime.now(timezone.utc),
+            "delete_after": datetime.now(timezone.utc) + timedelta(days=30),
         }
+        mock_db.workouts.find_one_and_update = AsyncMock(side_effect=[deleted_workout, None])
+        workout_service._on_workout_changed = AsyncMock()
 
-        mock_db.workouts.find_one = AsyncMock(return_value=mock_deleted_workout)
+        first = await workout_service.restore_workout(workout_id, user_id)
+        second = await workout_service.restore_workout(workout_id, user_id)
 
-        result = await workout_service.restore_workout(workout_id, user_id)
+        assert first is not None and second is None
+        workout_service._on_workout_changed.assert_awaited_once()
+        before, after = workout_service._on_workout_changed.await_args[0]
+        assert before["is_deleted"] is True
+        assert after["is_deleted"] is False and "delete_after" not in after
 
-        assert result is None
+    @pytest.mark.asyncio
+    async def test_purge_expired_trash(self, workout_service, mock_db):
+        """測試永久刪除超過保留期限的垃圾桶記錄"""
+        mock_db.workouts.delete_many = AsyncMock(return_value=MagicMock(deleted_count=4))
+
+        purged = await workout_service.purge_expired_trash()
+
+        assert purged == 4
+        query = mock_db.workouts.delete_many.call_args[0][0]
+        assert query["is_deleted"] is True
+        assert query["delete_after"]["$lt"] <= datetime.now(timezone.utc)
 
 
 class TestWorkoutServiceBatch: